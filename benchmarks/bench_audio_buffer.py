@@ -0,0 +1,91 @@
+"""Micro-benchmarks for AudioBuffer against pydub's AudioSegment arithmetic.
+
+Random 16-bit PCM is generated in memory for each requested duration and the
+same operations the normalizer needs (RMS/dBFS, peak, gain) are timed on both
+implementations. pydub keeps its raw data as bytes and returns a new
+AudioSegment from apply_gain, while AudioBuffer works in place on a bytearray.
+
+Usage:
+    uv run python benchmarks/bench_audio_buffer.py --durations 60 3600 10800
+
+Note that a multi-hour input needs several GB of RAM for the pydub side alone
+(44.1 kHz stereo is about 635 MB per hour, and apply_gain copies it).
+"""
+
+import argparse
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio_buffer import AudioBuffer
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+GAIN_DB = -3.0
+
+
+def _time(func: Callable[[], object]) -> float:
+    """Return the wall time of one call to func, in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench(duration_s: int) -> list[tuple[str, float, float]]:
+    """Time each operation on duration_s seconds of random stereo audio.
+
+    Args:
+        duration_s: Length of the generated audio in seconds.
+
+    Returns:
+        A list of (operation, pydub seconds, AudioBuffer seconds).
+    """
+    rng = np.random.default_rng(0)
+    samples = rng.integers(
+        -8000, 8000, size=duration_s * SAMPLE_RATE * CHANNELS, dtype=np.int16
+    )
+    data = bytearray(samples.tobytes())
+    del samples
+
+    segment = AudioSegment(
+        data=bytes(data), sample_width=2, frame_rate=SAMPLE_RATE, channels=CHANNELS
+    )
+    buffer = AudioBuffer(data, CHANNELS, SAMPLE_RATE)
+    results = [
+        ("dBFS", _time(lambda: segment.dBFS), _time(lambda: buffer.dbfs)),
+        ("peak", _time(lambda: segment.max), _time(lambda: buffer.peak)),
+        (
+            "apply_gain",
+            _time(lambda: segment.apply_gain(GAIN_DB)),
+            _time(lambda: buffer.apply_gain(GAIN_DB)),
+        ),
+    ]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--durations",
+        type=int,
+        nargs="+",
+        default=[60, 3600, 10800],
+        help="Input lengths in seconds. Defaults to 60 3600 10800.",
+    )
+    args = parser.parse_args()
+    print(
+        f"{'duration':>9} {'operation':<11} {'pydub (s)':>10} {'numpy (s)':>10} "
+        f"{'speedup':>8}"
+    )
+    for duration in args.durations:
+        for operation, pydub_s, numpy_s in bench(duration):
+            print(
+                f"{duration:>8}s {operation:<11} {pydub_s:>10.3f} {numpy_s:>10.3f} "
+                f"{pydub_s / numpy_s:>7.1f}x"
+            )
@@ -0,0 +1,79 @@
+"""Compare opening video files through VideoFileClip and AudioFileClip.
+
+For every file, each loader runs in a fresh interpreter so the measurements do
+not share caches or memory. Two numbers are reported per file and loader:
+
+* time to first audio sample: wall time from constructing the clip to holding
+  the first decoded chunk of audio.
+* peak RSS: the high-water mark of the Python process plus the largest ffmpeg
+  child it spawned.
+
+Usage:
+    uv run python benchmarks/bench_audio_open.py video_1.mkv video_2.mp4
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+LOADERS = ("VideoFileClip", "AudioFileClip")
+
+_CHILD_SCRIPT = """
+import json, resource, sys, time
+import moviepy
+
+loader, path = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+clip = getattr(moviepy, loader)(path)
+audio = clip.audio if loader == "VideoFileClip" else clip
+next(audio.iter_chunks(chunksize=1024))
+elapsed = time.perf_counter() - start
+clip.close()
+self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+print(json.dumps({"first_sample_s": elapsed, "peak_rss_kb": self_rss + child_rss}))
+"""
+
+
+def measure(loader: str, file_path: str) -> dict[str, float]:
+    """Open file_path with the named moviepy loader in a fresh interpreter.
+
+    Args:
+        loader: Name of the moviepy clip class to use.
+        file_path: Path to a video file with an audio track.
+
+    Returns:
+        A dict with first_sample_s and peak_rss_kb.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT, loader, file_path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", help="Video files to open.")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per file and loader; the fastest is reported. Defaults to 3.",
+    )
+    args = parser.parse_args()
+    print(
+        f"{'file':<40} {'loader':<14} {'first sample (ms)':>18} {'peak RSS (MB)':>14}"
+    )
+    for file_path in args.files:
+        for loader in LOADERS:
+            runs = [measure(loader, file_path) for _ in range(args.repeat)]
+            first_sample = min(run["first_sample_s"] for run in runs) * 1000
+            peak_rss = max(run["peak_rss_kb"] for run in runs) / 1024
+            print(
+                f"{file_path[-40:]:<40} {loader:<14} {first_sample:>18.1f} "
+                f"{peak_rss:>14.1f}"
+            )
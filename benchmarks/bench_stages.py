@@ -0,0 +1,308 @@
+"""Benchmark the extract, normalize and tag stages on synthetic media.
+
+Synthetic videos and mp3s are generated with ffmpeg (see synthetic_media.py)
+for every requested duration and channel count, in several containers and
+codecs. Each stage variant is then run on each matching file in a fresh
+interpreter, so runs do not share caches or memory, and the following is
+recorded per run:
+
+* throughput: seconds of audio processed per wall-clock second.
+* peak RSS: the high-water mark of the Python process plus the largest child
+  (ffmpeg) process it spawned.
+* storage I/O: bytes read from and written to block devices by the process
+  and its children (getrusage block counts; reads served from the page cache
+  do not count).
+* Python I/O: bytes the Python process itself read and wrote through file
+  descriptors, pipes from ffmpeg included (Linux only).
+
+The fastest of --repeat runs is kept. Results are written as JSON with stable
+keys and ordering, so files from two commits can be diffed directly, or
+compared with --baseline.
+
+Usage:
+    uv run python benchmarks/bench_stages.py --output bench.json
+    uv run python benchmarks/bench_stages.py --baseline bench.json --stages tag
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from synthetic_media import MediaSpec, default_specs, generate
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Stage variant -> (module, class, extra kwargs, whether it takes videos).
+STAGES: dict[str, tuple[str, str, dict[str, Any], bool]] = {
+    "extract": ("audio_extractor", "AudioExtractor", {}, True),
+    "extract_copy": ("audio_extractor", "AudioExtractor", {"copy_stream": True}, True),
+    "normalize": ("audio_normalizer", "AudioNormalizer", {"target_dbfs": -20.0}, False),
+    "normalize_streaming": (
+        "audio_normalizer",
+        "AudioNormalizer",
+        {"target_dbfs": -20.0, "streaming": True},
+        False,
+    ),
+    "normalize_lufs": (
+        "audio_normalizer",
+        "AudioNormalizer",
+        {"target_dbfs": -23.0, "mode": "lufs", "streaming": True},
+        False,
+    ),
+    "normalize_lossless": (
+        "audio_normalizer",
+        "AudioNormalizer",
+        {"target_dbfs": -20.0, "lossless": True},
+        False,
+    ),
+    "tag": (
+        "audio_tagger",
+        "AudioTagger",
+        {"artist_tag": "Bench Artist", "album_tag": "Bench Album"},
+        False,
+    ),
+    "tag_in_place": (
+        "audio_tagger",
+        "AudioTagger",
+        {"artist_tag": "Bench Artist", "album_tag": "Bench Album", "in_place": True},
+        False,
+    ),
+}
+
+_CHILD_SCRIPT = """
+import contextlib, importlib, io, json, resource, sys, time
+from pathlib import Path
+
+config = json.loads(sys.argv[1])
+sys.path.insert(0, config["src_dir"])
+module = importlib.import_module(config["module"])
+# Stage classes read their output directory from these module globals.
+for name in ("EXTRACTED_DIR", "NORMALIZED_DIR"):
+    if hasattr(module, name):
+        setattr(module, name, Path(config["out_dir"]))
+
+
+def python_io():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except OSError:
+        return None
+
+
+def block_io():
+    blocks = [
+        resource.getrusage(who)
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    ]
+    return (
+        sum(usage.ru_inblock for usage in blocks) * 512,
+        sum(usage.ru_oublock for usage in blocks) * 512,
+    )
+
+
+processor = getattr(module, config["class"])(config["path"], **config["kwargs"])
+io_before, blocks_before = python_io(), block_io()
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    processor.process_file()
+elapsed = time.perf_counter() - start
+io_after, blocks_after = python_io(), block_io()
+self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+print(json.dumps({
+    "wall_s": elapsed,
+    "peak_rss_kb": self_rss + child_rss,
+    "storage_read_bytes": blocks_after[0] - blocks_before[0],
+    "storage_write_bytes": blocks_after[1] - blocks_before[1],
+    "python_read_bytes": None if io_after is None else io_after[0] - io_before[0],
+    "python_write_bytes": None if io_after is None else io_after[1] - io_before[1],
+}))
+"""
+
+
+def run_stage(stage: str, media: Path, work_dir: Path) -> dict[str, Any]:
+    """Run one stage variant on one file in a fresh interpreter.
+
+    The input is copied into work_dir first, since the tag stages modify
+    their input in place.
+
+    Args:
+        stage: Key of STAGES.
+        media: Input file.
+        work_dir: Empty scratch directory for the input copy and the output.
+
+    Returns:
+        The measurements printed by the child process.
+    """
+    module, class_name, kwargs, _ = STAGES[stage]
+    source = work_dir / media.name
+    shutil.copyfile(media, source)
+    config = {
+        "src_dir": str(REPO_ROOT / "src"),
+        "module": module,
+        "class": class_name,
+        "kwargs": kwargs,
+        "path": str(source),
+        "out_dir": str(work_dir / "out"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT, json.dumps(config)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench(stage: str, spec: MediaSpec, media: Path, repeat: int) -> dict[str, Any]:
+    """Run a stage variant repeat times on a file and keep the fastest run.
+
+    Args:
+        stage: Key of STAGES.
+        spec: Parameters the file was generated with.
+        media: Input file.
+        repeat: Number of runs.
+
+    Returns:
+        One result record: the stage, the media parameters and the
+        measurements of the fastest run, with throughput added.
+    """
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="bench_stage_") as work_dir:
+            runs.append(run_stage(stage, media, Path(work_dir)))
+    fastest = min(runs, key=lambda run: run["wall_s"])
+    return {
+        "id": f"{stage}/{spec.file_name}",
+        "stage": stage,
+        "media": asdict(spec),
+        "throughput": spec.duration_s / fastest["wall_s"],
+        **fastest,
+        "peak_rss_kb": max(run["peak_rss_kb"] for run in runs),
+    }
+
+
+def environment() -> dict[str, Any]:
+    """Describe the commit and machine the benchmark ran on."""
+
+    def output_of(command: list[str]) -> str | None:
+        try:
+            result = subprocess.run(
+                command, capture_output=True, text=True, check=True, cwd=REPO_ROOT
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.strip().splitlines()[0]
+
+    return {
+        "commit": output_of(["git", "rev-parse", "HEAD"]),
+        "ffmpeg": output_of(["ffmpeg", "-version"]),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+    }
+
+
+def print_comparison(results: list[dict[str, Any]], baseline_path: Path) -> None:
+    """Print the throughput and peak RSS change of every run in a baseline.
+
+    Args:
+        results: Records returned by bench.
+        baseline_path: JSON file written by an earlier run of this script.
+    """
+    baseline = {
+        record["id"]: record
+        for record in json.loads(baseline_path.read_text())["results"]
+    }
+    print(f"\n{'case':<44} {'throughput':>11} {'peak RSS':>9}")
+    for record in results:
+        old = baseline.get(record["id"])
+        if old is None:
+            print(f"{record['id']:<44} {'new':>11}")
+            continue
+        speed = record["throughput"] / old["throughput"] - 1
+        rss = record["peak_rss_kb"] / old["peak_rss_kb"] - 1
+        print(f"{record['id']:<44} {speed:>+10.1%} {rss:>+8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--stages",
+        type=str,
+        nargs="+",
+        choices=list(STAGES),
+        default=list(STAGES),
+        help="Stage variants to run. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--durations",
+        type=int,
+        nargs="+",
+        default=[60, 600],
+        help="Audio lengths in seconds. Defaults to 60 600.",
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        nargs="+",
+        default=[1, 2],
+        help="Channel counts. Defaults to 1 2.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per stage and file; the fastest is kept. Defaults to 3.",
+    )
+    parser.add_argument(
+        "--media_dir",
+        type=str,
+        default=str(Path(tempfile.gettempdir()) / "audio_extractor_bench_media"),
+        help="Where synthetic media is generated and reused from.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="bench_results.json",
+        help="JSON file to write results to. Defaults to bench_results.json.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Results JSON of an earlier run to compare against.",
+    )
+    args = parser.parse_args()
+    videos, mp3s = default_specs(args.durations, args.channels)
+    media_dir = Path(args.media_dir)
+    print(f"{'stage':<20} {'media':<22} {'throughput (x)':>15} {'peak RSS (MB)':>14}")
+    results = []
+    for stage in args.stages:
+        for spec in videos if STAGES[stage][3] else mp3s:
+            record = bench(stage, spec, generate(spec, media_dir), args.repeat)
+            results.append(record)
+            print(
+                f"{stage:<20} {spec.file_name:<22} {record['throughput']:>15.1f} "
+                f"{record['peak_rss_kb'] / 1024:>14.1f}"
+            )
+    Path(args.output).write_text(
+        json.dumps(
+            {"environment": environment(), "results": results},
+            indent=2,
+            sort_keys=True,
+        )
+        + "\n"
+    )
+    print(f"\nWrote {len(results)} results to {args.output}")
+    if args.baseline is not None:
+        print_comparison(results, Path(args.baseline))
@@ -0,0 +1,243 @@
+"""Benchmark how long each CLI module takes to import.
+
+Every CLI is imported in a fresh interpreter with ``python -X importtime``,
+which reports the time spent importing each module. The following is
+recorded per CLI:
+
+* import_ms: cumulative import time of the CLI module itself.
+* startup_ms: wall-clock time of the whole interpreter run, i.e. what a
+  scheduler starting the CLI waits before any file is processed.
+* heavy_modules: heavy packages that were imported: the third-party moviepy,
+  pydub, eyed3 and numpy, and asyncio, which only the asyncio API needs. Each
+  CLI lists the ones it must not import; stages load them on first use
+  instead.
+* slowest: the modules with the largest self import time.
+
+The fastest of --repeat runs is kept. With --check the script exits with
+status 1 if a CLI imports a package it must not, or, given --baseline, if its
+import time grew by more than both --tolerance and --slack_ms (import times of
+a few tens of milliseconds vary by that much between runs), so it can guard a
+CI job.
+
+Usage:
+    uv run python benchmarks/bench_startup.py --output startup.json
+    uv run python benchmarks/bench_startup.py --baseline startup.json --check
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES: tuple[str, ...] = ("asyncio", "eyed3", "moviepy", "numpy", "pydub")
+
+# CLI module -> heavy packages it must not import at startup. None of the CLIs
+# runs an event loop, so none of them may load asyncio.
+CLIS: dict[str, tuple[str, ...]] = {
+    "files_processor": HEAVY_MODULES,
+    "extract_audios_from_dir": ("asyncio", "eyed3", "moviepy", "pydub"),
+    # Normalizing measures levels with numpy, so it is loaded up front.
+    "normalize_audios_from_dir": ("asyncio", "eyed3", "moviepy", "pydub"),
+    "tag_audios_from_dir": HEAVY_MODULES,
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """Parse the output of python -X importtime.
+
+    Args:
+        stderr: Standard error of the interpreter run.
+
+    Returns:
+        One (module, self microseconds, cumulative microseconds, depth) tuple
+        per imported module, in the order they finished importing. Depth 0
+        means the module was imported directly by the -c code.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        # The name follows one space and two more per nesting level.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def run_cli_import(module: str) -> dict[str, Any]:
+    """Import one CLI module in a fresh interpreter and time it.
+
+    Args:
+        module: Name of the module under src/.
+
+    Returns:
+        The import time, startup time, heavy packages imported and slowest
+        modules of the run.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_ROOT / "src",
+    )
+    startup_ms = (time.perf_counter() - start) * 1000
+    modules = parse_importtime(result.stderr)
+    top_level = {name.partition(".")[0] for name, *_ in modules}
+    slowest = sorted(modules, key=lambda entry: entry[1], reverse=True)[:5]
+    return {
+        "import_ms": next(
+            cumulative / 1000
+            for name, _, cumulative, depth in modules
+            if name == module and depth == 0
+        ),
+        "startup_ms": startup_ms,
+        "heavy_modules": sorted(top_level.intersection(HEAVY_MODULES)),
+        "slowest": {name: self_us / 1000 for name, self_us, *_ in slowest},
+    }
+
+
+def bench(module: str, repeat: int) -> dict[str, Any]:
+    """Import a CLI module repeat times and keep the fastest run.
+
+    Args:
+        module: Key of CLIS.
+        repeat: Number of runs.
+
+    Returns:
+        One result record: the measurements of the fastest run, plus the
+        heavy packages the CLI imported but must not.
+    """
+    runs = [run_cli_import(module) for _ in range(repeat)]
+    fastest = min(runs, key=lambda run: run["import_ms"])
+    return {
+        "id": module,
+        **fastest,
+        "forbidden_imports": sorted(set(fastest["heavy_modules"]) & set(CLIS[module])),
+    }
+
+
+def regressions(
+    results: list[dict[str, Any]],
+    baseline_path: Path | None,
+    tolerance: float,
+    slack_ms: float,
+) -> list[str]:
+    """Describe every CLI that imports too much, and print the comparison.
+
+    Args:
+        results: Records returned by bench.
+        baseline_path: JSON file written by an earlier run of this script, or
+            None to only check for forbidden imports.
+        tolerance: Allowed relative growth of import_ms over the baseline.
+        slack_ms: Allowed absolute growth of import_ms; only growth beyond
+            both allowances is a regression.
+
+    Returns:
+        One message per regression; empty if there is none.
+    """
+    baseline = {}
+    if baseline_path is not None:
+        baseline = {
+            record["id"]: record
+            for record in json.loads(baseline_path.read_text())["results"]
+        }
+        print(f"\n{'cli':<28} {'import time':>12}")
+    problems = []
+    for record in results:
+        if record["forbidden_imports"]:
+            problems.append(
+                f"{record['id']} imports {', '.join(record['forbidden_imports'])}"
+            )
+        old = baseline.get(record["id"])
+        if old is None:
+            continue
+        change = record["import_ms"] / old["import_ms"] - 1
+        print(f"{record['id']:<28} {change:>+11.1%}")
+        if change > tolerance and record["import_ms"] - old["import_ms"] > slack_ms:
+            problems.append(
+                f"{record['id']} imports {change:.0%} slower than the baseline"
+            )
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--clis",
+        type=str,
+        nargs="+",
+        choices=list(CLIS),
+        default=list(CLIS),
+        help="CLI modules to import. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Imports per CLI; the fastest is kept. Defaults to 5.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="bench_startup.json",
+        help="JSON file to write results to. Defaults to bench_startup.json.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Results JSON of an earlier run to compare against.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed growth of import time over --baseline. Defaults to 0.25.",
+    )
+    parser.add_argument(
+        "--slack_ms",
+        type=float,
+        default=20.0,
+        help="Allowed absolute growth of import time in ms. Defaults to 20.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with status 1 on a forbidden import or a slower import.",
+    )
+    args = parser.parse_args()
+    print(f"{'cli':<28} {'import (ms)':>12} {'startup (ms)':>13}  heavy modules")
+    results = []
+    for module in args.clis:
+        record = bench(module, args.repeat)
+        results.append(record)
+        print(
+            f"{module:<28} {record['import_ms']:>12.1f} {record['startup_ms']:>13.1f}"
+            f"  {', '.join(record['heavy_modules']) or '-'}"
+        )
+    Path(args.output).write_text(
+        json.dumps(
+            {"python": sys.version.split()[0], "results": results},
+            indent=2,
+            sort_keys=True,
+        )
+        + "\n"
+    )
+    print(f"\nWrote {len(results)} results to {args.output}")
+    problems = regressions(
+        results,
+        None if args.baseline is None else Path(args.baseline),
+        args.tolerance,
+        args.slack_ms,
+    )
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if args.check and problems:
+        sys.exit(1)
@@ -0,0 +1,169 @@
+"""Generate synthetic test media with ffmpeg for the stage benchmarks.
+
+Every file is pink noise (which encoders handle like real program material,
+unlike a pure tone) at 44.1 kHz, with the requested duration and channel
+count. Videos get a small black picture track so the audio has to be found
+and demuxed from a real container. Files are written once and reused by later
+runs, since their names encode every parameter.
+
+Usage:
+    uv run python benchmarks/synthetic_media.py --out_dir ./bench_media
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from constants import FFMPEG_BINARY
+
+SAMPLE_RATE = 44100
+# (container, audio codec) pairs of the videos generated by default.
+VIDEO_FORMATS: tuple[tuple[str, str], ...] = (
+    ("mp4", "aac"),
+    ("mkv", "opus"),
+    ("avi", "mp3"),
+)
+_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+
+
+@dataclass(frozen=True)
+class MediaSpec:
+    """Parameters of one synthetic media file.
+
+    Attributes:
+        duration_s: Length of the audio in seconds.
+        channels: Number of audio channels.
+        codec: Audio codec, a key of the encoder table (aac, mp3, opus).
+        container: File extension of the container, e.g. mp4 or mp3.
+    """
+
+    duration_s: int
+    channels: int
+    codec: str
+    container: str
+
+    @property
+    def is_video(self) -> bool:
+        """True if the file has a picture track."""
+        return self.container != self.codec
+
+    @property
+    def file_name(self) -> str:
+        """File name encoding every parameter."""
+        return f"{self.duration_s}s_{self.channels}ch_{self.codec}.{self.container}"
+
+
+def generate(spec: MediaSpec, out_dir: Path) -> Path:
+    """Write the file described by spec to out_dir, unless it already exists.
+
+    Args:
+        spec: File to generate.
+        out_dir: Directory to write it to; created if missing.
+
+    Returns:
+        Path of the file.
+
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg fails, e.g. because it was
+            built without the codec's encoder.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / spec.file_name
+    if path.is_file():
+        return path
+    inputs = [
+        "-f",
+        "lavfi",
+        "-i",
+        (
+            f"anoisesrc=color=pink:amplitude=0.25:sample_rate={SAMPLE_RATE}"
+            f":duration={spec.duration_s}:seed=1"
+        ),
+    ]
+    if spec.is_video:
+        inputs += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"color=c=black:s=160x120:r=10:d={spec.duration_s}",
+        ]
+        video = ["-c:v", "mpeg4", "-shortest"]
+    else:
+        video = ["-vn"]
+    partial = path.with_name(f".{path.name}.partial{path.suffix}")
+    subprocess.run(
+        [
+            FFMPEG_BINARY,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            *inputs,
+            "-ac",
+            str(spec.channels),
+            "-c:a",
+            _ENCODERS[spec.codec],
+            *video,
+            str(partial),
+        ],
+        check=True,
+    )
+    partial.replace(path)
+    return path
+
+
+def default_specs(
+    durations: list[int], channels: list[int]
+) -> tuple[list[MediaSpec], list[MediaSpec]]:
+    """Return the videos and mp3s generated for every duration/channel pair.
+
+    Args:
+        durations: Audio lengths in seconds.
+        channels: Channel counts.
+
+    Returns:
+        A tuple of (video specs, mp3 specs).
+    """
+    videos = [
+        MediaSpec(duration, channel_count, codec, container)
+        for duration in durations
+        for channel_count in channels
+        for container, codec in VIDEO_FORMATS
+    ]
+    mp3s = [
+        MediaSpec(duration, channel_count, "mp3", "mp3")
+        for duration in durations
+        for channel_count in channels
+    ]
+    return videos, mp3s
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--out_dir", type=str, required=True, help="Directory to write files to."
+    )
+    parser.add_argument(
+        "--durations",
+        type=int,
+        nargs="+",
+        default=[60, 600],
+        help="Audio lengths in seconds. Defaults to 60 600.",
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        nargs="+",
+        default=[1, 2],
+        help="Channel counts. Defaults to 1 2.",
+    )
+    args = parser.parse_args()
+    videos, mp3s = default_specs(args.durations, args.channels)
+    for spec in videos + mp3s:
+        path = generate(spec, Path(args.out_dir))
+        print(json.dumps({"path": str(path), **asdict(spec)}))
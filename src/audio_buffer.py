@@ -0,0 +1,177 @@
+"""NumPy-backed PCM buffer for measuring and adjusting audio levels."""
+
+import math
+
+import numpy as np
+
+__all__ = ["SAMPLE_FORMATS", "AudioBuffer", "dbfs_from_sum_squares"]
+
+# Supported sample formats (ffmpeg naming, little-endian) and their NumPy dtypes.
+SAMPLE_FORMATS: dict[str, np.dtype] = {
+    "s16": np.dtype("<i2"),
+    "f32": np.dtype("<f4"),
+}
+
+# Samples converted to float64 at a time, so analysis and gain need a bounded
+# amount of scratch memory whatever the size of the buffer.
+_BLOCK_SAMPLES = 1 << 20
+
+
+def _max_amplitude(sample_format: str) -> float:
+    """Return the full-scale amplitude of a sample format."""
+    dtype = SAMPLE_FORMATS[sample_format]
+    if dtype.kind == "f":
+        return 1.0
+    return float(1 << (8 * dtype.itemsize - 1))
+
+
+def dbfs_from_sum_squares(
+    sum_squares: float, sample_count: int, sample_format: str = "s16"
+) -> float:
+    """Convert a sum of squared samples to decibels relative to full scale.
+
+    Lets callers that only see audio a chunk at a time accumulate sum_squares
+    and sample_count, and get the same value AudioBuffer.dbfs would give for
+    the whole signal.
+
+    Args:
+        sum_squares: Sum of the squares of every sample.
+        sample_count: Number of samples summed (frames * channels).
+        sample_format: Sample format of the summed samples. Defaults to "s16".
+
+    Returns:
+        The RMS level in dBFS, or -inf for silence or no samples.
+    """
+    if sample_count == 0 or sum_squares == 0:
+        return -math.inf
+    rms = math.sqrt(sum_squares / sample_count)
+    return 20 * math.log10(rms / _max_amplitude(sample_format))
+
+
+class AudioBuffer:
+    """Interleaved PCM audio viewed as a NumPy array.
+
+    The samples array is a view over the bytes passed in, not a copy. Gain is
+    applied in place, so the buffer must be writable (e.g. a bytearray) to use
+    apply_gain; read-only data such as bytes is fine for analysis.
+    """
+
+    def __init__(
+        self,
+        data: bytes | bytearray | memoryview,
+        channels: int,
+        sample_rate: int,
+        sample_format: str = "s16",
+    ) -> None:
+        """Init method for the AudioBuffer class.
+
+        Args:
+            data: Interleaved little-endian PCM.
+            channels: Number of interleaved channels.
+            sample_rate: Sample rate in Hz.
+            sample_format: One of SAMPLE_FORMATS. Defaults to "s16".
+
+        Raises:
+            ValueError: If sample_format is unknown or data does not hold a
+                whole number of frames.
+        """
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(
+                f"Unknown sample format {sample_format!r}; "
+                f"expected one of {sorted(SAMPLE_FORMATS)}."
+            )
+        frame_bytes = SAMPLE_FORMATS[sample_format].itemsize * channels
+        if memoryview(data).nbytes % frame_bytes:
+            raise ValueError(
+                f"Buffer length is not a multiple of the {frame_bytes}-byte frame."
+            )
+        self.data = data
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.samples: np.ndarray = np.frombuffer(
+            data, dtype=SAMPLE_FORMATS[sample_format]
+        )
+
+    @property
+    def frame_count(self) -> int:
+        """Number of frames (one sample per channel) in the buffer."""
+        return len(self.samples) // self.channels
+
+    @property
+    def duration_seconds(self) -> float:
+        """Length of the audio in seconds."""
+        return self.frame_count / self.sample_rate
+
+    @property
+    def full_scale(self) -> float:
+        """Amplitude of a full-scale sample in this buffer's format."""
+        return _max_amplitude(self.sample_format)
+
+    def frames(self) -> np.ndarray:
+        """Return the samples as a (frames, channels) view."""
+        return self.samples.reshape(-1, self.channels)
+
+    def sum_squares(self) -> float:
+        """Return the sum of the squares of every sample."""
+        total = 0.0
+        for start in range(0, len(self.samples), _BLOCK_SAMPLES):
+            block = self.samples[start : start + _BLOCK_SAMPLES].astype(np.float64)
+            total += float(np.dot(block, block))
+        return total
+
+    @property
+    def rms(self) -> float:
+        """Root mean square of all samples, in sample units."""
+        if len(self.samples) == 0:
+            return 0.0
+        return math.sqrt(self.sum_squares() / len(self.samples))
+
+    @property
+    def peak(self) -> float:
+        """Largest absolute sample value, in sample units."""
+        if len(self.samples) == 0:
+            return 0.0
+        return float(
+            max(abs(float(self.samples.max())), abs(float(self.samples.min())))
+        )
+
+    @property
+    def dbfs(self) -> float:
+        """RMS level in decibels relative to full scale (-inf for silence)."""
+        return dbfs_from_sum_squares(
+            self.sum_squares(), len(self.samples), self.sample_format
+        )
+
+    @property
+    def max_dbfs(self) -> float:
+        """Peak level in decibels relative to full scale (-inf for silence)."""
+        peak = self.peak
+        if peak == 0:
+            return -math.inf
+        return 20 * math.log10(peak / _max_amplitude(self.sample_format))
+
+    def apply_gain(self, gain_db: float) -> None:
+        """Scale every sample in place by gain_db decibels.
+
+        Integer samples are rounded and clipped to the range of their type.
+
+        Args:
+            gain_db: Gain to apply, in dB. Negative values attenuate.
+
+        Raises:
+            ValueError: If the underlying data is read-only.
+        """
+        if not self.samples.flags.writeable:
+            raise ValueError("Cannot apply gain to a read-only buffer.")
+        factor = 10 ** (gain_db / 20)
+        if self.samples.dtype.kind == "f":
+            self.samples *= np.float32(factor)
+            return
+        info = np.iinfo(self.samples.dtype)
+        for start in range(0, len(self.samples), _BLOCK_SAMPLES):
+            block = self.samples[start : start + _BLOCK_SAMPLES]
+            scaled = block * factor
+            np.rint(scaled, out=scaled)
+            np.clip(scaled, info.min, info.max, out=scaled)
+            block[:] = scaled
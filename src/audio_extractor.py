@@ -1,65 +1,484 @@
 """Audio extraction module for converting video files to mp3 format."""
 
 import argparse
+import logging
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
-from moviepy import VideoFileClip
-
-from constants import EXTRACTED_DIR
+from audio_io import AudioInput, read_audio
+from constants import EXTRACTED_DIR, STREAM_COPY_EXTS
+from ffmpeg_utils import (
+    FFmpegProgress,
+    probe_audio_stream,
+    probe_audio_stream_async,
+    run_ffmpeg,
+    run_ffmpeg_async,
+    stream_duration,
+)
+from instrumentation import configure_logging
+from mp3_frames import crc16_lame, iter_frames, read_encoder_padding, write_info_tag
 from process_class import ProcessClass
-from utils import get_file_strings
+from utils import atomic_output, get_file_strings
+
+if TYPE_CHECKING:
+    from moviepy import AudioFileClip
+
+    from audio_buffer import AudioBuffer
+
+__all__ = ["AudioExtractor", "extract_audio"]
+
+logger = logging.getLogger(__name__)
+
+# Samples per channel in an MPEG-1 Layer III frame.
+_MP3_FRAME_SAMPLES = 1152
+# moviepy's output format, so segmented extraction decodes the same samples.
+_PCM_RATE = 44100
+_PCM_CHANNELS = 2
+_PCM_FRAME_BYTES = 2 * _PCM_CHANNELS
+# LAME's default bitrate for the 44.1 kHz stereo audio moviepy writes.
+_MP3_BITRATE = "128k"
+# Frames each segment encodes before and after its range and then drops, so
+# the encoder has settled by the first kept frame and has seen the audio the
+# last kept frame overlaps.
+_PRE_ROLL_FRAMES = 8
+_POST_ROLL_FRAMES = 4
+# Shortest range worth its own encoder, about ten seconds.
+_MIN_SEGMENT_FRAMES = 384
+
+
+@dataclass(frozen=True)
+class _Segment:
+    """One time range of a segmented extraction.
+
+    Attributes:
+        start_sample: First PCM sample the segment encodes.
+        sample_count: Number of PCM samples it encodes.
+        keep_from: Index of its first audio frame that goes into the output.
+        keep_to: Index one past its last audio frame that goes into the
+            output, or None to keep every frame to the end.
+    """
+
+    start_sample: int
+    sample_count: int
+    keep_from: int
+    keep_to: int | None
+
+
+def _plan_segments(sample_count: int, segments: int) -> list[_Segment]:
+    """Split sample_count PCM samples into at most segments ranges.
+
+    Ranges start on frame boundaries of the serial encode, so frame k of a
+    segment starting at sample s is frame s / 1152 + k of the whole output.
+    Fewer ranges are used if they would be shorter than _MIN_SEGMENT_FRAMES.
+    """
+    total_frames = -(-sample_count // _MP3_FRAME_SAMPLES)
+    segments = max(1, min(segments, total_frames // _MIN_SEGMENT_FRAMES))
+    bounds = [round(index * total_frames / segments) for index in range(segments)]
+    plan = []
+    for index, first in enumerate(bounds):
+        start = max(first - _PRE_ROLL_FRAMES, 0)
+        stop = bounds[index + 1] if index + 1 < segments else None
+        end = sample_count
+        if stop is not None:
+            end = min(sample_count, (stop + _POST_ROLL_FRAMES) * _MP3_FRAME_SAMPLES)
+        plan.append(
+            _Segment(
+                start_sample=start * _MP3_FRAME_SAMPLES,
+                sample_count=end - start * _MP3_FRAME_SAMPLES,
+                keep_from=first - start,
+                keep_to=None if stop is None else stop - start,
+            )
+        )
+    return plan
+
+
+def _encode_segment(pcm_path: Path, segment: _Segment, output_path: Path) -> None:
+    """Encode one range of a raw PCM file to mp3 with ffmpeg.
+
+    The bit reservoir is disabled, so every frame holds all of its own audio
+    data and frames from different encodes can be joined.
+    """
+    run_ffmpeg(
+        [
+            "-f",
+            "s16le",
+            "-ar",
+            str(_PCM_RATE),
+            "-ac",
+            str(_PCM_CHANNELS),
+            "-skip_initial_bytes",
+            str(segment.start_sample * _PCM_FRAME_BYTES),
+            "-i",
+            str(pcm_path),
+            "-af",
+            f"atrim=end_sample={segment.sample_count}",
+            "-c:a",
+            "libmp3lame",
+            "-reservoir",
+            "0",
+            str(output_path),
+        ]
+    )
 
-__all__ = ["AudioExtractor"]
+
+def _join_segments(
+    parts: list[tuple[Path, _Segment]], output_path: Path, sample_count: int
+) -> None:
+    """Join the kept frames of every segment's mp3 into one gapless mp3.
+
+    The first segment's ID3v2 tag and Xing/LAME metadata frame are kept, and
+    the metadata frame is rewritten to describe the joined frames, with the
+    padding that makes gapless players decode exactly sample_count samples.
+
+    Raises:
+        ValueError: If a segment has no LAME metadata frame or ended early.
+    """
+    header = bytearray()
+    frame_offsets: list[int] = []
+    music_crc = 0
+    with output_path.open("wb") as out:
+        for path, segment in parts:
+            data = path.read_bytes()
+            frames = list(iter_frames(data))
+            if not header:
+                if not frames or not frames[0].is_info:
+                    raise ValueError(f"{path} has no Xing/LAME metadata frame.")
+                info = frames[0]
+                header = bytearray(data[: info.offset + info.length])
+                delay, _ = read_encoder_padding(header, info)
+                out.write(header)
+                position = info.length
+            audio = [frame for frame in frames if not frame.is_info]
+            kept = audio[segment.keep_from : segment.keep_to]
+            if segment.keep_to is not None and len(kept) < (
+                segment.keep_to - segment.keep_from
+            ):
+                raise ValueError(f"The encode of {path} ended early.")
+            chunk = b"".join(
+                data[frame.offset : frame.offset + frame.length] for frame in kept
+            )
+            for frame in kept:
+                frame_offsets.append(position)
+                position += frame.length
+            music_crc = crc16_lame(chunk, music_crc)
+            out.write(chunk)
+        padding = len(frame_offsets) * _MP3_FRAME_SAMPLES - delay - sample_count
+        write_info_tag(header, info, frame_offsets, position, padding, music_crc)
+        out.seek(0)
+        out.write(header)
+
+
+def extract_audio(source: AudioInput) -> "AudioBuffer":
+    """Decode a video's audio track into memory, without writing any file.
+
+    The audio is decoded to the format moviepy extracts (44.1 kHz stereo,
+    16-bit), so chaining in-memory stages gives the same audio as the
+    file-based AudioExtractor.
+
+    Args:
+        source: The video as a path, encoded bytes, or a binary stream.
+
+    Returns:
+        The audio track as PCM.
+
+    Raises:
+        FFmpegError: If ffmpeg cannot decode source, e.g. it has no audio.
+    """
+    return read_audio(source, _PCM_RATE, _PCM_CHANNELS)
 
 
 class AudioExtractor(ProcessClass):
     """Processes a video file and extracts its audio as an mp3."""
 
-    def __init__(self, vid_path: str, audio_name: str | None = None) -> None:
+    mirrors_input_tree = True
+
+    def __init__(
+        self,
+        vid_path: str,
+        audio_name: str | None = None,
+        copy_stream: bool = False,
+        relative_dir: str = "",
+        segments: int = 1,
+    ) -> None:
         """Init method for the AudioExtractor class.
 
         Args:
             vid_path: Path to video file.
             audio_name: Name for the output audio file. If None, the video
                 filename is used. Defaults to None.
+            copy_stream: If True, audio that is already mp3 or AAC is copied out
+                of the video without re-encoding (AAC is written to an .m4a).
+                Other codecs are still transcoded to mp3. Defaults to False.
+            relative_dir: Subdirectory of EXTRACTED_DIR to write the audio to.
+                Defaults to "" (EXTRACTED_DIR itself).
+            segments: Number of time ranges encoded in parallel when the
+                audio is transcoded (see extract_segmented). Defaults to 1
+                (one moviepy encode).
 
         Raises:
             FileNotFoundError: If vid_path does not point to a valid file.
+            ValueError: If segments is less than 1.
         """
         if not Path(vid_path).is_file():
             raise FileNotFoundError(f"{vid_path} does not point to a valid file!")
+        if segments < 1:
+            raise ValueError(f"segments must be at least 1, got {segments}.")
         self.vid_path = vid_path
         if audio_name is None:
             self.audio_name, _ = get_file_strings(self.vid_path)
         else:
             self.audio_name = audio_name
-        self.audio_dir: Path = EXTRACTED_DIR
+        self.copy_stream = copy_stream
+        self.segments = segments
+        self.audio_dir: Path = EXTRACTED_DIR / relative_dir
+
+    def get_clip(self) -> "AudioFileClip":
+        """Load only the audio stream of the video file as a clip.
 
-    def get_clip(self) -> VideoFileClip:
-        """Load the video file as a clip.
+        No video reader is created, so the cost of opening the file does not
+        depend on the resolution or codec of its video stream.
 
         Returns:
-            The loaded video file clip.
+            The loaded audio clip.
+
+        Raises:
+            ValueError: If the video file has no audio track.
         """
-        return VideoFileClip(self.vid_path)
+        # moviepy is imported on first use: it pulls in numpy, imageio and
+        # IPython, which would otherwise slow down every CLI's startup.
+        from moviepy import AudioFileClip
+
+        try:
+            return AudioFileClip(self.vid_path)
+        except KeyError as exc:
+            # moviepy's audio reader fails looking up the audio stream's
+            # metadata when the file has no audio stream.
+            raise ValueError(
+                f"Video file {self.vid_path!r} has no audio track."
+            ) from exc
+
+    def copy_audio(self) -> bool:
+        """Copy the compressed audio stream out of the video without decoding.
+
+        Returns:
+            True if the stream was copied, False if its codec cannot be copied
+            and the audio has to be transcoded instead.
+
+        Raises:
+            ValueError: If the video file has no audio track.
+        """
+        stream = probe_audio_stream(self.vid_path)
+        output_path = self._copy_output_path(stream)
+        if output_path is None:
+            return False
+        with atomic_output(output_path) as partial_path:
+            run_ffmpeg(self._copy_args(partial_path))
+        self.output_path = output_path
+        self.audio_seconds = stream_duration(stream)
+        logger.info("Finished copying audio!")
+        return True
+
+    def _copy_output_path(self, stream: dict[str, Any] | None) -> Path | None:
+        """Return where the probed audio stream is copied to, creating its folder.
+
+        Returns None if the stream's codec cannot be copied.
+        """
+        if stream is None:
+            raise ValueError(f"Video file {self.vid_path!r} has no audio track.")
+        codec = stream.get("codec_name")
+        audio_ext = STREAM_COPY_EXTS.get(codec or "")
+        if audio_ext is None:
+            logger.info("%s audio cannot be stream-copied, transcoding instead.", codec)
+            return None
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Copying %s audio for %s...", codec, self.audio_name)
+        return self.audio_dir / f"{self.audio_name}.{audio_ext}"
+
+    def _copy_args(self, output_path: Path) -> list[str]:
+        """Return the ffmpeg arguments copying the audio stream to output_path."""
+        return [
+            "-i",
+            self.vid_path,
+            "-map",
+            "0:a:0",
+            "-vn",
+            "-c:a",
+            "copy",
+            str(output_path),
+        ]
 
     def process_file(self) -> None:
         """Extract audio from the video file and write it as an mp3.
 
+        If copy_stream is set and the audio codec allows it, the audio stream is
+        copied as-is instead (see copy_audio). If segments is more than 1, the
+        audio is encoded by extract_segmented. Every path writes to a temporary
+        file that only replaces the output once it is complete (see
+        atomic_output), so an interrupted extraction never leaves a truncated
+        mp3 behind.
+
         Raises:
             ValueError: If the video file has no audio track.
         """
+        if self.copy_stream and self.copy_audio():
+            return
+        if self.segments > 1:
+            self.extract_segmented()
+            return
         clip = self.get_clip()
         try:
-            if clip.audio is None:
-                raise ValueError(f"Video file {self.vid_path!r} has no audio track.")
             self.audio_dir.mkdir(parents=True, exist_ok=True)
-            print(f"\nExtracting audio for {self.audio_name}...\n")
-            clip.audio.write_audiofile(self.audio_dir / f"{self.audio_name}.mp3")
-            print("\nFinished extracting audio!\n")
+            logger.info("Extracting audio for %s...", self.audio_name)
+            output_path = self.audio_dir / f"{self.audio_name}.mp3"
+            with atomic_output(output_path) as partial_path:
+                # moviepy's own progress bar is replaced by this module's logging.
+                clip.write_audiofile(partial_path, logger=None)
+            self.output_path = output_path
+            self.audio_seconds = clip.duration
+            logger.info("Finished extracting audio!")
         finally:
             clip.close()
 
+    def extract_segmented(self) -> None:
+        """Encode the audio as segments time ranges in parallel and join them.
+
+        The audio is decoded once to raw PCM in moviepy's format (44.1 kHz,
+        16-bit stereo, cut to the clip's duration) in a temporary folder next
+        to the output. The samples
+        are split into ranges starting on mp3 frame boundaries, each encoded by
+        its own ffmpeg process with a few frames of lead-in and lead-out that
+        are dropped again, and the frames are joined into one mp3 whose LAME
+        tag makes gapless players decode exactly the samples the serial path
+        writes. Each encode runs with the bit reservoir disabled so that its
+        frames can be cut apart, which costs a little quality at a given
+        bitrate.
+
+        Raises:
+            ValueError: If the video file has no audio track.
+            FFmpegError: If ffmpeg fails.
+        """
+        # The serial path writes int(rate * duration) samples of moviepy's
+        # duration, which can be shorter than what ffmpeg decodes.
+        clip = self.get_clip()
+        clip.close()
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        logger.info(
+            "Extracting audio for %s in %d segments...", self.audio_name, self.segments
+        )
+        output_path = self.audio_dir / f"{self.audio_name}.mp3"
+        with tempfile.TemporaryDirectory(
+            prefix=".segments_", dir=self.audio_dir
+        ) as tmp_dir:
+            pcm_path = Path(tmp_dir) / "audio.pcm"
+            run_ffmpeg(
+                [
+                    "-i",
+                    self.vid_path,
+                    "-map",
+                    "0:a:0",
+                    "-vn",
+                    "-f",
+                    "s16le",
+                    "-ar",
+                    str(_PCM_RATE),
+                    "-ac",
+                    str(_PCM_CHANNELS),
+                    str(pcm_path),
+                ]
+            )
+            sample_count = min(
+                pcm_path.stat().st_size // _PCM_FRAME_BYTES,
+                int(_PCM_RATE * clip.duration),
+            )
+            plan = _plan_segments(sample_count, self.segments)
+            parts = [
+                (Path(tmp_dir) / f"segment_{index}.mp3", segment)
+                for index, segment in enumerate(plan)
+            ]
+            with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+                # list() re-raises the first failed encode.
+                list(
+                    pool.map(
+                        lambda part: _encode_segment(pcm_path, part[1], part[0]), parts
+                    )
+                )
+            with atomic_output(output_path) as partial_path:
+                _join_segments(parts, partial_path, sample_count)
+        self.output_path = output_path
+        self.audio_seconds = sample_count / _PCM_RATE
+        logger.info("Finished extracting audio!")
+
+    async def process_file_async(
+        self, on_progress: Callable[[FFmpegProgress], None] | None = None
+    ) -> None:
+        """Extract the audio like process_file, as an asyncio ffmpeg subprocess.
+
+        The audio is transcoded to mp3 by ffmpeg directly instead of through
+        moviepy, which would block the event loop, in the same format moviepy
+        writes (44.1 kHz stereo at 128 kbit/s), so the output does not depend
+        on which of the two wrote it. Segmented extraction runs
+        extract_segmented in a thread.
+
+        Args:
+            on_progress: Called with ffmpeg's progress reports while it runs.
+                Defaults to None.
+
+        Raises:
+            ValueError: If the video file has no audio track.
+            FFmpegError: If ffmpeg fails.
+        """
+        # Imported on first use, so the synchronous CLIs never load asyncio.
+        import asyncio
+
+        def progress(report: FFmpegProgress) -> None:
+            self.audio_seconds = report.out_time
+            if on_progress is not None:
+                on_progress(report)
+
+        stream = await probe_audio_stream_async(self.vid_path)
+        if stream is None:
+            raise ValueError(f"Video file {self.vid_path!r} has no audio track.")
+        if self.copy_stream:
+            output_path = self._copy_output_path(stream)
+            if output_path is not None:
+                with atomic_output(output_path) as partial_path:
+                    await run_ffmpeg_async(self._copy_args(partial_path), progress)
+                self.output_path = output_path
+                logger.info("Finished copying audio!")
+                return
+        if self.segments > 1:
+            await asyncio.to_thread(self.extract_segmented)
+            return
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Extracting audio for %s...", self.audio_name)
+        output_path = self.audio_dir / f"{self.audio_name}.mp3"
+        with atomic_output(output_path) as partial_path:
+            await run_ffmpeg_async(
+                [
+                    "-i",
+                    self.vid_path,
+                    "-map",
+                    "0:a:0",
+                    "-vn",
+                    "-ar",
+                    str(_PCM_RATE),
+                    "-ac",
+                    str(_PCM_CHANNELS),
+                    "-c:a",
+                    "libmp3lame",
+                    "-b:a",
+                    _MP3_BITRATE,
+                    str(partial_path),
+                ],
+                progress,
+            )
+        self.output_path = output_path
+        logger.info("Finished extracting audio!")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -69,6 +488,20 @@ if __name__ == "__main__":
         required=True,
         help="File path to video file that will have audio extracted from.",
     )
+    parser.add_argument(
+        "--copy_stream",
+        action="store_true",
+        help="Copy mp3/AAC audio out without re-encoding (AAC is saved as .m4a).",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Encode this many time ranges of the audio in parallel. Defaults to 1.",
+    )
     args = parser.parse_args()
-    ae = AudioExtractor(args.vid_path)
+    configure_logging()
+    ae = AudioExtractor(
+        args.vid_path, copy_stream=args.copy_stream, segments=args.segments
+    )
     ae.process_file()
@@ -0,0 +1,277 @@
+"""In-memory audio inputs and outputs, so stages can be chained without files.
+
+Encoded audio held in memory is handed to ffmpeg through an anonymous
+in-memory file (memfd) where the platform has one, so ffmpeg can seek in it
+like in a file: containers that keep their index at the end (e.g. mp4 without
+faststart) can be read, and mp3 outputs get their Xing/LAME header completed.
+Elsewhere ffmpeg reads from stdin and writes to stdout instead, where those
+two things are not possible.
+"""
+
+import contextlib
+import os
+import struct
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from ffmpeg_utils import pipe_ffmpeg
+from utils import atomic_output
+
+if TYPE_CHECKING:
+    from audio_buffer import AudioBuffer
+
+__all__ = ["AudioInput", "AudioOutput", "read_audio", "read_encoded", "write_audio"]
+
+# A media file path, encoded audio (or video) bytes, or a binary stream of them.
+AudioInput = str | Path | bytes | bytearray | memoryview | BinaryIO
+# A file path, or a writable binary stream.
+AudioOutput = str | Path | BinaryIO
+
+_HAS_MEMFD = hasattr(os, "memfd_create")
+_RIFF_HEADER = struct.Struct("<4sI4s")
+_CHUNK_HEADER = struct.Struct("<4sI")
+_COPY_BYTES = 1 << 20
+
+
+def read_encoded(source: AudioInput) -> bytes | bytearray | memoryview:
+    """Return the encoded bytes of a source, reading files and streams.
+
+    Args:
+        source: Encoded audio as a path, bytes-like object, or binary stream.
+
+    Returns:
+        The bytes; bytes-like sources are returned as they are.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes()
+    return source.read()
+
+
+@contextlib.contextmanager
+def _memory_fd(name: str, data: bytes | bytearray | memoryview = b"") -> Iterator[int]:
+    """Yield an anonymous in-memory file holding data, closed on exit."""
+    fd = os.memfd_create(name)
+    try:
+        view = memoryview(data).cast("B")
+        while view:
+            view = view[os.write(fd, view) :]
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def _fd_url(fd: int) -> str:
+    """Return the path under which a child process opens an inherited fd."""
+    return f"/dev/fd/{fd}"
+
+
+@contextlib.contextmanager
+def _input_url(
+    source: AudioInput | None, data: bytes | bytearray | memoryview | None = None
+) -> Iterator[tuple[str, bytes | bytearray | memoryview | None, tuple[int, ...]]]:
+    """Yield (url, stdin data, fds to pass) for ffmpeg to read an input from.
+
+    Paths are passed on as they are; anything else is read into memory (or
+    given as data) and shared with ffmpeg without touching disk.
+    """
+    if isinstance(source, (str, Path)):
+        yield str(source), None, ()
+        return
+    if data is None:
+        assert source is not None
+        data = read_encoded(source)
+    if not _HAS_MEMFD:
+        yield "pipe:0", data, ()
+        return
+    with _memory_fd("audio_input", data) as fd:
+        yield _fd_url(fd), None, (fd,)
+
+
+def _run_to_memory(
+    args: list[str],
+    input_data: bytes | bytearray | memoryview | None,
+    pass_fds: tuple[int, ...],
+) -> bytearray:
+    """Run ffmpeg with args (all but the output) and return its output.
+
+    Returns:
+        The output in a new, writable buffer.
+    """
+    if not _HAS_MEMFD:
+        return bytearray(pipe_ffmpeg([*args, "pipe:1"], input_data, pass_fds))
+    with _memory_fd("audio_output") as fd:
+        pipe_ffmpeg([*args, _fd_url(fd)], input_data, (*pass_fds, fd))
+        output = bytearray(os.fstat(fd).st_size)
+        view = memoryview(output)
+        offset = 0
+        while offset < len(output):
+            read = os.preadv(fd, [view[offset:]], offset)
+            if not read:
+                del view
+                del output[offset:]
+                break
+            offset += read
+        return output
+
+
+def _parse_wav(data: bytearray) -> tuple[int, int, memoryview]:
+    """Return (sample_rate, channels, samples) of a WAV file written by ffmpeg.
+
+    The data chunk is taken to run to the end of the file, because ffmpeg
+    cannot fill in its size when writing to a pipe.
+
+    Raises:
+        ValueError: If data is not a WAV file with a format and a data chunk.
+    """
+    if len(data) < _RIFF_HEADER.size:
+        raise ValueError("ffmpeg did not write a WAV header.")
+    riff, _, wave = _RIFF_HEADER.unpack_from(data)
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise ValueError("ffmpeg did not write a WAV header.")
+    offset = _RIFF_HEADER.size
+    format_chunk = None
+    while offset + _CHUNK_HEADER.size <= len(data):
+        chunk_id, size = _CHUNK_HEADER.unpack_from(data, offset)
+        offset += _CHUNK_HEADER.size
+        if chunk_id == b"data":
+            if format_chunk is None:
+                break
+            channels, sample_rate = struct.unpack_from("<HI", data, format_chunk + 2)
+            return sample_rate, channels, memoryview(data)[offset:]
+        if chunk_id == b"fmt ":
+            format_chunk = offset
+        offset += size + (size & 1)
+    raise ValueError("ffmpeg wrote a WAV file without format or data.")
+
+
+def read_audio(
+    source: "AudioInput | AudioBuffer",
+    sample_rate: int | None = None,
+    channels: int | None = None,
+    sample_format: str = "s16",
+) -> "AudioBuffer":
+    """Decode audio from a file, from encoded bytes or a stream, or from PCM.
+
+    Encoded input (audio, or video with an audio track) is decoded by a
+    single ffmpeg run; only the first audio stream is used. An AudioBuffer
+    already in the requested format is returned as it is; otherwise it is
+    resampled or remixed by ffmpeg.
+
+    Args:
+        source: A media file path, encoded bytes, a binary stream of them, or
+            an AudioBuffer.
+        sample_rate: Sample rate to decode to, in Hz. Defaults to None (the
+            source's own).
+        channels: Number of channels to decode to. Defaults to None (the
+            source's own).
+        sample_format: Sample format to decode to, one of SAMPLE_FORMATS.
+            Defaults to "s16".
+
+    Returns:
+        The decoded audio, backed by a writable buffer unless source was an
+        AudioBuffer returned unchanged.
+
+    Raises:
+        ValueError: If sample_format is unknown.
+        FFmpegError: If ffmpeg cannot decode source, e.g. it has no audio.
+    """
+    from audio_buffer import SAMPLE_FORMATS, AudioBuffer
+
+    if sample_format not in SAMPLE_FORMATS:
+        raise ValueError(
+            f"Unknown sample format {sample_format!r}; "
+            f"expected one of {sorted(SAMPLE_FORMATS)}."
+        )
+    pcm_format = f"{sample_format}le"
+    if isinstance(source, AudioBuffer):
+        if (
+            sample_rate in (None, source.sample_rate)
+            and channels in (None, source.channels)
+            and sample_format == source.sample_format
+        ):
+            return source
+        input_args = [
+            "-f",
+            f"{source.sample_format}le",
+            "-ar",
+            str(source.sample_rate),
+            "-ac",
+            str(source.channels),
+        ]
+        context = _input_url(None, source.data)
+    else:
+        input_args = []
+        context = _input_url(source)
+    output_args = ["-vn", "-map_metadata", "-1", "-fflags", "+bitexact"]
+    if sample_rate is not None:
+        output_args += ["-ar", str(sample_rate)]
+    if channels is not None:
+        output_args += ["-ac", str(channels)]
+    output_args += ["-acodec", f"pcm_{pcm_format}", "-f", "wav"]
+    with context as (url, input_data, pass_fds):
+        wav = _run_to_memory(
+            [*input_args, "-i", url, *output_args], input_data, pass_fds
+        )
+    rate, channel_count, samples = _parse_wav(wav)
+    return AudioBuffer(samples, channel_count, rate, sample_format)
+
+
+def write_audio(
+    audio: "AudioInput | AudioBuffer",
+    destination: AudioOutput,
+    tags: Mapping[str, str] | None = None,
+    audio_format: str = "mp3",
+    codec: str | None = None,
+) -> None:
+    """Encode audio to a file or a stream.
+
+    Args:
+        audio: PCM in an AudioBuffer, or encoded audio as a path, bytes or a
+            binary stream.
+        destination: Path to write to, or a writable binary stream. A path
+            is only replaced once the output is complete (see atomic_output).
+        tags: Metadata to write, e.g. {"artist": ..., "album": ..., "title":
+            ...}. mp3 files get them as an ID3v2.3 tag. Defaults to None.
+        audio_format: ffmpeg output format. Defaults to "mp3".
+        codec: ffmpeg audio codec, or "copy" to keep encoded audio as it is.
+            Defaults to None (the format's default encoder).
+
+    Raises:
+        FFmpegError: If ffmpeg cannot encode the audio.
+    """
+    from audio_buffer import AudioBuffer
+
+    if isinstance(audio, AudioBuffer):
+        input_args = [
+            "-f",
+            f"{audio.sample_format}le",
+            "-ar",
+            str(audio.sample_rate),
+            "-ac",
+            str(audio.channels),
+        ]
+        context = _input_url(None, audio.data)
+    else:
+        input_args = []
+        context = _input_url(audio)
+    output_args = ["-map", "0:a"]
+    if codec is not None:
+        output_args += ["-c:a", codec]
+    for key, value in (tags or {}).items():
+        output_args += ["-metadata", f"{key}={value}"]
+    if audio_format == "mp3":
+        output_args += ["-id3v2_version", "3"]
+    output_args += ["-f", audio_format]
+    with context as (url, input_data, pass_fds):
+        args = [*input_args, "-i", url, *output_args]
+        if isinstance(destination, (str, Path)):
+            with atomic_output(destination) as partial_path:
+                pipe_ffmpeg([*args, str(partial_path)], input_data, pass_fds)
+            return
+        encoded = _run_to_memory(args, input_data, pass_fds)
+    view = memoryview(encoded)
+    for start in range(0, len(view), _COPY_BYTES):
+        destination.write(view[start : start + _COPY_BYTES])
@@ -1,43 +1,269 @@
 """Audio normalization module for adjusting mp3 volume levels."""
 
 import argparse
+import logging
+import math
+import os
+from collections.abc import Callable, Iterable, Iterator
 from pathlib import Path
+from typing import Any, ClassVar
 
-from pydub import AudioSegment
-
-from constants import DEFAULT_DBFS, NORMALIZED_DIR
+from audio_buffer import AudioBuffer, dbfs_from_sum_squares
+from constants import (
+    DEFAULT_DBFS,
+    NORMALIZATION_MODES,
+    NORMALIZED_DIR,
+    STREAM_CHUNK_FRAMES,
+)
+from ffmpeg_utils import (
+    PCM_SAMPLE_WIDTH,
+    FFmpegError,
+    FFmpegProgress,
+    decode_pcm,
+    encode_pcm,
+    iter_pcm_chunks,
+    iter_pcm_chunks_async,
+    probe_audio_stream,
+    probe_audio_stream_async,
+    run_ffmpeg_async,
+    stream_duration,
+)
+from instrumentation import configure_logging
+from loudness import LoudnessMeter, TruePeakMeter
+from mp3_frames import GAIN_STEP_DB, adjust_global_gain
 from process_class import ProcessClass
-from utils import get_file_strings
+from scheduling import estimate_cost
+from utils import atomic_output, get_file_strings
+
+__all__ = ["AudioNormalizer", "FileNotSupportedError", "normalize_audio"]
+
+logger = logging.getLogger(__name__)
 
-__all__ = ["AudioNormalizer", "FileNotSupportedError"]
+# Peak memory of process_file per byte of PCM it holds at once, as measured
+# across modes (1.3-1.5x: the level is measured on copies of the samples).
+_PEAK_BYTES_PER_PCM_BYTE = 1.5
 
 
 class FileNotSupportedError(Exception):
     """Raised when a file with an unsupported extension is processed."""
 
 
+class _LevelMeter:
+    """Accumulates the level and true peak of audio fed in buffer by buffer."""
+
+    def __init__(self, mode: str, measure_true_peak: bool) -> None:
+        self.mode = mode
+        self.measure_true_peak = measure_true_peak
+        self.loudness: LoudnessMeter | None = None
+        self.peaks: TruePeakMeter | None = None
+        self.sum_squares = 0.0
+        self.sample_count = 0
+        self.duration_seconds = 0.0
+
+    def add(self, buffer: AudioBuffer) -> None:
+        """Measure the next stretch of audio."""
+        self.duration_seconds += buffer.duration_seconds
+        if self.mode == "lufs":
+            if self.loudness is None:
+                self.loudness = LoudnessMeter(buffer.sample_rate, buffer.channels)
+            self.loudness.add(buffer)
+        else:
+            self.sum_squares += buffer.sum_squares()
+            self.sample_count += len(buffer.samples)
+        if self.measure_true_peak:
+            if self.peaks is None:
+                self.peaks = TruePeakMeter(buffer.sample_rate, buffer.channels)
+            self.peaks.add(buffer)
+
+    def result(self) -> tuple[float, float]:
+        """Return (level, true_peak) of all audio added so far."""
+        if self.mode == "lufs":
+            if self.loudness is None:
+                level = -math.inf
+            else:
+                level = self.loudness.integrated_loudness
+        else:
+            level = dbfs_from_sum_squares(self.sum_squares, self.sample_count)
+        true_peak = -math.inf if self.peaks is None else self.peaks.true_peak
+        return level, true_peak
+
+
+def _check_mode(mode: str) -> None:
+    """Raise ValueError if mode is not one of NORMALIZATION_MODES."""
+    if mode not in NORMALIZATION_MODES:
+        raise ValueError(
+            f"Unknown normalization mode {mode!r}; "
+            f"expected one of {list(NORMALIZATION_MODES)}."
+        )
+
+
+def _gain_db(
+    target: float, ceiling: float | None, level: float, true_peak: float
+) -> float:
+    """Return the gain moving audio at level to target, see AudioNormalizer.gain_for."""
+    if math.isinf(level):
+        return 0.0
+    gain_db = target - level
+    if ceiling is not None and not math.isinf(true_peak):
+        gain_db = min(gain_db, ceiling - true_peak)
+    return gain_db
+
+
+def normalize_audio(
+    buffer: AudioBuffer,
+    target_dbfs: float,
+    mode: str = "dbfs",
+    true_peak: float | None = None,
+) -> AudioBuffer:
+    """Normalize audio held in memory to a target level, without any file.
+
+    The level is measured and the gain applied exactly as AudioNormalizer
+    does for a file, so in-memory stages can be chained, e.g.
+    normalize_audio(extract_audio(video_bytes), -20.0).
+
+    Args:
+        buffer: The audio.
+        target_dbfs: Target volume level, in dBFS in "dbfs" mode or in LUFS
+            in "lufs" mode.
+        mode: How the level is measured, one of NORMALIZATION_MODES.
+            Defaults to "dbfs".
+        true_peak: Ceiling for the true peak of the output in dBTP. Defaults
+            to None (no ceiling).
+
+    Returns:
+        The normalized audio. Gain is applied in place when buffer is
+        writable, so this is buffer itself; read-only data is copied first.
+
+    Raises:
+        ValueError: If mode is not one of NORMALIZATION_MODES.
+    """
+    _check_mode(mode)
+    meter = _LevelMeter(mode, true_peak is not None)
+    meter.add(buffer)
+    if not buffer.samples.flags.writeable:
+        buffer = AudioBuffer(
+            bytearray(buffer.data),
+            buffer.channels,
+            buffer.sample_rate,
+            buffer.sample_format,
+        )
+    buffer.apply_gain(_gain_db(target_dbfs, true_peak, *meter.result()))
+    return buffer
+
+
 class AudioNormalizer(ProcessClass):
-    """Normalizes the volume of an mp3 file to a target dBFS level."""
+    """Normalizes the volume of an mp3 file to a target level.
+
+    In "dbfs" mode the level is the plain RMS of every sample. In "lufs" mode
+    it is the integrated loudness of ITU-R BS.1770 / EBU R128: K-weighted, so
+    it follows perceived loudness, and gated, so silence and quiet passages do
+    not drag the measurement down.
+    """
+
+    mirrors_input_tree = True
+    low_memory_kwargs: ClassVar[dict[str, Any] | None] = {"streaming": True}
 
-    def __init__(self, audio_path: str, target_dbfs: float) -> None:
+    def __init__(
+        self,
+        audio_path: str,
+        target_dbfs: float,
+        streaming: bool = False,
+        mode: str = "dbfs",
+        true_peak: float | None = None,
+        lossless: bool = False,
+        relative_dir: str = "",
+    ) -> None:
         """Init method for the AudioNormalizer class.
 
         Args:
             audio_path: Path to audio file.
-            target_dbfs: Target volume level in decibels relative to full scale.
+            target_dbfs: Target volume level, in dBFS in "dbfs" mode or in LUFS
+                in "lufs" mode.
+            streaming: If True, the file is normalized in two passes over
+                fixed-size PCM chunks instead of being decoded into memory as a
+                whole, so peak memory does not grow with the file's length.
+                Defaults to False.
+            mode: How the level is measured, one of NORMALIZATION_MODES.
+                Defaults to "dbfs".
+            true_peak: Ceiling for the true peak of the output in dBTP. If the
+                gain would push the peak above it, less gain is applied.
+                Defaults to None (no ceiling).
+            lossless: If True, the gain is applied by editing the global_gain
+                field of every mp3 frame instead of re-encoding, which is fast
+                and lossless but limited to steps of GAIN_STEP_DB (about
+                1.5 dB). The level is still measured from the decoded audio,
+                in chunks. Defaults to False.
+            relative_dir: Subdirectory of NORMALIZED_DIR to write the normalized
+                audio to. Defaults to "" (NORMALIZED_DIR itself).
 
         Raises:
             FileNotFoundError: If audio_path does not point to a valid file.
+            ValueError: If mode is not one of NORMALIZATION_MODES.
         """
         if not Path(audio_path).is_file():
             raise FileNotFoundError(f"{audio_path} does not point to a valid file!")
+        _check_mode(mode)
         self.audio_path = audio_path
         self.target_dbfs = target_dbfs
+        self.streaming = streaming
+        self.mode = mode
+        self.true_peak = true_peak
+        self.lossless = lossless
         self.audio_name, self.audio_ext = get_file_strings(self.audio_path)
-        self.normalized_dir: Path = NORMALIZED_DIR
+        self.normalized_dir: Path = NORMALIZED_DIR / relative_dir
+
+    @classmethod
+    def estimate_peak_memory(
+        cls,
+        file_path: str,
+        streaming: bool = False,
+        lossless: bool = False,
+        **kwargs: Any,
+    ) -> int:
+        """Estimate the memory process_file needs for a file, from its headers.
+
+        By default the whole file is decoded to 16-bit PCM, so memory grows
+        with duration x sample rate x channels x PCM_SAMPLE_WIDTH; streaming
+        and lossless modes hold STREAM_CHUNK_FRAMES frames at a time. Lossless
+        mode also reads the whole mp3 into memory to edit its frames, so the
+        file's size is added. Files without a probed duration are estimated
+        from their size.
+
+        Args:
+            file_path: Path to the audio file.
+            streaming: Whether the file would be normalized in streaming mode.
+                Defaults to False.
+            lossless: Whether the file would be normalized losslessly.
+                Defaults to False.
+            **kwargs: The normalizer's other arguments, which do not change
+                its memory use.
+
+        Returns:
+            The estimated peak memory, in bytes, or 0 if the file cannot be
+            probed (it will fail to normalize anyway).
+        """
+        try:
+            stream = probe_audio_stream(file_path)
+            file_bytes = os.path.getsize(file_path) if lossless else 0
+        except (FFmpegError, OSError):
+            return 0
+        if stream is None:
+            return 0
+        if streaming or lossless:
+            frames = float(STREAM_CHUNK_FRAMES)
+        else:
+            duration = stream_duration(stream)
+            if duration is None:
+                _, duration = estimate_cost(file_path)
+            frames = duration * int(stream["sample_rate"])
+        pcm_bytes = frames * int(stream["channels"]) * PCM_SAMPLE_WIDTH
+        return int(pcm_bytes * _PEAK_BYTES_PER_PCM_BYTE) + file_bytes
 
     def process_file(self) -> None:
-        """Normalize the audio file to the target dBFS level and export it.
+        """Normalize the audio file to the target level and export it.
+
+        The output is written to a temporary file that replaces the final one
+        only once it is complete (see atomic_output).
 
         Raises:
             FileNotSupportedError: If the file is not an mp3.
@@ -47,14 +273,203 @@ class AudioNormalizer(ProcessClass):
                 f"{self.audio_ext} files are not supported! Use mp3 for now!"
             )
         self.normalized_dir.mkdir(parents=True, exist_ok=True)
-        print(f"Normalizing {self.audio_name}...")
-        sound = AudioSegment.from_mp3(self.audio_path)
-        audio_diff = self.target_dbfs - sound.dBFS
-        normalized_audio = sound.apply_gain(audio_diff)
-        normalized_audio.export(
-            self.normalized_dir / f"{self.audio_name}_norm.{self.audio_ext}"
+        logger.info("Normalizing %s...", self.audio_name)
+        output_path = self.normalized_dir / f"{self.audio_name}_norm.{self.audio_ext}"
+        with atomic_output(output_path) as partial_path:
+            if self.lossless:
+                self.normalize_lossless(partial_path)
+            elif self.streaming:
+                self.normalize_streaming(partial_path)
+            else:
+                sample_rate, channels = self.get_stream_format()
+                buffer = AudioBuffer(
+                    decode_pcm(self.audio_path, sample_rate, channels),
+                    channels,
+                    sample_rate,
+                )
+                buffer.apply_gain(self.gain_for(*self.measure([buffer])))
+                encode_pcm([buffer.data], partial_path, sample_rate, channels)
+        self.output_path = output_path
+
+    def get_stream_format(self) -> tuple[int, int]:
+        """Probe the sample rate and channel count of the audio file.
+
+        Returns:
+            A tuple of (sample_rate, channels).
+
+        Raises:
+            ValueError: If the file has no audio stream.
+        """
+        return self._stream_format(probe_audio_stream(self.audio_path))
+
+    def _stream_format(self, stream: dict[str, Any] | None) -> tuple[int, int]:
+        """Return (sample_rate, channels) of a probed stream."""
+        if stream is None:
+            raise ValueError(f"Audio file {self.audio_path!r} has no audio stream.")
+        return int(stream["sample_rate"]), int(stream["channels"])
+
+    def measure(self, buffers: Iterable[AudioBuffer]) -> tuple[float, float]:
+        """Measure the level and true peak of audio in a single pass.
+
+        Args:
+            buffers: Consecutive stretches of the audio, all with the same
+                sample rate and channel count.
+
+        Returns:
+            A tuple of (level, true_peak). level is in dBFS or LUFS depending
+            on the mode; true_peak is in dBTP, and is only measured when a
+            true-peak ceiling is set (-inf otherwise). audio_seconds is set to
+            the length of the audio measured.
+        """
+        meter = _LevelMeter(self.mode, self.true_peak is not None)
+        for buffer in buffers:
+            meter.add(buffer)
+        self.audio_seconds = meter.duration_seconds
+        return meter.result()
+
+    def gain_for(self, level: float, true_peak: float = -math.inf) -> float:
+        """Return the gain in dB that moves audio at level to the target level.
+
+        Silent audio (-inf) cannot be brought to any level, so it is left
+        unchanged. With a true-peak ceiling set, the gain is reduced as far as
+        needed to keep true_peak at or below it.
+
+        Args:
+            level: Measured level of the audio, in dBFS or LUFS.
+            true_peak: Measured true peak of the audio in dBTP. Defaults to
+                -inf (no limit).
+
+        Returns:
+            The gain to apply, in dB.
+        """
+        return _gain_db(self.target_dbfs, self.true_peak, level, true_peak)
+
+    def normalize_streaming(self, output_path: Path) -> None:
+        """Normalize the audio file in two passes over streamed PCM chunks.
+
+        The first pass measures the file's level (and true peak, if a ceiling is
+        set), the second applies the gain chunk by chunk while piping the result into
+        the encoder. Only one chunk is held in memory at a time.
+
+        Args:
+            output_path: Path to write the normalized mp3 to.
+
+        Raises:
+            ValueError: If the file has no audio stream.
+        """
+        sample_rate, channels = self.get_stream_format()
+        gain_db = self.gain_for(
+            *self.measure(
+                AudioBuffer(chunk, channels, sample_rate)
+                for chunk in iter_pcm_chunks(self.audio_path, sample_rate, channels)
+            )
+        )
+        encode_pcm(
+            self._iter_gained_chunks(sample_rate, channels, gain_db),
+            output_path,
+            sample_rate,
+            channels,
         )
 
+    def normalize_lossless(self, output_path: Path) -> None:
+        """Normalize the mp3 by rewriting its frames' global_gain fields.
+
+        The level is measured from the decoded audio as usual, and the gain is
+        rounded to the nearest whole step of GAIN_STEP_DB (rounded down if a
+        true-peak ceiling would otherwise be exceeded). The audio data itself
+        is copied to output_path unchanged apart from those fields, so the
+        file is never re-encoded.
+
+        Args:
+            output_path: Path to write the normalized mp3 to.
+
+        Raises:
+            ValueError: If the file has no audio stream or no mp3 frames.
+        """
+        sample_rate, channels = self.get_stream_format()
+        level, true_peak = self.measure(
+            AudioBuffer(chunk, channels, sample_rate)
+            for chunk in iter_pcm_chunks(self.audio_path, sample_rate, channels)
+        )
+        self._write_gain_steps(output_path, level, true_peak)
+
+    def _write_gain_steps(
+        self, output_path: Path, level: float, true_peak: float
+    ) -> None:
+        """Write a copy of the mp3 with its global_gain moved towards the target."""
+        steps = round(self.gain_for(level, true_peak) / GAIN_STEP_DB)
+        if self.true_peak is not None and not math.isinf(true_peak):
+            steps = min(steps, math.floor((self.true_peak - true_peak) / GAIN_STEP_DB))
+        data = bytearray(Path(self.audio_path).read_bytes())
+        adjust_global_gain(data, steps)
+        output_path.write_bytes(data)
+
+    def _iter_gained_chunks(
+        self, sample_rate: int, channels: int, gain_db: float
+    ) -> Iterator[bytearray]:
+        """Decode the audio file again, yielding chunks with gain_db applied."""
+        for chunk in iter_pcm_chunks(self.audio_path, sample_rate, channels):
+            AudioBuffer(chunk, channels, sample_rate).apply_gain(gain_db)
+            yield chunk
+
+    async def process_file_async(
+        self, on_progress: Callable[[FFmpegProgress], None] | None = None
+    ) -> None:
+        """Normalize the audio file like process_file, without blocking.
+
+        The level is measured from PCM streamed out of an asyncio ffmpeg
+        subprocess, one chunk at a time as in streaming mode. The gain is then
+        applied by ffmpeg's volume filter while re-encoding (or, with lossless
+        set, by editing the mp3 frames).
+
+        Args:
+            on_progress: Called with ffmpeg's progress reports while the
+                output is encoded. Defaults to None.
+
+        Raises:
+            FileNotSupportedError: If the file is not an mp3.
+            ValueError: If the file has no audio stream or no mp3 frames.
+            FFmpegError: If ffmpeg fails to decode or encode the audio.
+        """
+        if self.audio_ext != "mp3":
+            raise FileNotSupportedError(
+                f"{self.audio_ext} files are not supported! Use mp3 for now!"
+            )
+        self.normalized_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Normalizing %s...", self.audio_name)
+        output_path = self.normalized_dir / f"{self.audio_name}_norm.{self.audio_ext}"
+        stream = await probe_audio_stream_async(self.audio_path)
+        sample_rate, channels = self._stream_format(stream)
+        meter = _LevelMeter(self.mode, self.true_peak is not None)
+        async for chunk in iter_pcm_chunks_async(
+            self.audio_path, sample_rate, channels
+        ):
+            meter.add(AudioBuffer(chunk, channels, sample_rate))
+        self.audio_seconds = meter.duration_seconds
+        level, true_peak = meter.result()
+        with atomic_output(output_path) as partial_path:
+            if self.lossless:
+                self._write_gain_steps(partial_path, level, true_peak)
+            else:
+                await run_ffmpeg_async(
+                    [
+                        "-i",
+                        self.audio_path,
+                        "-vn",
+                        "-map_metadata",
+                        "-1",
+                        "-af",
+                        f"volume={self.gain_for(level, true_peak):.6f}dB",
+                        "-ar",
+                        str(sample_rate),
+                        "-ac",
+                        str(channels),
+                        str(partial_path),
+                    ],
+                    on_progress,
+                )
+        self.output_path = output_path
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -68,8 +483,41 @@ if __name__ == "__main__":
         "--dBFS",
         type=float,
         default=DEFAULT_DBFS,
-        help=f"Target dBFS. Defaults to {DEFAULT_DBFS}.",
+        help=f"Target dBFS (or LUFS with --mode lufs). Defaults to {DEFAULT_DBFS}.",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Normalize in fixed-size chunks to keep memory use bounded.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=NORMALIZATION_MODES,
+        default="dbfs",
+        help=(
+            "Level to normalize: 'dbfs' (average RMS) or 'lufs' (EBU R128 "
+            "integrated loudness). Defaults to 'dbfs'."
+        ),
+    )
+    parser.add_argument(
+        "--true_peak",
+        type=float,
+        default=None,
+        help="Maximum true peak of the output in dBTP (e.g. -1). Defaults to none.",
+    )
+    parser.add_argument(
+        "--lossless",
+        action="store_true",
+        help="Adjust mp3 frame gain in 1.5 dB steps instead of re-encoding.",
     )
     args = parser.parse_args()
-    an = AudioNormalizer(args.audio_path, args.dBFS)
+    configure_logging()
+    an = AudioNormalizer(
+        args.audio_path,
+        args.dBFS,
+        streaming=args.streaming,
+        mode=args.mode,
+        true_peak=args.true_peak,
+        lossless=args.lossless,
+    )
     an.process_file()
@@ -0,0 +1,225 @@
+"""Fused pipeline module for extracting, normalizing, and tagging in one pass."""
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Any
+
+from constants import (
+    DEFAULT_ALBUM,
+    DEFAULT_ARTIST,
+    DEFAULT_DBFS,
+    NORMALIZATION_MODES,
+    NORMALIZED_DIR,
+)
+from ffmpeg_utils import (
+    PCM_SAMPLE_WIDTH,
+    FFmpegError,
+    probe_audio_stream,
+    stream_duration,
+)
+from instrumentation import configure_logging
+from process_class import ProcessClass
+from scheduling import estimate_cost
+from utils import get_file_strings
+
+__all__ = ["AudioPipeline"]
+
+logger = logging.getLogger(__name__)
+
+# The format extract_audio decodes to, so the estimate matches process_file.
+_PCM_RATE = 44100
+_PCM_CHANNELS = 2
+# Copies of the decoded PCM process_file holds at once: the samples, and the
+# in-memory file they are shared with ffmpeg through while decoding and
+# encoding. The gain is applied in place.
+_PCM_COPIES = 2
+
+
+class AudioPipeline(ProcessClass):
+    """Turns a video file into a normalized, tagged mp3 with a single encode.
+
+    The audio track is decoded to PCM once (extract_audio), normalized in
+    memory (normalize_audio), and encoded to mp3 exactly once with the ID3
+    tags written by the encoder (tag_audio), so the output matches the
+    AudioExtractor, AudioNormalizer and AudioTagger stages run one after the
+    other. No intermediate file is written to EXTRACTED_DIR.
+    """
+
+    mirrors_input_tree = True
+
+    def __init__(
+        self,
+        vid_path: str,
+        target_dbfs: float,
+        artist_tag: str,
+        album_tag: str,
+        title_tag: str | None = None,
+        relative_dir: str = "",
+        mode: str = "dbfs",
+        true_peak: float | None = None,
+    ) -> None:
+        """Init method for the AudioPipeline class.
+
+        Args:
+            vid_path: Path to video file.
+            target_dbfs: Target volume level in decibels relative to full scale.
+            artist_tag: Artist name.
+            album_tag: Album name.
+            title_tag: Title of the mp3. If None, the video filename is used.
+                Defaults to None.
+            relative_dir: Subdirectory of NORMALIZED_DIR to write the mp3 to.
+                Defaults to "" (NORMALIZED_DIR itself).
+            mode: Level to normalize, one of NORMALIZATION_MODES: "dbfs"
+                (average RMS) or "lufs" (EBU R128 integrated loudness, with
+                target_dbfs read as LUFS). Defaults to "dbfs".
+            true_peak: Ceiling for the true peak of the output in dBTP. The
+                gain is lowered if needed to keep the peak below it. Defaults
+                to None (no ceiling).
+
+        Raises:
+            FileNotFoundError: If vid_path does not point to a valid file.
+            ValueError: If mode is not one of NORMALIZATION_MODES.
+        """
+        if not Path(vid_path).is_file():
+            raise FileNotFoundError(f"{vid_path} does not point to a valid file!")
+        if mode not in NORMALIZATION_MODES:
+            raise ValueError(
+                f"Unknown normalization mode {mode!r}; "
+                f"expected one of {list(NORMALIZATION_MODES)}."
+            )
+        self.vid_path = vid_path
+        self.target_dbfs = target_dbfs
+        self.mode = mode
+        self.true_peak = true_peak
+        self.artist_tag = artist_tag
+        self.album_tag = album_tag
+        self.audio_name, _ = get_file_strings(self.vid_path)
+        if title_tag is None:
+            self.title_tag = self.audio_name
+        else:
+            self.title_tag = title_tag
+        self.normalized_dir: Path = NORMALIZED_DIR / relative_dir
+
+    @classmethod
+    def estimate_peak_memory(cls, file_path: str, **kwargs: Any) -> int:
+        """Estimate the memory process_file needs for a file, from its headers.
+
+        The whole audio track is decoded to 16-bit stereo PCM at 44.1 kHz, and
+        shared with ffmpeg through an in-memory file while it is decoded and
+        encoded, so memory grows with duration x 44100 x 2 x PCM_SAMPLE_WIDTH
+        x 2. Files without a probed duration are estimated from their size.
+
+        Args:
+            file_path: Path to the video file.
+            **kwargs: The pipeline's other arguments, which do not change its
+                memory use.
+
+        Returns:
+            The estimated peak memory, in bytes, or 0 if the file cannot be
+            probed (it will fail to process anyway).
+        """
+        try:
+            stream = probe_audio_stream(file_path)
+        except (FFmpegError, OSError):
+            return 0
+        if stream is None:
+            return 0
+        duration = stream_duration(stream)
+        if duration is None:
+            _, duration = estimate_cost(file_path)
+        frames = duration * _PCM_RATE
+        return int(frames * _PCM_CHANNELS * PCM_SAMPLE_WIDTH * _PCM_COPIES)
+
+    def process_file(self) -> None:
+        """Decode, normalize, encode, and tag the video's audio in one pass.
+
+        Silent audio cannot be brought to the target level, so, as in
+        AudioNormalizer, it is encoded unchanged.
+
+        Raises:
+            ValueError: If the video file has no audio track.
+            FFmpegError: If ffmpeg cannot decode or encode the audio.
+        """
+        # Imported on first use: the in-memory stages load numpy.
+        from audio_extractor import extract_audio
+        from audio_normalizer import normalize_audio
+        from audio_tagger import tag_audio
+
+        try:
+            audio = extract_audio(self.vid_path)
+        except FFmpegError:
+            # Only probed on failure, so a video with audio is read once.
+            if probe_audio_stream(self.vid_path) is None:
+                raise ValueError(
+                    f"Video file {self.vid_path!r} has no audio track."
+                ) from None
+            raise
+        self.normalized_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Processing %s...", self.audio_name)
+        audio = normalize_audio(audio, self.target_dbfs, self.mode, self.true_peak)
+        output_path = self.normalized_dir / f"{self.audio_name}_norm.mp3"
+        tag_audio(audio, output_path, self.artist_tag, self.album_tag, self.title_tag)
+        self.output_path = output_path
+        self.audio_seconds = audio.duration_seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--vid_path",
+        type=str,
+        required=True,
+        help="File path to video file to extract, normalize, and tag.",
+    )
+    parser.add_argument(
+        "--dBFS",
+        type=float,
+        default=DEFAULT_DBFS,
+        help=f"Target dBFS (or LUFS with --mode lufs). Defaults to {DEFAULT_DBFS}.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=NORMALIZATION_MODES,
+        default="dbfs",
+        help=(
+            "Level to normalize: 'dbfs' (average RMS) or 'lufs' (EBU R128 "
+            "integrated loudness). Defaults to 'dbfs'."
+        ),
+    )
+    parser.add_argument(
+        "--true_peak",
+        type=float,
+        default=None,
+        help="Maximum true peak of the output in dBTP (e.g. -1). Defaults to none.",
+    )
+    parser.add_argument(
+        "--artist",
+        type=str,
+        default=DEFAULT_ARTIST,
+        help=f"artist tag for mp3 file - Defaults to {DEFAULT_ARTIST!r}.",
+    )
+    parser.add_argument(
+        "--album",
+        type=str,
+        default=DEFAULT_ALBUM,
+        help=f"album tag for mp3 file - Defaults to {DEFAULT_ALBUM!r}.",
+    )
+    parser.add_argument(
+        "--title",
+        type=str,
+        default=None,
+        help="title tag for mp3 file - Defaults to video file name.",
+    )
+    args = parser.parse_args()
+    configure_logging()
+    pipeline = AudioPipeline(
+        args.vid_path,
+        args.dBFS,
+        args.artist,
+        args.album,
+        args.title,
+        mode=args.mode,
+        true_peak=args.true_peak,
+    )
+    pipeline.process_file()
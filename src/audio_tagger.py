@@ -1,20 +1,86 @@
 """Audio tagging module for writing ID3 tags to mp3 files."""
 
 import argparse
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-import eyed3
-import eyed3.core
-import eyed3.id3
-
+from audio_io import AudioInput, AudioOutput, read_encoded, write_audio
 from constants import DEFAULT_ALBUM, DEFAULT_ARTIST
+from id3_writer import (
+    ALBUM_FRAME,
+    ARTIST_FRAME,
+    TITLE_FRAME,
+    UnsupportedTagError,
+    read_id3v2,
+    set_text_frames,
+    write_text_frames,
+)
+from instrumentation import configure_logging
 from process_class import ProcessClass
-from utils import get_file_strings
+from utils import atomic_output, get_file_strings
+
+if TYPE_CHECKING:
+    import eyed3.core
+
+    from audio_buffer import AudioBuffer
+
+__all__ = ["AudioTagger", "tag_audio"]
+
+logger = logging.getLogger(__name__)
+
 
-__all__ = ["AudioTagger"]
+def tag_audio(
+    audio: "AudioInput | AudioBuffer",
+    destination: AudioOutput,
+    artist_tag: str,
+    album_tag: str,
+    title_tag: str,
+) -> None:
+    """Write tagged mp3 audio to a path or stream, without intermediate files.
+
+    PCM in an AudioBuffer is encoded to mp3 with the tags in a single ffmpeg
+    run. An mp3 (bytes, a stream or a path) only has its ID3v2 tag rewritten
+    in memory, or, if the fast writer cannot handle its tag, is remuxed by
+    ffmpeg without re-encoding.
+
+    Args:
+        audio: PCM in an AudioBuffer, or an encoded mp3.
+        destination: Path to write the mp3 to, or a writable binary stream.
+        artist_tag: Artist name.
+        album_tag: Album name.
+        title_tag: Title of the mp3.
+
+    Raises:
+        FFmpegError: If ffmpeg cannot encode or remux the audio.
+    """
+    from audio_buffer import AudioBuffer
+
+    tags = {"artist": artist_tag, "album": album_tag, "title": title_tag}
+    if isinstance(audio, AudioBuffer):
+        write_audio(audio, destination, tags)
+        return
+    data = read_encoded(audio)
+    values = {ALBUM_FRAME: album_tag, ARTIST_FRAME: artist_tag, TITLE_FRAME: title_tag}
+    try:
+        tagged = set_text_frames(data, values)
+    except UnsupportedTagError:
+        write_audio(data, destination, tags, codec="copy")
+        return
+    if isinstance(destination, (str, Path)):
+        with atomic_output(destination) as partial_path:
+            partial_path.write_bytes(tagged)
+    else:
+        destination.write(tagged)
 
 
 class AudioTagger(ProcessClass):
-    """Tags an mp3 file with album, artist, and title metadata."""
+    """Tags an mp3 file with album, artist, and title metadata.
+
+    Files whose ID3v2 tag already holds the requested values are left
+    untouched, so re-running the tagger over a library only writes the files
+    that changed.
+    """
 
     def __init__(
         self,
@@ -22,6 +88,7 @@ class AudioTagger(ProcessClass):
         artist_tag: str,
         album_tag: str,
         title_tag: str | None = None,
+        in_place: bool = False,
     ) -> None:
         """Init method for AudioTagger class.
 
@@ -31,6 +98,12 @@ class AudioTagger(ProcessClass):
             album_tag: Album name.
             title_tag: Title of the mp3. If None, the filename is used.
                 Defaults to None.
+            in_place: If True, the tags are written by editing the ID3v2 tag
+                at the start of the file directly: only the tag is read, and
+                when the new values fit in the tag's padding only the tag is
+                rewritten, without touching the audio. Files without a tag
+                get one with room to spare, so later edits fit. Tags the fast
+                path cannot handle fall back to eyed3. Defaults to False.
         """
         self.sound_file_path = sound_file_path
         self.artist_tag = artist_tag
@@ -39,6 +112,7 @@ class AudioTagger(ProcessClass):
             self.title_tag, _ = get_file_strings(self.sound_file_path)
         else:
             self.title_tag = title_tag
+        self.in_place = in_place
         self.mp3_file: eyed3.core.AudioFile | None = None
 
     def get_mp3(self) -> None:
@@ -47,6 +121,9 @@ class AudioTagger(ProcessClass):
         Raises:
             ValueError: If eyed3 cannot load the file (corrupt or not a valid mp3).
         """
+        # Imported on first use, so the in-place path never loads eyed3.
+        import eyed3
+
         self.mp3_file = eyed3.load(self.sound_file_path)
         if self.mp3_file is None:
             raise ValueError(
@@ -54,9 +131,51 @@ class AudioTagger(ProcessClass):
                 "The file may be corrupt or is not a valid MP3."
             )
 
+    def tags_match(self) -> bool:
+        """Check whether the file's tag already holds the requested values.
+
+        Only the ID3v2 tag at the start of the file is read.
+
+        Returns:
+            True if album, artist, and title all equal the requested values;
+            False if any differs, the file has no tag, or the tag is one the
+            fast reader does not handle.
+        """
+        try:
+            tag = read_id3v2(self.sound_file_path)
+        except UnsupportedTagError:
+            return False
+        return tag is not None and all(
+            tag.text(frame_id) == value
+            for frame_id, value in self._frame_values().items()
+        )
+
+    def _frame_values(self) -> dict[str, str]:
+        return {
+            ALBUM_FRAME: self.album_tag,
+            ARTIST_FRAME: self.artist_tag,
+            TITLE_FRAME: self.title_tag,
+        }
+
     def process_file(self) -> None:
-        """Load the mp3 and write album, artist, and title tags to it."""
-        print(f"Tagging {self.title_tag}...")
+        """Write album, artist, and title tags to the mp3 unless already set.
+
+        Sets skipped to True, without writing anything, when the tags already
+        match.
+        """
+        self.output_path = Path(self.sound_file_path)
+        self.skipped = self.tags_match()
+        if self.skipped:
+            return
+        logger.info("Tagging %s...", self.title_tag)
+        if self.in_place:
+            try:
+                write_text_frames(self.sound_file_path, self._frame_values())
+                return
+            except UnsupportedTagError:
+                pass
+        from eyed3.id3 import ID3_V2_3
+
         self.get_mp3()
         if self.mp3_file is None:
             raise RuntimeError(
@@ -67,7 +186,7 @@ class AudioTagger(ProcessClass):
         self.mp3_file.tag.album = self.album_tag
         self.mp3_file.tag.artist = self.artist_tag
         self.mp3_file.tag.title = self.title_tag
-        self.mp3_file.tag.save(version=eyed3.id3.ID3_V2_3)  # type: ignore[attr-defined]
+        self.mp3_file.tag.save(version=ID3_V2_3)  # type: ignore[attr-defined]
 
 
 if __name__ == "__main__":
@@ -96,11 +215,18 @@ if __name__ == "__main__":
         default=None,
         help="title tag for mp3 file - Defaults to mp3 file name.",
     )
+    parser.add_argument(
+        "--in_place",
+        action="store_true",
+        help="Edit the ID3 tag in place, reading and writing only the tag.",
+    )
     args = parser.parse_args()
+    configure_logging()
     tagger = AudioTagger(
         args.audio_path,
         args.artist,
         args.album,
         args.title,
+        in_place=args.in_place,
     )
     tagger.process_file()
@@ -8,9 +8,22 @@ __all__ = [
     "DEFAULT_ALBUM",
     "DEFAULT_ARTIST",
     "DEFAULT_DBFS",
+    "DEFAULT_LEASE_SECONDS",
+    "DEFAULT_MAX_ATTEMPTS",
+    "DEFAULT_MAX_CONCURRENT",
+    "DEFAULT_POLL_INTERVAL",
+    "DEFAULT_QUEUE_SIZE",
     "EXTRACTED_DIR",
+    "FFMPEG_BINARY",
+    "FFPROBE_BINARY",
+    "JOURNAL_DIR",
+    "MANIFEST_PATH",
+    "NORMALIZATION_MODES",
     "NORMALIZED_DIR",
+    "QUARANTINE_PATH",
     "REPO_ROOT",
+    "STREAM_CHUNK_FRAMES",
+    "STREAM_COPY_EXTS",
     "VID_EXTS",
 ]
 
@@ -18,10 +31,37 @@ REPO_ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = REPO_ROOT / "data"
 NORMALIZED_DIR = DATA_DIR / "normalized_audio"
 EXTRACTED_DIR = DATA_DIR / "extracted_audio"
+MANIFEST_PATH = DATA_DIR / "manifest.jsonl"
+# Journals of unfinished files_processor batches, one per batch.
+JOURNAL_DIR = DATA_DIR / "journals"
+# Files that failed in a batch run with --quarantine, skipped until retried.
+QUARANTINE_PATH = DATA_DIR / "quarantine.json"
 
 VID_EXTS: frozenset[str] = frozenset({"mp4", "avi", "mov", "mkv"})
 AUDIO_EXTS: frozenset[str] = frozenset({"mp3"})
+# Source audio codecs that can be copied out of a video without re-encoding,
+# mapped to the extension of the container they are copied into.
+STREAM_COPY_EXTS: dict[str, str] = {"mp3": "mp3", "aac": "m4a"}
+
+# Frames of PCM held in memory at once when audio is streamed through ffmpeg.
+STREAM_CHUNK_FRAMES: int = 1 << 16
+
+FFMPEG_BINARY: str = "ffmpeg"
+# ffmpeg subprocesses files_processor.AsyncRunner runs at once by default.
+DEFAULT_MAX_CONCURRENT: int = 4
+# Seconds between directory scans when watching a folder without inotify.
+DEFAULT_POLL_INTERVAL: float = 2.0
+# Files waiting between two stages of files_processor.process_pipelined.
+DEFAULT_QUEUE_SIZE: int = 4
+# Seconds a work_queue.WorkQueue lease lasts without a heartbeat, and how many
+# times a job is tried before it is marked failed.
+DEFAULT_LEASE_SECONDS: float = 300.0
+DEFAULT_MAX_ATTEMPTS: int = 3
+FFPROBE_BINARY: str = "ffprobe"
 
 DEFAULT_DBFS: float = -30.0
+# How AudioNormalizer measures levels: average RMS in dBFS, or EBU R128
+# integrated loudness in LUFS.
+NORMALIZATION_MODES: tuple[str, ...] = ("dbfs", "lufs")
 DEFAULT_ARTIST: str = "default artist"
 DEFAULT_ALBUM: str = "default album"
@@ -5,7 +5,13 @@ from pathlib import Path
 
 from audio_extractor import AudioExtractor
 from constants import VID_EXTS
-from files_processor import process_all_files
+from files_processor import (
+    add_batch_arguments,
+    batch_options,
+    print_plan,
+    process_all_files,
+    report_batch,
+)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -15,5 +21,28 @@ if __name__ == "__main__":
         default=str(Path.cwd()),
         help="Directory containing video files to extract audio from.",
     )
+    parser.add_argument(
+        "--copy_stream",
+        action="store_true",
+        help="Copy mp3/AAC audio out without re-encoding (AAC is saved as .m4a).",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Encode this many time ranges of each video in parallel. Defaults to 1.",
+    )
+    add_batch_arguments(parser)
     args = parser.parse_args()
-    process_all_files(args.dir, VID_EXTS, AudioExtractor)
+    if args.plan:
+        print_plan(args, VID_EXTS)
+        parser.exit()
+    report = process_all_files(
+        args.dir,
+        VID_EXTS,
+        AudioExtractor,
+        **batch_options(args),
+        copy_stream=args.copy_stream,
+        segments=args.segments,
+    )
+    report_batch(args, report)
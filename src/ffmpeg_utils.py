@@ -0,0 +1,519 @@
+"""Helpers for running ffmpeg and ffprobe as subprocesses."""
+
+import json
+import subprocess
+import tempfile
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any
+
+from constants import FFMPEG_BINARY, FFPROBE_BINARY, STREAM_CHUNK_FRAMES
+
+if TYPE_CHECKING:
+    import asyncio
+
+__all__ = [
+    "PCM_SAMPLE_WIDTH",
+    "FFmpegError",
+    "FFmpegProgress",
+    "decode_pcm",
+    "encode_pcm",
+    "iter_pcm_chunks",
+    "iter_pcm_chunks_async",
+    "pipe_ffmpeg",
+    "probe_audio_stream",
+    "probe_audio_stream_async",
+    "run_ffmpeg",
+    "run_ffmpeg_async",
+    "stream_duration",
+]
+
+# Bytes per sample of the signed 16-bit little-endian PCM piped to and from ffmpeg.
+PCM_SAMPLE_WIDTH = 2
+
+
+class FFmpegError(Exception):
+    """Raised when an ffmpeg or ffprobe command exits with an error."""
+
+
+@dataclass(frozen=True)
+class FFmpegProgress:
+    """One progress report of a running ffmpeg command.
+
+    Attributes:
+        out_time: Seconds of output written so far.
+        speed: Processing speed as a multiple of real time, or None while
+            ffmpeg has not reported one yet.
+        done: True for the final report, sent when ffmpeg has finished.
+    """
+
+    out_time: float
+    speed: float | None
+    done: bool
+
+
+def run_ffmpeg(args: list[str]) -> None:
+    """Run ffmpeg with the given arguments, overwriting any existing output.
+
+    Args:
+        args: Arguments passed to ffmpeg after the global options.
+
+    Raises:
+        FFmpegError: If ffmpeg exits with a non-zero status.
+    """
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", *args]
+    result = subprocess.run(command, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise FFmpegError(
+            f"ffmpeg exited with status {result.returncode}: {result.stderr.strip()}"
+        )
+
+
+def pipe_ffmpeg(
+    args: list[str],
+    input_data: bytes | bytearray | memoryview | None = None,
+    pass_fds: Sequence[int] = (),
+) -> bytes:
+    """Run ffmpeg, feeding input_data to its stdin and returning its stdout.
+
+    Lets callers read from "pipe:0" and write to "pipe:1", or hand ffmpeg
+    open file descriptors to use as "/dev/fd/N", instead of naming files.
+
+    Args:
+        args: Arguments passed to ffmpeg after the global options.
+        input_data: Bytes written to ffmpeg's stdin. Defaults to None (no
+            input on stdin).
+        pass_fds: File descriptors kept open in ffmpeg. Defaults to none.
+
+    Returns:
+        Everything ffmpeg wrote to stdout.
+
+    Raises:
+        FFmpegError: If ffmpeg exits with a non-zero status.
+    """
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", *args]
+    result = subprocess.run(
+        command,
+        input=input_data,
+        capture_output=True,
+        check=False,
+        pass_fds=tuple(pass_fds),
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace")
+        raise FFmpegError(
+            f"ffmpeg exited with status {result.returncode}: {stderr.strip()}"
+        )
+    return result.stdout
+
+
+def probe_audio_stream(file_path: str | Path) -> dict[str, Any] | None:
+    """Read the first audio stream's metadata from the container headers.
+
+    Args:
+        file_path: Path to a media file.
+
+    Only the headers are read: no audio is decoded, so probing a long file
+    costs about as much as probing a short one.
+
+    Returns:
+        The ffprobe stream entries (codec_name, sample_rate, channels and,
+        if the container records it, duration) for the first audio stream, or
+        None if the file has no audio stream. Containers that only record the
+        duration of the whole file (e.g. Matroska) report that as the stream's.
+
+    Raises:
+        FFmpegError: If ffprobe cannot read the file.
+    """
+    command = _probe_command(file_path)
+    result = subprocess.run(command, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise FFmpegError(
+            f"ffprobe exited with status {result.returncode}: {result.stderr.strip()}"
+        )
+    return _first_stream(result.stdout)
+
+
+def _probe_command(file_path: str | Path) -> list[str]:
+    """Return the ffprobe command reading a file's first audio stream."""
+    return [
+        FFPROBE_BINARY,
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "stream=codec_name,sample_rate,channels,duration:format=duration",
+        "-of",
+        "json",
+        str(file_path),
+    ]
+
+
+def _first_stream(probe_output: str) -> dict[str, Any] | None:
+    """Return the first stream of ffprobe's JSON output, or None.
+
+    The container's duration stands in for a stream that has none.
+    """
+    probe = json.loads(probe_output)
+    streams = probe.get("streams", [])
+    if not streams:
+        return None
+    stream = streams[0]
+    container_duration = probe.get("format", {}).get("duration")
+    if "duration" not in stream and container_duration is not None:
+        stream["duration"] = container_duration
+    return stream
+
+
+def stream_duration(stream: dict[str, Any] | None) -> float | None:
+    """Return the probed duration of a stream in seconds, if the file has it.
+
+    Args:
+        stream: Stream entries returned by probe_audio_stream, or None.
+
+    Returns:
+        The duration, or None if there is no stream or it has no duration.
+    """
+    if stream is None:
+        return None
+    try:
+        return float(stream["duration"])
+    except (KeyError, ValueError):
+        return None
+
+
+def iter_pcm_chunks(
+    file_path: str | Path,
+    sample_rate: int,
+    channels: int,
+    chunk_frames: int = STREAM_CHUNK_FRAMES,
+) -> Iterator[bytearray]:
+    """Decode a file's audio and yield it as fixed-size chunks of PCM.
+
+    Audio is decoded by an ffmpeg subprocess and read from its stdout pipe, so
+    only one chunk is held in memory at a time. ffmpeg's stderr goes to a
+    temporary file rather than a pipe nobody reads until the end, which
+    ffmpeg would block on once a long run of warnings filled it.
+
+    Args:
+        file_path: Path to a media file with an audio stream.
+        sample_rate: Sample rate to decode to, in Hz.
+        channels: Number of channels to decode to.
+        chunk_frames: Number of frames (one sample per channel) per chunk.
+            Defaults to STREAM_CHUNK_FRAMES.
+
+    Yields:
+        Interleaved signed 16-bit little-endian PCM in a new, writable buffer.
+        Every chunk but the last holds exactly chunk_frames frames.
+
+    Raises:
+        FFmpegError: If ffmpeg fails to decode the file.
+    """
+    command = _decode_command(file_path, sample_rate, channels)
+    chunk_bytes = chunk_frames * channels * PCM_SAMPLE_WIDTH
+    with (
+        tempfile.TemporaryFile() as stderr,
+        subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr) as proc,
+    ):
+        assert proc.stdout is not None
+        try:
+            while True:
+                chunk = bytearray(chunk_bytes)
+                read = proc.stdout.readinto(chunk)
+                if not read:
+                    break
+                del chunk[read:]
+                yield chunk
+        except BaseException:
+            # Also reached when the caller stops iterating early.
+            proc.kill()
+            raise
+        if proc.wait() != 0:
+            raise FFmpegError(
+                f"ffmpeg exited with status {proc.returncode}: {_read_stderr(stderr)}"
+            )
+
+
+def _read_stderr(stderr: IO[bytes]) -> str:
+    """Return what a finished subprocess wrote to its stderr file."""
+    stderr.seek(0)
+    return stderr.read().decode(errors="replace").strip()
+
+
+def _decode_command(
+    file_path: str | Path, sample_rate: int, channels: int
+) -> list[str]:
+    """Return the ffmpeg command decoding a file's audio to PCM on stdout."""
+    return [
+        FFMPEG_BINARY,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        str(file_path),
+        "-vn",
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        str(channels),
+        "-",
+    ]
+
+
+def decode_pcm(file_path: str | Path, sample_rate: int, channels: int) -> bytearray:
+    """Decode a file's audio into a single writable PCM buffer.
+
+    Args:
+        file_path: Path to a media file with an audio stream.
+        sample_rate: Sample rate to decode to, in Hz.
+        channels: Number of channels to decode to.
+
+    Returns:
+        Interleaved signed 16-bit little-endian PCM for the whole file.
+
+    Raises:
+        FFmpegError: If ffmpeg fails to decode the file.
+    """
+    pcm = bytearray()
+    for chunk in iter_pcm_chunks(file_path, sample_rate, channels):
+        pcm += chunk
+    return pcm
+
+
+def encode_pcm(
+    chunks: Iterable[bytes | bytearray | memoryview],
+    output_path: str | Path,
+    sample_rate: int,
+    channels: int,
+) -> None:
+    """Encode PCM chunks to a file by piping them into ffmpeg.
+
+    The output format is chosen by ffmpeg from the output path's extension.
+    Like iter_pcm_chunks, ffmpeg's stderr goes to a temporary file, so it
+    never blocks on a full pipe while chunks are written.
+
+    Args:
+        chunks: Interleaved signed 16-bit little-endian PCM.
+        output_path: Path to write the encoded audio to.
+        sample_rate: Sample rate of the PCM, in Hz.
+        channels: Number of interleaved channels in the PCM.
+
+    Raises:
+        FFmpegError: If ffmpeg fails to encode the audio.
+    """
+    command = [
+        FFMPEG_BINARY,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-f",
+        "s16le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        str(channels),
+        "-i",
+        "-",
+        str(output_path),
+    ]
+    with (
+        tempfile.TemporaryFile() as stderr,
+        subprocess.Popen(command, stdin=subprocess.PIPE, stderr=stderr) as proc,
+    ):
+        assert proc.stdin is not None
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+            proc.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg exited early; its stderr below explains why.
+            pass
+        except BaseException:
+            proc.kill()
+            raise
+        if proc.wait() != 0:
+            raise FFmpegError(
+                f"ffmpeg exited with status {proc.returncode}: {_read_stderr(stderr)}"
+            )
+
+
+async def _kill(proc: "asyncio.subprocess.Process") -> None:
+    """Kill a subprocess that is still running and reap it."""
+    if proc.returncode is None:
+        proc.kill()
+        await proc.wait()
+
+
+def _parse_progress(fields: dict[str, str]) -> FFmpegProgress:
+    """Build an FFmpegProgress from one block of ffmpeg -progress output."""
+    # out_time_ms is in microseconds too; older ffmpeg builds only print it.
+    raw_time = fields.get("out_time_us", fields.get("out_time_ms", "N/A"))
+    out_time = int(raw_time) / 1e6 if raw_time.lstrip("-").isdigit() else 0.0
+    raw_speed = fields.get("speed", "N/A").strip().removesuffix("x")
+    try:
+        speed = float(raw_speed)
+    except ValueError:
+        speed = None
+    return FFmpegProgress(
+        out_time=max(out_time, 0.0),
+        speed=speed,
+        done=fields.get("progress") == "end",
+    )
+
+
+async def run_ffmpeg_async(
+    args: list[str],
+    on_progress: Callable[[FFmpegProgress], None] | None = None,
+    timeout: float | None = None,
+) -> None:
+    """Run ffmpeg without blocking the event loop, overwriting any existing output.
+
+    The subprocess is started with asyncio.create_subprocess_exec. Progress is
+    read from ffmpeg's machine-readable -progress output on stdout while stderr
+    is collected for the error message. If the awaiting task is cancelled or
+    the timeout expires, ffmpeg is killed before the exception propagates.
+
+    Args:
+        args: Arguments passed to ffmpeg after the global options.
+        on_progress: Called with every progress report, the last one with
+            done set. Defaults to None.
+        timeout: Seconds after which ffmpeg is killed. Defaults to None (no
+            limit).
+
+    Raises:
+        FFmpegError: If ffmpeg exits with a non-zero status.
+        TimeoutError: If ffmpeg is still running after timeout seconds.
+    """
+    # Imported on first use, so the synchronous CLIs never load asyncio.
+    import asyncio
+
+    command = [
+        FFMPEG_BINARY,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+        "-y",
+        *args,
+    ]
+    proc = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    assert proc.stdout is not None and proc.stderr is not None
+    stderr = asyncio.ensure_future(proc.stderr.read())
+    try:
+        async with asyncio.timeout(timeout):
+            fields: dict[str, str] = {}
+            async for raw_line in proc.stdout:
+                key, _, value = raw_line.decode(errors="replace").strip().partition("=")
+                fields[key] = value
+                if key == "progress":
+                    if on_progress is not None:
+                        on_progress(_parse_progress(fields))
+                    fields = {}
+            returncode = await proc.wait()
+            message = (await stderr).decode(errors="replace").strip()
+    except TimeoutError as exc:
+        raise TimeoutError(f"ffmpeg was still running after {timeout} s") from exc
+    finally:
+        await _kill(proc)
+        stderr.cancel()
+    if returncode != 0:
+        raise FFmpegError(f"ffmpeg exited with status {returncode}: {message}")
+
+
+async def probe_audio_stream_async(file_path: str | Path) -> dict[str, Any] | None:
+    """Async version of probe_audio_stream; see it for details.
+
+    Args:
+        file_path: Path to a media file.
+
+    Returns:
+        The ffprobe stream entries for the first audio stream, or None if the
+        file has no audio stream.
+
+    Raises:
+        FFmpegError: If ffprobe cannot read the file.
+    """
+    import asyncio
+
+    proc = await asyncio.create_subprocess_exec(
+        *_probe_command(file_path),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    finally:
+        await _kill(proc)
+    if proc.returncode != 0:
+        raise FFmpegError(
+            f"ffprobe exited with status {proc.returncode}: "
+            f"{stderr.decode(errors='replace').strip()}"
+        )
+    return _first_stream(stdout.decode())
+
+
+async def iter_pcm_chunks_async(
+    file_path: str | Path,
+    sample_rate: int,
+    channels: int,
+    chunk_frames: int = STREAM_CHUNK_FRAMES,
+) -> AsyncIterator[bytearray]:
+    """Async version of iter_pcm_chunks; see it for details.
+
+    Args:
+        file_path: Path to a media file with an audio stream.
+        sample_rate: Sample rate to decode to, in Hz.
+        channels: Number of channels to decode to.
+        chunk_frames: Number of frames (one sample per channel) per chunk.
+            Defaults to STREAM_CHUNK_FRAMES.
+
+    Yields:
+        Interleaved signed 16-bit little-endian PCM in a new, writable buffer.
+        Every chunk but the last holds exactly chunk_frames frames.
+
+    Raises:
+        FFmpegError: If ffmpeg fails to decode the file.
+    """
+    import asyncio
+
+    proc = await asyncio.create_subprocess_exec(
+        *_decode_command(file_path, sample_rate, channels),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    assert proc.stdout is not None and proc.stderr is not None
+    stderr = asyncio.ensure_future(proc.stderr.read())
+    chunk_bytes = chunk_frames * channels * PCM_SAMPLE_WIDTH
+    try:
+        while True:
+            try:
+                chunk = await proc.stdout.readexactly(chunk_bytes)
+            except asyncio.IncompleteReadError as exc:
+                if exc.partial:
+                    yield bytearray(exc.partial)
+                break
+            yield bytearray(chunk)
+        returncode = await proc.wait()
+        message = (await stderr).decode(errors="replace").strip()
+    finally:
+        # Also reached when the caller stops iterating early.
+        await _kill(proc)
+        stderr.cancel()
+    if returncode != 0:
+        raise FFmpegError(f"ffmpeg exited with status {returncode}: {message}")
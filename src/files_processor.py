@@ -1,49 +1,1848 @@
 """Batch file processing module for running processors across directories."""
 
 import argparse
-from collections.abc import Callable, Collection
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import queue
+import signal
+import sys
+import threading
+import time
+from collections.abc import Callable, Collection, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Any
 
-from audio_extractor import AudioExtractor
-from audio_normalizer import AudioNormalizer
-from audio_tagger import AudioTagger
 from constants import (
     AUDIO_EXTS,
     DEFAULT_ALBUM,
     DEFAULT_ARTIST,
     DEFAULT_DBFS,
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_MAX_CONCURRENT,
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_QUEUE_SIZE,
     EXTRACTED_DIR,
+    JOURNAL_DIR,
+    MANIFEST_PATH,
+    NORMALIZATION_MODES,
     NORMALIZED_DIR,
+    QUARANTINE_PATH,
     VID_EXTS,
 )
-from utils import is_valid_ext
+from ffmpeg_utils import FFmpegProgress
+from instrumentation import (
+    LOG_FORMATS,
+    MetricsSink,
+    StageMetrics,
+    configure_logging,
+    measure,
+    open_metrics_sink,
+)
+from manifest import Manifest
+from quarantine import Quarantine
+from scheduling import BatchPlan, MemoryBudget, format_plan, parse_size, plan_batch
+from utils import atomic_output, is_valid_ext, iter_files
+from watcher import watch_files
+from work_queue import Job, WorkQueue, default_worker_id
+
+__all__ = [
+    "AsyncRunner",
+    "BatchReport",
+    "FileResult",
+    "Stage",
+    "add_batch_arguments",
+    "batch_journal",
+    "batch_options",
+    "plan_files",
+    "print_plan",
+    "process_all_files",
+    "process_all_files_async",
+    "process_pipelined",
+    "process_queue",
+    "report_batch",
+    "watch_and_process",
+]
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for cancellation while blocked on a pipeline queue.
+_QUEUE_POLL_S = 0.1
+
+
+@dataclass
+class FileResult:
+    """Outcome of processing a single file in a batch.
+
+    Attributes:
+        file_path: Path of the file the stage processed.
+        error: "ExceptionType: message" if processing raised, otherwise None.
+        skipped: True if the file was up to date and nothing was written.
+        output_path: Path of the file the stage wrote, if any.
+        stage: Name of the stage, or None if the file failed outside of one
+            (e.g. its worker process died).
+        error_type: Name of the exception's type if processing raised.
+        metrics: Resources processing the file took, if it ran.
+    """
+
+    file_path: str
+    error: str | None = None
+    skipped: bool = False
+    output_path: str | None = None
+    stage: str | None = None
+    error_type: str | None = None
+    # Timings differ between runs, so they are left out of comparisons.
+    metrics: StageMetrics | None = field(default=None, compare=False)
+
+    @property
+    def ok(self) -> bool:
+        """True if the file was processed without raising."""
+        return self.error is None
+
+    @property
+    def status(self) -> str:
+        """One of "failed", "skipped" or "ok"."""
+        if self.error is not None:
+            return "failed"
+        return "skipped" if self.skipped else "ok"
+
+    @property
+    def elapsed_s(self) -> float | None:
+        """Wall-clock seconds processing took, or None if it did not run."""
+        return None if self.metrics is None else self.metrics.wall_s
+
+
+class BatchReport(list[FileResult]):
+    """Results of a batch, one FileResult per file and stage, with its totals.
+
+    A report is a list of the results, so it can be indexed and iterated like
+    one. write saves a machine-readable summary of it.
+
+    Attributes:
+        aborted: True if the batch stopped early because too many files
+            failed.
+        not_run: Files that were found but not processed because the batch
+            stopped early.
+        quarantined: Files skipped because they are quarantined.
+        started_at: Unix time the report was created, as the batch started.
+    """
+
+    def __init__(self, results: Iterable[FileResult] = ()) -> None:
+        """Init method for the BatchReport class.
+
+        Args:
+            results: Results to start with. Defaults to none.
+        """
+        super().__init__(results)
+        self.aborted = False
+        self.not_run: list[str] = []
+        self.quarantined: list[str] = []
+        self.started_at = time.time()
+
+    @property
+    def failed(self) -> list[FileResult]:
+        """Results of the files that failed."""
+        return [result for result in self if not result.ok]
+
+    def counts(self) -> dict[str, int]:
+        """Return the number of results of each status, and of unprocessed files."""
+        counts = dict.fromkeys(("ok", "skipped", "failed"), 0)
+        for result in self:
+            counts[result.status] += 1
+        counts["not_run"] = len(self.not_run)
+        counts["quarantined"] = len(self.quarantined)
+        return counts
+
+    def collect(
+        self, chains: Iterator[list[FileResult]], max_failures: int | None = None
+    ) -> None:
+        """Add the results a chain runner yields, e.g. process_pipelined.
+
+        Args:
+            chains: Results of each file's chain of stages, as yielded by
+                process_pipelined, watch_and_process or process_queue.
+            max_failures: Number of failed files after which chains is closed,
+                which stops its runner, and the report marked aborted.
+                Defaults to None (run to the end).
+        """
+        failures = len({result.file_path for result in self.failed})
+        with contextlib.closing(chains):
+            for chain in chains:
+                self.extend(chain)
+                failures += any(not result.ok for result in chain)
+                if max_failures is not None and failures >= max_failures:
+                    self.aborted = True
+                    logger.error("Stopping the batch after %d failure(s).", failures)
+                    return
+
+    def summary(self) -> dict[str, Any]:
+        """Return the report as JSON-serializable data.
+
+        Returns:
+            The batch's start time, duration, whether it was aborted, its
+            counts, every result (file, stage, status, error type and
+            message, elapsed seconds and output), and the files not run and
+            quarantined.
+        """
+        return {
+            "started_at": self.started_at,
+            "wall_s": time.time() - self.started_at,
+            "aborted": self.aborted,
+            "counts": self.counts(),
+            "files": [
+                {
+                    "file_path": result.file_path,
+                    "stage": result.stage,
+                    "status": result.status,
+                    "error_type": result.error_type,
+                    "error": result.error,
+                    "elapsed_s": result.elapsed_s,
+                    "output_path": result.output_path,
+                }
+                for result in self
+            ],
+            "not_run": self.not_run,
+            "quarantined": self.quarantined,
+        }
+
+    def write(self, path: str | Path) -> None:
+        """Write the summary as JSON, replacing the file only once it is complete.
+
+        Args:
+            path: File to write.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(path) as partial_path:
+            partial_path.write_text(
+                json.dumps(self.summary(), indent=2) + "\n", encoding="utf-8"
+            )
+
+
+@dataclass
+class Stage:
+    """One step of a chain of processors, each fed the previous one's output.
+
+    Attributes:
+        process_class: Processor class run on each file.
+        ext_list: Extensions of the files the stage accepts. A chain stops at
+            an output the next stage does not accept (e.g. copied .m4a audio).
+        kwargs: Keyword arguments forwarded to process_class.
+        output_dir: Directory the stage writes its outputs to, or None if it
+            modifies its input in place.
+    """
+
+    process_class: Callable[..., Any]
+    ext_list: Collection[str]
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    output_dir: Path | None = None
+
+    @property
+    def name(self) -> str:
+        """Name the stage is recorded under in manifests and metrics."""
+        return _stage_name(self.process_class)
+
+
+def _process_file(
+    process_class: Callable[..., Any], file_path: str, kwargs: dict[str, Any]
+) -> FileResult:
+    """Build a processor for one file and run it, capturing any exception.
+
+    This runs inside pool workers, so the processor is constructed in the worker
+    process instead of being pickled across from the parent.
+
+    Args:
+        process_class: Processor class to instantiate for the file.
+        file_path: Path of the file to process.
+        kwargs: Keyword arguments forwarded to process_class.
+
+    Returns:
+        A FileResult with the error message set if processing raised.
+    """
+    metrics = StageMetrics(_stage_name(process_class), file_path)
+    try:
+        processor = _run_measured(process_class, file_path, kwargs, metrics)
+    except Exception as exc:
+        return _failure(file_path, metrics.stage, exc, metrics)
+    return _result_of(file_path, processor, metrics)
+
+
+def _run_measured(
+    process_class: Callable[..., Any],
+    file_path: str,
+    kwargs: dict[str, Any],
+    metrics: StageMetrics,
+) -> Any:
+    """Build a processor for one file and run it, recording its metrics.
 
-__all__ = ["process_all_files"]
+    Returns:
+        The processor, after process_file returned.
+    """
+    with measure(metrics):
+        processor = process_class(file_path, **kwargs)
+        processor.process_file()
+        metrics.observe(processor)
+    return processor
+
+
+def _stage_name(process_class: Callable[..., Any]) -> str:
+    return getattr(process_class, "__name__", repr(process_class))
+
+
+def _result_of(file_path: str, processor: Any, metrics: StageMetrics) -> FileResult:
+    """Build the FileResult of a processor that ran without raising."""
+    output_path = getattr(processor, "output_path", None)
+    return FileResult(
+        file_path,
+        skipped=getattr(processor, "skipped", False) is True,
+        output_path=str(output_path) if isinstance(output_path, str | Path) else None,
+        stage=metrics.stage,
+        metrics=metrics,
+    )
+
+
+def _failure(
+    file_path: str,
+    stage: str | None,
+    exc: BaseException,
+    metrics: StageMetrics | None = None,
+) -> FileResult:
+    """Build the FileResult of a file whose processing raised exc."""
+    return FileResult(
+        file_path,
+        error=f"{type(exc).__name__}: {exc}",
+        stage=stage,
+        error_type=type(exc).__name__,
+        metrics=metrics,
+    )
 
 
 def process_all_files(
     file_dir: str | Path,
     ext_list: Collection[str],
     process_class: Callable[..., Any],
+    *,
+    workers: int = 1,
+    manifest: Manifest | None = None,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+    metrics_sink: MetricsSink | None = None,
+    largest_first: bool = False,
+    memory_budget: int | None = None,
+    max_failures: int | None = None,
+    quarantine: Quarantine | None = None,
+    retry_quarantined: bool = False,
     **kwargs: Any,
-) -> None:
+) -> BatchReport:
     """Process all matching files in a directory using the given processor.
 
+    Files are discovered lazily (see utils.iter_files), so processing starts as
+    soon as the first match is found. With workers=1 files are processed one at
+    a time in this process; with more workers they are fanned out across a
+    process pool. A failing file is recorded in its FileResult (its error
+    type and message) and logged, and the rest of the batch carries on until
+    max_failures files have failed: then no more files are started, the ones
+    running are finished, and the report is marked aborted. max_failures=1
+    fails fast.
+
+    With a quarantine, files in it are skipped, and every file that fails is
+    added to it, so later batches do not stall on it again; with
+    retry_quarantined, only the quarantined files are processed instead, and
+    each one that succeeds is released.
+
+    If a manifest is given, files it records as already processed by this
+    process_class with the same kwargs, and unchanged since, are skipped; every
+    file processed successfully is recorded in it. Files whose processor sets
+    skipped (its output was already up to date) are reported as skipped too.
+
+    When searching recursively, processor classes with a true
+    mirrors_input_tree attribute are also passed relative_dir, the file's
+    directory relative to file_dir, so their outputs mirror the input tree.
+
+    With largest_first set, every file is found and its duration read from
+    its headers before the first one starts, and files are handed to the
+    workers longest first (see scheduling.plan_batch), so a long file found
+    last does not hold up the end of the batch on a single worker.
+
+    With a memory_budget, each file's peak memory is estimated from its
+    headers (see ProcessClass.estimate_peak_memory) and a file is only handed
+    to a worker once it fits next to the files being processed, so workers
+    sets the most files processed at once rather than how many always are. A
+    file that alone would exceed the budget is processed with the
+    processor's low_memory_kwargs instead, if it has any.
+
+    Each processed file's wall and CPU time, decoded audio duration, input and
+    output size and peak memory are recorded in its FileResult's metrics and,
+    if a metrics_sink is given, emitted to it as the file finishes.
+
     Args:
         file_dir: Directory containing files to process.
         ext_list: Collection of valid file extensions to match against.
         process_class: Processor class to instantiate and call for each file.
+            Must be importable at module level when workers > 1.
+        workers: Number of worker processes. Defaults to 1 (serial).
+        manifest: Manifest used to skip unchanged files. Defaults to None,
+            which processes every file.
+        recursive: If True, subdirectories are searched too. Defaults to False.
+        include: Globs a file must match one of to be processed. Defaults to
+            no filter.
+        exclude: Globs of files and directories to skip. Defaults to no filter.
+        max_depth: Deepest subdirectory level searched when recursive, where 0
+            is file_dir itself. Defaults to None (no limit).
+        metrics_sink: Sink every processed file's metrics are emitted to.
+            Defaults to None.
+        largest_first: If True, process the longest files first. Defaults to
+            False (discovery order).
+        memory_budget: Most memory, in bytes, the files being processed at
+            once may need. Defaults to None (no limit).
+        max_failures: Number of failed files after which the batch stops.
+            Defaults to None (never stop).
+        quarantine: Quarantine of failed files. Defaults to None.
+        retry_quarantined: If True, process only the files in quarantine.
+            Defaults to False.
         **kwargs: Additional keyword arguments forwarded to process_class.
+
+    Returns:
+        A report with one FileResult per processed or skipped file, in
+        discovery order regardless of the order in which workers finish.
+
+    Raises:
+        ValueError: If workers or max_failures is less than 1, memory_budget
+            is not positive, or retry_quarantined is set without a quarantine.
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    budget = None if memory_budget is None else MemoryBudget(memory_budget)
+    batch = _Batch(
+        file_dir,
+        ext_list,
+        process_class,
+        manifest,
+        recursive,
+        include,
+        exclude,
+        max_depth,
+        metrics_sink,
+        kwargs,
+        workers if largest_first else None,
+        max_failures=max_failures,
+        quarantine=quarantine,
+        retry_quarantined=retry_quarantined,
+    )
+    if workers == 1:
+        for file_path, file_kwargs in batch.jobs():
+            if budget is not None:
+                overrides, _ = _fit_to_budget(
+                    process_class, file_path, file_kwargs, budget
+                )
+                file_kwargs = {**file_kwargs, **overrides}
+            batch.finish(_process_file(process_class, file_path, file_kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures: dict[Future[FileResult], str] = {}
+            for file_path, file_kwargs in batch.jobs():
+                if budget is not None:
+                    overrides, peak = _fit_to_budget(
+                        process_class, file_path, file_kwargs, budget
+                    )
+                    budget.acquire(peak)
+                    file_kwargs = {**file_kwargs, **overrides}
+                future = pool.submit(
+                    _process_file, process_class, file_path, file_kwargs
+                )
+                if budget is not None:
+                    future.add_done_callback(functools.partial(_release, budget, peak))
+                futures[future] = file_path
+                # Finish what is done already, so a failure stops the batch
+                # before more files are started.
+                for finished in [done for done in futures if done.done()]:
+                    del futures[finished]
+                    batch.finish(finished.result())
+            for future in as_completed(futures):
+                if batch.stopped:
+                    for pending in futures:
+                        pending.cancel()
+                if not future.cancelled():
+                    batch.finish(future.result())
+    return batch.results()
+
+
+def _fit_to_budget(
+    process_class: Callable[..., Any],
+    file_path: str,
+    kwargs: dict[str, Any],
+    budget: MemoryBudget,
+) -> tuple[dict[str, Any], int]:
+    """Estimate a file's peak memory, switching to low memory if it exceeds budget.
+
+    Returns:
+        A tuple of (overrides, peak): keyword arguments to run the file with
+        on top of kwargs (the processor's low_memory_kwargs if the file alone
+        would exceed the budget, otherwise none), and the file's estimated
+        peak memory with them, in bytes.
+    """
+    estimate = getattr(process_class, "estimate_peak_memory", None)
+    if estimate is None:
+        return {}, 0
+    peak = estimate(file_path, **kwargs)
+    low_memory_kwargs = getattr(process_class, "low_memory_kwargs", None)
+    if peak <= budget.limit or not low_memory_kwargs:
+        return {}, peak
+    logger.info(
+        "%s needs about %d MiB, more than the memory budget; processing it with %s.",
+        file_path,
+        peak >> 20,
+        low_memory_kwargs,
+    )
+    return low_memory_kwargs, estimate(file_path, **{**kwargs, **low_memory_kwargs})
+
+
+def _release(budget: MemoryBudget, peak: int, _: Future[Any]) -> None:
+    """Give a finished job's share of the memory budget back."""
+    budget.release(peak)
+
+
+class _Batch:
+    """File discovery and result bookkeeping shared by the batch runners."""
+
+    def __init__(
+        self,
+        file_dir: str | Path,
+        ext_list: Collection[str],
+        process_class: Callable[..., Any],
+        manifest: Manifest | None,
+        recursive: bool,
+        include: Sequence[str],
+        exclude: Sequence[str],
+        max_depth: int | None,
+        metrics_sink: MetricsSink | None,
+        kwargs: dict[str, Any],
+        plan_workers: int | None = None,
+        *,
+        max_failures: int | None = None,
+        quarantine: Quarantine | None = None,
+        retry_quarantined: bool = False,
+    ) -> None:
+        if max_failures is not None and max_failures < 1:
+            raise ValueError(f"max_failures must be at least 1, got {max_failures}.")
+        if retry_quarantined and quarantine is None:
+            raise ValueError("retry_quarantined needs a quarantine.")
+        self.file_dir = file_dir
+        self.ext_list = ext_list
+        self.manifest = manifest
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.max_depth = max_depth
+        self.metrics_sink = metrics_sink
+        self.kwargs = kwargs
+        # Number of workers to plan the batch largest first for, if any.
+        self.plan_workers = plan_workers
+        self.max_failures = max_failures
+        self.quarantine = quarantine
+        self.retry_quarantined = retry_quarantined
+        self.failures = 0
+        self.report = BatchReport()
+        self.stage = _stage_name(process_class)
+        self.mirror_tree = recursive and getattr(
+            process_class, "mirrors_input_tree", False
+        )
+        self.file_paths: list[str] = []
+        self._results: dict[str, FileResult] = {}
+
+    @property
+    def stopped(self) -> bool:
+        """True once max_failures files have failed."""
+        return self.max_failures is not None and self.failures >= self.max_failures
+
+    def jobs(self) -> Iterator[tuple[str, dict[str, Any]]]:
+        """Yield each file to process with its kwargs, recording skipped ones.
+
+        Once the batch is stopped, the remaining files are still found, so
+        they can be reported as not run, but not yielded.
+        """
+        file_paths: Iterable[str] = self._pending()
+        if self.plan_workers is not None:
+            file_paths = plan_batch(file_paths, self.plan_workers).file_paths
+        for file_path in file_paths:
+            if self.stopped:
+                continue
+            if self.mirror_tree is True:
+                relative_dir = Path(file_path).parent.relative_to(self.file_dir)
+                yield file_path, {**self.kwargs, "relative_dir": str(relative_dir)}
+            else:
+                yield file_path, self.kwargs
+
+    def _pending(self) -> Iterator[str]:
+        """Yield the files to process in discovery order, recording skipped ones."""
+        for file_path in iter_files(
+            self.file_dir,
+            self.ext_list,
+            self.recursive,
+            self.include,
+            self.exclude,
+            self.max_depth,
+        ):
+            if not _in_batch(file_path, self.quarantine, self.retry_quarantined):
+                if not self.retry_quarantined:
+                    self.report.quarantined.append(file_path)
+                continue
+            self.file_paths.append(file_path)
+            if self.manifest is not None and self.manifest.is_current(
+                file_path, self.stage, self.kwargs
+            ):
+                self._results[file_path] = FileResult(file_path, skipped=True)
+                continue
+            yield file_path
+
+    def finish(self, result: FileResult) -> None:
+        """Store a processed file's result, record it and emit its metrics.
+
+        A failed file is counted towards max_failures and quarantined; a file
+        that succeeds is released from quarantine.
+        """
+        _record_result(
+            result, self.stage, self.kwargs, self.manifest, self.metrics_sink
+        )
+        self._results[result.file_path] = result
+        if not result.ok:
+            self.failures += 1
+            if self.stopped and self.failures == self.max_failures:
+                logger.error("Stopping the batch after %d failure(s).", self.failures)
+        if self.quarantine is not None:
+            _update_quarantine(
+                self.quarantine, result.file_path, None if result.ok else result
+            )
+
+    def results(self) -> BatchReport:
+        """Print how many files were skipped and return the report in order."""
+        results = self._results.values()
+        skipped = sum(result.skipped for result in results)
+        if skipped:
+            written = sum(result.ok and not result.skipped for result in results)
+            logger.info(
+                "Skipped %d unchanged file(s), processed %d.",
+                skipped,
+                written,
+                extra={"stage": self.stage, "skipped": skipped, "written": written},
+            )
+        report = self.report
+        if report.quarantined:
+            logger.info("Skipped %d quarantined file(s).", len(report.quarantined))
+        for file_path in self.file_paths:
+            if file_path in self._results:
+                report.append(self._results[file_path])
+            else:
+                report.not_run.append(file_path)
+        report.aborted = self.stopped
+        return report
+
+
+def _in_batch(
+    file_path: str, quarantine: Quarantine | None, retry_quarantined: bool
+) -> bool:
+    """Whether a found file is processed: only quarantined ones when retrying."""
+    if quarantine is None:
+        return True
+    return (file_path in quarantine) is retry_quarantined
+
+
+def _update_quarantine(
+    quarantine: Quarantine, file_path: str, failure: FileResult | None
+) -> None:
+    """Quarantine a file that failed, or release one that succeeded."""
+    if failure is not None:
+        quarantine.add(file_path, failure.stage, failure.error_type, failure.error)
+    elif quarantine.release(file_path):
+        logger.info("Released %s from quarantine.", file_path)
+
+
+def _record_result(
+    result: FileResult,
+    stage: str,
+    kwargs: dict[str, Any],
+    manifest: Manifest | None,
+    metrics_sink: MetricsSink | None,
+) -> None:
+    """Log a processed file's failure or record it, and emit its metrics."""
+    if not result.ok:
+        logger.error(
+            "Failed to process %s: %s",
+            result.file_path,
+            result.error,
+            extra={"stage": stage, "file_path": result.file_path},
+        )
+    elif manifest is not None:
+        manifest.record(result.file_path, stage, kwargs, result.output_path)
+    if result.metrics is not None:
+        _emit_metrics(result.metrics, metrics_sink)
+
+
+def _emit_metrics(metrics: StageMetrics, metrics_sink: MetricsSink | None) -> None:
+    """Log a processed file's metrics and pass them to the sink."""
+    logger.debug(
+        "%s took %.3f s on %s",
+        metrics.stage,
+        metrics.wall_s,
+        metrics.file_path,
+        extra={"metrics": asdict(metrics)},
+    )
+    if metrics_sink is not None:
+        metrics_sink.emit(metrics)
+
+
+class AsyncRunner:
+    """Runs processors' process_file_async concurrently on the event loop.
+
+    At most max_concurrent files are processed at once; the rest wait their
+    turn. A runner can be shared by several batches (and by other code in the
+    same event loop) to bound the number of ffmpeg processes overall. A
+    running or waiting job is cancelled with cancel, which kills its ffmpeg
+    subprocess.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        timeout: float | None = None,
+        on_progress: Callable[[str, FFmpegProgress], None] | None = None,
+    ) -> None:
+        """Init method for the AsyncRunner class.
+
+        Args:
+            max_concurrent: Maximum number of files processed at once.
+                Defaults to DEFAULT_MAX_CONCURRENT.
+            timeout: Seconds after which a file's processing is cancelled and
+                reported as failed. Waiting for a free slot does not count.
+                Defaults to None (no limit).
+            on_progress: Called with the file path and every ffmpeg progress
+                report of its processing. Defaults to None.
+
+        Raises:
+            ValueError: If max_concurrent is less than 1.
+        """
+        if max_concurrent < 1:
+            raise ValueError(
+                f"max_concurrent must be at least 1, got {max_concurrent}."
+            )
+        # Imported on first use, so the synchronous CLIs never load asyncio.
+        import asyncio
+
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks: dict[str, asyncio.Task[FileResult]] = {}
+
+    async def run(
+        self, process_class: Callable[..., Any], file_path: str, **kwargs: Any
+    ) -> FileResult:
+        """Build a processor for one file and run its process_file_async.
+
+        Args:
+            process_class: Processor class to instantiate for the file.
+            file_path: Path of the file to process.
+            **kwargs: Keyword arguments forwarded to process_class.
+
+        Returns:
+            A FileResult with the error message set if processing raised,
+            timed out, or was cancelled with cancel.
+
+        Raises:
+            asyncio.CancelledError: If the task awaiting run is cancelled.
+        """
+        import asyncio
+
+        task = asyncio.ensure_future(self._run(process_class, file_path, kwargs))
+        self._tasks[file_path] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                raise
+            return FileResult(
+                file_path,
+                error="CancelledError: cancelled",
+                stage=_stage_name(process_class),
+                error_type="CancelledError",
+            )
+        finally:
+            if self._tasks.get(file_path) is task:
+                del self._tasks[file_path]
+
+    def cancel(self, file_path: str) -> bool:
+        """Cancel the processing of a file, killing its ffmpeg subprocess.
+
+        Args:
+            file_path: Path the file was passed to run with.
+
+        Returns:
+            True if a pending or running job was cancelled, False if there is
+            no such job.
+        """
+        task = self._tasks.get(file_path)
+        if task is None or task.done():
+            return False
+        return task.cancel()
+
+    async def _run(
+        self,
+        process_class: Callable[..., Any],
+        file_path: str,
+        kwargs: dict[str, Any],
+    ) -> FileResult:
+        import asyncio
+
+        on_progress = None
+        if self.on_progress is not None:
+            on_progress = functools.partial(self.on_progress, file_path)
+        metrics = StageMetrics(_stage_name(process_class), file_path)
+        async with self._semaphore:
+            try:
+                async with asyncio.timeout(self.timeout):
+                    with measure(metrics):
+                        processor = process_class(file_path, **kwargs)
+                        await processor.process_file_async(on_progress)
+                        metrics.observe(processor)
+            except TimeoutError:
+                metrics.error = f"TimeoutError: not done after {self.timeout} s"
+                return FileResult(
+                    file_path,
+                    error=metrics.error,
+                    stage=metrics.stage,
+                    error_type="TimeoutError",
+                    metrics=metrics,
+                )
+            except Exception as exc:
+                return _failure(file_path, metrics.stage, exc, metrics)
+        return _result_of(file_path, processor, metrics)
+
+
+async def process_all_files_async(
+    file_dir: str | Path,
+    ext_list: Collection[str],
+    process_class: Callable[..., Any],
+    *,
+    runner: AsyncRunner | None = None,
+    manifest: Manifest | None = None,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+    metrics_sink: MetricsSink | None = None,
+    **kwargs: Any,
+) -> list[FileResult]:
+    """Async version of process_all_files for use inside an event loop.
+
+    Every matching file is processed by process_class's process_file_async,
+    which for the extract and normalize stages runs ffmpeg as an asyncio
+    subprocess, so no threads or worker processes are used; other stages run
+    in a worker thread. How many files run at once, the per-file timeout and
+    progress reporting are set by the runner. A failing, timed out or
+    cancelled file is recorded in its FileResult and the rest of the batch
+    carries on; manifest entries are recorded as files finish. If the task
+    awaiting this coroutine is cancelled, every job is cancelled with it.
+
+    Args:
+        file_dir: Directory containing files to process.
+        ext_list: Collection of valid file extensions to match against.
+        process_class: Processor class to instantiate for each file; see
+            ProcessClass.process_file_async.
+        runner: Runner the files are processed with; keep a reference to it
+            to cancel single files. Defaults to a new AsyncRunner.
+        manifest: Manifest used to skip unchanged files. Defaults to None,
+            which processes every file.
+        recursive: If True, subdirectories are searched too. Defaults to False.
+        include: Globs a file must match one of to be processed. Defaults to
+            no filter.
+        exclude: Globs of files and directories to skip. Defaults to no filter.
+        max_depth: Deepest subdirectory level searched when recursive, where 0
+            is file_dir itself. Defaults to None (no limit).
+        metrics_sink: Sink every processed file's metrics are emitted to.
+            Defaults to None.
+        **kwargs: Additional keyword arguments forwarded to process_class.
+
+    Returns:
+        One FileResult per matching file (skipped ones included), in discovery
+        order regardless of the order in which files finish.
+    """
+    import asyncio
+
+    if runner is None:
+        runner = AsyncRunner()
+    batch = _Batch(
+        file_dir,
+        ext_list,
+        process_class,
+        manifest,
+        recursive,
+        include,
+        exclude,
+        max_depth,
+        metrics_sink,
+        kwargs,
+    )
+    tasks = [
+        asyncio.ensure_future(runner.run(process_class, file_path, **file_kwargs))
+        for file_path, file_kwargs in batch.jobs()
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            batch.finish(await next_done)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return batch.results()
+
+
+def _skip_done_stages(
+    file_path: str, stages: Sequence[Stage], manifest: Manifest | None
+) -> tuple[list[FileResult], str, Sequence[Stage]]:
+    """Skip the leading stages of a chain the manifest records as done.
+
+    This runs in the parent process, like _skipped_stage, so pool workers
+    are only sent the stages that have to run, and never the manifest.
+
+    Args:
+        file_path: Path of the file the first stage processes.
+        stages: Stages of the chain, in order.
+        manifest: Manifest used to skip stages, or None.
+
+    Returns:
+        A tuple of (skipped, file_path, rest): the skipped stages' results,
+        the recorded output the chain continues with, and the stages left to
+        run on it, which is empty if the chain ended at a skipped stage.
+    """
+    skipped: list[FileResult] = []
+    for index, stage in enumerate(stages):
+        if not is_valid_ext(file_path, stage.ext_list):
+            return skipped, file_path, ()
+        result = _skipped_stage(stage, file_path, manifest)
+        if result is None:
+            return skipped, file_path, stages[index:]
+        skipped.append(result)
+        if result.output_path is None:
+            return skipped, file_path, ()
+        file_path = result.output_path
+    return skipped, file_path, ()
+
+
+def _process_chain(
+    file_path: str, stages: Sequence[Stage], relative_dir: str | None
+) -> list[FileResult]:
+    """Run each stage on the previous stage's output, capturing any exception.
+
+    This runs inside pool workers, like _process_file; the stages already
+    done are taken off the chain beforehand, with _skip_done_stages. The
+    chain stops at the first failure, or at an output the next stage does
+    not accept.
+
+    Args:
+        file_path: Path of the file the first stage processes.
+        stages: Stages to run, in order.
+        relative_dir: Directory of the file relative to the watched directory,
+            passed to processors that mirror the input tree; None if the tree
+            is not mirrored.
+
+    Returns:
+        One FileResult per stage that ran.
+    """
+    results = []
+    for stage in stages:
+        if not is_valid_ext(file_path, stage.ext_list):
+            break
+        result = _run_stage(stage, file_path, relative_dir)
+        results.append(result)
+        if not result.ok or result.output_path is None:
+            break
+        file_path = result.output_path
+    return results
+
+
+def _skipped_stage(
+    stage: Stage, file_path: str, manifest: Manifest | None
+) -> FileResult | None:
+    """Return a skipped result if the manifest records the stage as done.
+
+    This runs in the parent process, so the manifest is never pickled and
+    sent to a pool worker, and an unchanged file costs no round trip.
+
+    Returns:
+        A skipped FileResult reporting the output the manifest recorded, so
+        a chain can continue with it, or None if the stage has to run.
+    """
+    if manifest is None or not manifest.is_current(file_path, stage.name, stage.kwargs):
+        return None
+    output_path = manifest.recorded_output(file_path, stage.name)
+    return FileResult(
+        file_path, skipped=True, output_path=output_path, stage=stage.name
+    )
+
+
+def _run_stage(
+    stage: Stage,
+    file_path: str,
+    relative_dir: str | None,
+    overrides: dict[str, Any] | None = None,
+) -> FileResult:
+    """Run one stage on one file.
+
+    This runs inside pool workers, like _process_file; whether the stage is
+    already done is checked beforehand, with _skipped_stage. overrides are
+    passed to the processor on top of the stage's kwargs.
+
+    Returns:
+        The stage's FileResult.
+    """
+    kwargs = {**stage.kwargs, **(overrides or {})}
+    if relative_dir is not None and getattr(
+        stage.process_class, "mirrors_input_tree", False
+    ):
+        kwargs["relative_dir"] = relative_dir
+    return _process_file(stage.process_class, file_path, kwargs)
+
+
+def batch_journal(
+    file_dir: str | Path,
+    stages: Sequence[Stage],
+    *,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+) -> Manifest:
+    """Return the journal of a batch, to resume it after an interruption.
+
+    The journal is a Manifest in JOURNAL_DIR, passed to process_pipelined,
+    that records every stage each file has finished. If the batch is killed
+    (a crash, a preempted host, Ctrl-C), running it again with its journal
+    skips the finished stages and continues each file's chain from its
+    recorded output, so only the stages that were cut short run again. Since
+    every stage only renames its output into place once it is complete, a
+    finished stage's output is never a truncated file.
+
+    The journal's file is named after a hash of everything that decides what
+    the batch does, so only the same batch finds it again: the directory, the
+    stages and their arguments, and the file selection options, which mean
+    the same as for process_pipelined.
+
+    Args:
+        file_dir: Directory the batch processes.
+        stages: Stages of the batch, in order.
+        recursive: Whether subdirectories are searched. Defaults to False.
+        include: Globs selecting files. Defaults to no filter.
+        exclude: Globs of skipped files and directories. Defaults to no filter.
+        max_depth: Deepest subdirectory level searched. Defaults to None.
+
+    Returns:
+        The journal, holding the stages finished by earlier runs, if any.
+    """
+    batch = {
+        "dir": str(Path(file_dir).resolve()),
+        "stages": [[stage.name, stage.kwargs, stage.output_dir] for stage in stages],
+        "recursive": recursive,
+        "include": list(include),
+        "exclude": list(exclude),
+        "max_depth": max_depth,
+    }
+    key = json.dumps(batch, sort_keys=True, default=str).encode()
+    return Manifest(JOURNAL_DIR / f"{hashlib.sha256(key).hexdigest()[:16]}.jsonl")
+
+
+def process_pipelined(
+    file_dir: str | Path,
+    stages: Sequence[Stage],
+    *,
+    workers: int = 1,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    manifest: Manifest | None = None,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+    metrics_sink: MetricsSink | None = None,
+    largest_first: bool = False,
+    memory_budget: int | None = None,
+    quarantine: Quarantine | None = None,
+    retry_quarantined: bool = False,
+    quarantined: list[str] | None = None,
+) -> Iterator[list[FileResult]]:
+    """Push every matching file through the stages, with the stages overlapping.
+
+    Each stage has its own pool of worker processes, and stages are connected
+    by queues of at most queue_size files. A file moves on to the next stage
+    as soon as the previous one has written its output, so while one file is
+    being tagged the next can be normalized and a third extracted, and the
+    first file is done long before the batch is. When a stage falls behind,
+    the queue in front of it fills up and the stages before it wait, so at
+    most queue_size + workers intermediate files per stage exist at once.
+
+    A memory_budget is shared by all stages: each file is only handed to a
+    stage's pool once its estimated peak memory fits next to the files every
+    stage is processing, as in process_all_files.
+
+    Like watch_and_process, a failing file is logged and reported in its
+    results without stopping the batch, stages the manifest records as done
+    are skipped, and manifest entries and metrics are recorded per stage.
+    To stop after a number of failures, collect the results with
+    BatchReport.collect. A quarantine works as in process_all_files, for
+    the files found in file_dir: one whose chain fails is quarantined.
+
+    Args:
+        file_dir: Directory containing the files the first stage processes.
+        stages: Stages every file goes through, in order. The first stage's
+            ext_list selects the files; include, exclude and max_depth apply
+            to it too.
+        workers: Number of worker processes per stage. Defaults to 1.
+        queue_size: Most files waiting in front of each stage. Defaults to
+            DEFAULT_QUEUE_SIZE.
+        manifest: Manifest used to skip unchanged files stage by stage.
+            Defaults to None, which processes every file.
+        recursive: If True, subdirectories are searched too, and outputs
+            mirror the input tree. Defaults to False.
+        include: Globs a file must match one of to be processed. Defaults to
+            no filter.
+        exclude: Globs of files and directories to skip. Defaults to no filter.
+        max_depth: Deepest subdirectory level searched when recursive. Defaults
+            to None (no limit).
+        metrics_sink: Sink every processed file's metrics are emitted to.
+            Defaults to None.
+        largest_first: If True, feed the longest files in first, like
+            process_all_files does. Defaults to False (discovery order).
+        memory_budget: Most memory, in bytes, the files being processed at
+            once may need. Defaults to None (no limit).
+        quarantine: Quarantine of failed files. Defaults to None.
+        retry_quarantined: If True, process only the files in quarantine.
+            Defaults to False.
+        quarantined: List the files skipped because they are quarantined are
+            appended to once the run ends, e.g. a BatchReport's quarantined.
+            Defaults to None.
+
+    Yields:
+        The results of every stage run on a file, once per file, in the
+        order files finish.
+
+    Raises:
+        ValueError: If workers or queue_size is less than 1, stages is
+            empty, memory_budget is not positive, or retry_quarantined is set
+            without a quarantine.
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    if queue_size < 1:
+        raise ValueError(f"queue_size must be at least 1, got {queue_size}.")
+    if not stages:
+        raise ValueError("At least one stage is required.")
+    if retry_quarantined and quarantine is None:
+        raise ValueError("retry_quarantined needs a quarantine.")
+    budget = None if memory_budget is None else MemoryBudget(memory_budget)
+    # Queue items are (job id, file path, relative dir), or None once the
+    # stage in front has finished.
+    queues: list[queue.Queue[tuple[int, str, str | None] | None]] = [
+        queue.Queue(maxsize=queue_size) for _ in stages
+    ]
+    # (job id, stage index, result, whether the file's chain ended), or None
+    # once the last stage has finished.
+    events: queue.SimpleQueue[tuple[int, int, FileResult, bool] | None] = (
+        queue.SimpleQueue()
+    )
+    cancelled = threading.Event()
+    lock = threading.Lock()
+    running = [workers] * len(stages)
+    errors: list[BaseException] = []
+    pools = [ProcessPoolExecutor(max_workers=workers) for _ in stages]
+
+    def put(index: int, item: tuple[int, str, str | None] | None) -> None:
+        while not cancelled.is_set():
+            try:
+                queues[index].put(item, timeout=_QUEUE_POLL_S)
+                return
+            except queue.Full:
+                continue
+
+    def get(index: int) -> tuple[int, str, str | None] | None:
+        while not cancelled.is_set():
+            try:
+                return queues[index].get(timeout=_QUEUE_POLL_S)
+            except queue.Empty:
+                continue
+        return None
+
+    skipped: list[str] = []
+
+    def in_batch(file_path: str) -> bool:
+        if _in_batch(file_path, quarantine, retry_quarantined):
+            return True
+        if not retry_quarantined:
+            skipped.append(file_path)
+        return False
+
+    def feed() -> None:
+        try:
+            file_paths: Iterable[str] = filter(
+                in_batch,
+                iter_files(
+                    file_dir, stages[0].ext_list, recursive, include, exclude, max_depth
+                ),
+            )
+            if largest_first:
+                file_paths = plan_batch(file_paths, workers).file_paths
+            for job_id, file_path in enumerate(file_paths):
+                relative_dir = None
+                if recursive:
+                    relative_dir = str(Path(file_path).parent.relative_to(file_dir))
+                put(0, (job_id, file_path, relative_dir))
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            for _ in range(workers):
+                put(0, None)
+
+    def admit(peak: int) -> bool:
+        while not cancelled.is_set():
+            if budget is None or budget.acquire(peak, timeout=_QUEUE_POLL_S):
+                return True
+        return False
+
+    def work(index: int) -> None:
+        stage = stages[index]
+        following = stages[index + 1] if index + 1 < len(stages) else None
+        while (job := get(index)) is not None:
+            job_id, file_path, relative_dir = job
+            result = _skipped_stage(stage, file_path, manifest)
+            if result is None:
+                overrides: dict[str, Any] = {}
+                peak = 0
+                if budget is not None:
+                    overrides, peak = _fit_to_budget(
+                        stage.process_class, file_path, stage.kwargs, budget
+                    )
+                if not admit(peak):
+                    break
+                try:
+                    result = (
+                        pools[index]
+                        .submit(_run_stage, stage, file_path, relative_dir, overrides)
+                        .result()
+                    )
+                except Exception as exc:
+                    # The worker process died, or the job could not be pickled.
+                    result = _failure(file_path, stage.name, exc)
+                finally:
+                    if budget is not None:
+                        budget.release(peak)
+            output_path = result.output_path if result.ok else None
+            forward = (
+                following is not None
+                and output_path is not None
+                and is_valid_ext(output_path, following.ext_list)
+            )
+            events.put((job_id, index, result, not forward))
+            if forward and output_path is not None:
+                put(index + 1, (job_id, output_path, relative_dir))
+        with lock:
+            running[index] -= 1
+            last = running[index] == 0
+        if last and following is not None:
+            for _ in range(workers):
+                put(index + 1, None)
+        elif last:
+            events.put(None)
+
+    if budget is not None:
+        # The work threads run ffprobe to estimate memory, and a pool worker
+        # forked while ffprobe is being started holds its exec status pipe
+        # open, so ffprobe's caller never returns. Forking pools start all
+        # their workers on their first job, so start them before the threads.
+        for pool in pools:
+            pool.submit(int).result()
+    threads = [threading.Thread(target=feed, daemon=True)] + [
+        threading.Thread(target=work, args=(index,), daemon=True)
+        for index in range(len(stages))
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    chains: dict[int, list[FileResult]] = {}
+    try:
+        while (event := events.get()) is not None:
+            job_id, index, result, chain_ended = event
+            stage = stages[index]
+            # Stages the manifest skipped carry no metrics and need no record.
+            if result.metrics is not None or not result.ok:
+                _record_result(result, stage.name, stage.kwargs, manifest, metrics_sink)
+            chains.setdefault(job_id, []).append(result)
+            if chain_ended:
+                chain = chains.pop(job_id)
+                if quarantine is not None:
+                    failure = next((r for r in chain if not r.ok), None)
+                    _update_quarantine(quarantine, chain[0].file_path, failure)
+                yield chain
+        if errors:
+            raise errors[0]
+    finally:
+        cancelled.set()
+        for thread in threads:
+            thread.join()
+        for pool in pools:
+            pool.shutdown(cancel_futures=True)
+        if skipped:
+            logger.info("Skipped %d quarantined file(s).", len(skipped))
+            if quarantined is not None:
+                quarantined.extend(skipped)
+
+
+def watch_and_process(
+    file_dir: str | Path,
+    stages: Sequence[Stage],
+    *,
+    workers: int = 1,
+    manifest: Manifest | None = None,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+    metrics_sink: MetricsSink | None = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    polling: bool = False,
+    stop: threading.Event | None = None,
+) -> Iterator[list[FileResult]]:
+    """Watch a directory and push every file that lands through the stages.
+
+    The files already in file_dir are processed first, then each file as soon
+    as it has been completely written (see watcher.watch_files): with inotify
+    when its writer closes it, otherwise once its size stops changing between
+    scans. Each file runs through all stages before the next one starts, or,
+    with more than one worker, on a pool of processes as files arrive. Unlike
+    process_all_files, a failing file never stops the watch; it is logged and
+    reported in its results. Manifest entries and metrics are recorded per
+    stage, like process_all_files does.
+
+    Args:
+        file_dir: Directory to watch.
+        stages: Stages every file goes through, in order. The first stage's
+            ext_list selects the files to watch; include, exclude and
+            max_depth apply to it too.
+        workers: Number of worker processes. Defaults to 1 (serial).
+        manifest: Manifest used to skip unchanged files stage by stage.
+            Defaults to None, which processes every file.
+        recursive: If True, subdirectories are watched too, and outputs mirror
+            the input tree. Defaults to False.
+        include: Globs a file must match one of to be processed. Defaults to
+            no filter.
+        exclude: Globs of files and directories to skip. Defaults to no filter.
+        max_depth: Deepest subdirectory level watched when recursive. Defaults
+            to None (no limit).
+        metrics_sink: Sink every processed file's metrics are emitted to.
+            Defaults to None.
+        poll_interval: Seconds between scans when inotify is unavailable or
+            polling is set, and longest wait between checks of stop and of
+            finished pool jobs. Defaults to DEFAULT_POLL_INTERVAL.
+        polling: If True, poll even where inotify is available, e.g. for
+            network file systems. Defaults to False.
+        stop: Event that ends the watch once set; files already being
+            processed are finished first. Defaults to None (watch until the
+            generator is closed).
+
+    Yields:
+        The results of every stage run on a file, once per file, in the
+        order files finish.
+
+    Raises:
+        ValueError: If workers is less than 1 or stages is empty.
     """
-    dir_path = Path(file_dir)
-    file_paths: list[str] = []
-    for entry in dir_path.iterdir():
-        if entry.is_file() and is_valid_ext(str(entry), ext_list):
-            file_paths.append(str(entry))
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    if not stages:
+        raise ValueError("At least one stage is required.")
+
+    def finished(results: list[FileResult]) -> list[FileResult]:
+        for stage, result in zip(stages, results, strict=False):
+            # Stages the manifest skipped carry no metrics and need no record.
+            if result.metrics is not None:
+                _record_result(result, stage.name, stage.kwargs, manifest, metrics_sink)
+        return results
 
-    for file_path in file_paths:
-        process_class(file_path, **kwargs).process_file()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    # Each submitted chain's skipped stages and the future of the rest.
+    pending: list[tuple[list[FileResult], Future[list[FileResult]]]] = []
+    logger.info("Watching %s for new files...", file_dir)
+    try:
+        with contextlib.closing(
+            watch_files(
+                file_dir,
+                stages[0].ext_list,
+                recursive,
+                include,
+                exclude,
+                max_depth,
+                poll_interval=poll_interval,
+                polling=polling,
+                stop=stop,
+            )
+        ) as batches:
+            for ready in batches:
+                for file_path in ready:
+                    relative_dir = None
+                    if recursive:
+                        relative_dir = str(Path(file_path).parent.relative_to(file_dir))
+                    skipped, next_path, rest = _skip_done_stages(
+                        file_path, stages, manifest
+                    )
+                    if not rest:
+                        yield skipped
+                    elif pool is None:
+                        yield finished(
+                            skipped + _process_chain(next_path, rest, relative_dir)
+                        )
+                    else:
+                        pending.append(
+                            (
+                                skipped,
+                                pool.submit(
+                                    _process_chain, next_path, rest, relative_dir
+                                ),
+                            )
+                        )
+                for job in [job for job in pending if job[1].done()]:
+                    pending.remove(job)
+                    yield finished(job[0] + job[1].result())
+        for skipped, future in pending:
+            yield finished(skipped + future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def process_queue(
+    file_dir: str | Path,
+    stages: Sequence[Stage],
+    work_queue: WorkQueue,
+    *,
+    workers: int = 1,
+    manifest: Manifest | None = None,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+    metrics_sink: MetricsSink | None = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    worker_id: str | None = None,
+    stop: threading.Event | None = None,
+    largest_first: bool = False,
+) -> Iterator[list[FileResult]]:
+    """Share a batch with other workers, on this host or others, through a queue.
+
+    The matching files in file_dir are added to work_queue (files it already
+    has are left alone, so every worker can be started the same way), then
+    files are claimed from the queue until none is left. Each claimed file
+    runs through all stages on a pool of workers processes, while its lease
+    is renewed every third of the queue's lease_seconds. A file whose chain
+    fails is given back for another attempt, up to the queue's max_attempts;
+    a file whose worker died is claimed again once its lease runs out.
+    Manifest entries and metrics are recorded per stage, like
+    process_all_files does.
+
+    Args:
+        file_dir: Directory containing the files the first stage processes.
+            Workers on other hosts must see the files under the same path.
+        stages: Stages every file goes through, in order. The first stage's
+            ext_list selects the files; include, exclude and max_depth apply
+            to it too.
+        work_queue: Queue shared by every worker of the batch.
+        workers: Number of files this process works on at once, each in its
+            own worker process. Defaults to 1.
+        manifest: Manifest used to skip unchanged files stage by stage.
+            Defaults to None, which processes every file.
+        recursive: If True, subdirectories are searched too, and outputs
+            mirror the input tree. Defaults to False.
+        include: Globs a file must match one of to be processed. Defaults to
+            no filter.
+        exclude: Globs of files and directories to skip. Defaults to no filter.
+        max_depth: Deepest subdirectory level searched when recursive. Defaults
+            to None (no limit).
+        metrics_sink: Sink every processed file's metrics are emitted to.
+            Defaults to None.
+        poll_interval: Seconds to wait before claiming again while every
+            remaining file is leased to another worker. Defaults to
+            DEFAULT_POLL_INTERVAL.
+        worker_id: Id the claims are made under. Defaults to None
+            (default_worker_id()).
+        stop: Event that ends the run once set; files already claimed are
+            finished first. Defaults to None (run until the queue is done).
+        largest_first: If True, add the longest files to the queue first, so
+            every worker claims them first. Defaults to False (discovery
+            order).
+
+    Yields:
+        The results of every stage run on a claimed file, once per attempt,
+        in the order attempts finish.
+
+    Raises:
+        ValueError: If workers is less than 1 or stages is empty.
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    if not stages:
+        raise ValueError("At least one stage is required.")
+    owner = default_worker_id() if worker_id is None else worker_id
+    file_paths: Iterable[str] = iter_files(
+        file_dir, stages[0].ext_list, recursive, include, exclude, max_depth
+    )
+    if largest_first:
+        file_paths = plan_batch(file_paths, workers).file_paths
+    added = work_queue.enqueue(
+        (
+            file_path,
+            str(Path(file_path).parent.relative_to(file_dir)) if recursive else None,
+        )
+        for file_path in file_paths
+    )
+    logger.info("Added %d new file(s) to %s.", added, work_queue.path)
+    heartbeat_s = work_queue.lease_seconds / 3
+    cancelled = threading.Event()
+    lock = threading.Lock()
+    pools = [ProcessPoolExecutor(max_workers=workers)]
+    # Each finished attempt's results, or None once a thread has stopped.
+    events: queue.SimpleQueue[list[FileResult] | None] = queue.SimpleQueue()
+    errors: list[BaseException] = []
+
+    def stopped() -> bool:
+        return cancelled.is_set() or (stop is not None and stop.is_set())
+
+    def run(job: Job) -> list[FileResult]:
+        """Run job's chain on the pool, renewing its lease until it is done."""
+        file_path = job.file_path
+        skipped, next_path, rest = _skip_done_stages(file_path, stages, manifest)
+        if not rest:
+            return skipped
+        pool = pools[-1]
+        try:
+            future = pool.submit(_process_chain, next_path, rest, job.relative_dir)
+            while True:
+                try:
+                    return skipped + future.result(timeout=heartbeat_s)
+                except TimeoutError:
+                    if not work_queue.heartbeat(job, owner):
+                        logger.warning("Lost the lease on %s.", file_path)
+        except BrokenProcessPool as exc:
+            # A worker process died; later files get a fresh pool.
+            with lock:
+                if pools[-1] is pool:
+                    pools.append(ProcessPoolExecutor(max_workers=workers))
+            return [*skipped, _failure(next_path, None, exc)]
+        except Exception as exc:
+            return [*skipped, _failure(next_path, None, exc)]
+
+    def work() -> None:
+        try:
+            while not stopped():
+                job = work_queue.claim(owner)
+                if job is None:
+                    counts = work_queue.counts()
+                    if not counts["pending"] and not counts["leased"]:
+                        return
+                    # Other workers hold the rest; wait for them to finish
+                    # or for their leases to run out.
+                    cancelled.wait(poll_interval)
+                    continue
+                logger.info("Claimed %s (attempt %d).", job.file_path, job.attempts)
+                results = run(job)
+                error = next((r.error for r in results if not r.ok), None)
+                if error is None:
+                    work_queue.complete(job, owner)
+                else:
+                    work_queue.fail(job, owner, error)
+                events.put(results)
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            events.put(None)
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            results = events.get()
+            if results is None:
+                running -= 1
+                continue
+            for stage, result in zip(stages, results, strict=False):
+                # Stages the manifest skipped carry no metrics and need no record.
+                if result.metrics is not None or not result.ok:
+                    _record_result(
+                        result, stage.name, stage.kwargs, manifest, metrics_sink
+                    )
+            yield results
+        if errors:
+            raise errors[0]
+    finally:
+        cancelled.set()
+        for thread in threads:
+            thread.join()
+        for pool in pools:
+            pool.shutdown(cancel_futures=True)
+
+
+def add_batch_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options shared by every directory CLI to parser.
+
+    Args:
+        parser: Parser of a CLI that calls process_all_files.
+    """
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes per stage. Defaults to 1 (serial).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Skip files unchanged since they were last processed with the same "
+            f"settings, as recorded in {MANIFEST_PATH}."
+        ),
+    )
+    parser.add_argument(
+        "--content_hash",
+        action="store_true",
+        help="With --incremental, also compare file contents (SHA-256).",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Search subdirectories too; outputs mirror the input tree.",
+    )
+    parser.add_argument(
+        "--include",
+        type=str,
+        nargs="+",
+        default=[],
+        help="Only process files matching one of these glob patterns.",
+    )
+    parser.add_argument(
+        "--exclude",
+        type=str,
+        nargs="+",
+        default=[],
+        help="Skip files and directories matching one of these glob patterns.",
+    )
+    parser.add_argument(
+        "--max_depth",
+        type=int,
+        default=None,
+        help="With --recursive, deepest subdirectory level to search.",
+    )
+    parser.add_argument(
+        "--largest_first",
+        action="store_true",
+        help=(
+            "Read every file's duration from its headers first, then process "
+            "the longest files first so the batch ends sooner."
+        ),
+    )
+    parser.add_argument(
+        "--memory_budget",
+        type=parse_size,
+        default=None,
+        help=(
+            "Most memory the files being normalized at once may need (e.g. "
+            "4G): files start only while their estimated sum fits, and a file "
+            "that alone would exceed it is streamed. Defaults to no limit."
+        ),
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help=(
+            "Print the estimated cost of every file and the batch's makespan "
+            "with --largest_first, then exit without processing anything."
+        ),
+    )
+    failures = parser.add_mutually_exclusive_group()
+    failures.add_argument(
+        "--fail_fast",
+        action="store_const",
+        const=1,
+        dest="max_failures",
+        help="Stop the batch at the first file that fails.",
+    )
+    failures.add_argument(
+        "--max_failures",
+        type=int,
+        default=None,
+        help=(
+            "Stop the batch once this many files have failed. Defaults to "
+            "processing every file whatever fails."
+        ),
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help=(
+            "JSON file to write the batch report to: the status, stage, error, "
+            "elapsed time and output of every file, and the totals."
+        ),
+    )
+    parser.add_argument(
+        "--quarantine",
+        action="store_true",
+        help=(
+            f"Record files that fail in {QUARANTINE_PATH} and skip them in later "
+            "batches."
+        ),
+    )
+    parser.add_argument(
+        "--retry_quarantined",
+        action="store_true",
+        help=(
+            "Process only the quarantined files, releasing each one that "
+            "succeeds. Implies --quarantine."
+        ),
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help=(
+            "File to write per-file stage metrics to: a Prometheus textfile if it "
+            "ends in .prom, JSON lines otherwise."
+        ),
+    )
+    parser.add_argument(
+        "--log_format",
+        choices=LOG_FORMATS,
+        default="text",
+        help="Console log format: plain 'text' or 'json' lines. Defaults to 'text'.",
+    )
+
+
+def batch_options(args: argparse.Namespace) -> dict[str, Any]:
+    """Build process_all_files keyword arguments from add_batch_arguments options.
+
+    Logging is configured with the chosen log format as a side effect.
+
+    Args:
+        args: Parsed arguments of a parser passed to add_batch_arguments.
+
+    Returns:
+        Keyword arguments for process_all_files.
+    """
+    configure_logging(args.log_format)
+    return {
+        "workers": args.workers,
+        "manifest": (
+            Manifest(use_hash=args.content_hash) if args.incremental else None
+        ),
+        "recursive": args.recursive,
+        "include": args.include,
+        "exclude": args.exclude,
+        "max_depth": args.max_depth,
+        "metrics_sink": (
+            None if args.metrics is None else open_metrics_sink(args.metrics)
+        ),
+        "largest_first": args.largest_first,
+        "memory_budget": args.memory_budget,
+        "max_failures": args.max_failures,
+        "quarantine": (
+            Quarantine() if args.quarantine or args.retry_quarantined else None
+        ),
+        "retry_quarantined": args.retry_quarantined,
+    }
+
+
+def plan_files(
+    file_dir: str | Path,
+    ext_list: Collection[str],
+    *,
+    workers: int = 1,
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+) -> BatchPlan:
+    """Plan the files process_all_files would process, longest first.
+
+    Every matching file is probed (see scheduling.plan_batch); nothing is
+    processed. The arguments mean the same as for process_all_files.
+
+    Args:
+        file_dir: Directory containing files to process.
+        ext_list: Collection of valid file extensions to match against.
+        workers: Number of worker processes. Defaults to 1.
+        recursive: If True, subdirectories are searched too. Defaults to False.
+        include: Globs a file must match one of. Defaults to no filter.
+        exclude: Globs of files and directories to skip. Defaults to no filter.
+        max_depth: Deepest subdirectory level searched when recursive.
+            Defaults to None (no limit).
+
+    Returns:
+        The plan of every matching file.
+    """
+    return plan_batch(
+        iter_files(file_dir, ext_list, recursive, include, exclude, max_depth),
+        workers,
+    )
+
+
+def print_plan(args: argparse.Namespace, ext_list: Collection[str]) -> None:
+    """Print the plan of the batch a directory CLI was asked to run, for --plan.
+
+    Logging is configured with the chosen log format as a side effect.
+
+    Args:
+        args: Parsed arguments of a parser passed to add_batch_arguments,
+            with the directory in args.dir.
+        ext_list: Extensions of the files the batch's first stage accepts.
+    """
+    configure_logging(args.log_format)
+    plan = plan_files(
+        args.dir,
+        ext_list,
+        workers=args.workers,
+        recursive=args.recursive,
+        include=args.include,
+        exclude=args.exclude,
+        max_depth=args.max_depth,
+    )
+    print(format_plan(plan))
+
+
+def report_batch(args: argparse.Namespace, report: BatchReport) -> None:
+    """Log a batch's totals, write its --report, and exit with 1 if a file failed.
+
+    Args:
+        args: Parsed arguments of a parser passed to add_batch_arguments.
+        report: Report of the batch the CLI ran.
+    """
+    counts = report.counts()
+    logger.info(
+        "Batch done: %d ok, %d skipped, %d failed, %d not run, %d quarantined.",
+        counts["ok"],
+        counts["skipped"],
+        counts["failed"],
+        counts["not_run"],
+        counts["quarantined"],
+    )
+    if args.report is not None:
+        report.write(args.report)
+    if report.failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -66,11 +1865,64 @@ if __name__ == "__main__":
         action="store_true",
         help="Tag flag - tag audio from files in directory.",
     )
+    parser.add_argument(
+        "--copy_stream",
+        action="store_true",
+        help=(
+            "Copy mp3/AAC audio out of videos without re-encoding when extracting "
+            "(AAC is saved as .m4a, which the normalize and tag stages skip)."
+        ),
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Encode this many time ranges of each video in parallel when "
+        "extracting. Defaults to 1.",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Normalize in fixed-size chunks to keep memory use bounded.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=NORMALIZATION_MODES,
+        default="dbfs",
+        help=(
+            "Level to normalize: 'dbfs' (average RMS) or 'lufs' (EBU R128 "
+            "integrated loudness). Defaults to 'dbfs'."
+        ),
+    )
+    parser.add_argument(
+        "--true_peak",
+        type=float,
+        default=None,
+        help="Maximum true peak of the output in dBTP (e.g. -1). Defaults to none.",
+    )
+    parser.add_argument(
+        "--lossless",
+        action="store_true",
+        help="Adjust mp3 frame gain in 1.5 dB steps instead of re-encoding.",
+    )
+    parser.add_argument(
+        "--in_place",
+        action="store_true",
+        help="Tag by editing the ID3 tag in place, reading and writing only the tag.",
+    )
+    parser.add_argument(
+        "--fused",
+        action="store_true",
+        help=(
+            "Fused flag - extract, normalize and tag videos in directory with a "
+            "single decode and encode, without intermediate files."
+        ),
+    )
     parser.add_argument(
         "--dBFS",
         type=float,
         default=DEFAULT_DBFS,
-        help=f"Target dBFS. Defaults to {DEFAULT_DBFS}.",
+        help=f"Target dBFS (or LUFS with --mode lufs). Defaults to {DEFAULT_DBFS}.",
     )
     parser.add_argument(
         "--artist",
@@ -84,23 +1936,240 @@ if __name__ == "__main__":
         default=DEFAULT_ALBUM,
         help=f"album tag for mp3 file - Defaults to {DEFAULT_ALBUM!r}.",
     )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Keep running and push every file that lands in --dir through the "
+            "requested stages as soon as it is completely written."
+        ),
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="With --watch, rescan --dir instead of using inotify (e.g. on NFS).",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=(
+            "With --watch, seconds between rescans when polling; with --queue, "
+            "seconds between claims while other workers hold every remaining "
+            f"file. Defaults to {DEFAULT_POLL_INTERVAL}."
+        ),
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=(
+            "Most files waiting in front of each stage; a slow stage holds up "
+            f"the ones before it. Defaults to {DEFAULT_QUEUE_SIZE}."
+        ),
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help=(
+            "Start over instead of resuming an interrupted run of the same "
+            "batch. Runs with --incremental, --watch or --queue keep no journal."
+        ),
+    )
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        help=(
+            "SQLite work queue file shared with other workers (e.g. on other "
+            "hosts): files in --dir are added to it, then claimed one at a time "
+            "until none is left."
+        ),
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help=(
+            "With --queue, seconds before a claimed file whose worker stopped "
+            f"sending heartbeats is handed to another. Defaults to "
+            f"{DEFAULT_LEASE_SECONDS:g}."
+        ),
+    )
+    parser.add_argument(
+        "--max_attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help=(
+            "With --queue, times a file is tried before it is marked failed. "
+            f"Defaults to {DEFAULT_MAX_ATTEMPTS}."
+        ),
+    )
+    add_batch_arguments(parser)
     args = parser.parse_args()
-    if args.extract:
-        process_all_files(args.dir, VID_EXTS, AudioExtractor)
-    if args.normalize:
-        audio_dir = EXTRACTED_DIR if args.extract else args.dir
-        process_all_files(audio_dir, AUDIO_EXTS, AudioNormalizer, target_dbfs=args.dBFS)
-    if args.tag:
-        if args.normalize:
-            audio_dir = NORMALIZED_DIR
-        elif args.extract:
-            audio_dir = EXTRACTED_DIR
-        else:
-            audio_dir = args.dir
-        process_all_files(
-            audio_dir,
-            AUDIO_EXTS,
-            AudioTagger,
-            artist_tag=args.artist,
-            album_tag=args.album,
+    if args.watch and args.queue is not None:
+        parser.error("--watch and --queue cannot be combined.")
+    if args.watch and args.largest_first:
+        parser.error("--watch processes files as they arrive; drop --largest_first.")
+    if args.memory_budget is not None and (args.watch or args.queue is not None):
+        parser.error("--memory_budget cannot be combined with --watch or --queue.")
+    if (args.quarantine or args.retry_quarantined) and (
+        args.watch or args.queue is not None
+    ):
+        parser.error(
+            "--quarantine and --retry_quarantined cannot be combined with --watch "
+            "or --queue."
+        )
+    if args.fused:
+        # The fused pipeline decodes and encodes each file once, in memory, so
+        # it has no streaming, lossless, segmented, stream copy or in-place mode.
+        ignored = [
+            flag
+            for flag, value in (
+                ("--copy_stream", args.copy_stream),
+                ("--segments", args.segments != 1),
+                ("--streaming", args.streaming),
+                ("--lossless", args.lossless),
+                ("--in_place", args.in_place),
+            )
+            if value
+        ]
+        if ignored:
+            parser.error(f"--fused cannot be combined with {', '.join(ignored)}.")
+    # Stages are imported only when requested, so e.g. a tag-only run does not
+    # pay for importing moviepy and numpy.
+    stages: list[Stage] = []
+    if args.fused:
+        from audio_pipeline import AudioPipeline
+
+        stages.append(
+            Stage(
+                AudioPipeline,
+                VID_EXTS,
+                {
+                    "target_dbfs": args.dBFS,
+                    "artist_tag": args.artist,
+                    "album_tag": args.album,
+                    "mode": args.mode,
+                    "true_peak": args.true_peak,
+                },
+                NORMALIZED_DIR,
+            )
+        )
+    if args.extract and not args.fused:
+        from audio_extractor import AudioExtractor
+
+        stages.append(
+            Stage(
+                AudioExtractor,
+                VID_EXTS,
+                {"copy_stream": args.copy_stream, "segments": args.segments},
+                EXTRACTED_DIR,
+            )
+        )
+    if args.normalize and not args.fused:
+        from audio_normalizer import AudioNormalizer
+
+        stages.append(
+            Stage(
+                AudioNormalizer,
+                AUDIO_EXTS,
+                {
+                    "target_dbfs": args.dBFS,
+                    "streaming": args.streaming,
+                    "mode": args.mode,
+                    "true_peak": args.true_peak,
+                    "lossless": args.lossless,
+                },
+                NORMALIZED_DIR,
+            )
+        )
+    if args.tag and not args.fused:
+        from audio_tagger import AudioTagger
+
+        stages.append(
+            Stage(
+                AudioTagger,
+                AUDIO_EXTS,
+                {
+                    "artist_tag": args.artist,
+                    "album_tag": args.album,
+                    "in_place": args.in_place,
+                },
+            )
+        )
+    if args.plan and stages:
+        print_plan(args, stages[0].ext_list)
+        parser.exit()
+    options = batch_options(args)
+    max_failures = options.pop("max_failures")
+    report = BatchReport()
+    if args.queue is not None and stages:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        work_queue = WorkQueue(args.queue, args.lease_seconds, args.max_attempts)
+        del options["memory_budget"], options["quarantine"]
+        del options["retry_quarantined"]
+        with contextlib.suppress(KeyboardInterrupt):
+            report.collect(
+                process_queue(
+                    args.dir,
+                    stages,
+                    work_queue,
+                    **options,
+                    poll_interval=args.poll_interval,
+                    stop=stop,
+                ),
+                max_failures,
+            )
+    elif args.watch and stages:
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        del options["largest_first"], options["memory_budget"]
+        del options["quarantine"], options["retry_quarantined"]
+        with contextlib.suppress(KeyboardInterrupt):
+            report.collect(
+                watch_and_process(
+                    args.dir,
+                    stages,
+                    **options,
+                    poll_interval=args.poll_interval,
+                    polling=args.polling,
+                    stop=stop,
+                ),
+                max_failures,
+            )
+    elif stages:
+        journal = None
+        if options["manifest"] is None:
+            # The stages each file has finished are journaled, so running an
+            # interrupted batch again resumes it where it stopped.
+            journal = batch_journal(
+                args.dir,
+                stages,
+                recursive=args.recursive,
+                include=args.include,
+                exclude=args.exclude,
+                max_depth=args.max_depth,
+            )
+            if args.restart:
+                journal.clear()
+            elif journal.path.is_file():
+                logger.info("Resuming the interrupted batch in %s.", journal.path)
+            options["manifest"] = journal
+        # Files flow from stage to stage as soon as each is done with them.
+        report.collect(
+            process_pipelined(
+                args.dir,
+                stages,
+                **options,
+                queue_size=args.queue_size,
+                quarantined=report.quarantined,
+            ),
+            max_failures,
         )
+        if journal is not None and not report.aborted:
+            # The batch is complete, so running it again starts over.
+            journal.clear()
+    if stages:
+        report_batch(args, report)
@@ -0,0 +1,286 @@
+"""Header-only ID3v2 reader and writer that edits tags inside their padding."""
+
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+__all__ = [
+    "ALBUM_FRAME",
+    "ARTIST_FRAME",
+    "TITLE_FRAME",
+    "Id3Tag",
+    "UnsupportedTagError",
+    "read_id3v2",
+    "set_text_frames",
+    "write_text_frames",
+]
+
+ALBUM_FRAME = "TALB"
+ARTIST_FRAME = "TPE1"
+TITLE_FRAME = "TIT2"
+
+_HEADER_BYTES = 10
+_FRAME_HEADER_BYTES = 10
+# Padding reserved whenever the tag has to be (re)written in front of the
+# audio, so later edits fit in place and never move the audio data again.
+_PADDING_BYTES = 4096
+_UNSYNCHRONISATION = 0x80
+_EXTENDED_HEADER = 0x40
+_FOOTER = 0x10
+_LATIN1, _UTF16, _UTF16BE, _UTF8 = 0, 1, 2, 3
+_TEXT_CODECS = {
+    _LATIN1: "latin-1",
+    _UTF16: "utf-16",
+    _UTF16BE: "utf-16-be",
+    _UTF8: "utf-8",
+}
+
+
+class UnsupportedTagError(Exception):
+    """Raised when an ID3 tag uses features the fast writer does not handle.
+
+    These are ID3v2.2 tags and tags with unsynchronisation, an extended
+    header, or a footer. Callers fall back to a full tag library for them.
+    """
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def _from_syncsafe(data: bytes) -> int:
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+@dataclass
+class Id3Tag:
+    """An ID3v2.3 or v2.4 tag, as read from the start of an mp3 file.
+
+    Attributes:
+        version: Major version, 3 or 4.
+        size: Size of the tag after its 10-byte header, padding included.
+        frames: Raw frames in file order as (frame id, complete frame bytes).
+    """
+
+    version: int
+    size: int
+    frames: list[tuple[str, bytes]] = field(default_factory=list)
+
+    @property
+    def frames_size(self) -> int:
+        """Bytes used by frames; the rest of size is padding."""
+        return sum(len(frame) for _, frame in self.frames)
+
+    def text(self, frame_id: str) -> str | None:
+        """Return the value of a text frame, or None if the tag lacks it.
+
+        Args:
+            frame_id: Four-character frame id, e.g. TITLE_FRAME.
+
+        Returns:
+            The decoded text with trailing NULs removed.
+        """
+        for current_id, frame in self.frames:
+            if current_id == frame_id:
+                body = frame[_FRAME_HEADER_BYTES:]
+                if not body:
+                    return ""
+                codec = _TEXT_CODECS.get(body[0], "latin-1")
+                return body[1:].decode(codec, errors="replace").rstrip("\x00")
+        return None
+
+    def set_text(self, frame_id: str, value: str) -> None:
+        """Replace (or append) a text frame.
+
+        Text is written as Latin-1 when possible, and otherwise as UTF-16 for
+        v2.3 tags or UTF-8 for v2.4 tags.
+
+        Args:
+            frame_id: Four-character frame id, e.g. TITLE_FRAME.
+            value: New text.
+        """
+        try:
+            body = bytes([_LATIN1]) + value.encode("latin-1")
+        except UnicodeEncodeError:
+            if self.version == 4:
+                body = bytes([_UTF8]) + value.encode("utf-8")
+            else:
+                body = bytes([_UTF16]) + value.encode("utf-16")
+        if self.version == 4:
+            size = _syncsafe(len(body))
+        else:
+            size = len(body).to_bytes(4, "big")
+        frame = frame_id.encode("ascii") + size + b"\x00\x00" + body
+        for index, (current_id, _) in enumerate(self.frames):
+            if current_id == frame_id:
+                self.frames[index] = (frame_id, frame)
+                return
+        self.frames.append((frame_id, frame))
+
+    def render(self, size: int) -> bytes:
+        """Return the complete tag, header included, padded to size.
+
+        Args:
+            size: Size to declare in the header; must fit every frame.
+        """
+        body = b"".join(frame for _, frame in self.frames)
+        header = b"ID3" + bytes([self.version, 0, 0]) + _syncsafe(size)
+        return header + body + bytes(size - len(body))
+
+
+def _parse_frames(version: int, body: bytes) -> list[tuple[str, bytes]]:
+    frames = []
+    offset = 0
+    while offset + _FRAME_HEADER_BYTES <= len(body):
+        frame_id = body[offset : offset + 4]
+        if frame_id == b"\x00\x00\x00\x00":
+            break
+        raw_size = body[offset + 4 : offset + 8]
+        if version == 4:
+            size = _from_syncsafe(raw_size)
+        else:
+            size = int.from_bytes(raw_size, "big")
+        end = offset + _FRAME_HEADER_BYTES + size
+        if end > len(body) or not frame_id.isalnum():
+            raise UnsupportedTagError("Malformed ID3v2 frame.")
+        frames.append((frame_id.decode("ascii"), body[offset:end]))
+        offset = end
+    return frames
+
+
+def _parse_header(header: bytes) -> tuple[int, int] | None:
+    """Return (version, size) from a tag header, or None if it is not one.
+
+    Raises:
+        UnsupportedTagError: If the tag is not a plain v2.3/v2.4 tag.
+    """
+    if len(header) < _HEADER_BYTES or header[:3] != b"ID3":
+        return None
+    version, flags = header[3], header[5]
+    if version not in (3, 4):
+        raise UnsupportedTagError(f"ID3v2.{version} tags are not supported.")
+    if flags & (_UNSYNCHRONISATION | _EXTENDED_HEADER | _FOOTER):
+        raise UnsupportedTagError(
+            "ID3 tags with unsynchronisation, an extended header or a footer "
+            "are not supported."
+        )
+    return version, _from_syncsafe(header[6:10])
+
+
+def read_id3v2(path: str | Path) -> Id3Tag | None:
+    """Read the ID3v2 tag at the start of a file, without touching the audio.
+
+    Only the 10-byte header and then the tag itself are read.
+
+    Args:
+        path: Path of the mp3 file.
+
+    Returns:
+        The tag, or None if the file does not start with one.
+
+    Raises:
+        UnsupportedTagError: If the tag is not a plain v2.3/v2.4 tag.
+    """
+    with open(path, "rb") as f:
+        parsed = _parse_header(f.read(_HEADER_BYTES))
+        if parsed is None:
+            return None
+        version, size = parsed
+        body = f.read(size)
+    return Id3Tag(version, size, _parse_frames(version, body))
+
+
+def set_text_frames(
+    data: bytes | bytearray | memoryview, values: dict[str, str]
+) -> bytes:
+    """Return an mp3 held in memory with text frames set in its ID3v2 tag.
+
+    The in-memory counterpart of write_text_frames: the tag keeps its size
+    when the new frames fit, and otherwise (e.g. there is no tag yet) a v2.3
+    tag with generous padding is put in front of the audio.
+
+    Args:
+        data: The mp3.
+        values: New values, keyed by frame id (e.g. {TITLE_FRAME: "Intro"}).
+
+    Returns:
+        The retagged mp3.
+
+    Raises:
+        UnsupportedTagError: If the existing tag is not a plain v2.3/v2.4 tag.
+    """
+    view = memoryview(data).cast("B")
+    parsed = _parse_header(bytes(view[:_HEADER_BYTES]))
+    if parsed is None:
+        tag = Id3Tag(version=3, size=0)
+        audio_start = 0
+    else:
+        version, size = parsed
+        audio_start = _HEADER_BYTES + size
+        tag = Id3Tag(
+            version,
+            size,
+            _parse_frames(version, bytes(view[_HEADER_BYTES:audio_start])),
+        )
+    old_size = None if parsed is None else tag.size
+    for frame_id, value in values.items():
+        tag.set_text(frame_id, value)
+    if old_size is not None and tag.frames_size <= old_size:
+        rendered = tag.render(old_size)
+    else:
+        rendered = tag.render(tag.frames_size + _PADDING_BYTES)
+    return rendered + view[audio_start:]
+
+
+def write_text_frames(path: str | Path, values: dict[str, str]) -> bool:
+    """Set text frames in a file's ID3v2 tag, in place whenever possible.
+
+    If the file has a tag and the new frames fit in its size (padding
+    included), only the tag region at the start of the file is overwritten
+    and the audio is not read or moved. Otherwise, e.g. the file has no tag
+    yet, the file is rewritten once, with a v2.3 tag followed by generous
+    padding so later edits fit in place.
+
+    Args:
+        path: Path of the mp3 file.
+        values: New values, keyed by frame id (e.g. {TITLE_FRAME: "Intro"}).
+
+    Returns:
+        True if the tag was updated in place, False if the file was rewritten.
+
+    Raises:
+        UnsupportedTagError: If the existing tag is not a plain v2.3/v2.4 tag.
+    """
+    path = Path(path)
+    tag = read_id3v2(path)
+    old_size = None if tag is None else tag.size
+    if tag is None:
+        tag = Id3Tag(version=3, size=0)
+    for frame_id, value in values.items():
+        tag.set_text(frame_id, value)
+    if old_size is not None and tag.frames_size <= old_size:
+        with open(path, "r+b") as f:
+            f.write(tag.render(old_size))
+        return True
+    audio_start = 0 if old_size is None else _HEADER_BYTES + old_size
+    rendered = tag.render(tag.frames_size + _PADDING_BYTES)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as out:
+        try:
+            out.write(rendered)
+            with open(path, "rb") as source:
+                source.seek(audio_start)
+                shutil.copyfileobj(source, out)
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
+    shutil.copymode(path, out.name)
+    os.replace(out.name, path)
+    return False
@@ -0,0 +1,383 @@
+"""Per-file stage metrics, JSON-lines and Prometheus sinks, and logging setup."""
+
+import abc
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+__all__ = [
+    "LOG_FORMATS",
+    "JsonLinesSink",
+    "JsonLogFormatter",
+    "MetricsSink",
+    "PrometheusTextfileSink",
+    "StageMetrics",
+    "configure_logging",
+    "measure",
+    "open_metrics_sink",
+]
+
+LOG_FORMATS: tuple[str, ...] = ("text", "json")
+
+_PROMETHEUS_PREFIX = "audio_extractor"
+_PROMETHEUS_SUFFIX = ".prom"
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+_STATUS = Path("/proc/self/status")
+# Attributes every LogRecord has; anything else was passed through extra.
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+# Measurements in progress in this process, by id of their metrics, mapped to
+# whether another measurement ran alongside them.
+_running: dict[int, bool] = {}
+_running_lock = threading.Lock()
+
+
+def _forget_running() -> None:
+    """Start a forked worker with no measurements, and a lock nobody holds."""
+    global _running_lock
+    _running.clear()
+    _running_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):  # Not on Windows, which never forks.
+    os.register_at_fork(after_in_child=_forget_running)
+
+
+@dataclass
+class StageMetrics:
+    """Resources one stage spent on one file.
+
+    Attributes:
+        stage: Name of the processor class.
+        file_path: Path of the input file.
+        started_at: Unix time processing started.
+        wall_s: Wall-clock seconds spent in the processor.
+        cpu_s: CPU seconds of this process and of the child processes (ffmpeg)
+            that exited meanwhile, or None if another file was measured in
+            the same process at the same time (the asyncio runner, threads):
+            the counters are process-wide, so they cannot be split by file.
+        audio_s: Seconds of audio the processor decoded, or None if it decodes
+            nothing (tagging) or cannot tell.
+        input_bytes: Size of the input file before processing.
+        output_bytes: Size of the output file, or None if nothing was written.
+        peak_rss_kb: Peak resident memory of this process while the file was
+            processed. On Linux the high-water mark is reset first; elsewhere
+            it is the peak since the process started. None, like cpu_s, if
+            another file was measured at the same time.
+        output_path: Path of the output file, if any.
+        skipped: True if the processor found its output up to date.
+        error: Error message if processing raised, otherwise None.
+    """
+
+    stage: str
+    file_path: str
+    started_at: float = 0.0
+    wall_s: float = 0.0
+    cpu_s: float | None = 0.0
+    audio_s: float | None = None
+    input_bytes: int = 0
+    output_bytes: int | None = None
+    peak_rss_kb: int | None = 0
+    output_path: str | None = None
+    skipped: bool = False
+    error: str | None = None
+
+    @property
+    def status(self) -> str:
+        """One of "failed", "skipped" or "ok"."""
+        if self.error is not None:
+            return "failed"
+        return "skipped" if self.skipped else "ok"
+
+    def observe(self, processor: Any) -> None:
+        """Copy what a processor reports about its last run.
+
+        Args:
+            processor: Processor whose process_file has returned.
+        """
+        output_path = getattr(processor, "output_path", None)
+        if isinstance(output_path, str | Path):
+            self.output_path = str(output_path)
+        audio_s = getattr(processor, "audio_seconds", None)
+        if isinstance(audio_s, int | float):
+            self.audio_s = float(audio_s)
+        self.skipped = getattr(processor, "skipped", False) is True
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the process's resident-memory high-water mark, where supported."""
+    try:
+        _CLEAR_REFS.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def _peak_rss_kb(was_reset: bool) -> int:
+    if was_reset:
+        for line in _STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _size_or_none(path: str | Path | None) -> int | None:
+    if path is None:
+        return None
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+@contextmanager
+def measure(metrics: StageMetrics) -> Iterator[StageMetrics]:
+    """Fill in metrics with the resources spent inside the with block.
+
+    Call metrics.observe(processor) inside the block once process_file has
+    returned, so the output and decoded duration are recorded too. If the
+    block raises, the error is recorded and the exception propagates. If
+    other measurements in the process overlap this one, its cpu_s and
+    peak_rss_kb are set to None, as are theirs.
+
+    Args:
+        metrics: Metrics of the file about to be processed.
+
+    Yields:
+        metrics.
+    """
+    metrics.input_bytes = _size_or_none(metrics.file_path) or 0
+    key = id(metrics)
+    with _running_lock:
+        overlapped = bool(_running)
+        for other in _running:
+            _running[other] = True
+        _running[key] = overlapped
+    # Resetting the high-water mark would spoil the readings of the others.
+    was_reset = not overlapped and _reset_peak_rss()
+    metrics.started_at = time.time()
+    start = time.perf_counter()
+    cpu_start = _cpu_seconds()
+    try:
+        yield metrics
+    except Exception as exc:
+        metrics.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        metrics.wall_s = time.perf_counter() - start
+        with _running_lock:
+            overlapped = _running.pop(key)
+        if overlapped:
+            metrics.cpu_s = None
+            metrics.peak_rss_kb = None
+        else:
+            metrics.cpu_s = _cpu_seconds() - cpu_start
+            metrics.peak_rss_kb = _peak_rss_kb(was_reset)
+        metrics.output_bytes = _size_or_none(metrics.output_path)
+
+
+class MetricsSink(abc.ABC):
+    """Destination for the metrics of every processed file."""
+
+    @abc.abstractmethod
+    def emit(self, metrics: StageMetrics) -> None:
+        """Record the metrics of one processed file.
+
+        Args:
+            metrics: Metrics of the file.
+        """
+
+
+class JsonLinesSink(MetricsSink):
+    """Appends one JSON object per processed file to a file."""
+
+    def __init__(self, path: str | Path) -> None:
+        """Init method for the JsonLinesSink class.
+
+        Args:
+            path: JSON-lines file to append to; created if missing.
+        """
+        self.path = Path(path)
+
+    def emit(self, metrics: StageMetrics) -> None:
+        """Append the metrics as one line, with their status added."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({**asdict(metrics), "status": metrics.status}) + "\n")
+
+
+class PrometheusTextfileSink(MetricsSink):
+    """Keeps per-stage totals in a Prometheus textfile-collector file.
+
+    The file is rewritten atomically after every file, so node_exporter never
+    reads a partial file. Totals cover the files emitted by this sink, i.e.
+    one run. Throughput is audio_seconds_total / wall_seconds_total. Files
+    measured together (see StageMetrics.cpu_s) add no CPU time and do not
+    count towards the peak RSS.
+    """
+
+    _COUNTERS = (
+        ("wall_seconds_total", "Wall-clock seconds spent processing files."),
+        (
+            "cpu_seconds_total",
+            "CPU seconds spent processing files, except files measured together.",
+        ),
+        ("audio_seconds_total", "Seconds of audio decoded."),
+        ("input_bytes_total", "Bytes of input files processed."),
+        ("output_bytes_total", "Bytes of output files written."),
+    )
+
+    def __init__(self, path: str | Path) -> None:
+        """Init method for the PrometheusTextfileSink class.
+
+        Args:
+            path: File to write; should end in .prom for node_exporter.
+        """
+        self.path = Path(path)
+        self._files: dict[tuple[str, str], int] = {}
+        self._totals: dict[tuple[str, str], float] = {}
+        self._peak_rss: dict[str, int] = {}
+        self._last_success: dict[str, float] = {}
+
+    def emit(self, metrics: StageMetrics) -> None:
+        """Add the metrics to the stage's totals and rewrite the file."""
+        stage = metrics.stage
+        key = (stage, metrics.status)
+        self._files[key] = self._files.get(key, 0) + 1
+        values = {
+            "wall_seconds_total": metrics.wall_s,
+            "cpu_seconds_total": metrics.cpu_s or 0.0,
+            "audio_seconds_total": metrics.audio_s or 0.0,
+            "input_bytes_total": metrics.input_bytes,
+            "output_bytes_total": metrics.output_bytes or 0,
+        }
+        for name, value in values.items():
+            self._totals[(stage, name)] = self._totals.get((stage, name), 0.0) + value
+        if metrics.peak_rss_kb is not None:
+            self._peak_rss[stage] = max(
+                self._peak_rss.get(stage, 0), metrics.peak_rss_kb
+            )
+        if metrics.error is None:
+            self._last_success[stage] = metrics.started_at + metrics.wall_s
+        self._write()
+
+    def render(self) -> str:
+        """Return the current totals in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {_PROMETHEUS_PREFIX}_files_total Files processed, by status.",
+            f"# TYPE {_PROMETHEUS_PREFIX}_files_total counter",
+        ]
+        for (stage, status), count in sorted(self._files.items()):
+            lines.append(
+                f'{_PROMETHEUS_PREFIX}_files_total{{stage="{stage}",'
+                f'status="{status}"}} {count}'
+            )
+        for name, help_text in self._COUNTERS:
+            lines.append(f"# HELP {_PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_{name} counter")
+            for (stage, total_name), total in sorted(self._totals.items()):
+                if total_name == name:
+                    lines.append(
+                        f'{_PROMETHEUS_PREFIX}_{name}{{stage="{stage}"}} {total:g}'
+                    )
+        lines += [
+            f"# HELP {_PROMETHEUS_PREFIX}_peak_rss_bytes Largest per-file peak RSS.",
+            f"# TYPE {_PROMETHEUS_PREFIX}_peak_rss_bytes gauge",
+        ]
+        for stage, peak in sorted(self._peak_rss.items()):
+            lines.append(
+                f'{_PROMETHEUS_PREFIX}_peak_rss_bytes{{stage="{stage}"}} {peak * 1024}'
+            )
+        lines += [
+            f"# HELP {_PROMETHEUS_PREFIX}_last_success_timestamp_seconds "
+            "Unix time the last file was processed successfully.",
+            f"# TYPE {_PROMETHEUS_PREFIX}_last_success_timestamp_seconds gauge",
+        ]
+        for stage, timestamp in sorted(self._last_success.items()):
+            lines.append(
+                f"{_PROMETHEUS_PREFIX}_last_success_timestamp_seconds"
+                f'{{stage="{stage}"}} {timestamp:.3f}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_name(f".{self.path.name}.partial")
+        partial.write_text(self.render(), encoding="utf-8")
+        os.replace(partial, self.path)
+
+
+def open_metrics_sink(path: str | Path) -> MetricsSink:
+    """Return the sink for a metrics file, chosen by its extension.
+
+    Args:
+        path: A .prom file gets a PrometheusTextfileSink; anything else a
+            JsonLinesSink.
+
+    Returns:
+        The sink.
+    """
+    if Path(path).suffix == _PROMETHEUS_SUFFIX:
+        return PrometheusTextfileSink(path)
+    return JsonLinesSink(path)
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats log records as one JSON object per line.
+
+    The object holds the time, level, logger name and message, plus every
+    field passed to the logging call through extra.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Return the record as a JSON line."""
+        entry: dict[str, Any] = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(log_format: str = "text", level: int = logging.INFO) -> None:
+    """Send log records of every module to stderr.
+
+    Args:
+        log_format: "text" for bare messages, or "json" for one JSON object
+            per line (see JsonLogFormatter). Defaults to "text".
+        level: Lowest level logged. Defaults to logging.INFO.
+
+    Raises:
+        ValueError: If log_format is not one of LOG_FORMATS.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(
+            f"Unknown log format {log_format!r}; expected one of {list(LOG_FORMATS)}."
+        )
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
@@ -0,0 +1,176 @@
+"""Persistent manifest of processed files, used to skip unchanged inputs."""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+from constants import MANIFEST_PATH
+
+__all__ = ["Manifest"]
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_BYTES = 1 << 20
+
+
+def _file_sha256(file_path: Path) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with file_path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _normalize_params(params: dict[str, Any]) -> dict[str, Any]:
+    """Round-trip params through JSON so they compare equal to stored ones."""
+    return json.loads(json.dumps(params, sort_keys=True, default=str))
+
+
+class Manifest:
+    """Records which files each stage has processed and with which parameters.
+
+    Entries are appended to a JSON-lines file keyed by (source path, stage); when
+    the file is loaded, later lines for the same key replace earlier ones. A
+    source is considered unchanged while its size and modification time match
+    the entry. With use_hash set, a SHA-256 of the contents is stored as well, so
+    a file whose timestamp changed but whose contents did not is still skipped.
+
+    Every entry is flushed to disk as it is recorded, so a manifest survives
+    the process being killed: at worst its last line is cut short, and that
+    line is ignored when the file is loaded again.
+    """
+
+    def __init__(self, path: str | Path = MANIFEST_PATH, use_hash: bool = False):
+        """Init method for the Manifest class.
+
+        Args:
+            path: JSON-lines file the manifest is read from and appended to.
+                Defaults to MANIFEST_PATH.
+            use_hash: If True, also compare content hashes. Defaults to False.
+        """
+        self.path = Path(path)
+        self.use_hash = use_hash
+        self._entries: dict[tuple[str, str], dict[str, Any]] = {}
+        # Set when the file ends in a cut-short line, which the next entry
+        # must not be appended to.
+        self._torn = False
+        if self.path.is_file():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    self._torn = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Ignoring a cut-short line in %s.", self.path)
+                        continue
+                    self._entries[(entry["source"], entry["stage"])] = entry
+
+    @staticmethod
+    def _key(source: str | Path) -> str:
+        return str(Path(source).resolve())
+
+    def is_current(
+        self, source: str | Path, stage: str, params: dict[str, Any]
+    ) -> bool:
+        """Check whether source was already processed by stage with params.
+
+        Args:
+            source: Path of the input file.
+            stage: Name of the processing stage.
+            params: Parameters the stage would be run with.
+
+        Returns:
+            True if the recorded entry matches the source's current size,
+            modification time (or content hash) and params, and the recorded
+            output still exists. A source found current by its hash has its
+            new modification time recorded, so it is not hashed again.
+        """
+        entry = self._entries.get((self._key(source), stage))
+        if entry is None or entry["params"] != _normalize_params(params):
+            return False
+        if entry["output"] is not None and not Path(entry["output"]).exists():
+            return False
+        source_path = Path(source)
+        try:
+            stat = source_path.stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if not self.use_hash or entry["sha256"] is None:
+            return False
+        if _file_sha256(source_path) != entry["sha256"]:
+            return False
+        self._append({**entry, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return True
+
+    def recorded_output(self, source: str | Path, stage: str) -> str | None:
+        """Return the output recorded for source by stage, if any.
+
+        Args:
+            source: Path of the input file.
+            stage: Name of the processing stage.
+
+        Returns:
+            The output path of the latest entry, or None if there is no entry
+            or the stage wrote no output.
+        """
+        entry = self._entries.get((self._key(source), stage))
+        return None if entry is None else entry["output"]
+
+    def record(
+        self,
+        source: str | Path,
+        stage: str,
+        params: dict[str, Any],
+        output: str | Path | None = None,
+    ) -> None:
+        """Record that source was processed by stage and append it to the file.
+
+        The source is stat-ed at this point, so processors that modify their input
+        in place are recorded in their processed state.
+
+        Args:
+            source: Path of the input file.
+            stage: Name of the processing stage.
+            params: Parameters the stage was run with.
+            output: Path of the file the stage wrote, if any. Defaults to None.
+        """
+        source_path = Path(source)
+        stat = source_path.stat()
+        entry = {
+            "source": self._key(source),
+            "stage": stage,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": _file_sha256(source_path) if self.use_hash else None,
+            "params": _normalize_params(params),
+            "output": None if output is None else str(output),
+        }
+        self._append(entry)
+
+    def _append(self, entry: dict[str, Any]) -> None:
+        """Make entry the latest for its key and append it to the file."""
+        self._entries[(entry["source"], entry["stage"])] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            if self._torn:
+                f.write("\n")
+                self._torn = False
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        """Forget every entry and delete the file."""
+        self._entries.clear()
+        self._torn = False
+        self.path.unlink(missing_ok=True)
@@ -4,8 +4,14 @@ import argparse
 from pathlib import Path
 
 from audio_normalizer import AudioNormalizer
-from constants import AUDIO_EXTS, DEFAULT_DBFS
-from files_processor import process_all_files
+from constants import AUDIO_EXTS, DEFAULT_DBFS, NORMALIZATION_MODES
+from files_processor import (
+    add_batch_arguments,
+    batch_options,
+    print_plan,
+    process_all_files,
+    report_batch,
+)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -19,7 +25,47 @@ if __name__ == "__main__":
         "--dBFS",
         type=float,
         default=DEFAULT_DBFS,
-        help=f"Target dBFS. Defaults to {DEFAULT_DBFS}.",
+        help=f"Target dBFS (or LUFS with --mode lufs). Defaults to {DEFAULT_DBFS}.",
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Normalize in fixed-size chunks to keep memory use bounded.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=NORMALIZATION_MODES,
+        default="dbfs",
+        help=(
+            "Level to normalize: 'dbfs' (average RMS) or 'lufs' (EBU R128 "
+            "integrated loudness). Defaults to 'dbfs'."
+        ),
+    )
+    parser.add_argument(
+        "--true_peak",
+        type=float,
+        default=None,
+        help="Maximum true peak of the output in dBTP (e.g. -1). Defaults to none.",
+    )
+    parser.add_argument(
+        "--lossless",
+        action="store_true",
+        help="Adjust mp3 frame gain in 1.5 dB steps instead of re-encoding.",
+    )
+    add_batch_arguments(parser)
     args = parser.parse_args()
-    process_all_files(args.dir, AUDIO_EXTS, AudioNormalizer, target_dbfs=args.dBFS)
+    if args.plan:
+        print_plan(args, AUDIO_EXTS)
+        parser.exit()
+    report = process_all_files(
+        args.dir,
+        AUDIO_EXTS,
+        AudioNormalizer,
+        **batch_options(args),
+        target_dbfs=args.dBFS,
+        streaming=args.streaming,
+        mode=args.mode,
+        true_peak=args.true_peak,
+        lossless=args.lossless,
+    )
+    report_batch(args, report)
@@ -1,12 +1,57 @@
 """Abstract base class defining the interface for all file processors."""
 
 import abc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, ClassVar
+
+from ffmpeg_utils import FFmpegProgress
 
 __all__ = ["ProcessClass"]
 
 
 class ProcessClass(abc.ABC):
-    """Abstract base class enforcing a process_file method on all subclasses."""
+    """Abstract base class enforcing a process_file method on all subclasses.
+
+    Attributes:
+        mirrors_input_tree: True for processors that write to an output
+            directory and accept a relative_dir argument, placing their output
+            in that subdirectory of it. Used when processing a tree recursively.
+        low_memory_kwargs: Keyword arguments that make the processor hold
+            only a bounded amount of audio in memory, whatever the file's
+            length, or None if it has no such mode. Used to fit files into a
+            memory budget (see estimate_peak_memory).
+        output_path: Path of the file written by the last successful call to
+            process_file, or None if nothing has been written yet.
+        skipped: True if the last call to process_file found its output already
+            up to date and wrote nothing.
+        audio_seconds: Seconds of audio decoded by the last call to
+            process_file, or None if it decoded none or the length is unknown.
+            Reported in the stage's metrics (see instrumentation.StageMetrics).
+    """
+
+    mirrors_input_tree: ClassVar[bool] = False
+    low_memory_kwargs: ClassVar[dict[str, Any] | None] = None
+    output_path: Path | None = None
+    skipped: bool = False
+    audio_seconds: float | None = None
+
+    @classmethod
+    def estimate_peak_memory(cls, file_path: str, **kwargs: Any) -> int:
+        """Estimate the memory process_file needs for a file, from its headers.
+
+        files_processor admits files under a memory budget with this. The
+        default, for processors whose memory use does not grow with the
+        file, is 0.
+
+        Args:
+            file_path: Path of the file to process.
+            **kwargs: Keyword arguments the processor would be built with.
+
+        Returns:
+            The estimated peak memory, in bytes.
+        """
+        return 0
 
     @abc.abstractmethod
     def process_file(self) -> None:
@@ -14,10 +59,33 @@ class ProcessClass(abc.ABC):
 
         Implementations must load the file at the path provided during construction,
         apply the relevant transformation (extraction, normalisation, tagging, etc.),
-        and persist the result. Implementations should raise a specific exception on
-        failure rather than silently suppressing errors.
+        persist the result, and set output_path to the file written (the input path
+        itself for processors that modify files in place). Implementations should
+        raise a specific exception on failure rather than silently suppressing errors.
 
         Raises:
             FileNotFoundError: If the source file cannot be found.
             ValueError: If the source file is corrupt or in an unsupported format.
         """
+
+    async def process_file_async(
+        self, on_progress: Callable[[FFmpegProgress], None] | None = None
+    ) -> None:
+        """Do the work of process_file without blocking the event loop.
+
+        The default runs process_file in a worker thread, so every processor
+        can be used from an event loop (see
+        files_processor.process_all_files_async). A thread cannot be
+        interrupted, so a cancelled or timed out file keeps processing in
+        the background until it is done. Processors whose work is done by
+        ffmpeg override this to run it as an asyncio subprocess, which is
+        killed on cancellation and reports its progress.
+
+        Args:
+            on_progress: Called with ffmpeg's progress reports while it runs.
+                Not called by the default. Defaults to None.
+        """
+        # Imported on first use, so the synchronous CLIs never load asyncio.
+        import asyncio
+
+        await asyncio.to_thread(self.process_file)
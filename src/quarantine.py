@@ -0,0 +1,100 @@
+"""Record of files that failed, set aside so later batches skip them."""
+
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+from constants import QUARANTINE_PATH
+from utils import atomic_output
+
+__all__ = ["Quarantine"]
+
+
+class Quarantine:
+    """Files that failed, with the stage and error they last failed with.
+
+    A batch run with a quarantine skips the files in it, so a file that keeps
+    failing (a video without audio, a corrupt download) does not fail again
+    in every run. The quarantined files are retried separately, by a batch
+    that processes only them; each file that then succeeds is released.
+
+    The record is a JSON file keyed by resolved path, rewritten whole on
+    every change and only replaced once complete (see utils.atomic_output),
+    so it is never left half-written.
+    """
+
+    def __init__(self, path: str | Path = QUARANTINE_PATH) -> None:
+        """Init method for the Quarantine class.
+
+        Args:
+            path: JSON file the quarantine is read from and written to.
+                Defaults to QUARANTINE_PATH.
+        """
+        self.path = Path(path)
+        self._entries: dict[str, dict[str, Any]] = {}
+        if self.path.is_file():
+            self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def _key(file_path: str | Path) -> str:
+        return str(Path(file_path).resolve())
+
+    def __contains__(self, file_path: object) -> bool:
+        """Check whether a file is quarantined."""
+        if not isinstance(file_path, str | Path):
+            return False
+        return self._key(file_path) in self._entries
+
+    def __len__(self) -> int:
+        """Return the number of quarantined files."""
+        return len(self._entries)
+
+    def entries(self) -> dict[str, dict[str, Any]]:
+        """Return the stage, error and attempts of every file, keyed by path."""
+        return {key: dict(entry) for key, entry in self._entries.items()}
+
+    def add(
+        self,
+        file_path: str | Path,
+        stage: str | None,
+        error_type: str | None,
+        error: str | None,
+    ) -> None:
+        """Quarantine a file that failed, or update its entry if it failed again.
+
+        Args:
+            file_path: Path of the file the batch processed.
+            stage: Name of the stage that failed, if known.
+            error_type: Name of the exception's type.
+            error: "ExceptionType: message" of the failure.
+        """
+        key = self._key(file_path)
+        previous = self._entries.get(key, {})
+        self._entries[key] = {
+            "stage": stage,
+            "error_type": error_type,
+            "error": error,
+            "attempts": previous.get("attempts", 0) + 1,
+            "quarantined_at": time.time(),
+        }
+        self._save()
+
+    def release(self, file_path: str | Path) -> bool:
+        """Take a file out of quarantine, e.g. once a retry succeeded.
+
+        Returns:
+            True if the file was quarantined.
+        """
+        if self._entries.pop(self._key(file_path), None) is None:
+            return False
+        self._save()
+        return True
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(self.path) as partial_path:
+            partial_path.write_text(
+                json.dumps(self._entries, indent=2, sort_keys=True) + "\n",
+                encoding="utf-8",
+            )
@@ -0,0 +1,277 @@
+"""Cost estimates, longest-first schedules and memory admission for batches."""
+
+import heapq
+import logging
+import os
+import re
+import threading
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from ffmpeg_utils import FFmpegError, probe_audio_stream, stream_duration
+
+__all__ = [
+    "BatchPlan",
+    "FilePlan",
+    "MemoryBudget",
+    "estimate_cost",
+    "format_plan",
+    "parse_size",
+    "plan_batch",
+]
+
+logger = logging.getLogger(__name__)
+
+# ffprobe processes run at once while planning; each only reads headers, so
+# they wait on disk rather than on the CPU.
+_PROBE_THREADS = 8
+# Bytes per second of audio assumed for files whose duration cannot be probed
+# (128 kbit/s, a common mp3 bitrate).
+_FALLBACK_BYTES_PER_SECOND = 16_000
+# Multipliers of the unit suffixes parse_size accepts.
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+@dataclass(frozen=True)
+class FilePlan:
+    """Where and when a file is expected to be processed in a batch.
+
+    Attributes:
+        file_path: Path of the file.
+        duration_s: Audio duration read from the file's headers, or None if
+            it could not be probed.
+        cost_s: Estimated work, in seconds of audio: the duration, or an
+            estimate from the file size if there is none.
+        worker: Index of the worker expected to process the file.
+        start_s: Estimated work its worker does before starting the file,
+            in the same unit as cost_s.
+    """
+
+    file_path: str
+    duration_s: float | None
+    cost_s: float
+    worker: int
+    start_s: float
+
+
+@dataclass(frozen=True)
+class BatchPlan:
+    """Longest-processing-time-first schedule of a batch across workers.
+
+    Attributes:
+        files: Files in the order they are handed to workers, longest first.
+        workers: Number of workers the batch is spread across.
+        discovery_makespan_s: Estimated makespan if the files were handed out
+            in the order they were found instead.
+    """
+
+    files: list[FilePlan]
+    workers: int
+    discovery_makespan_s: float
+
+    @property
+    def file_paths(self) -> list[str]:
+        """Paths of the files in the order they are handed to workers."""
+        return [plan.file_path for plan in self.files]
+
+    @property
+    def total_cost_s(self) -> float:
+        """Estimated work of the whole batch, in seconds of audio."""
+        return sum(plan.cost_s for plan in self.files)
+
+    @property
+    def makespan_s(self) -> float:
+        """Estimated work of the busiest worker, which bounds the batch's time."""
+        return max((plan.start_s + plan.cost_s for plan in self.files), default=0.0)
+
+
+def estimate_cost(file_path: str | Path) -> tuple[float | None, float]:
+    """Estimate how much work processing a file is, from its headers only.
+
+    Every stage's work grows with the length of the audio it decodes or
+    encodes, so the duration ffprobe reads from the container headers is the
+    estimate; no audio is decoded. Files without a probed duration (no audio
+    stream, or a format ffprobe cannot read) are estimated from their size.
+
+    Args:
+        file_path: Path of the file.
+
+    Returns:
+        A tuple of (duration_s, cost_s); duration_s is None if it could not
+        be probed.
+    """
+    try:
+        duration = stream_duration(probe_audio_stream(file_path))
+    except (FFmpegError, OSError) as exc:
+        logger.debug("Could not probe %s: %s", file_path, exc)
+        duration = None
+    if duration is not None:
+        return duration, duration
+    try:
+        size = os.stat(file_path).st_size
+    except OSError:
+        size = 0
+    return None, size / _FALLBACK_BYTES_PER_SECOND
+
+
+def _list_schedule(costs: Sequence[float], workers: int) -> list[tuple[int, float]]:
+    """Hand costs out in order, each to the worker that frees up first.
+
+    Returns:
+        (worker, start) of each cost, in the order given.
+    """
+    loads = [(0.0, worker) for worker in range(workers)]
+    slots = []
+    for cost in costs:
+        start, worker = heapq.heappop(loads)
+        slots.append((worker, start))
+        heapq.heappush(loads, (start + cost, worker))
+    return slots
+
+
+def plan_batch(file_paths: Iterable[str], workers: int = 1) -> BatchPlan:
+    """Plan a batch longest-processing-time (LPT) first.
+
+    The cost of every file is estimated with estimate_cost, probing several
+    files at once. Handing files to a pool longest first, each to whichever
+    worker is free, keeps a long file found last from running alone at the
+    end while the other workers sit idle: the makespan is at most 4/3 of the
+    best possible one.
+
+    Args:
+        file_paths: Files of the batch, in the order they were found.
+        workers: Number of workers the batch runs on. Defaults to 1.
+
+    Returns:
+        The plan, with files in the order they should be handed out.
+
+    Raises:
+        ValueError: If workers is less than 1.
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    file_paths = list(file_paths)
+    with ThreadPoolExecutor(max_workers=_PROBE_THREADS) as pool:
+        estimates = list(pool.map(estimate_cost, file_paths))
+    costs = [cost for _, cost in estimates]
+    discovery_makespan = max(
+        (
+            start + cost
+            for (_, start), cost in zip(
+                _list_schedule(costs, workers), costs, strict=True
+            )
+        ),
+        default=0.0,
+    )
+    # sorted is stable, so files of equal cost keep their discovery order.
+    order = sorted(range(len(file_paths)), key=lambda i: -costs[i])
+    slots = _list_schedule([costs[i] for i in order], workers)
+    files = [
+        FilePlan(file_paths[i], *estimates[i], *slot)
+        for i, slot in zip(order, slots, strict=True)
+    ]
+    return BatchPlan(files, workers, discovery_makespan)
+
+
+def _clock(seconds: float) -> str:
+    """Format seconds as H:MM:SS."""
+    minutes, secs = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+def format_plan(plan: BatchPlan) -> str:
+    """Render a plan as a table of files followed by its estimated makespan.
+
+    Args:
+        plan: Plan returned by plan_batch.
+
+    Returns:
+        One line per file (its worker, estimated start and cost, and path,
+        with costs estimated from the file size marked "~"), then a summary.
+    """
+    lines = [f"{'worker':>6}  {'start':>9}  {'cost':>10}  file"]
+    for file in plan.files:
+        estimated = "~" if file.duration_s is None else " "
+        lines.append(
+            f"{file.worker:>6}  {_clock(file.start_s):>9}  "
+            f"{estimated}{_clock(file.cost_s):>9}  {file.file_path}"
+        )
+    lines.append(
+        f"{len(plan.files)} file(s) on {plan.workers} worker(s): "
+        f"{_clock(plan.total_cost_s)} of audio, makespan {_clock(plan.makespan_s)} "
+        f"(in discovery order {_clock(plan.discovery_makespan_s)})."
+    )
+    return "\n".join(lines)
+
+
+def parse_size(text: str) -> int:
+    """Parse a size in bytes with an optional binary unit, e.g. "512M" or "4G".
+
+    Args:
+        text: Number of bytes, optionally followed by K, M, G or T (powers of
+            1024, case-insensitive, with or without a trailing "B" or "iB").
+
+    Returns:
+        The size in bytes.
+
+    Raises:
+        ValueError: If text is not a size.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*", text, re.I)
+    if match is None:
+        raise ValueError(f"Not a size: {text!r}.")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.lower()])
+
+
+class MemoryBudget:
+    """Admits jobs only while their estimated peak memory fits in a budget.
+
+    acquire waits until a job fits next to the jobs already admitted, and
+    release gives its share back once it is done; both can be called from
+    any thread. A job estimated above the whole budget is admitted once no
+    other job is running, so it runs alone rather than never.
+    """
+
+    def __init__(self, limit: int) -> None:
+        """Init method for the MemoryBudget class.
+
+        Args:
+            limit: Most memory, in bytes, the admitted jobs may need at once.
+
+        Raises:
+            ValueError: If limit is not positive.
+        """
+        if limit < 1:
+            raise ValueError(f"The memory budget must be positive, got {limit}.")
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, peak: int, timeout: float | None = None) -> bool:
+        """Wait until a job needing peak bytes fits, then count it as running.
+
+        Args:
+            peak: Estimated peak memory of the job, in bytes.
+            timeout: Longest wait in seconds. Defaults to None (no limit).
+
+        Returns:
+            True once the job is admitted, False if timeout ran out first.
+        """
+        with self._condition:
+            admitted = self._condition.wait_for(
+                lambda: self.in_use == 0 or self.in_use + peak <= self.limit,
+                timeout,
+            )
+            if admitted:
+                self.in_use += peak
+            return admitted
+
+    def release(self, peak: int) -> None:
+        """Give back the share of a finished job acquired with peak bytes."""
+        with self._condition:
+            self.in_use -= peak
+            self._condition.notify_all()
@@ -5,7 +5,13 @@ from pathlib import Path
 
 from audio_tagger import AudioTagger
 from constants import AUDIO_EXTS, DEFAULT_ALBUM, DEFAULT_ARTIST
-from files_processor import process_all_files
+from files_processor import (
+    add_batch_arguments,
+    batch_options,
+    print_plan,
+    process_all_files,
+    report_batch,
+)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -27,7 +33,23 @@ if __name__ == "__main__":
         default=DEFAULT_ALBUM,
         help=f"album tag for mp3 file - Defaults to {DEFAULT_ALBUM!r}.",
     )
+    parser.add_argument(
+        "--in_place",
+        action="store_true",
+        help="Edit the ID3 tag in place, reading and writing only the tag.",
+    )
+    add_batch_arguments(parser)
     args = parser.parse_args()
-    process_all_files(
-        args.dir, AUDIO_EXTS, AudioTagger, artist_tag=args.artist, album_tag=args.album
+    if args.plan:
+        print_plan(args, AUDIO_EXTS)
+        parser.exit()
+    report = process_all_files(
+        args.dir,
+        AUDIO_EXTS,
+        AudioTagger,
+        **batch_options(args),
+        artist_tag=args.artist,
+        album_tag=args.album,
+        in_place=args.in_place,
     )
+    report_batch(args, report)
@@ -1,9 +1,23 @@
-"""Utility functions for file path parsing and extension validation."""
+"""Utility functions for file path parsing, extension validation and outputs."""
 
-from collections.abc import Collection
+import contextlib
+import os
+import uuid
+from collections.abc import Collection, Iterator, Sequence
+from fnmatch import fnmatch
 from pathlib import Path
 
-__all__ = ["get_file_strings", "is_valid_ext"]
+__all__ = [
+    "atomic_output",
+    "get_file_strings",
+    "is_partial",
+    "is_selected",
+    "is_valid_ext",
+    "iter_files",
+]
+
+# Marks the hidden files atomic_output writes before renaming them into place.
+_PARTIAL_MARKER = ".partial"
 
 
 def get_file_strings(file_path: str | Path, full_path: bool = False) -> tuple[str, str]:
@@ -44,3 +58,172 @@ def is_valid_ext(file_path: str | Path, ext_list: Collection[str]) -> bool:
     """
     _, file_ext = get_file_strings(file_path)
     return file_ext in ext_list
+
+
+def is_partial(file_path: str | Path) -> bool:
+    """Check whether a file is an unfinished output of atomic_output.
+
+    Args:
+        file_path: File path (ex: mydir/.my_file.123-0a1b2c3d.partial.mp3).
+
+    Returns:
+        True if the file is hidden and carries atomic_output's partial marker.
+    """
+    name = Path(file_path).name
+    return name.startswith(".") and _PARTIAL_MARKER in Path(name).suffixes
+
+
+def _fsync_dir(dir_path: Path) -> None:
+    """Flush a directory entry change (e.g. a rename) to disk, where possible."""
+    # Directories cannot be opened for fsync on every platform (e.g. Windows).
+    with contextlib.suppress(OSError):
+        fd = os.open(dir_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_output(path: str | Path) -> Iterator[Path]:
+    """Yield a temporary path to write an output to, renamed to path on success.
+
+    The temporary file is hidden, lives next to path (so the rename never
+    crosses file systems) and keeps path's extension, so writers that pick a
+    format from the extension (ffmpeg, moviepy) still do. When the block
+    finishes, the file is flushed to disk and atomically renamed over path, so
+    path only ever holds either its old contents or a complete new output,
+    even if the process is killed halfway. If the block raises, the temporary
+    file is removed and path is left untouched.
+
+    Args:
+        path: Final path of the output. Its directory must exist.
+
+    Yields:
+        The temporary path. The block must create the file there.
+    """
+    path = Path(path)
+    partial = path.with_name(
+        f".{path.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        f"{_PARTIAL_MARKER}{path.suffix}"
+    )
+    try:
+        yield partial
+        with partial.open("rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    _fsync_dir(path.parent)
+
+
+def _matches_any(rel_path: str, name: str, patterns: Sequence[str]) -> bool:
+    """Check a path, relative to the search root, or its base name against globs."""
+    return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
+
+
+def iter_files(
+    root: str | Path,
+    ext_list: Collection[str],
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+) -> Iterator[str]:
+    """Lazily yield paths of files under root with a valid extension.
+
+    Directories are read with os.scandir and the file type cached on each
+    DirEntry is used, so no extra stat call is made per entry. Entries of each
+    directory are visited in name order and subdirectories are walked depth
+    first, so paths are produced as soon as they are found.
+
+    Glob patterns are matched against both the path relative to root (with "/"
+    separators) and the entry's base name. Unfinished outputs of atomic_output
+    are never yielded.
+
+    Args:
+        root: Directory to search.
+        ext_list: Collection of valid file extensions to match against.
+        recursive: If True, subdirectories are searched too. Defaults to False.
+        include: If given, only files matching one of these globs are yielded.
+            Defaults to no filter.
+        exclude: Files and directories matching one of these globs are skipped.
+            Defaults to no filter.
+        max_depth: Deepest level of subdirectory to search when recursive,
+            where 0 is root itself. Defaults to None (no limit).
+
+    Yields:
+        Paths of matching files, as strings.
+    """
+    if not recursive:
+        max_depth = 0
+    stack: list[tuple[str, str, int]] = [(str(root), "", 0)]
+    while stack:
+        dir_path, rel_dir, depth = stack.pop()
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        subdirs: list[tuple[str, str, int]] = []
+        for entry in entries:
+            rel_path = f"{rel_dir}{entry.name}"
+            if exclude and _matches_any(rel_path, entry.name, exclude):
+                continue
+            if entry.is_dir():
+                if max_depth is None or depth < max_depth:
+                    subdirs.append((entry.path, f"{rel_path}/", depth + 1))
+            elif (
+                entry.is_file()
+                and is_valid_ext(entry.name, ext_list)
+                and not is_partial(entry.name)
+                and (not include or _matches_any(rel_path, entry.name, include))
+            ):
+                yield entry.path
+        stack.extend(reversed(subdirs))
+
+
+def is_selected(
+    root: str | Path,
+    file_path: str | Path,
+    ext_list: Collection[str],
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+) -> bool:
+    """Check whether iter_files would yield a file, without walking root.
+
+    Used to filter files reported one at a time, e.g. by a directory watcher.
+    The arguments mean the same as for iter_files.
+
+    Args:
+        root: Directory that is searched.
+        file_path: Path of the file, under root.
+        ext_list: Collection of valid file extensions to match against.
+        recursive: If True, files in subdirectories count. Defaults to False.
+        include: If given, the file must match one of these globs. Defaults to
+            no filter.
+        exclude: The file and its directories below root must not match any of
+            these globs. Defaults to no filter.
+        max_depth: Deepest level of subdirectory searched when recursive.
+            Defaults to None (no limit).
+
+    Returns:
+        True if iter_files(root, ...) would yield the file.
+    """
+    try:
+        parts = Path(file_path).relative_to(root).parts
+    except ValueError:
+        return False
+    if not recursive:
+        max_depth = 0
+    if not parts or (max_depth is not None and len(parts) - 1 > max_depth):
+        return False
+    if exclude:
+        for i, name in enumerate(parts):
+            if _matches_any("/".join(parts[: i + 1]), name, exclude):
+                return False
+    if is_partial(parts[-1]):
+        return False
+    return is_valid_ext(parts[-1], ext_list) and (
+        not include or _matches_any("/".join(parts), parts[-1], include)
+    )
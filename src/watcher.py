@@ -0,0 +1,381 @@
+"""Directory watchers that report files once they have been completely written."""
+
+import abc
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from pathlib import Path
+from types import TracebackType
+
+from constants import DEFAULT_POLL_INTERVAL
+from utils import is_selected, iter_files
+
+__all__ = [
+    "DirectoryWatcher",
+    "InotifyWatcher",
+    "PollingWatcher",
+    "open_watcher",
+    "watch_files",
+]
+
+logger = logging.getLogger(__name__)
+
+# Event bits from <sys/inotify.h>.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR
+# struct inotify_event header: wd, mask, cookie, len; the name follows.
+_EVENT = struct.Struct("iIII")
+_READ_BYTES = 64 * 1024
+
+
+class DirectoryWatcher(abc.ABC):
+    """Reports files under a directory that have been completely written.
+
+    Use as a context manager, or call close when done.
+    """
+
+    @abc.abstractmethod
+    def wait(self, timeout: float) -> list[str]:
+        """Wait up to timeout seconds for files to finish being written.
+
+        Args:
+            timeout: Longest time to block, in seconds.
+
+        Returns:
+            Paths of the files that were completely written since the previous
+            call; empty if there were none before the timeout. A file may be
+            reported again after it is rewritten.
+        """
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """Release the watcher's resources."""
+
+    def __enter__(self) -> "DirectoryWatcher":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """Linux inotify watcher, reporting files as soon as their writer closes them.
+
+    A file is reported when a process that opened it for writing closes it
+    (IN_CLOSE_WRITE) or when it is moved into a watched directory
+    (IN_MOVED_TO), so partially copied files are never reported. When
+    recursive, directories created later are watched as they appear, and the
+    files already inside them when the watch is added are reported at once.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        recursive: bool = False,
+        max_depth: int | None = None,
+    ) -> None:
+        """Init method for the InotifyWatcher class.
+
+        Args:
+            root: Directory to watch.
+            recursive: If True, subdirectories are watched too. Defaults to
+                False.
+            max_depth: Deepest subdirectory level watched when recursive, where
+                0 is root itself. Defaults to None (no limit).
+
+        Raises:
+            OSError: If inotify is not available (not Linux, or out of
+                inotify instances or watches).
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            libc.inotify_init1.restype = ctypes.c_int
+            libc.inotify_add_watch.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint32,
+            ]
+        except (OSError, AttributeError) as exc:
+            raise OSError("inotify is not available on this system.") from exc
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self.root = str(root)
+        self.max_depth = max_depth if recursive else 0
+        # Watch descriptor -> (directory path, depth below root).
+        self._dirs: dict[int, tuple[str, int]] = {}
+        try:
+            self._watch_tree(self.root, 0)
+        except BaseException:
+            self.close()
+            raise
+
+    def _watch_tree(self, dir_path: str, depth: int) -> list[str]:
+        """Watch a directory and, within max_depth, its subdirectories.
+
+        Returns:
+            Paths of the files already in the watched directories.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Cannot watch {dir_path!r}: {os.strerror(errno)}")
+        self._dirs[wd] = (dir_path, depth)
+        files = []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.max_depth is None or depth < self.max_depth:
+                        files += self._watch_tree(entry.path, depth + 1)
+                elif entry.is_file():
+                    files.append(entry.path)
+        return files
+
+    def wait(self, timeout: float) -> list[str]:
+        """Return the files closed after writing or moved in, see DirectoryWatcher."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, _READ_BYTES)
+        except BlockingIOError:
+            return []
+        files = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                # Events were dropped; report everything and let the caller
+                # skip what it has already seen.
+                logger.warning("inotify queue overflowed; rescanning %s.", self.root)
+                files += self._rescan()
+                continue
+            if wd not in self._dirs:
+                continue
+            if mask & _IN_IGNORED:
+                del self._dirs[wd]
+                continue
+            dir_path, depth = self._dirs[wd]
+            path = os.path.join(dir_path, name)
+            if mask & _IN_ISDIR:
+                if self.max_depth is None or depth < self.max_depth:
+                    try:
+                        files += self._watch_tree(path, depth + 1)
+                    except OSError as exc:
+                        logger.warning("Cannot watch new directory %s: %s", path, exc)
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                files.append(path)
+        return files
+
+    def _rescan(self) -> list[str]:
+        files = []
+        for dir_path, _ in list(self._dirs.values()):
+            try:
+                with os.scandir(dir_path) as it:
+                    files += [entry.path for entry in it if entry.is_file()]
+            except OSError:
+                continue
+        return files
+
+    def close(self) -> None:
+        """Close the inotify file descriptor, removing every watch."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(DirectoryWatcher):
+    """Portable watcher that rescans the directory every interval seconds.
+
+    A file is reported once its size and modification time are unchanged
+    between two consecutive scans, i.e. once it has stopped growing for an
+    interval. Use it where inotify is unavailable or does not see writes
+    (e.g. from other hosts on a network file system).
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        ext_list: Collection[str],
+        recursive: bool = False,
+        max_depth: int | None = None,
+        interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        """Init method for the PollingWatcher class.
+
+        Args:
+            root: Directory to watch.
+            ext_list: Extensions of the files to watch.
+            recursive: If True, subdirectories are scanned too. Defaults to
+                False.
+            max_depth: Deepest subdirectory level scanned when recursive.
+                Defaults to None (no limit).
+            interval: Seconds between scans. Defaults to DEFAULT_POLL_INTERVAL.
+        """
+        self.root = root
+        self.ext_list = ext_list
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.interval = interval
+        self._next_scan = time.monotonic()
+        self._previous: dict[str, tuple[int, int]] = {}
+        self._reported: dict[str, tuple[int, int]] = {}
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for path in iter_files(
+            self.root, self.ext_list, self.recursive, max_depth=self.max_depth
+        ):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout: float) -> list[str]:
+        """Return the files that stopped changing, see DirectoryWatcher."""
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(delay, 0.0))
+        self._next_scan = time.monotonic() + self.interval
+        current = self._scan()
+        files = [
+            path
+            for path, state in current.items()
+            if self._previous.get(path) == state and self._reported.get(path) != state
+        ]
+        for path in files:
+            self._reported[path] = current[path]
+        self._previous = current
+        return files
+
+    def close(self) -> None:
+        """Nothing to release; scans hold no resources between calls."""
+
+
+def open_watcher(
+    root: str | Path,
+    ext_list: Collection[str],
+    recursive: bool = False,
+    max_depth: int | None = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    polling: bool = False,
+) -> DirectoryWatcher:
+    """Return an InotifyWatcher, or a PollingWatcher where inotify is unavailable.
+
+    Args:
+        root: Directory to watch.
+        ext_list: Extensions of the files to watch (used when polling).
+        recursive: If True, subdirectories are watched too. Defaults to False.
+        max_depth: Deepest subdirectory level watched when recursive. Defaults
+            to None (no limit).
+        poll_interval: Seconds between scans when polling. Defaults to
+            DEFAULT_POLL_INTERVAL.
+        polling: If True, poll even where inotify is available. Defaults to
+            False.
+
+    Returns:
+        The watcher.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root, recursive, max_depth)
+        except OSError as exc:
+            logger.warning("%s Falling back to polling every %g s.", exc, poll_interval)
+    return PollingWatcher(root, ext_list, recursive, max_depth, poll_interval)
+
+
+def watch_files(
+    root: str | Path,
+    ext_list: Collection[str],
+    recursive: bool = False,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: int | None = None,
+    *,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    polling: bool = False,
+    stop: threading.Event | None = None,
+) -> Iterator[list[str]]:
+    """Yield the files under root as they are completely written.
+
+    The files already in root are yielded first, then every file that is
+    written, or rewritten, afterwards. Files are selected like iter_files
+    selects them. The watcher is set up before the existing files are listed,
+    so no file landing in between is missed; a file is only yielded again if
+    its size or modification time changed since.
+
+    Args:
+        root: Directory to watch.
+        ext_list: Collection of valid file extensions to match against.
+        recursive: If True, subdirectories are watched too. Defaults to False.
+        include: If given, only files matching one of these globs are yielded.
+            Defaults to no filter.
+        exclude: Files and directories matching one of these globs are skipped.
+            Defaults to no filter.
+        max_depth: Deepest subdirectory level watched when recursive. Defaults
+            to None (no limit).
+        poll_interval: Longest time between yields, and seconds between scans
+            when polling. Defaults to DEFAULT_POLL_INTERVAL.
+        polling: If True, poll even where inotify is available. Defaults to
+            False.
+        stop: Event that ends the watch once set. Defaults to None (watch
+            until the generator is closed).
+
+    Yields:
+        Lists of the paths that became ready, in the order they did. An empty
+        list is yielded whenever poll_interval passes without any, so callers
+        can do other work between files.
+    """
+    seen: dict[str, tuple[int, int]] = {}
+
+    def new_files(paths: Iterable[str]) -> list[str]:
+        files = []
+        for path in paths:
+            if not is_selected(
+                root, path, ext_list, recursive, include, exclude, max_depth
+            ):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if seen.get(path) != state:
+                seen[path] = state
+                files.append(path)
+        return files
+
+    with open_watcher(
+        root, ext_list, recursive, max_depth, poll_interval, polling
+    ) as watcher:
+        yield new_files(
+            iter_files(root, ext_list, recursive, include, exclude, max_depth)
+        )
+        while stop is None or not stop.is_set():
+            yield new_files(watcher.wait(poll_interval))
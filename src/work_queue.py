@@ -0,0 +1,274 @@
+"""SQLite work queue that lets several workers and hosts share one batch."""
+
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from constants import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS
+
+__all__ = ["JOB_STATES", "Job", "WorkQueue", "default_worker_id"]
+
+logger = logging.getLogger(__name__)
+
+# A job is pending until a worker claims it, leased while that worker holds
+# it, and done or failed once it is finished.
+JOB_STATES: tuple[str, ...] = ("pending", "leased", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    file_path TEXT NOT NULL UNIQUE,
+    relative_dir TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+# Seconds a connection waits for another worker's transaction to finish.
+_BUSY_TIMEOUT_S = 60.0
+
+
+def default_worker_id() -> str:
+    """Return an id unique to this process across hosts: "hostname:pid"."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass(frozen=True)
+class Job:
+    """A file claimed from a WorkQueue.
+
+    Attributes:
+        id: Row id of the job in the queue.
+        file_path: Path of the file to process.
+        relative_dir: Directory of the file relative to the enqueued
+            directory, or None if outputs do not mirror the input tree.
+        attempts: Number of times the job has been claimed, this time
+            included.
+    """
+
+    id: int
+    file_path: str
+    relative_dir: str | None
+    attempts: int
+
+
+class WorkQueue:
+    """Queue of files that any number of workers claim under time-limited leases.
+
+    The queue is a SQLite database, so workers on several hosts can share one
+    on a common volume, and every change is a transaction, so two workers never
+    claim the same file. A claimed job is leased to its worker for
+    lease_seconds; the worker renews the lease with heartbeat while it works
+    and then marks the job complete or failed. If the worker dies, its lease
+    runs out and the next claim hands the job to another worker. A job is
+    tried at most max_attempts times, whether its attempts failed or timed
+    out, and is then marked failed.
+
+    Each method opens its own short-lived connection, so a WorkQueue can be
+    used from several threads and sent to other processes. The database keeps
+    SQLite's default rollback journal, which, unlike WAL, works on network
+    file systems with working POSIX locks (e.g. NFSv4); leases are compared
+    against each host's wall clock, so hosts need synchronized clocks.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> None:
+        """Init method for the WorkQueue class.
+
+        Creates the database if it does not exist yet.
+
+        Args:
+            path: SQLite database file.
+            lease_seconds: How long a claim lasts without a heartbeat.
+                Defaults to DEFAULT_LEASE_SECONDS.
+            max_attempts: How many times a job is claimed before it is
+                marked failed. Defaults to DEFAULT_MAX_ATTEMPTS.
+
+        Raises:
+            ValueError: If lease_seconds is not positive or max_attempts is
+                less than 1.
+        """
+        if lease_seconds <= 0:
+            raise ValueError(f"lease_seconds must be positive, got {lease_seconds}.")
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}.")
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._transaction() as db:
+            db.execute(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yield a connection inside a write transaction, committed on exit."""
+        db = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT_S, isolation_level=None)
+        try:
+            # Take the write lock up front, so a read-then-update (a claim)
+            # cannot interleave with another worker's.
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def enqueue(self, jobs: Iterable[tuple[str, str | None]]) -> int:
+        """Add files to the queue, ignoring the ones it already has.
+
+        Every worker can enqueue the same directory: each file is only ever
+        added once, whatever state its job is in.
+
+        Args:
+            jobs: (file path, relative dir) pairs, see Job.
+
+        Returns:
+            How many files were new.
+        """
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (file_path, relative_dir) VALUES (?, ?)",
+                jobs,
+            )
+            return db.total_changes - before
+
+    def claim(self, worker: str) -> Job | None:
+        """Lease the oldest pending job, or one whose lease ran out, to worker.
+
+        Jobs whose lease ran out on their last attempt are marked failed
+        instead of being handed out again.
+
+        Args:
+            worker: Id of the claiming worker, see default_worker_id.
+
+        Returns:
+            The claimed job, or None if no job is available right now.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET state = 'failed', owner = NULL, lease_until = NULL,"
+                " error = 'Lease expired on the last attempt.'"
+                " WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT id, file_path, relative_dir, attempts, owner FROM jobs"
+                " WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)"
+                " ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, file_path, relative_dir, attempts, owner = row
+            if owner is not None:
+                logger.warning(
+                    "Lease of %s held by %s expired; reclaiming it.", file_path, owner
+                )
+            db.execute(
+                "UPDATE jobs SET state = 'leased', owner = ?, lease_until = ?,"
+                " attempts = attempts + 1 WHERE id = ?",
+                (worker, now + self.lease_seconds, job_id),
+            )
+        return Job(job_id, file_path, relative_dir, attempts + 1)
+
+    def _update_owned(
+        self, job: Job, worker: str, assignments: str, *values: object
+    ) -> bool:
+        """Update a job if worker still holds its lease; return whether it did.
+
+        assignments is always one of this class's literal SET clauses, never
+        caller input; values fill its placeholders.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                f"UPDATE jobs SET {assignments}"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (*values, job.id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job: Job, worker: str) -> bool:
+        """Extend worker's lease on job by another lease_seconds.
+
+        Returns:
+            False if the lease was lost (it ran out and the job was claimed
+            again), in which case the worker's result will be discarded.
+        """
+        return self._update_owned(
+            job, worker, "lease_until = ?", time.time() + self.lease_seconds
+        )
+
+    def complete(self, job: Job, worker: str) -> bool:
+        """Mark job done.
+
+        Returns:
+            False if worker no longer held the lease, and the job was left to
+            its new owner.
+        """
+        return self._update_owned(
+            job,
+            worker,
+            "state = 'done', owner = NULL, lease_until = NULL, error = NULL",
+        )
+
+    def fail(self, job: Job, worker: str, error: str) -> bool:
+        """Record a failed attempt: retry job later, or mark it failed for good.
+
+        Returns:
+            False if worker no longer held the lease, and the job was left to
+            its new owner.
+        """
+        return self._update_owned(
+            job,
+            worker,
+            "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+            " owner = NULL, lease_until = NULL, error = ?",
+            self.max_attempts,
+            error,
+        )
+
+    def release(self, job: Job, worker: str) -> bool:
+        """Give job back unprocessed, without counting the attempt.
+
+        Returns:
+            False if worker no longer held the lease.
+        """
+        return self._update_owned(
+            job,
+            worker,
+            "state = 'pending', owner = NULL, lease_until = NULL,"
+            " attempts = attempts - 1",
+        )
+
+    def counts(self) -> dict[str, int]:
+        """Return the number of jobs in each of JOB_STATES."""
+        with self._transaction() as db:
+            rows = db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            counts = dict.fromkeys(JOB_STATES, 0)
+            counts.update(rows.fetchall())
+        return counts
+
+    def failures(self) -> dict[str, str]:
+        """Return the error of every failed job, keyed by file path."""
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT file_path, error FROM jobs WHERE state = 'failed' ORDER BY id"
+            )
+            return dict(rows.fetchall())
@@ -1,5 +1,6 @@
 """Shared pytest fixtures for the audio-extractor test suite."""
 
+import contextlib
 from pathlib import Path
 from unittest.mock import MagicMock
 
@@ -21,3 +22,20 @@ def mock_path_is_file(mocker: MockerFixture) -> MagicMock:
         The patch mock object for Path.is_file.
     """
     return mocker.patch.object(Path, "is_file", return_value=True)
+
+
+@pytest.fixture
+def direct_outputs(mocker: MockerFixture) -> None:
+    """Make the stages write their outputs straight to the final path.
+
+    Use this fixture in tests that mock the writer (moviepy, ffmpeg, pydub), so
+    no file ever appears at atomic_output's temporary path.
+
+    Args:
+        mocker: The pytest-mock fixture.
+    """
+    for module in ("audio_extractor", "audio_normalizer"):
+        mocker.patch(
+            f"{module}.atomic_output",
+            side_effect=lambda path: contextlib.nullcontext(Path(path)),
+        )
@@ -0,0 +1,94 @@
+"""Tests for the NumPy-backed AudioBuffer and dBFS helpers."""
+
+import math
+import struct
+
+import numpy as np
+import pytest
+
+from audio_buffer import AudioBuffer, dbfs_from_sum_squares
+
+
+def _s16(*samples: int) -> bytearray:
+    return bytearray(struct.pack(f"<{len(samples)}h", *samples))
+
+
+class TestAudioBufferInit:
+    """Verifies zero-copy construction and input validation."""
+
+    def test_samples_are_a_view_over_data(self):
+        data = _s16(1, 2, 3, 4)
+        buffer = AudioBuffer(data, channels=2, sample_rate=44100)
+
+        data[0:2] = struct.pack("<h", 100)
+
+        assert buffer.samples[0] == 100
+
+    def test_reports_frames_and_duration(self):
+        buffer = AudioBuffer(_s16(*range(8)), channels=2, sample_rate=4)
+        assert buffer.frame_count == 4
+        assert buffer.duration_seconds == 1.0
+        assert buffer.frames().shape == (4, 2)
+
+    def test_rejects_partial_frames(self):
+        with pytest.raises(ValueError, match="frame"):
+            AudioBuffer(_s16(1, 2, 3), channels=2, sample_rate=44100)
+
+    def test_rejects_unknown_format(self):
+        with pytest.raises(ValueError, match="sample format"):
+            AudioBuffer(_s16(1, 2), channels=1, sample_rate=44100, sample_format="u8")
+
+
+class TestAudioBufferAnalysis:
+    """Verifies RMS, peak, and dBFS against known signals."""
+
+    def test_half_scale_square_wave(self):
+        buffer = AudioBuffer(_s16(16384, -16384), channels=1, sample_rate=44100)
+        assert buffer.rms == 16384
+        assert buffer.peak == 16384
+        assert buffer.dbfs == pytest.approx(20 * math.log10(0.5))
+
+    def test_peak_uses_most_negative_sample(self):
+        buffer = AudioBuffer(_s16(100, -32768), channels=1, sample_rate=44100)
+        assert buffer.peak == 32768
+        assert buffer.max_dbfs == 0.0
+
+    def test_silence_is_negative_infinity(self):
+        buffer = AudioBuffer(_s16(0, 0), channels=1, sample_rate=44100)
+        assert buffer.dbfs == -math.inf
+        assert buffer.max_dbfs == -math.inf
+
+    def test_float_samples_are_full_scale_at_one(self):
+        data = bytearray(np.array([0.5, -0.5], dtype="<f4").tobytes())
+        buffer = AudioBuffer(data, channels=1, sample_rate=44100, sample_format="f32")
+        assert buffer.dbfs == pytest.approx(20 * math.log10(0.5))
+
+    def test_matches_dbfs_from_sum_squares(self):
+        buffer = AudioBuffer(_s16(1000, -2000, 3000), channels=1, sample_rate=8000)
+        expected = dbfs_from_sum_squares(1000**2 + 2000**2 + 3000**2, 3)
+        assert buffer.dbfs == pytest.approx(expected)
+
+
+class TestAudioBufferApplyGain:
+    """Verifies in-place gain, rounding, and clipping."""
+
+    def test_scales_in_place(self):
+        data = _s16(1000, -1000)
+        AudioBuffer(data, channels=1, sample_rate=44100).apply_gain(20 * math.log10(2))
+        assert struct.unpack("<2h", data) == (2000, -2000)
+
+    def test_clips_to_sample_range(self):
+        data = _s16(20000, -20000)
+        AudioBuffer(data, channels=1, sample_rate=44100).apply_gain(12.0)
+        assert struct.unpack("<2h", data) == (32767, -32768)
+
+    def test_float_samples_are_scaled(self):
+        data = bytearray(np.array([0.25], dtype="<f4").tobytes())
+        buffer = AudioBuffer(data, channels=1, sample_rate=44100, sample_format="f32")
+        buffer.apply_gain(20 * math.log10(2))
+        assert buffer.samples[0] == pytest.approx(0.5)
+
+    def test_rejects_read_only_data(self):
+        buffer = AudioBuffer(bytes(_s16(1, 2)), channels=1, sample_rate=44100)
+        with pytest.raises(ValueError, match="read-only"):
+            buffer.apply_gain(3.0)
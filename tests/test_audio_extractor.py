@@ -1,32 +1,93 @@
 """Tests for the AudioExtractor class and its process_file behaviour."""
 
+import asyncio
 from pathlib import Path
 from unittest.mock import MagicMock
 
 import pytest
 from pytest_mock import MockerFixture
 
-from audio_extractor import AudioExtractor
+import audio_extractor
+from audio_extractor import AudioExtractor, _plan_segments, extract_audio
 from constants import EXTRACTED_DIR
+from ffmpeg_utils import FFmpegProgress
+from mp3_frames import crc16_lame, iter_frames, read_encoder_padding
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz stereo: 417-byte frames of 1152 samples.
+_FRAME_BYTES = 417
+_FRAME_SAMPLES = 1152
+_ENCODER_DELAY = 576
 
 
 @pytest.fixture
-def mock_clip_env(mocker: MockerFixture) -> tuple[MagicMock, MagicMock]:
-    """Patch is_file, VideoFileClip, and mkdir for AudioExtractor process_file tests.
+def mock_clip_env(
+    mocker: MockerFixture, direct_outputs: None
+) -> tuple[MagicMock, MagicMock]:
+    """Patch is_file, AudioFileClip, and mkdir for AudioExtractor process_file tests.
+
+    Outputs are written straight to their final paths (see direct_outputs).
 
     Args:
         mocker: The pytest-mock fixture.
+        direct_outputs: The direct_outputs fixture.
 
     Returns:
         A tuple of (mock_clip, mock_mkdir).
     """
     mocker.patch.object(Path, "is_file", return_value=True)
     mock_clip = mocker.MagicMock()
-    mocker.patch("audio_extractor.VideoFileClip", return_value=mock_clip)
+    mocker.patch("moviepy.AudioFileClip", return_value=mock_clip)
     mock_mkdir = mocker.patch.object(Path, "mkdir")
     return mock_clip, mock_mkdir
 
 
+def _fake_mp3(first_frame: int, sample_count: int) -> bytes:
+    """Build the mp3 an encoder would write for sample_count samples.
+
+    The body of every audio frame holds its index in the whole output, counting
+    from first_frame, so tests can tell which frames were joined.
+    """
+    frame_count = -(-(sample_count + _ENCODER_DELAY) // _FRAME_SAMPLES)
+    padding = frame_count * _FRAME_SAMPLES - _ENCODER_DELAY - sample_count
+    info = bytearray(_FRAME_BYTES)
+    info[:4] = b"\xff\xfb\x90\x00"
+    tag = (
+        b"Info"
+        + (0xF).to_bytes(4, "big")
+        + frame_count.to_bytes(4, "big")
+        + bytes(4 + 100 + 4)
+        + b"LAME3.100"
+        + bytes(12)
+        + (_ENCODER_DELAY << 12 | padding).to_bytes(3, "big")
+    )
+    info[36 : 36 + len(tag)] = tag
+    crc_at = 36 + 120 + 34
+    info[crc_at : crc_at + 2] = crc16_lame(info[:crc_at]).to_bytes(2, "big")
+    frames = b"".join(
+        b"\xff\xfb\x90\x00"
+        + bytes(32)
+        + (first_frame + index).to_bytes(4, "big")
+        + bytes(_FRAME_BYTES - 40)
+        for index in range(frame_count)
+    )
+    return bytes(info) + frames
+
+
+def _fake_ffmpeg(sample_count: int):
+    """Return a run_ffmpeg stand-in that decodes and encodes synthetic audio."""
+
+    def run(args: list[str]) -> None:
+        output = Path(args[-1])
+        if "-skip_initial_bytes" not in args:
+            output.write_bytes(bytes(sample_count * 4))
+            return
+        start = int(args[args.index("-skip_initial_bytes") + 1]) // 4
+        count = int(args[args.index("-af") + 1].removeprefix("atrim=end_sample="))
+        output.write_bytes(_fake_mp3(start // _FRAME_SAMPLES, count))
+
+    return run
+
+
 class TestAudioExtractorInit:
     """Verifies constructor validation and attribute assignment."""
 
@@ -52,21 +113,33 @@ class TestAudioExtractorInit:
         ae = AudioExtractor("/some/path/my_video.mp4")
         assert ae.audio_dir == EXTRACTED_DIR
 
+    def test_audio_dir_mirrors_relative_dir(self, mock_path_is_file):
+        ae = AudioExtractor("/some/path/my_video.mp4", relative_dir="2024/jan")
+        assert ae.audio_dir == EXTRACTED_DIR / "2024" / "jan"
+
 
 class TestAudioExtractorGetClip:
-    """Verifies that get_clip loads the video file via VideoFileClip."""
+    """Verifies that get_clip loads only the audio stream via AudioFileClip."""
 
-    def test_get_clip_calls_video_file_clip(self, mocker):
+    def test_get_clip_calls_audio_file_clip(self, mocker):
         mocker.patch.object(Path, "is_file", return_value=True)
         mock_clip = mocker.MagicMock()
-        mock_vfc = mocker.patch("audio_extractor.VideoFileClip", return_value=mock_clip)
+        mock_afc = mocker.patch("moviepy.AudioFileClip", return_value=mock_clip)
 
         ae = AudioExtractor("/some/path/my_video.mp4")
         result = ae.get_clip()
 
-        mock_vfc.assert_called_once_with("/some/path/my_video.mp4")
+        mock_afc.assert_called_once_with("/some/path/my_video.mp4")
         assert result is mock_clip
 
+    def test_get_clip_raises_when_no_audio_track(self, mocker):
+        mocker.patch.object(Path, "is_file", return_value=True)
+        mocker.patch("moviepy.AudioFileClip", side_effect=KeyError("audio"))
+
+        ae = AudioExtractor("/some/path/my_video.mp4")
+        with pytest.raises(ValueError, match="no audio track"):
+            ae.get_clip()
+
 
 class TestAudioExtractorProcessFile:
     """Verifies extraction behaviour, output path construction, and clip cleanup."""
@@ -84,7 +157,7 @@ class TestAudioExtractorProcessFile:
         ae.process_file()
 
         expected_path = ae.audio_dir / "my_video.mp3"
-        mock_clip.audio.write_audiofile.assert_called_once_with(expected_path)
+        mock_clip.write_audiofile.assert_called_once_with(expected_path, logger=None)
 
     def test_process_file_uses_custom_name_in_path(self, mock_clip_env):
         mock_clip, _ = mock_clip_env
@@ -92,7 +165,7 @@ class TestAudioExtractorProcessFile:
         ae.process_file()
 
         expected_path = ae.audio_dir / "custom_name.mp3"
-        mock_clip.audio.write_audiofile.assert_called_once_with(expected_path)
+        mock_clip.write_audiofile.assert_called_once_with(expected_path, logger=None)
 
     def test_process_file_closes_clip_on_success(self, mock_clip_env):
         mock_clip, _ = mock_clip_env
@@ -103,7 +176,7 @@ class TestAudioExtractorProcessFile:
 
     def test_process_file_closes_clip_on_error(self, mock_clip_env):
         mock_clip, _ = mock_clip_env
-        mock_clip.audio.write_audiofile.side_effect = RuntimeError("write failed")
+        mock_clip.write_audiofile.side_effect = RuntimeError("write failed")
         ae = AudioExtractor("/some/path/my_video.mp4")
 
         with pytest.raises(RuntimeError):
@@ -111,13 +184,258 @@ class TestAudioExtractorProcessFile:
 
         mock_clip.close.assert_called_once()
 
-    def test_process_file_raises_when_no_audio_track(self, mock_clip_env):
-        mock_clip, mock_mkdir = mock_clip_env
-        mock_clip.audio = None
+    def test_process_file_raises_when_no_audio_track(self, mock_clip_env, mocker):
+        _, mock_mkdir = mock_clip_env
+        mocker.patch("moviepy.AudioFileClip", side_effect=KeyError("audio"))
         ae = AudioExtractor("/some/path/my_video.mp4")
 
         with pytest.raises(ValueError, match="no audio track"):
             ae.process_file()
 
         mock_mkdir.assert_not_called()
-        mock_clip.close.assert_called_once()
+
+
+class TestAudioExtractorAtomicOutput:
+    """Verifies that an interrupted extraction leaves no truncated mp3 behind."""
+
+    @pytest.fixture
+    def clip(self, mocker, tmp_path):
+        mocker.patch.object(Path, "is_file", return_value=True)
+        mocker.patch.object(audio_extractor, "EXTRACTED_DIR", tmp_path)
+        clip = mocker.MagicMock(duration=1.0)
+        mocker.patch("moviepy.AudioFileClip", return_value=clip)
+        return clip
+
+    def test_writes_to_temporary_file_then_renames(self, clip, tmp_path):
+        clip.write_audiofile.side_effect = lambda path, **_: path.write_bytes(b"mp3")
+
+        ae = AudioExtractor("/some/path/my_video.mp4")
+        ae.process_file()
+
+        written = clip.write_audiofile.call_args.args[0]
+        assert written != ae.output_path
+        assert written.suffix == ".mp3"
+        assert [p.name for p in tmp_path.iterdir()] == ["my_video.mp3"]
+        assert ae.output_path.read_bytes() == b"mp3"
+
+    def test_failed_write_leaves_no_output(self, clip, tmp_path):
+        def write_then_fail(path, **_):
+            path.write_bytes(b"trunc")
+            raise RuntimeError("killed")
+
+        clip.write_audiofile.side_effect = write_then_fail
+
+        with pytest.raises(RuntimeError):
+            AudioExtractor("/some/path/my_video.mp4").process_file()
+
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestAudioExtractorCopyStream:
+    """Verifies stream-copy extraction and the fallback to transcoding."""
+
+    def test_copy_stream_defaults_to_false(self, mock_path_is_file):
+        ae = AudioExtractor("/some/path/my_video.mp4")
+        assert ae.copy_stream is False
+
+    @pytest.mark.parametrize(("codec", "ext"), [("mp3", "mp3"), ("aac", "m4a")])
+    def test_copies_supported_codec_without_decoding(
+        self, mock_clip_env, mocker, codec, ext
+    ):
+        mock_clip, _ = mock_clip_env
+        mocker.patch(
+            "audio_extractor.probe_audio_stream", return_value={"codec_name": codec}
+        )
+        mock_run = mocker.patch("audio_extractor.run_ffmpeg")
+        ae = AudioExtractor("/some/path/my_video.mp4", copy_stream=True)
+        ae.process_file()
+
+        args = mock_run.call_args.args[0]
+        assert args[args.index("-c:a") + 1] == "copy"
+        assert args[-1] == str(ae.audio_dir / f"my_video.{ext}")
+        mock_clip.write_audiofile.assert_not_called()
+
+    def test_transcodes_unsupported_codec(self, mock_clip_env, mocker):
+        mock_clip, _ = mock_clip_env
+        mocker.patch(
+            "audio_extractor.probe_audio_stream", return_value={"codec_name": "opus"}
+        )
+        mock_run = mocker.patch("audio_extractor.run_ffmpeg")
+        ae = AudioExtractor("/some/path/my_video.mp4", copy_stream=True)
+        ae.process_file()
+
+        mock_run.assert_not_called()
+        mock_clip.write_audiofile.assert_called_once_with(
+            ae.audio_dir / "my_video.mp3", logger=None
+        )
+
+    def test_raises_when_no_audio_stream(self, mock_clip_env, mocker):
+        mocker.patch("audio_extractor.probe_audio_stream", return_value=None)
+        ae = AudioExtractor("/some/path/my_video.mp4", copy_stream=True)
+
+        with pytest.raises(ValueError, match="no audio track"):
+            ae.process_file()
+
+
+class TestPlanSegments:
+    """Verifies that segment ranges line up with the frames of one encode."""
+
+    @pytest.mark.parametrize("sample_count", [44100 * 600, 44100 * 600 + 7, 30000000])
+    @pytest.mark.parametrize("segments", [2, 3, 8])
+    def test_kept_frames_cover_the_output_once(self, sample_count, segments):
+        plan = _plan_segments(sample_count, segments)
+
+        kept = []
+        for segment in plan:
+            assert segment.start_sample % _FRAME_SAMPLES == 0
+            first = segment.start_sample // _FRAME_SAMPLES
+            stop = segment.keep_to
+            if stop is None:
+                stop = -(-(segment.sample_count + _ENCODER_DELAY) // _FRAME_SAMPLES)
+            kept += range(first + segment.keep_from, first + stop)
+        assert len(plan) == segments
+        assert kept == list(range(-(-(sample_count + 576) // _FRAME_SAMPLES)))
+        assert plan[-1].start_sample + plan[-1].sample_count == sample_count
+
+    def test_short_audio_is_not_split(self):
+        assert len(_plan_segments(44100 * 5, 8)) == 1
+
+
+class TestAudioExtractorSegmented:
+    """Verifies parallel segment encodes and their gapless join."""
+
+    def test_rejects_fewer_than_one_segment(self, mock_path_is_file):
+        with pytest.raises(ValueError, match="at least 1"):
+            AudioExtractor("/some/path/my_video.mp4", segments=0)
+
+    def test_joins_segments_into_one_gapless_mp3(self, mocker, tmp_path):
+        vid_path = tmp_path / "my_video.mp4"
+        vid_path.write_bytes(b"video")
+        sample_count = 44100 * 90 + 22050
+        mock_clip = mocker.MagicMock(duration=sample_count / 44100)
+        mocker.patch("moviepy.AudioFileClip", return_value=mock_clip)
+        mock_run = mocker.patch(
+            "audio_extractor.run_ffmpeg", side_effect=_fake_ffmpeg(sample_count)
+        )
+        mocker.patch.object(audio_extractor, "EXTRACTED_DIR", tmp_path / "out")
+        ae = AudioExtractor(str(vid_path), segments=3)
+
+        ae.process_file()
+
+        data = ae.output_path.read_bytes()
+        frames = list(iter_frames(data))
+        indices = [
+            int.from_bytes(data[frame.offset + 36 : frame.offset + 40], "big")
+            for frame in frames[1:]
+        ]
+        frame_count = -(-(sample_count + _ENCODER_DELAY) // _FRAME_SAMPLES)
+        assert indices == list(range(frame_count))
+        assert read_encoder_padding(data, frames[0]) == (
+            _ENCODER_DELAY,
+            frame_count * _FRAME_SAMPLES - _ENCODER_DELAY - sample_count,
+        )
+        assert mock_run.call_count == 4
+        assert ae.audio_seconds == sample_count / 44100
+        mock_clip.write_audiofile.assert_not_called()
+        assert [path.name for path in ae.audio_dir.iterdir()] == ["my_video.mp3"]
+
+    def test_cuts_audio_to_the_clip_duration(self, mocker, tmp_path):
+        vid_path = tmp_path / "my_video.mp4"
+        vid_path.write_bytes(b"video")
+        mocker.patch("moviepy.AudioFileClip").return_value.duration = 60.0
+        mock_run = mocker.patch(
+            "audio_extractor.run_ffmpeg", side_effect=_fake_ffmpeg(44100 * 61)
+        )
+        mocker.patch.object(audio_extractor, "EXTRACTED_DIR", tmp_path / "out")
+        ae = AudioExtractor(str(vid_path), segments=2)
+
+        ae.process_file()
+
+        last = mock_run.call_args_list[-1].args[0]
+        start = int(last[last.index("-skip_initial_bytes") + 1]) // 4
+        trim = last[last.index("-af") + 1]
+        assert start + int(trim.removeprefix("atrim=end_sample=")) == 44100 * 60
+        assert ae.audio_seconds == 60.0
+
+
+class TestAudioExtractorAsync:
+    """Verifies that process_file_async runs ffmpeg instead of moviepy."""
+
+    @pytest.fixture
+    def mock_run_async(self, mock_clip_env, mocker):
+        return mocker.patch("audio_extractor.run_ffmpeg_async")
+
+    @pytest.fixture(autouse=True)
+    def mock_probe_async(self, mocker):
+        return mocker.patch(
+            "audio_extractor.probe_audio_stream_async",
+            return_value={"codec_name": "aac"},
+        )
+
+    def test_transcodes_to_mp3_with_ffmpeg(self, mock_clip_env, mock_run_async):
+        mock_clip, _ = mock_clip_env
+        on_progress = MagicMock()
+        ae = AudioExtractor("/some/path/my_video.mp4")
+
+        asyncio.run(ae.process_file_async(on_progress))
+
+        args, progress = mock_run_async.call_args.args
+        assert args[args.index("-c:a") + 1] == "libmp3lame"
+        assert args[args.index("-ar") + 1] == "44100"
+        assert args[args.index("-ac") + 1] == "2"
+        assert args[args.index("-b:a") + 1] == "128k"
+        assert args[-1] == str(ae.audio_dir / "my_video.mp3")
+        assert ae.output_path == ae.audio_dir / "my_video.mp3"
+        report = FFmpegProgress(out_time=12.5, speed=3.0, done=True)
+        progress(report)
+        on_progress.assert_called_once_with(report)
+        assert ae.audio_seconds == 12.5
+        mock_clip.write_audiofile.assert_not_called()
+
+    def test_copies_supported_codec(self, mock_run_async, mocker):
+        mocker.patch(
+            "audio_extractor.probe_audio_stream_async",
+            return_value={"codec_name": "aac"},
+        )
+        ae = AudioExtractor("/some/path/my_video.mp4", copy_stream=True)
+
+        asyncio.run(ae.process_file_async())
+
+        args = mock_run_async.call_args.args[0]
+        assert args[args.index("-c:a") + 1] == "copy"
+        assert ae.output_path == ae.audio_dir / "my_video.m4a"
+
+    def test_transcodes_unsupported_codec(self, mock_run_async, mocker):
+        mocker.patch(
+            "audio_extractor.probe_audio_stream_async",
+            return_value={"codec_name": "opus"},
+        )
+        ae = AudioExtractor("/some/path/my_video.mp4", copy_stream=True)
+
+        asyncio.run(ae.process_file_async())
+
+        args = mock_run_async.call_args.args[0]
+        assert args[args.index("-c:a") + 1] == "libmp3lame"
+
+    def test_video_without_audio_raises_value_error(
+        self, mock_run_async, mock_probe_async
+    ):
+        mock_probe_async.return_value = None
+        ae = AudioExtractor("/some/path/my_video.mp4")
+
+        with pytest.raises(ValueError, match="no audio track"):
+            asyncio.run(ae.process_file_async())
+
+        mock_run_async.assert_not_called()
+
+
+class TestExtractAudio:
+    """Verifies in-memory extraction in moviepy's output format."""
+
+    def test_decodes_to_44100_hz_stereo(self, mocker):
+        mock_read = mocker.patch("audio_extractor.read_audio")
+
+        buffer = extract_audio(b"video bytes")
+
+        mock_read.assert_called_once_with(b"video bytes", 44100, 2)
+        assert buffer is mock_read.return_value
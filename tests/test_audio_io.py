@@ -0,0 +1,184 @@
+"""Tests for in-memory audio inputs and outputs."""
+
+import io
+import os
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+from audio_buffer import AudioBuffer
+from audio_io import read_audio, read_encoded, write_audio
+
+linux_only = pytest.mark.skipif(sys.platform != "linux", reason="needs memfd")
+
+
+def _wav(pcm: bytes, sample_rate: int = 8000, channels: int = 2) -> bytes:
+    """Return a WAV file as ffmpeg writes it to a pipe, sizes left unset."""
+    fmt = struct.pack("<HHIIHH", 1, channels, sample_rate, 0, 0, 16)
+    return (
+        b"RIFF\xff\xff\xff\xffWAVE"
+        + b"fmt "
+        + struct.pack("<I", len(fmt))
+        + fmt
+        + b"data\xff\xff\xff\xff"
+        + pcm
+    )
+
+
+def _fake_ffmpeg(mocker, output: bytes):
+    """Patch pipe_ffmpeg to write output to the command's last argument."""
+    calls = []
+
+    def fake(args, input_data=None, pass_fds=()):
+        url = args[-1]
+        source = args[args.index("-i") + 1]
+        if source.startswith("/dev/fd/"):
+            fd = int(source.rsplit("/", 1)[1])
+            input_data = os.pread(fd, os.fstat(fd).st_size, 0)
+        calls.append((args, bytes(input_data or b""), tuple(pass_fds)))
+        if url == "pipe:1":
+            return output
+        if url.startswith("/dev/fd/"):
+            os.write(int(url.rsplit("/", 1)[1]), output)
+        else:
+            Path(url).write_bytes(output)
+        return b""
+
+    mocker.patch("audio_io.pipe_ffmpeg", side_effect=fake)
+    return calls
+
+
+@pytest.fixture
+def no_memfd(mocker):
+    mocker.patch("audio_io._HAS_MEMFD", False)
+
+
+class TestReadEncoded:
+    """Verifies reading encoded audio from each kind of source."""
+
+    def test_bytes_are_returned_as_is(self):
+        data = bytearray(b"mp3")
+
+        assert read_encoded(data) is data
+
+    def test_reads_paths_and_streams(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(b"file")
+
+        assert read_encoded(path) == b"file"
+        assert read_encoded(io.BytesIO(b"stream")) == b"stream"
+
+
+class TestReadAudio:
+    """Verifies decoding from memory through pipes and memfds."""
+
+    def test_buffer_in_requested_format_is_returned_as_is(self):
+        buffer = AudioBuffer(bytearray(8), 2, 8000)
+
+        assert read_audio(buffer, 8000, 2) is buffer
+        assert read_audio(buffer) is buffer
+
+    def test_decodes_bytes_through_stdin(self, mocker, no_memfd):
+        pcm = struct.pack("<4h", 1, 2, 3, 4)
+        calls = _fake_ffmpeg(mocker, _wav(pcm))
+
+        buffer = read_audio(b"encoded")
+
+        args, input_data, _ = calls[0]
+        assert args[args.index("-i") + 1] == "pipe:0"
+        assert input_data == b"encoded"
+        assert (buffer.sample_rate, buffer.channels) == (8000, 2)
+        assert list(buffer.samples) == [1, 2, 3, 4]
+        assert buffer.samples.flags.writeable
+
+    @linux_only
+    def test_decodes_stream_through_memfds(self, mocker):
+        pcm = struct.pack("<4h", 5, 6, 7, 8)
+        calls = _fake_ffmpeg(mocker, _wav(pcm))
+
+        buffer = read_audio(io.BytesIO(b"encoded"))
+
+        args, input_data, pass_fds = calls[0]
+        assert args[args.index("-i") + 1].startswith("/dev/fd/")
+        assert input_data == b"encoded"
+        assert len(pass_fds) == 2
+        assert list(buffer.samples) == [5, 6, 7, 8]
+
+    def test_paths_are_passed_to_ffmpeg(self, mocker):
+        calls = _fake_ffmpeg(mocker, _wav(b""))
+
+        read_audio("/videos/a.mp4", 44100, 2)
+
+        args, _, _ = calls[0]
+        assert args[args.index("-i") + 1] == "/videos/a.mp4"
+        assert args[args.index("-ar") + 1] == "44100"
+        assert args[args.index("-ac") + 1] == "2"
+
+    def test_resamples_buffer_from_raw_pcm(self, mocker, no_memfd):
+        calls = _fake_ffmpeg(mocker, _wav(bytes(4), 44100, 1))
+        buffer = AudioBuffer(bytearray(8), 2, 8000)
+
+        resampled = read_audio(buffer, 44100, 1)
+
+        args, input_data, _ = calls[0]
+        assert args[: args.index("-i")] == ["-f", "s16le", "-ar", "8000", "-ac", "2"]
+        assert input_data == bytes(8)
+        assert (resampled.sample_rate, resampled.channels) == (44100, 1)
+
+    def test_rejects_output_without_wav_header(self, mocker):
+        _fake_ffmpeg(mocker, b"not a wav")
+
+        with pytest.raises(ValueError, match="WAV header"):
+            read_audio(b"encoded")
+
+    def test_rejects_unknown_sample_format(self):
+        with pytest.raises(ValueError, match="Unknown sample format"):
+            read_audio(b"encoded", sample_format="s24")
+
+
+class TestWriteAudio:
+    """Verifies encoding to paths and streams."""
+
+    def test_encodes_buffer_to_path_with_tags(self, mocker, tmp_path):
+        calls = _fake_ffmpeg(mocker, b"encoded mp3")
+        buffer = AudioBuffer(bytearray(8), 2, 8000)
+        path = tmp_path / "a.mp3"
+
+        write_audio(buffer, path, {"artist": "Me", "title": "Intro"})
+
+        args, input_data, _ = calls[0]
+        assert args[-1] != str(path)
+        assert args[-1].endswith(".mp3")
+        assert [p.name for p in tmp_path.iterdir()] == ["a.mp3"]
+        assert path.read_bytes() == b"encoded mp3"
+        assert input_data == bytes(8)
+        assert "artist=Me" in args
+        assert "title=Intro" in args
+        assert args[args.index("-id3v2_version") + 1] == "3"
+        assert args[args.index("-f", args.index("-i")) + 1] == "mp3"
+
+    def test_writes_to_stream_through_stdout(self, mocker, no_memfd):
+        calls = _fake_ffmpeg(mocker, b"encoded mp3")
+        out = io.BytesIO()
+
+        write_audio(b"wav data", out, audio_format="wav", codec="copy")
+
+        args, input_data, _ = calls[0]
+        assert args[-1] == "pipe:1"
+        assert args[args.index("-c:a") + 1] == "copy"
+        assert "-id3v2_version" not in args
+        assert input_data == b"wav data"
+        assert out.getvalue() == b"encoded mp3"
+
+    @linux_only
+    def test_writes_to_stream_through_memfd(self, mocker):
+        calls = _fake_ffmpeg(mocker, b"seekable mp3")
+        out = io.BytesIO()
+
+        write_audio(AudioBuffer(bytearray(8), 2, 8000), out)
+
+        args, _, _ = calls[0]
+        assert args[-1].startswith("/dev/fd/")
+        assert out.getvalue() == b"seekable mp3"
@@ -1,11 +1,17 @@
 """Tests for the AudioNormalizer class and its process_file behaviour."""
 
+import asyncio
+import math
+import struct
 from pathlib import Path
 
+import numpy as np
 import pytest
 
-from audio_normalizer import AudioNormalizer, FileNotSupportedError
-from constants import NORMALIZED_DIR
+from audio_buffer import AudioBuffer
+from audio_normalizer import AudioNormalizer, FileNotSupportedError, normalize_audio
+from constants import NORMALIZED_DIR, STREAM_CHUNK_FRAMES
+from ffmpeg_utils import FFmpegError
 
 
 class TestAudioNormalizerInit:
@@ -36,6 +42,21 @@ class TestAudioNormalizerInit:
         an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
         assert an.normalized_dir == NORMALIZED_DIR
 
+    def test_mode_defaults_to_dbfs(self, mock_path_is_file):
+        an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
+        assert an.mode == "dbfs"
+        assert an.true_peak is None
+
+    def test_raises_for_unknown_mode(self, mock_path_is_file):
+        with pytest.raises(ValueError, match="normalization mode"):
+            AudioNormalizer("/some/path/audio.mp3", -20.0, mode="peak")
+
+    def test_normalized_dir_mirrors_relative_dir(self, mock_path_is_file):
+        an = AudioNormalizer(
+            "/some/path/audio.mp3", target_dbfs=-20.0, relative_dir="2024/jan"
+        )
+        assert an.normalized_dir == NORMALIZED_DIR / "2024" / "jan"
+
 
 class TestAudioNormalizerProcessFile:
     """Verifies normalization logic, output path construction, and gain calculation."""
@@ -45,51 +66,402 @@ class TestAudioNormalizerProcessFile:
         with pytest.raises(FileNotSupportedError):
             an.process_file()
 
-    def test_creates_output_directory(self, mock_path_is_file, mocker):
+    @pytest.fixture
+    def decode_env(self, mock_path_is_file, direct_outputs, mocker):
+        """Patch probing, decoding, and encoding around a -40 dBFS-ish signal."""
+        mocker.patch(
+            "audio_normalizer.probe_audio_stream",
+            return_value={"sample_rate": "44100", "channels": 2},
+        )
+        pcm = bytearray(struct.pack("<4h", 328, -328, 328, -328))
+        mock_decode = mocker.patch("audio_normalizer.decode_pcm", return_value=pcm)
+        mock_encode = mocker.patch("audio_normalizer.encode_pcm")
+        return mock_decode, mock_encode
+
+    def test_creates_output_directory(self, decode_env, mocker):
         mock_mkdir = mocker.patch.object(Path, "mkdir")
-        mock_sound = mocker.MagicMock()
-        mock_sound.dBFS = -40.0
-        mocker.patch("audio_normalizer.AudioSegment.from_mp3", return_value=mock_sound)
 
         an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
         an.process_file()
 
         mock_mkdir.assert_called_once_with(parents=True, exist_ok=True)
 
-    def test_computes_correct_gain_delta(self, mock_path_is_file, mocker):
+    def test_computes_correct_gain_delta(self, decode_env, mocker):
+        mocker.patch.object(Path, "mkdir")
+        mocker.patch.object(AudioNormalizer, "measure", return_value=(-40.0, -3.0))
+        mock_gain = mocker.patch.object(AudioBuffer, "apply_gain")
+
+        an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
+        an.process_file()
+
+        mock_gain.assert_called_once_with(20.0)
+
+    def test_applies_gain_to_decoded_samples(self, decode_env, mocker):
         mocker.patch.object(Path, "mkdir")
-        mock_sound = mocker.MagicMock()
-        mock_sound.dBFS = -40.0
-        mocker.patch("audio_normalizer.AudioSegment.from_mp3", return_value=mock_sound)
+        _, mock_encode = decode_env
 
         an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
         an.process_file()
 
-        mock_sound.apply_gain.assert_called_once_with(20.0)
+        (encoded,) = mock_encode.call_args.args[0]
+        assert struct.unpack("<4h", encoded) == (3277, -3277, 3277, -3277)
 
-    def test_exports_to_correct_path(self, mock_path_is_file, mocker):
+    def test_leaves_silence_unchanged(self, decode_env, mocker):
         mocker.patch.object(Path, "mkdir")
-        mock_sound = mocker.MagicMock()
-        mock_sound.dBFS = -40.0
-        mock_normalized = mocker.MagicMock()
-        mock_sound.apply_gain.return_value = mock_normalized
-        mocker.patch("audio_normalizer.AudioSegment.from_mp3", return_value=mock_sound)
+        mock_decode, mock_encode = decode_env
+        mock_decode.return_value = bytearray(8)
+
+        an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
+        an.process_file()
+
+        (encoded,) = mock_encode.call_args.args[0]
+        assert bytes(encoded) == bytes(8)
+
+    def test_exports_to_correct_path(self, decode_env, mocker):
+        mocker.patch.object(Path, "mkdir")
+        _, mock_encode = decode_env
 
         an = AudioNormalizer("/some/path/my_audio.mp3", target_dbfs=-20.0)
         an.process_file()
 
         expected_path = an.normalized_dir / "my_audio_norm.mp3"
-        mock_normalized.export.assert_called_once_with(expected_path)
+        assert mock_encode.call_args.args[1:] == (expected_path, 44100, 2)
 
-    def test_loads_from_correct_audio_path(self, mock_path_is_file, mocker):
+    def test_loads_from_correct_audio_path(self, decode_env, mocker):
         mocker.patch.object(Path, "mkdir")
-        mock_sound = mocker.MagicMock()
-        mock_sound.dBFS = -30.0
-        mock_from_mp3 = mocker.patch(
-            "audio_normalizer.AudioSegment.from_mp3", return_value=mock_sound
+        mock_decode, _ = decode_env
+
+        an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
+        an.process_file()
+
+        mock_decode.assert_called_once_with("/some/path/audio.mp3", 44100, 2)
+
+
+class TestAudioNormalizerStreaming:
+    """Verifies the two-pass chunked normalization path."""
+
+    @staticmethod
+    def _pcm(value: int, samples: int) -> bytes:
+        return struct.pack(f"<{samples}h", *([value] * samples))
+
+    @pytest.fixture
+    def streaming_env(self, mock_path_is_file, direct_outputs, mocker):
+        mocker.patch.object(Path, "mkdir")
+        mocker.patch(
+            "audio_normalizer.probe_audio_stream",
+            return_value={"sample_rate": "44100", "channels": 2},
         )
+        mock_iter = mocker.patch(
+            "audio_normalizer.iter_pcm_chunks",
+            side_effect=lambda *_: iter(
+                [bytearray(self._pcm(16384, 8)), bytearray(self._pcm(-16384, 4))]
+            ),
+        )
+        encoded: list[bytes] = []
+        mock_encode = mocker.patch(
+            "audio_normalizer.encode_pcm",
+            side_effect=lambda pcm, *_: encoded.extend(pcm),
+        )
+        return mock_iter, mock_encode, encoded
 
+    def test_streaming_defaults_to_false(self, mock_path_is_file):
         an = AudioNormalizer("/some/path/audio.mp3", target_dbfs=-20.0)
+        assert an.streaming is False
+
+    def test_does_not_decode_whole_file(self, streaming_env, mocker):
+        mock_decode = mocker.patch("audio_normalizer.decode_pcm")
+
+        AudioNormalizer("/some/path/a.mp3", -20.0, streaming=True).process_file()
+
+        mock_decode.assert_not_called()
+
+    def test_reads_file_twice_with_probed_format(self, streaming_env):
+        mock_iter, _, _ = streaming_env
+
+        AudioNormalizer("/some/path/a.mp3", -20.0, streaming=True).process_file()
+
+        assert mock_iter.call_count == 2
+        mock_iter.assert_called_with("/some/path/a.mp3", 44100, 2)
+
+    def test_applies_gain_to_every_chunk(self, streaming_env):
+        _, _, encoded = streaming_env
+
+        # Full-scale/2 input is about -6.02 dBFS; -12.04 dBFS halves it again.
+        target = 20 * math.log10(0.25)
+        AudioNormalizer("/some/path/a.mp3", target, streaming=True).process_file()
+
+        assert encoded == [self._pcm(8192, 8), self._pcm(-8192, 4)]
+
+    def test_encodes_to_normalized_path(self, streaming_env):
+        _, mock_encode, _ = streaming_env
+
+        an = AudioNormalizer("/some/path/my_audio.mp3", -20.0, streaming=True)
         an.process_file()
 
-        mock_from_mp3.assert_called_once_with("/some/path/audio.mp3")
+        assert mock_encode.call_args.args[1:] == (
+            an.normalized_dir / "my_audio_norm.mp3",
+            44100,
+            2,
+        )
+
+    def test_raises_when_no_audio_stream(self, mock_path_is_file, mocker):
+        mocker.patch.object(Path, "mkdir")
+        mocker.patch("audio_normalizer.probe_audio_stream", return_value=None)
+
+        an = AudioNormalizer("/some/path/a.mp3", -20.0, streaming=True)
+        with pytest.raises(ValueError, match="no audio stream"):
+            an.process_file()
+
+
+class TestAudioNormalizerLoudness:
+    """Verifies LUFS measurement and the true-peak ceiling."""
+
+    @staticmethod
+    def _sine(amplitude: float, seconds: float = 2.0, rate: int = 48000):
+        t = np.arange(int(rate * seconds)) / rate
+        samples = (amplitude * 32767 * np.sin(2 * np.pi * 997 * t)).astype("<i2")
+        return AudioBuffer(bytearray(samples.tobytes()), 1, rate)
+
+    def test_lufs_mode_measures_integrated_loudness(self, mock_path_is_file):
+        an = AudioNormalizer("/some/path/a.mp3", -23.0, mode="lufs")
+
+        level, _ = an.measure([self._sine(1.0)])
+
+        # BS.1770: a full-scale 997 Hz sine in one channel reads about -3 LUFS.
+        assert level == pytest.approx(-3.01, abs=0.1)
+
+    def test_lufs_gating_ignores_silence(self, mock_path_is_file):
+        lufs = AudioNormalizer("/some/path/a.mp3", -23.0, mode="lufs")
+        dbfs = AudioNormalizer("/some/path/a.mp3", -23.0)
+        tone = self._sine(0.5)
+        silence = AudioBuffer(bytearray(2 * 48000 * 10), 1, 48000)
+
+        lufs_drop = lufs.measure([tone])[0] - lufs.measure([tone, silence])[0]
+        dbfs_drop = dbfs.measure([tone])[0] - dbfs.measure([tone, silence])[0]
+
+        assert lufs_drop < 0.5
+        assert dbfs_drop > 7
+
+    def test_true_peak_only_measured_with_ceiling(self, mock_path_is_file):
+        an = AudioNormalizer("/some/path/a.mp3", -23.0, mode="lufs")
+        assert an.measure([self._sine(0.5)])[1] == -math.inf
+
+    def test_true_peak_ceiling_limits_gain(self, mock_path_is_file):
+        an = AudioNormalizer("/some/path/a.mp3", -10.0, mode="lufs", true_peak=-1.0)
+        assert an.gain_for(-20.0, -4.0) == 3.0
+        assert an.gain_for(-20.0, -20.0) == 10.0
+
+    def test_streaming_lufs_matches_whole_file(
+        self, mock_path_is_file, direct_outputs, mocker
+    ):
+        mocker.patch.object(Path, "mkdir")
+        mocker.patch(
+            "audio_normalizer.probe_audio_stream",
+            return_value={"sample_rate": "48000", "channels": 1},
+        )
+        pcm = bytes(self._sine(0.25).data)
+        chunks = [bytearray(pcm[i : i + 5000]) for i in range(0, len(pcm), 5000)]
+        mocker.patch(
+            "audio_normalizer.iter_pcm_chunks",
+            side_effect=lambda *_: iter([bytearray(c) for c in chunks]),
+        )
+        mocker.patch("audio_normalizer.decode_pcm", return_value=bytearray(pcm))
+        encoded: list[bytes] = []
+        mocker.patch(
+            "audio_normalizer.encode_pcm",
+            side_effect=lambda pcm, *_: encoded.append(b"".join(pcm)),
+        )
+
+        for streaming in (False, True):
+            AudioNormalizer(
+                "/some/path/a.mp3", -23.0, streaming=streaming, mode="lufs"
+            ).process_file()
+
+        assert encoded[0] == encoded[1]
+
+
+class TestAudioNormalizerLossless:
+    """Verifies that lossless mode edits frame gain instead of re-encoding."""
+
+    @pytest.fixture
+    def lossless_env(self, mock_path_is_file, direct_outputs, mocker):
+        mocker.patch.object(Path, "mkdir")
+        mocker.patch(
+            "audio_normalizer.probe_audio_stream",
+            return_value={"sample_rate": "44100", "channels": 2},
+        )
+        # Full-scale/2 is about -6.02 dBFS.
+        mocker.patch(
+            "audio_normalizer.iter_pcm_chunks",
+            side_effect=lambda *_: iter(
+                [bytearray(struct.pack("<8h", *([16384, -16384] * 4)))]
+            ),
+        )
+        mocker.patch.object(Path, "read_bytes", return_value=b"mp3 data")
+        mock_write = mocker.patch.object(Path, "write_bytes")
+        mock_adjust = mocker.patch("audio_normalizer.adjust_global_gain")
+        mock_encode = mocker.patch("audio_normalizer.encode_pcm")
+        return mock_adjust, mock_write, mock_encode
+
+    def test_lossless_defaults_to_false(self, mock_path_is_file):
+        assert AudioNormalizer("/some/path/a.mp3", -20.0).lossless is False
+
+    def test_applies_gain_in_whole_steps_without_encoding(self, lossless_env):
+        mock_adjust, mock_write, mock_encode = lossless_env
+
+        # -6.02 dB below the input is four 1.505 dB steps.
+        target = 20 * math.log10(0.25)
+        AudioNormalizer("/some/path/a.mp3", target, lossless=True).process_file()
+
+        mock_adjust.assert_called_once_with(bytearray(b"mp3 data"), -4)
+        mock_write.assert_called_once_with(bytearray(b"mp3 data"))
+        mock_encode.assert_not_called()
+
+    def test_rounds_down_under_true_peak_ceiling(self, lossless_env):
+        mock_adjust, _, _ = lossless_env
+
+        # The true peak sits at about -6 dBTP, so -1 dBTP leaves room for 5 dB:
+        # three whole steps, not the four that rounding 5 dB would give.
+        AudioNormalizer(
+            "/some/path/a.mp3", 0.0, true_peak=-1.0, lossless=True
+        ).process_file()
+
+        assert mock_adjust.call_args.args[1] == 3
+
+
+class TestAudioNormalizerPeakMemory:
+    """Verifies peak memory estimates from probed headers."""
+
+    @pytest.fixture
+    def mock_probe(self, mocker):
+        return mocker.patch(
+            "audio_normalizer.probe_audio_stream",
+            return_value={"sample_rate": "44100", "channels": 2, "duration": "60"},
+        )
+
+    def test_whole_file_grows_with_duration(self, mock_probe):
+        peak = AudioNormalizer.estimate_peak_memory("/a.mp3", target_dbfs=-20.0)
+
+        assert peak == int(60 * 44100 * 2 * 2 * 1.5)
+
+    def test_streaming_holds_one_chunk(self, mock_probe):
+        peak = AudioNormalizer.estimate_peak_memory("/a.mp3", streaming=True)
+
+        assert peak == int(STREAM_CHUNK_FRAMES * 2 * 2 * 1.5)
+        assert AudioNormalizer.low_memory_kwargs == {"streaming": True}
+
+    def test_lossless_holds_one_chunk_and_the_whole_mp3(self, mock_probe, mocker):
+        mocker.patch("audio_normalizer.os.path.getsize", return_value=5_000_000)
+
+        peak = AudioNormalizer.estimate_peak_memory("/a.mp3", lossless=True)
+
+        assert peak == int(STREAM_CHUNK_FRAMES * 2 * 2 * 1.5) + 5_000_000
+
+    def test_missing_duration_is_estimated_from_size(self, mock_probe, mocker):
+        mock_probe.return_value = {"sample_rate": "8000", "channels": 1}
+        mocker.patch("audio_normalizer.estimate_cost", return_value=(None, 10.0))
+
+        assert AudioNormalizer.estimate_peak_memory("/a.mp3") == 240_000
+
+    @pytest.mark.parametrize("probe", [None, FFmpegError("Invalid data")])
+    def test_unprobeable_file_is_free(self, mock_probe, probe):
+        if probe is None:
+            mock_probe.return_value = None
+        else:
+            mock_probe.side_effect = probe
+
+        assert AudioNormalizer.estimate_peak_memory("/a.mp3") == 0
+
+
+class TestAudioNormalizerAsync:
+    """Verifies measurement and gain application in process_file_async."""
+
+    @pytest.fixture
+    def async_env(self, mock_path_is_file, direct_outputs, mocker):
+        mocker.patch.object(Path, "mkdir")
+        mocker.patch(
+            "audio_normalizer.probe_audio_stream_async",
+            return_value={"sample_rate": "48000", "channels": 2},
+        )
+
+        async def chunks(*_):
+            # Full-scale/2 is about -6.02 dBFS.
+            for _ in range(2):
+                yield bytearray(struct.pack("<8h", *([16384, -16384] * 4)))
+
+        mock_iter = mocker.patch(
+            "audio_normalizer.iter_pcm_chunks_async", side_effect=chunks
+        )
+        mock_run = mocker.patch("audio_normalizer.run_ffmpeg_async")
+        return mock_iter, mock_run
+
+    def test_applies_measured_gain_with_volume_filter(self, async_env, mocker):
+        mock_iter, mock_run = async_env
+        on_progress = mocker.MagicMock()
+        target = 20 * math.log10(0.25)
+        an = AudioNormalizer("/some/path/a.mp3", target)
+
+        asyncio.run(an.process_file_async(on_progress))
+
+        mock_iter.assert_called_once_with("/some/path/a.mp3", 48000, 2)
+        args, progress = mock_run.call_args.args
+        assert args[args.index("-af") + 1] == "volume=-6.020600dB"
+        assert args[args.index("-ar") + 1] == "48000"
+        assert args[-1] == str(an.normalized_dir / "a_norm.mp3")
+        assert progress is on_progress
+        assert an.output_path == an.normalized_dir / "a_norm.mp3"
+
+    def test_lossless_edits_frames_instead(self, async_env, mocker):
+        _, mock_run = async_env
+        mocker.patch.object(Path, "read_bytes", return_value=b"mp3 data")
+        mocker.patch.object(Path, "write_bytes")
+        mock_adjust = mocker.patch("audio_normalizer.adjust_global_gain")
+        target = 20 * math.log10(0.25)
+
+        an = AudioNormalizer("/some/path/a.mp3", target, lossless=True)
+        asyncio.run(an.process_file_async())
+
+        mock_adjust.assert_called_once_with(bytearray(b"mp3 data"), -4)
+        mock_run.assert_not_called()
+
+    def test_rejects_non_mp3(self, async_env):
+        an = AudioNormalizer("/some/path/a.wav", -20.0)
+
+        with pytest.raises(FileNotSupportedError):
+            asyncio.run(an.process_file_async())
+
+
+class TestNormalizeAudio:
+    """Verifies normalizing audio held in memory."""
+
+    def test_brings_buffer_to_target_in_place(self):
+        buffer = AudioBuffer(
+            bytearray(struct.pack("<4h", 328, -328, 328, -328)), 2, 44100
+        )
+
+        result = normalize_audio(buffer, -20.0)
+
+        assert result is buffer
+        assert result.dbfs == pytest.approx(-20.0, abs=0.05)
+
+    def test_copies_read_only_buffer(self):
+        data = struct.pack("<4h", 328, -328, 328, -328)
+        buffer = AudioBuffer(data, 2, 44100)
+
+        result = normalize_audio(buffer, -20.0)
+
+        assert result is not buffer
+        assert buffer.data == data
+        assert result.dbfs == pytest.approx(-20.0, abs=0.05)
+
+    def test_respects_true_peak_ceiling(self):
+        samples = np.full(4410 * 2, 3277, dtype="<i2")
+        buffer = AudioBuffer(bytearray(samples.tobytes()), 2, 44100)
+
+        result = normalize_audio(buffer, 0.0, true_peak=-6.0)
+
+        assert result.max_dbfs <= -5.9
+
+    def test_rejects_unknown_mode(self):
+        with pytest.raises(ValueError, match="Unknown normalization mode"):
+            normalize_audio(AudioBuffer(bytearray(4), 2, 44100), -20.0, mode="peak")
@@ -0,0 +1,178 @@
+"""Tests for the AudioPipeline class and its single-pass process_file behaviour."""
+
+import math
+import struct
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from audio_buffer import AudioBuffer
+from audio_pipeline import AudioPipeline
+from constants import NORMALIZED_DIR
+from ffmpeg_utils import FFmpegError
+
+
+def _buffer(*samples: int) -> AudioBuffer:
+    return AudioBuffer(bytearray(struct.pack(f"<{len(samples)}h", *samples)), 1, 44100)
+
+
+@pytest.fixture
+def mock_stages(mocker: MockerFixture) -> tuple[MagicMock, MagicMock]:
+    """Patch is_file, mkdir, extract_audio and tag_audio for process_file tests.
+
+    Args:
+        mocker: The pytest-mock fixture.
+
+    Returns:
+        The mock extract_audio, returning audio at -20 dBFS, and tag_audio.
+    """
+    mocker.patch.object(Path, "is_file", return_value=True)
+    mocker.patch.object(Path, "mkdir")
+    # A square wave at a tenth of full scale: -20 dBFS.
+    extract = mocker.patch(
+        "audio_extractor.extract_audio", return_value=_buffer(3277, -3277)
+    )
+    tag = mocker.patch("audio_tagger.tag_audio")
+    return extract, tag
+
+
+class TestAudioPipelineInit:
+    """Verifies constructor validation and attribute assignment."""
+
+    def test_raises_when_file_not_found(self, mocker):
+        mocker.patch.object(Path, "is_file", return_value=False)
+        with pytest.raises(FileNotFoundError):
+            AudioPipeline("/nonexistent/video.mp4", -20.0, "Artist", "Album")
+
+    def test_defaults_title_to_filename(self, mock_path_is_file):
+        ap = AudioPipeline("/some/path/my_video.mp4", -20.0, "Artist", "Album")
+        assert ap.title_tag == "my_video"
+
+    def test_stores_custom_title_tag(self, mock_path_is_file):
+        ap = AudioPipeline(
+            "/some/path/my_video.mp4", -20.0, "Artist", "Album", title_tag="Title"
+        )
+        assert ap.title_tag == "Title"
+
+    def test_rejects_unknown_mode(self, mock_path_is_file):
+        with pytest.raises(ValueError, match="normalization mode"):
+            AudioPipeline("/some/path/my_video.mp4", -20.0, "A", "B", mode="peak")
+
+    def test_normalized_dir_uses_constant(self, mock_path_is_file):
+        ap = AudioPipeline("/some/path/my_video.mp4", -20.0, "Artist", "Album")
+        assert ap.normalized_dir == NORMALIZED_DIR
+
+
+class TestAudioPipelineProcessFile:
+    """Verifies the single decode, in-place gain, and single tagged encode."""
+
+    def test_decodes_video_once(self, mock_stages):
+        extract, _ = mock_stages
+
+        AudioPipeline("/some/path/my_video.mp4", -20.0, "A", "B").process_file()
+
+        extract.assert_called_once_with("/some/path/my_video.mp4")
+
+    def test_applies_gain_in_place(self, mock_stages):
+        extract, tag = mock_stages
+        audio = extract.return_value
+
+        # 6.02 dB louder: twice the amplitude.
+        target = 20 * math.log10(3277 * 2 / 32768)
+        AudioPipeline("/some/path/my_video.mp4", target, "A", "B").process_file()
+
+        assert tag.call_args.args[0] is audio
+        assert audio.samples.tolist() == [6554, -6554]
+
+    def test_encodes_once_with_tags(self, mock_stages):
+        extract, tag = mock_stages
+        ap = AudioPipeline(
+            "/some/path/my_video.mp4", -20.0, "Artist", "Album", title_tag="Title"
+        )
+
+        ap.process_file()
+
+        tag.assert_called_once_with(
+            extract.return_value,
+            ap.normalized_dir / "my_video_norm.mp3",
+            "Artist",
+            "Album",
+            "Title",
+        )
+        assert ap.output_path == ap.normalized_dir / "my_video_norm.mp3"
+        assert ap.audio_seconds == pytest.approx(2 / 44100)
+
+    def test_passes_mode_and_true_peak_to_normalize_audio(self, mock_stages, mocker):
+        extract, tag = mock_stages
+        normalize = mocker.patch("audio_normalizer.normalize_audio")
+
+        AudioPipeline(
+            "/some/path/my_video.mp4", -14.0, "A", "B", mode="lufs", true_peak=-1.0
+        ).process_file()
+
+        normalize.assert_called_once_with(extract.return_value, -14.0, "lufs", -1.0)
+        assert tag.call_args.args[0] is normalize.return_value
+
+    def test_silent_audio_is_encoded_unchanged(self, mock_stages):
+        extract, tag = mock_stages
+        extract.return_value = _buffer(0, 0)
+
+        AudioPipeline("/some/path/my_video.mp4", -20.0, "A", "B").process_file()
+
+        tag.assert_called_once()
+        assert tag.call_args.args[0].samples.tolist() == [0, 0]
+
+
+class TestAudioPipelineInvalidAudio:
+    """Verifies that videos without an audio track raise ValueError."""
+
+    def test_video_without_audio_track(self, mock_stages, mocker):
+        extract, tag = mock_stages
+        extract.side_effect = FFmpegError("Output file does not contain any stream")
+        mocker.patch("audio_pipeline.probe_audio_stream", return_value=None)
+
+        with pytest.raises(ValueError, match="no audio track"):
+            AudioPipeline("/some/path/my_video.mp4", -20.0, "A", "B").process_file()
+
+        tag.assert_not_called()
+
+    def test_other_decode_errors_propagate(self, mock_stages, mocker):
+        extract, _ = mock_stages
+        extract.side_effect = FFmpegError("Invalid data")
+        mocker.patch("audio_pipeline.probe_audio_stream", return_value={"channels": 2})
+
+        with pytest.raises(FFmpegError, match="Invalid data"):
+            AudioPipeline("/some/path/my_video.mp4", -20.0, "A", "B").process_file()
+
+
+class TestAudioPipelinePeakMemory:
+    """Verifies peak memory estimates from probed headers."""
+
+    @pytest.fixture
+    def mock_probe(self, mocker):
+        return mocker.patch(
+            "audio_pipeline.probe_audio_stream",
+            return_value={"sample_rate": "48000", "channels": 2, "duration": "60"},
+        )
+
+    def test_decoded_audio_and_its_in_memory_file(self, mock_probe):
+        peak = AudioPipeline.estimate_peak_memory("/a.mp4", target_dbfs=-20.0)
+
+        assert peak == 60 * 44100 * 2 * 2 * 2
+
+    def test_missing_duration_is_estimated_from_size(self, mock_probe, mocker):
+        mock_probe.return_value = {"sample_rate": "8000", "channels": 1}
+        mocker.patch("audio_pipeline.estimate_cost", return_value=(None, 10.0))
+
+        assert AudioPipeline.estimate_peak_memory("/a.mp4") == 3_528_000
+
+    @pytest.mark.parametrize("probe", [None, FFmpegError("Invalid data")])
+    def test_unprobeable_file_is_free(self, mock_probe, probe):
+        if probe is None:
+            mock_probe.return_value = None
+        else:
+            mock_probe.side_effect = probe
+
+        assert AudioPipeline.estimate_peak_memory("/a.mp4") == 0
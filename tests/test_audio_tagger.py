@@ -1,5 +1,7 @@
 """Tests for the AudioTagger class and its process_file behaviour."""
 
+import io
+from pathlib import Path
 from unittest.mock import MagicMock
 
 import eyed3
@@ -7,7 +9,9 @@ import eyed3.id3
 import pytest
 from pytest_mock import MockerFixture
 
-from audio_tagger import AudioTagger
+from audio_buffer import AudioBuffer
+from audio_tagger import AudioTagger, tag_audio
+from id3_writer import UnsupportedTagError
 
 
 class TestAudioTaggerInit:
@@ -49,7 +53,7 @@ class TestAudioTaggerGetMp3:
 
     def test_get_mp3_calls_eyed3_load(self, mocker):
         mock_mp3 = mocker.MagicMock()
-        mock_load = mocker.patch("audio_tagger.eyed3.load", return_value=mock_mp3)
+        mock_load = mocker.patch("eyed3.load", return_value=mock_mp3)
 
         at = AudioTagger("/some/path/track.mp3", "Artist", "Album")
         at.get_mp3()
@@ -58,13 +62,20 @@ class TestAudioTaggerGetMp3:
         assert at.mp3_file is mock_mp3
 
     def test_get_mp3_raises_when_eyed3_returns_none(self, mocker):
-        mocker.patch("audio_tagger.eyed3.load", return_value=None)
+        mocker.patch("eyed3.load", return_value=None)
 
         at = AudioTagger("/some/path/track.mp3", "Artist", "Album")
         with pytest.raises(ValueError, match="Failed to load"):
             at.get_mp3()
 
 
+@pytest.fixture
+def untagged(mocker: MockerFixture) -> MagicMock:
+    """Patch the header-only tag read to report a file without a tag."""
+    return mocker.patch("audio_tagger.read_id3v2", return_value=None)
+
+
+@pytest.mark.usefixtures("untagged")
 class TestAudioTaggerProcessFile:
     """Verifies tag writing, initTag handling, and ID3 version selection."""
 
@@ -73,7 +84,7 @@ class TestAudioTaggerProcessFile:
     ) -> MagicMock:
         mock_mp3 = mocker.MagicMock()
         mock_mp3.tag = tag if tag is not None else mocker.MagicMock()
-        mocker.patch("audio_tagger.eyed3.load", return_value=mock_mp3)
+        mocker.patch("eyed3.load", return_value=mock_mp3)
         return mock_mp3
 
     def test_process_file_calls_get_mp3(self, mocker):
@@ -116,7 +127,7 @@ class TestAudioTaggerProcessFile:
             mock_mp3.tag = mock_tag
 
         mock_mp3.initTag.side_effect = init_tag_side_effect
-        mocker.patch("audio_tagger.eyed3.load", return_value=mock_mp3)
+        mocker.patch("eyed3.load", return_value=mock_mp3)
         at = AudioTagger("/some/path/track.mp3", "Artist", "Album")
         at.process_file()
 
@@ -135,3 +146,148 @@ class TestAudioTaggerProcessFile:
         at.process_file()
 
         mock_mp3.tag.save.assert_called_once_with(version=eyed3.id3.ID3_V2_3)
+
+
+@pytest.mark.usefixtures("untagged")
+class TestAudioTaggerInPlace:
+    """Verifies the in-place ID3 path and its eyed3 fallback."""
+
+    def test_in_place_defaults_to_false(self):
+        at = AudioTagger("/some/path/track.mp3", "Artist", "Album")
+        assert at.in_place is False
+
+    def test_writes_frames_without_loading_audio(self, mocker):
+        mock_write = mocker.patch("audio_tagger.write_text_frames")
+        mock_load = mocker.patch("eyed3.load")
+
+        at = AudioTagger(
+            "/some/path/track.mp3", "Artist", "Album", "Title", in_place=True
+        )
+        at.process_file()
+
+        mock_write.assert_called_once_with(
+            "/some/path/track.mp3",
+            {"TALB": "Album", "TPE1": "Artist", "TIT2": "Title"},
+        )
+        mock_load.assert_not_called()
+        assert at.output_path == Path("/some/path/track.mp3")
+
+    def test_falls_back_to_eyed3_for_unsupported_tags(self, mocker):
+        mocker.patch(
+            "audio_tagger.write_text_frames", side_effect=UnsupportedTagError("v2.2")
+        )
+        mock_mp3 = mocker.MagicMock()
+        mocker.patch("eyed3.load", return_value=mock_mp3)
+
+        at = AudioTagger("/some/path/track.mp3", "Artist", "Album", in_place=True)
+        at.process_file()
+
+        mock_mp3.tag.save.assert_called_once_with(version=eyed3.id3.ID3_V2_3)
+
+
+class TestAudioTaggerSkipsMatchingTags:
+    """Verifies that files already carrying the requested tags are not written."""
+
+    _AUDIO = b"\xff\xfb\x90\x00" + bytes(1000)
+
+    @pytest.mark.parametrize("in_place", [False, True])
+    def test_second_run_writes_nothing(self, tmp_path, in_place):
+        path = tmp_path / "track.mp3"
+        path.write_bytes(self._AUDIO)
+        first = AudioTagger(str(path), "Artist", "Album", in_place=True)
+        first.process_file()
+        stat = path.stat()
+
+        again = AudioTagger(str(path), "Artist", "Album", in_place=in_place)
+        again.process_file()
+
+        assert first.skipped is False
+        assert again.skipped is True
+        assert path.stat().st_mtime_ns == stat.st_mtime_ns
+        assert again.output_path == path
+
+    def test_skip_does_not_load_audio(self, tmp_path, mocker):
+        path = tmp_path / "track.mp3"
+        path.write_bytes(self._AUDIO)
+        AudioTagger(str(path), "Artist", "Album", in_place=True).process_file()
+        mock_load = mocker.patch("eyed3.load")
+
+        AudioTagger(str(path), "Artist", "Album").process_file()
+
+        mock_load.assert_not_called()
+
+    @pytest.mark.parametrize(
+        ("artist", "album", "title"),
+        [
+            ("Other", "Album", "track"),
+            ("Artist", "Other", "track"),
+            ("Artist", "Album", "Other"),
+        ],
+    )
+    def test_writes_when_any_value_differs(self, tmp_path, artist, album, title):
+        path = tmp_path / "track.mp3"
+        path.write_bytes(self._AUDIO)
+        AudioTagger(str(path), "Artist", "Album", in_place=True).process_file()
+
+        at = AudioTagger(str(path), artist, album, title, in_place=True)
+        at.process_file()
+
+        assert at.skipped is False
+        assert at.tags_match()
+
+    def test_unsupported_tag_is_not_treated_as_match(self, mocker):
+        mocker.patch("audio_tagger.read_id3v2", side_effect=UnsupportedTagError("v2.2"))
+        at = AudioTagger("/some/path/track.mp3", "Artist", "Album")
+        assert at.tags_match() is False
+
+
+class TestTagAudio:
+    """Verifies tagging in-memory audio into paths and streams."""
+
+    _AUDIO = b"\xff\xfb\x90\x00" + bytes(1000)
+
+    def test_retags_mp3_bytes_into_stream_without_ffmpeg(self, mocker):
+        mock_write = mocker.patch("audio_tagger.write_audio")
+        out = io.BytesIO()
+
+        tag_audio(self._AUDIO, out, "Artist", "Album", "Title")
+
+        data = out.getvalue()
+        mock_write.assert_not_called()
+        assert data.startswith(b"ID3")
+        assert data.endswith(self._AUDIO)
+        assert b"Artist" in data
+
+    def test_retags_stream_into_path(self, tmp_path):
+        path = tmp_path / "track.mp3"
+
+        tag_audio(io.BytesIO(self._AUDIO), path, "Artist", "Album", "Title")
+
+        tag = eyed3.load(str(path)).tag
+        assert (tag.artist, tag.album, tag.title) == ("Artist", "Album", "Title")
+
+    def test_encodes_pcm_with_tags(self, mocker):
+        mock_write = mocker.patch("audio_tagger.write_audio")
+        buffer = AudioBuffer(bytearray(8), 2, 44100)
+        out = io.BytesIO()
+
+        tag_audio(buffer, out, "Artist", "Album", "Title")
+
+        mock_write.assert_called_once_with(
+            buffer, out, {"artist": "Artist", "album": "Album", "title": "Title"}
+        )
+
+    def test_remuxes_unsupported_tags(self, mocker):
+        mocker.patch(
+            "audio_tagger.set_text_frames", side_effect=UnsupportedTagError("v2.2")
+        )
+        mock_write = mocker.patch("audio_tagger.write_audio")
+
+        tag_audio(self._AUDIO, "/out/track.mp3", "Artist", "Album", "Title")
+
+        mock_write.assert_called_once_with(
+            self._AUDIO,
+            "/out/track.mp3",
+            {"artist": "Artist", "album": "Album", "title": "Title"},
+            codec="copy",
+        )
@@ -0,0 +1,393 @@
+"""Tests for the ffmpeg and ffprobe subprocess helpers."""
+
+import asyncio
+import io
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import DEFAULT, MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from constants import FFMPEG_BINARY, FFPROBE_BINARY
+from ffmpeg_utils import (
+    FFmpegError,
+    FFmpegProgress,
+    encode_pcm,
+    iter_pcm_chunks,
+    iter_pcm_chunks_async,
+    pipe_ffmpeg,
+    probe_audio_stream,
+    probe_audio_stream_async,
+    run_ffmpeg,
+    run_ffmpeg_async,
+    stream_duration,
+)
+
+
+def _completed(returncode: int = 0, stdout: str = "", stderr: str = ""):
+    return subprocess.CompletedProcess([], returncode, stdout=stdout, stderr=stderr)
+
+
+def _mock_popen(
+    mocker: MockerFixture, returncode: int = 0, stdout: bytes = b"", stderr: bytes = b""
+) -> MagicMock:
+    proc = mocker.MagicMock()
+    proc.__enter__.return_value = proc
+    proc.stdout = io.BytesIO(stdout)
+    proc.stdin = mocker.MagicMock()
+    proc.wait.return_value = returncode
+    proc.returncode = returncode
+
+    def popen(command, **kwargs):
+        kwargs["stderr"].write(stderr)
+        return DEFAULT
+
+    return mocker.patch(
+        "ffmpeg_utils.subprocess.Popen", return_value=proc, side_effect=popen
+    )
+
+
+def _within(seconds: float, func):
+    """Call func in a thread and return its result, failing if it hangs."""
+    outcome = []
+
+    def call():
+        try:
+            outcome.append(func())
+        except Exception as exc:
+            outcome.append(exc)
+
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "deadlocked"
+    if isinstance(outcome[0], Exception):
+        raise outcome[0]
+    return outcome[0]
+
+
+# Writes more than a pipe's buffer to stderr before touching stdin or stdout.
+_NOISY = "sys.stderr.write('warning\\n' * 100_000); sys.stderr.flush()\n"
+
+
+class TestRunFfmpeg:
+    """Verifies command construction and error reporting for run_ffmpeg."""
+
+    def test_prepends_binary_and_global_options(self, mocker):
+        mock_run = mocker.patch(
+            "ffmpeg_utils.subprocess.run", return_value=_completed()
+        )
+
+        run_ffmpeg(["-i", "in.mp4", "out.mp3"])
+
+        command = mock_run.call_args.args[0]
+        assert command[0] == FFMPEG_BINARY
+        assert "-y" in command
+        assert command[-3:] == ["-i", "in.mp4", "out.mp3"]
+
+    def test_raises_on_non_zero_exit(self, mocker):
+        mocker.patch(
+            "ffmpeg_utils.subprocess.run",
+            return_value=_completed(1, stderr="Invalid data found"),
+        )
+
+        with pytest.raises(FFmpegError, match="Invalid data found"):
+            run_ffmpeg(["-i", "bad.mp4", "out.mp3"])
+
+
+class TestPipeFfmpeg:
+    """Verifies stdin, stdout and fd passing for pipe_ffmpeg."""
+
+    def test_feeds_stdin_and_returns_stdout(self, mocker):
+        mock_run = mocker.patch(
+            "ffmpeg_utils.subprocess.run", return_value=_completed(stdout=b"pcm")
+        )
+
+        output = pipe_ffmpeg(["-i", "pipe:0", "pipe:1"], b"mp3", pass_fds=[5])
+
+        assert output == b"pcm"
+        assert mock_run.call_args.kwargs["input"] == b"mp3"
+        assert mock_run.call_args.kwargs["pass_fds"] == (5,)
+        assert mock_run.call_args.args[0][-3:] == ["-i", "pipe:0", "pipe:1"]
+
+    def test_raises_on_non_zero_exit(self, mocker):
+        mocker.patch(
+            "ffmpeg_utils.subprocess.run",
+            return_value=_completed(1, stderr=b"Invalid data found"),
+        )
+
+        with pytest.raises(FFmpegError, match="Invalid data found"):
+            pipe_ffmpeg(["-i", "pipe:0", "pipe:1"], b"junk")
+
+
+class TestProbeAudioStream:
+    """Verifies parsing of ffprobe's JSON stream output."""
+
+    def test_returns_first_audio_stream(self, mocker):
+        stdout = '{"streams": [{"codec_name": "aac", "sample_rate": "44100"}]}'
+        mock_run = mocker.patch(
+            "ffmpeg_utils.subprocess.run", return_value=_completed(stdout=stdout)
+        )
+
+        stream = probe_audio_stream("/some/path/video.mp4")
+
+        assert stream == {"codec_name": "aac", "sample_rate": "44100"}
+        command = mock_run.call_args.args[0]
+        assert command[0] == FFPROBE_BINARY
+        assert command[-1] == "/some/path/video.mp4"
+
+    def test_returns_none_without_audio_stream(self, mocker):
+        mocker.patch(
+            "ffmpeg_utils.subprocess.run",
+            return_value=_completed(stdout='{"programs": [], "streams": []}'),
+        )
+
+        assert probe_audio_stream("/some/path/video.mp4") is None
+
+    def test_raises_on_non_zero_exit(self, mocker):
+        mocker.patch(
+            "ffmpeg_utils.subprocess.run",
+            return_value=_completed(1, stderr="No such file"),
+        )
+
+        with pytest.raises(FFmpegError, match="No such file"):
+            probe_audio_stream("/missing.mp4")
+
+    def test_container_duration_fills_missing_stream_duration(self, mocker):
+        stdout = (
+            '{"streams": [{"codec_name": "opus"}], "format": {"duration": "20.02"}}'
+        )
+        mocker.patch(
+            "ffmpeg_utils.subprocess.run", return_value=_completed(stdout=stdout)
+        )
+
+        stream = probe_audio_stream("/some/path/video.mkv")
+
+        assert stream == {"codec_name": "opus", "duration": "20.02"}
+
+
+class TestStreamDuration:
+    """Verifies reading the duration of a probed stream."""
+
+    @pytest.mark.parametrize(
+        ("stream", "expected"),
+        [
+            ({"duration": "12.5"}, 12.5),
+            ({"duration": "N/A"}, None),
+            ({"codec_name": "aac"}, None),
+            (None, None),
+        ],
+    )
+    def test_parses_duration(self, stream, expected):
+        assert stream_duration(stream) == expected
+
+
+class TestIterPcmChunks:
+    """Verifies chunking of ffmpeg's decoded PCM output."""
+
+    def test_yields_fixed_size_chunks(self, mocker):
+        _mock_popen(mocker, stdout=bytes(range(10)))
+
+        chunks = list(iter_pcm_chunks("a.mp3", 44100, 1, chunk_frames=2))
+
+        assert chunks == [bytes([0, 1, 2, 3]), bytes([4, 5, 6, 7]), bytes([8, 9])]
+
+    def test_requests_s16le_at_given_format(self, mocker):
+        mock_popen = _mock_popen(mocker)
+
+        list(iter_pcm_chunks("a.mp3", 48000, 2))
+
+        command = mock_popen.call_args.args[0]
+        assert command[command.index("-f") + 1] == "s16le"
+        assert command[command.index("-ar") + 1] == "48000"
+        assert command[command.index("-ac") + 1] == "2"
+
+    def test_raises_on_decode_failure(self, mocker):
+        _mock_popen(mocker, returncode=1, stderr=b"Invalid data")
+
+        with pytest.raises(FFmpegError, match="Invalid data"):
+            list(iter_pcm_chunks("bad.mp3", 44100, 2))
+
+    def test_lots_of_warnings_do_not_block_decoding(self, fake_ffmpeg):
+        fake_ffmpeg(_NOISY + "sys.stdout.buffer.write(bytes(8))")
+
+        chunks = _within(10, lambda: list(iter_pcm_chunks("a.mp3", 44100, 2)))
+
+        assert chunks == [bytes(8)]
+
+
+class TestEncodePcm:
+    """Verifies piping of PCM chunks into the ffmpeg encoder."""
+
+    def test_writes_every_chunk_to_stdin(self, mocker):
+        mock_popen = _mock_popen(mocker)
+
+        encode_pcm([b"ab", b"cd"], "out.mp3", 44100, 2)
+
+        stdin = mock_popen.return_value.stdin
+        assert [c.args[0] for c in stdin.write.call_args_list] == [b"ab", b"cd"]
+        stdin.close.assert_called_once()
+        assert mock_popen.call_args.args[0][-1] == "out.mp3"
+
+    def test_raises_on_encode_failure(self, mocker):
+        mock_popen = _mock_popen(mocker, returncode=1, stderr=b"Unknown encoder")
+        mock_popen.return_value.stdin.write.side_effect = BrokenPipeError
+
+        with pytest.raises(FFmpegError, match="Unknown encoder"):
+            encode_pcm([b"ab"], "out.mp3", 44100, 2)
+
+    def test_lots_of_warnings_do_not_block_encoding(self, fake_ffmpeg, tmp_path):
+        out = tmp_path / "out.raw"
+        fake_ffmpeg(
+            _NOISY
+            + f"open({str(out)!r}, 'wb').write(sys.stdin.buffer.read())\n"
+            + "sys.stderr.write('failed'); sys.exit(1)"
+        )
+        chunks = [bytes(1 << 16)] * 16
+
+        with pytest.raises(FFmpegError, match=r"failed$"):
+            _within(10, lambda: encode_pcm(chunks, "out.mp3", 44100, 2))
+
+        assert out.stat().st_size == 1 << 20
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, mocker: MockerFixture):
+    """Replace the ffmpeg and ffprobe binaries with a Python script.
+
+    The script runs the Python code passed to it with its command line in
+    sys.argv, so each test decides what the fake binary prints and how it exits.
+
+    Returns:
+        A function taking that code and installing it as the fake binary.
+    """
+
+    def install(code: str) -> list[str]:
+        body = tmp_path / "body.py"
+        body.write_text(code)
+        script = tmp_path / "fake_ffmpeg"
+        script.write_text(
+            f"#!{sys.executable}\nimport sys\nexec(open({str(body)!r}).read())\n"
+        )
+        script.chmod(0o755)
+        mocker.patch("ffmpeg_utils.FFMPEG_BINARY", str(script))
+        mocker.patch("ffmpeg_utils.FFPROBE_BINARY", str(script))
+        return [str(script)]
+
+    return install
+
+
+_PROGRESS_SCRIPT = """
+for out_time, speed, state in [(500000, "N/A", "continue"), (2000000, "4.5x", "end")]:
+    print(f"out_time_us={out_time}")
+    print(f"speed={speed}")
+    print(f"progress={state}", flush=True)
+"""
+
+
+class TestRunFfmpegAsync:
+    """Verifies progress reporting, errors, timeouts and cancellation."""
+
+    def test_reports_progress_blocks(self, fake_ffmpeg):
+        fake_ffmpeg(_PROGRESS_SCRIPT)
+        reports: list[FFmpegProgress] = []
+
+        asyncio.run(run_ffmpeg_async(["-i", "in.mp4", "out.mp3"], reports.append))
+
+        assert reports == [
+            FFmpegProgress(out_time=0.5, speed=None, done=False),
+            FFmpegProgress(out_time=2.0, speed=4.5, done=True),
+        ]
+
+    def test_passes_global_and_progress_options(self, fake_ffmpeg, tmp_path):
+        argv_file = tmp_path / "argv"
+        fake_ffmpeg(f"open({str(argv_file)!r}, 'w').write(' '.join(sys.argv[1:]))")
+
+        asyncio.run(run_ffmpeg_async(["-i", "in.mp4", "out.mp3"]))
+
+        argv = argv_file.read_text().split()
+        assert argv[argv.index("-progress") + 1] == "pipe:1"
+        assert "-y" in argv
+        assert argv[-3:] == ["-i", "in.mp4", "out.mp3"]
+
+    def test_raises_with_stderr_on_non_zero_exit(self, fake_ffmpeg):
+        fake_ffmpeg("sys.stderr.write('Invalid data found'); sys.exit(1)")
+
+        with pytest.raises(FFmpegError, match="status 1: Invalid data found"):
+            asyncio.run(run_ffmpeg_async(["-i", "bad.mp4", "out.mp3"]))
+
+    def test_kills_ffmpeg_after_timeout(self, fake_ffmpeg, tmp_path):
+        marker = tmp_path / "finished"
+        fake_ffmpeg(f"import time; time.sleep(5); open({str(marker)!r}, 'w')")
+        start = time.monotonic()
+
+        with pytest.raises(TimeoutError, match=r"after 0\.2 s"):
+            asyncio.run(run_ffmpeg_async(["out.mp3"], timeout=0.2))
+
+        assert time.monotonic() - start < 3
+        assert not marker.exists()
+
+    def test_kills_ffmpeg_when_cancelled(self, fake_ffmpeg, tmp_path):
+        pid_file = tmp_path / "pid"
+        fake_ffmpeg(
+            f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid()))"
+            "; time.sleep(5)"
+        )
+
+        async def cancel_soon() -> None:
+            task = asyncio.ensure_future(run_ffmpeg_async(["out.mp3"]))
+            while not pid_file.exists() or not pid_file.read_text():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(cancel_soon())
+
+        assert time.monotonic() - start < 3
+
+
+class TestProbeAudioStreamAsync:
+    """Verifies the async ffprobe wrapper."""
+
+    def test_returns_first_audio_stream(self, fake_ffmpeg):
+        fake_ffmpeg("""print('{"streams": [{"codec_name": "aac", "channels": 2}]}')""")
+
+        stream = asyncio.run(probe_audio_stream_async("in.mp4"))
+
+        assert stream == {"codec_name": "aac", "channels": 2}
+
+    def test_raises_on_non_zero_exit(self, fake_ffmpeg):
+        fake_ffmpeg("sys.stderr.write('No such file'); sys.exit(1)")
+
+        with pytest.raises(FFmpegError, match="No such file"):
+            asyncio.run(probe_audio_stream_async("missing.mp4"))
+
+
+class TestIterPcmChunksAsync:
+    """Verifies chunking and error reporting of the async PCM reader."""
+
+    @staticmethod
+    def _collect(*args) -> list[bytearray]:
+        async def collect() -> list[bytearray]:
+            return [chunk async for chunk in iter_pcm_chunks_async(*args)]
+
+        return asyncio.run(collect())
+
+    def test_yields_fixed_size_chunks(self, fake_ffmpeg):
+        fake_ffmpeg("sys.stdout.buffer.write(bytes(range(10)))")
+
+        chunks = self._collect("in.mp3", 44100, 2, 1)
+
+        assert chunks == [bytearray(range(0, 4)), bytearray(range(4, 8)), b"\x08\t"]
+        assert all(isinstance(chunk, bytearray) for chunk in chunks)
+
+    def test_raises_on_decode_failure(self, fake_ffmpeg):
+        fake_ffmpeg("sys.stderr.write('corrupt'); sys.exit(1)")
+
+        with pytest.raises(FFmpegError, match="corrupt"):
+            self._collect("bad.mp3", 44100, 2)
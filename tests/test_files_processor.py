@@ -1,68 +1,108 @@
 """Tests for the process_all_files batch processing function."""
 
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, ClassVar
 
-from files_processor import process_all_files
+import pytest
 
+import files_processor
+from ffmpeg_utils import FFmpegProgress
+from files_processor import (
+    AsyncRunner,
+    BatchReport,
+    FileResult,
+    Stage,
+    batch_journal,
+    plan_files,
+    process_all_files,
+    process_all_files_async,
+    process_pipelined,
+    process_queue,
+    report_batch,
+    watch_and_process,
+)
+from instrumentation import MetricsSink, StageMetrics
+from manifest import Manifest
+from process_class import ProcessClass
+from quarantine import Quarantine
+from scheduling import MemoryBudget
+from work_queue import WorkQueue
 
-class _FakeEntry:
-    """Minimal stand-in for a pathlib.Path entry returned by Path.iterdir()."""
 
-    def __init__(self, path_str: str, is_file_val: bool = True) -> None:
-        self._path_str = path_str
-        self._is_file_val = is_file_val
+class _RecordingProcessor:
+    """Picklable processor that fails for files whose name contains 'bad'."""
 
-    def is_file(self) -> bool:
-        """Return whether this entry represents a file."""
-        return self._is_file_val
+    def __init__(self, file_path: str, suffix: str = "") -> None:
+        self.file_path = file_path
+        self.suffix = suffix
 
-    def __str__(self) -> str:
-        return self._path_str
+    def process_file(self) -> None:
+        """Raise for 'bad' files, otherwise report the input as the output."""
+        if "bad" in self.file_path:
+            raise ValueError(f"cannot process {self.file_path}{self.suffix}")
+        self.output_path = Path(self.file_path)
 
 
-class TestProcessAllFiles:
-    """Verifies directory traversal, extension filtering, and processor dispatch."""
+class _MirroringProcessor(_RecordingProcessor):
+    """Recording processor that accepts relative_dir like the audio stages."""
 
-    def test_calls_process_class_for_each_valid_file(self, mocker):
-        entries = [
-            _FakeEntry("/some/dir/a.mp4"),
-            _FakeEntry("/some/dir/b.mp4"),
-        ]
-        mocker.patch.object(Path, "iterdir", return_value=entries)
-        mock_process_class = mocker.MagicMock()
+    mirrors_input_tree = True
 
-        process_all_files("/some/dir", ["mp4"], mock_process_class)
+    def __init__(self, file_path: str, relative_dir: str = "") -> None:
+        super().__init__(file_path)
+        self.relative_dir = relative_dir
 
-        assert mock_process_class.call_count == 2
+    def process_file(self) -> None:
+        """Report the output path the file would be mirrored to."""
+        self.output_path = Path("/out") / self.relative_dir / Path(self.file_path).name
 
-    def test_skips_invalid_extensions(self, mocker):
-        entries = [
-            _FakeEntry("/some/dir/a.mp4"),
-            _FakeEntry("/some/dir/b.txt"),
-            _FakeEntry("/some/dir/c.mp4"),
-        ]
-        mocker.patch.object(Path, "iterdir", return_value=entries)
+
+class TestProcessAllFiles:
+    """Verifies file discovery options, processor dispatch, and result order."""
+
+    def test_calls_process_class_for_each_file(self, mocker):
+        mocker.patch(
+            "files_processor.iter_files",
+            return_value=iter(["/some/dir/a.mp4", "/some/dir/b.mp4"]),
+        )
         mock_process_class = mocker.MagicMock()
 
         process_all_files("/some/dir", ["mp4"], mock_process_class)
 
         assert mock_process_class.call_count == 2
 
-    def test_skips_non_file_entries(self, mocker):
-        entries = [
-            _FakeEntry("/some/dir/subdir", is_file_val=False),
-            _FakeEntry("/some/dir/video.mp4"),
-        ]
-        mocker.patch.object(Path, "iterdir", return_value=entries)
-        mock_process_class = mocker.MagicMock()
+    def test_passes_discovery_options_to_iter_files(self, mocker):
+        mock_iter = mocker.patch("files_processor.iter_files", return_value=iter([]))
 
-        process_all_files("/some/dir", ["mp4"], mock_process_class)
+        process_all_files(
+            "/some/dir",
+            ["mp4"],
+            mocker.MagicMock(),
+            recursive=True,
+            include=["2024/*"],
+            exclude=["*tmp*"],
+            max_depth=2,
+        )
 
-        assert mock_process_class.call_count == 1
+        mock_iter.assert_called_once_with(
+            "/some/dir", ["mp4"], True, ["2024/*"], ["*tmp*"], 2
+        )
 
     def test_passes_correct_file_path(self, mocker):
-        entries = [_FakeEntry("/some/dir/video.mp4")]
-        mocker.patch.object(Path, "iterdir", return_value=entries)
+        mocker.patch(
+            "files_processor.iter_files", return_value=iter(["/some/dir/video.mp4"])
+        )
         mock_process_class = mocker.MagicMock()
 
         process_all_files("/some/dir", ["mp4"], mock_process_class)
@@ -70,8 +110,9 @@ class TestProcessAllFiles:
         mock_process_class.assert_called_once_with("/some/dir/video.mp4")
 
     def test_passes_kwargs_to_process_class(self, mocker):
-        entries = [_FakeEntry("/some/dir/audio.mp3")]
-        mocker.patch.object(Path, "iterdir", return_value=entries)
+        mocker.patch(
+            "files_processor.iter_files", return_value=iter(["/some/dir/audio.mp3"])
+        )
         mock_process_class = mocker.MagicMock()
 
         process_all_files("/some/dir", ["mp3"], mock_process_class, target_dbfs=-20)
@@ -80,22 +121,1319 @@ class TestProcessAllFiles:
             "/some/dir/audio.mp3", target_dbfs=-20
         )
 
-    def test_handles_empty_directory(self, mocker):
-        mocker.patch.object(Path, "iterdir", return_value=[])
+    def test_handles_no_matching_files(self, mocker):
+        mocker.patch("files_processor.iter_files", return_value=iter([]))
         mock_process_class = mocker.MagicMock()
 
-        process_all_files("/some/dir", ["mp4"], mock_process_class)
+        results = process_all_files("/some/dir", ["mp4"], mock_process_class)
 
         mock_process_class.assert_not_called()
+        assert results == []
 
-    def test_handles_dir_with_no_valid_extensions(self, mocker):
-        entries = [
-            _FakeEntry("/some/dir/doc.pdf"),
-            _FakeEntry("/some/dir/image.jpg"),
+    def test_returns_results_in_discovery_order(self, mocker):
+        mocker.patch(
+            "files_processor.iter_files",
+            return_value=iter(["/some/dir/b.mp4", "/some/dir/a.mp4"]),
+        )
+
+        results = process_all_files("/some/dir", ["mp4"], _RecordingProcessor)
+
+        assert results == [
+            FileResult(
+                "/some/dir/b.mp4",
+                output_path="/some/dir/b.mp4",
+                stage="_RecordingProcessor",
+            ),
+            FileResult(
+                "/some/dir/a.mp4",
+                output_path="/some/dir/a.mp4",
+                stage="_RecordingProcessor",
+            ),
         ]
-        mocker.patch.object(Path, "iterdir", return_value=entries)
+
+    def test_processes_files_while_discovering(self, mocker):
+        events: list[str] = []
+
+        def discover(*_):
+            for name in ("a", "b"):
+                events.append(f"found {name}")
+                yield f"/some/dir/{name}.mp4"
+
+        mocker.patch("files_processor.iter_files", side_effect=discover)
         mock_process_class = mocker.MagicMock()
+        mock_process_class.return_value.process_file.side_effect = lambda: (
+            events.append(f"process {mock_process_class.call_args.args[0][-5]}")
+        )
 
         process_all_files("/some/dir", ["mp4"], mock_process_class)
 
-        mock_process_class.assert_not_called()
+        assert events == ["found a", "process a", "found b", "process b"]
+
+    def test_raises_when_workers_less_than_one(self, mocker):
+        with pytest.raises(ValueError, match="workers"):
+            process_all_files("/some/dir", ["mp4"], mocker.MagicMock(), workers=0)
+
+
+class _UpToDateProcessor(_RecordingProcessor):
+    """Recording processor that finds files named "same*" already done."""
+
+    def process_file(self) -> None:
+        """Skip files whose name marks them as already up to date."""
+        super().process_file()
+        self.skipped = Path(self.file_path).name.startswith("same")
+
+
+class TestProcessAllFilesProcessorSkips:
+    """Verifies that processors reporting up-to-date outputs count as skipped."""
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_reports_processor_skips(self, mocker, caplog, workers):
+        mocker.patch(
+            "files_processor.iter_files",
+            return_value=iter(["/d/same1.mp3", "/d/new.mp3", "/d/same2.mp3"]),
+        )
+
+        with caplog.at_level(logging.INFO, logger="files_processor"):
+            results = process_all_files(
+                "/d", ["mp3"], _UpToDateProcessor, workers=workers
+            )
+
+        assert [r.skipped for r in results] == [True, False, True]
+        assert all(r.ok for r in results)
+        assert "Skipped 2 unchanged file(s), processed 1." in caplog.messages
+
+
+class TestProcessAllFilesRecursive:
+    """Verifies relative_dir is passed only to tree-mirroring processors."""
+
+    def _make_tree(self, tmp_path):
+        (tmp_path / "2024" / "chan").mkdir(parents=True)
+        (tmp_path / "top.mp4").write_bytes(b"")
+        (tmp_path / "2024" / "chan" / "deep.mp4").write_bytes(b"")
+
+    def test_mirrors_input_tree(self, tmp_path):
+        self._make_tree(tmp_path)
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _MirroringProcessor, recursive=True
+        )
+
+        assert [r.output_path for r in results] == [
+            str(Path("/out/top.mp4")),
+            str(Path("/out/2024/chan/deep.mp4")),
+        ]
+
+    def test_non_recursive_does_not_pass_relative_dir(self, tmp_path, mocker):
+        self._make_tree(tmp_path)
+        spy = mocker.spy(_MirroringProcessor, "__init__")
+
+        process_all_files(tmp_path, ["mp4"], _MirroringProcessor)
+
+        spy.assert_called_once_with(mocker.ANY, str(tmp_path / "top.mp4"))
+
+    def test_other_processors_do_not_get_relative_dir(self, tmp_path):
+        self._make_tree(tmp_path)
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, recursive=True
+        )
+
+        assert len(results) == 2
+
+
+class TestProcessAllFilesWorkers:
+    """Verifies the process pool path: ordering, kwargs, and error capture."""
+
+    def test_results_keep_discovery_order(self, mocker):
+        names = [f"/some/dir/{i:02d}.mp4" for i in range(12)]
+        mocker.patch("files_processor.iter_files", return_value=iter(names))
+
+        results = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, workers=3
+        )
+
+        assert [r.file_path for r in results] == names
+        assert all(r.ok for r in results)
+
+    def test_files_finished_while_discovering_are_reported(self, mocker):
+        names = [f"/some/dir/{i:02d}.mp4" for i in range(3)]
+
+        def discover(*_):
+            for name in names:
+                # Let the previous file finish before the next is submitted.
+                time.sleep(0.2)
+                yield name
+
+        mocker.patch("files_processor.iter_files", side_effect=discover)
+
+        results = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, workers=2
+        )
+
+        assert [r.file_path for r in results] == names
+        assert all(r.ok for r in results)
+
+    def test_failure_does_not_stop_batch(self, mocker):
+        mocker.patch(
+            "files_processor.iter_files",
+            return_value=iter(
+                ["/some/dir/a.mp4", "/some/dir/bad.mp4", "/some/dir/c.mp4"]
+            ),
+        )
+
+        results = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, workers=2, suffix="!"
+        )
+
+        assert [r.ok for r in results] == [True, False, True]
+        assert results[1].error == "ValueError: cannot process /some/dir/bad.mp4!"
+
+
+class TestProcessAllFilesFailurePolicy:
+    """Verifies max_failures and the quarantine of failed files."""
+
+    @pytest.fixture
+    def files(self, mocker):
+        names = ["/some/dir/a.mp4", "/some/dir/bad.mp4", "/some/dir/c.mp4"]
+        mocker.patch("files_processor.iter_files", side_effect=lambda *_: iter(names))
+        return names
+
+    def test_continues_past_failures_by_default(self, files):
+        report = process_all_files("/some/dir", ["mp4"], _RecordingProcessor)
+
+        assert [r.status for r in report] == ["ok", "failed", "ok"]
+        assert report[1].stage == "_RecordingProcessor"
+        assert report[1].error_type == "ValueError"
+        assert report.aborted is False
+
+    def test_max_failures_stops_serial_batch(self, files):
+        report = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, max_failures=1
+        )
+
+        assert [r.status for r in report] == ["ok", "failed"]
+        assert report.not_run == ["/some/dir/c.mp4"]
+        assert report.aborted is True
+
+    def test_max_failures_stops_pool_batch(self, mocker):
+        names = ["/some/dir/bad.mp4"] + [f"/some/dir/{i:02d}.mp4" for i in range(30)]
+        mocker.patch("files_processor.iter_files", return_value=iter(names))
+
+        report = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, workers=2, max_failures=1
+        )
+
+        assert report.aborted is True
+        assert [r.file_path for r in report.failed] == ["/some/dir/bad.mp4"]
+        assert sorted([r.file_path for r in report] + report.not_run) == sorted(names)
+
+    def test_failed_file_is_quarantined_and_skipped_next_time(self, files, tmp_path):
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+        process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, quarantine=quarantine
+        )
+
+        report = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, quarantine=quarantine
+        )
+
+        assert "/some/dir/bad.mp4" in quarantine
+        assert [r.file_path for r in report] == ["/some/dir/a.mp4", "/some/dir/c.mp4"]
+        assert report.quarantined == ["/some/dir/bad.mp4"]
+
+    def test_retry_processes_only_quarantined_files(self, files, tmp_path):
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+        quarantine.add("/some/dir/bad.mp4", None, "OSError", "OSError: x")
+        quarantine.add("/some/dir/c.mp4", None, "OSError", "OSError: x")
+
+        report = process_all_files(
+            "/some/dir",
+            ["mp4"],
+            _RecordingProcessor,
+            quarantine=quarantine,
+            retry_quarantined=True,
+        )
+
+        assert [(r.file_path, r.status) for r in report] == [
+            ("/some/dir/bad.mp4", "failed"),
+            ("/some/dir/c.mp4", "ok"),
+        ]
+        assert list(quarantine.entries()) == ["/some/dir/bad.mp4"]
+        assert quarantine.entries()["/some/dir/bad.mp4"]["attempts"] == 2
+
+    @pytest.mark.parametrize(
+        ("kwargs", "message"),
+        [
+            ({"max_failures": 0}, "max_failures"),
+            ({"retry_quarantined": True}, "quarantine"),
+        ],
+    )
+    def test_rejects_invalid_options(self, files, kwargs, message):
+        with pytest.raises(ValueError, match=message):
+            process_all_files("/some/dir", ["mp4"], _RecordingProcessor, **kwargs)
+
+
+class TestBatchReport:
+    """Verifies report totals, the written summary and collecting chains."""
+
+    @staticmethod
+    def _report():
+        metrics = StageMetrics("Stage", "/a.mp4")
+        metrics.wall_s = 1.5
+        report = BatchReport(
+            [
+                FileResult("/a.mp4", output_path="/a.mp3", stage="S", metrics=metrics),
+                FileResult("/b.mp4", skipped=True, stage="S"),
+                FileResult(
+                    "/c.mp4", error="OSError: no audio", stage="S", error_type="OSError"
+                ),
+            ]
+        )
+        report.not_run.append("/d.mp4")
+        return report
+
+    def test_counts_and_statuses(self):
+        report = self._report()
+
+        assert [r.status for r in report] == ["ok", "skipped", "failed"]
+        assert [r.elapsed_s for r in report] == [1.5, None, None]
+        assert report.counts() == {
+            "ok": 1,
+            "skipped": 1,
+            "failed": 1,
+            "not_run": 1,
+            "quarantined": 0,
+        }
+
+    def test_write_saves_summary(self, tmp_path):
+        path = tmp_path / "reports" / "batch.json"
+
+        self._report().write(path)
+
+        summary = json.loads(path.read_text())
+        assert summary["counts"]["failed"] == 1
+        assert summary["not_run"] == ["/d.mp4"]
+        assert summary["files"][0] == {
+            "file_path": "/a.mp4",
+            "stage": "S",
+            "status": "ok",
+            "error_type": None,
+            "error": None,
+            "elapsed_s": 1.5,
+            "output_path": "/a.mp3",
+        }
+        assert summary["files"][2]["error_type"] == "OSError"
+
+    def test_collect_closes_chains_after_max_failures(self):
+        closed = []
+
+        def chains():
+            try:
+                for name in ("bad1", "ok", "bad2", "never"):
+                    error = "ValueError: x" if "bad" in name else None
+                    yield [FileResult(f"/{name}.mp4", error=error)]
+            finally:
+                closed.append(True)
+
+        report = BatchReport()
+        report.collect(chains(), max_failures=2)
+
+        assert [r.file_path for r in report] == ["/bad1.mp4", "/ok.mp4", "/bad2.mp4"]
+        assert report.aborted is True
+        assert closed == [True]
+
+    def test_report_batch_writes_report_and_exits_on_failure(self, tmp_path):
+        path = tmp_path / "batch.json"
+        args = argparse.Namespace(report=str(path))
+
+        with pytest.raises(SystemExit) as exc_info:
+            report_batch(args, self._report())
+
+        assert exc_info.value.code == 1
+        assert json.loads(path.read_text())["counts"]["ok"] == 1
+
+    def test_report_batch_returns_when_nothing_failed(self):
+        report_batch(argparse.Namespace(report=None), BatchReport())
+
+
+class TestProcessAllFilesLargestFirst:
+    """Verifies that largest_first dispatches long files first."""
+
+    @pytest.fixture
+    def durations(self, mocker):
+        durations = {"/some/dir/a.mp4": 5, "/some/dir/b.mp4": 60, "/some/dir/c.mp4": 7}
+        mocker.patch("files_processor.iter_files", return_value=iter(durations))
+        mocker.patch(
+            "scheduling.probe_audio_stream",
+            side_effect=lambda path: {"duration": str(durations[path])},
+        )
+        return durations
+
+    def test_processes_longest_first_but_reports_in_discovery_order(
+        self, durations, mocker
+    ):
+        spy = mocker.spy(_RecordingProcessor, "process_file")
+
+        results = process_all_files(
+            "/some/dir", ["mp4"], _RecordingProcessor, largest_first=True
+        )
+
+        assert [call.args[0].file_path for call in spy.call_args_list] == [
+            "/some/dir/b.mp4",
+            "/some/dir/c.mp4",
+            "/some/dir/a.mp4",
+        ]
+        assert [r.file_path for r in results] == list(durations)
+
+    def test_plan_files_plans_without_processing(self, durations):
+        plan = plan_files("/some/dir", ["mp4"], workers=2)
+
+        assert plan.file_paths == [
+            "/some/dir/b.mp4",
+            "/some/dir/c.mp4",
+            "/some/dir/a.mp4",
+        ]
+        assert plan.makespan_s == 60
+
+
+class _SizedProcessor(_RecordingProcessor):
+    """Recording processor whose 'big' files need 1 GiB unless streamed."""
+
+    low_memory_kwargs: ClassVar[dict[str, Any]] = {"suffix": ".streamed"}
+
+    @classmethod
+    def estimate_peak_memory(cls, file_path: str, suffix: str = "", **_) -> int:
+        """Return 1 GiB for 'big' files not streamed, otherwise 1 MiB."""
+        return 1 << 30 if "big" in file_path and not suffix else 1 << 20
+
+    def process_file(self) -> None:
+        """Report the input with the suffix as the output."""
+        self.output_path = Path(self.file_path + self.suffix)
+
+
+class TestProcessAllFilesMemoryBudget:
+    """Verifies admission under a memory budget and the low-memory fallback."""
+
+    @pytest.fixture
+    def files(self, mocker):
+        names = ["/some/dir/a.mp3", "/some/dir/big.mp3", "/some/dir/c.mp3"]
+        mocker.patch("files_processor.iter_files", return_value=iter(names))
+        return names
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_oversized_file_runs_in_low_memory_mode(self, files, workers):
+        results = process_all_files(
+            "/some/dir",
+            ["mp3"],
+            _SizedProcessor,
+            workers=workers,
+            memory_budget=3 << 20,
+        )
+
+        assert [r.output_path for r in results] == [
+            "/some/dir/a.mp3",
+            "/some/dir/big.mp3.streamed",
+            "/some/dir/c.mp3",
+        ]
+
+    def test_each_file_is_admitted_and_released(self, files, mocker):
+        acquire = mocker.spy(MemoryBudget, "acquire")
+        release = mocker.spy(MemoryBudget, "release")
+
+        process_all_files(
+            "/some/dir", ["mp3"], _SizedProcessor, workers=2, memory_budget=3 << 20
+        )
+
+        assert [call.args[1] for call in acquire.call_args_list] == [1 << 20] * 3
+        assert [call.args[1] for call in release.call_args_list] == [1 << 20] * 3
+
+    def test_processors_without_estimate_are_not_limited(self, files):
+        results = process_all_files(
+            "/some/dir", ["mp3"], _RecordingProcessor, workers=2, memory_budget=1
+        )
+
+        assert all(r.ok for r in results)
+
+    def test_rejects_empty_budget(self, files):
+        with pytest.raises(ValueError, match="positive"):
+            process_all_files("/some/dir", ["mp3"], _SizedProcessor, memory_budget=0)
+
+
+class TestProcessAllFilesManifest:
+    """Verifies that unchanged files recorded in a manifest are skipped."""
+
+    def _make_files(self, tmp_path, *names):
+        for name in names:
+            (tmp_path / name).write_bytes(b"data")
+
+    def test_records_processed_files(self, tmp_path, mocker):
+        self._make_files(tmp_path, "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, manifest=manifest
+        )
+
+        assert results == [
+            FileResult(
+                str(tmp_path / "a.mp4"),
+                output_path=str(tmp_path / "a.mp4"),
+                stage="_RecordingProcessor",
+            )
+        ]
+        assert manifest.is_current(tmp_path / "a.mp4", "_RecordingProcessor", {})
+
+    def test_skips_unchanged_files_on_rerun(self, tmp_path, mocker):
+        self._make_files(tmp_path, "a.mp4", "b.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        process_all_files(tmp_path, ["mp4"], _RecordingProcessor, manifest=manifest)
+        (tmp_path / "c.mp4").write_bytes(b"new")
+        spy = mocker.spy(_RecordingProcessor, "process_file")
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, manifest=manifest
+        )
+
+        assert spy.call_count == 1
+        assert {Path(r.file_path).name: r.skipped for r in results} == {
+            "a.mp4": True,
+            "b.mp4": True,
+            "c.mp4": False,
+        }
+
+    def test_changed_kwargs_reprocess(self, tmp_path, mocker):
+        self._make_files(tmp_path, "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, manifest=manifest, suffix="x"
+        )
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, manifest=manifest, suffix="y"
+        )
+
+        assert results[0].skipped is False
+
+    def test_pool_records_only_successful_files(self, tmp_path):
+        self._make_files(tmp_path, "a.mp4", "bad.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+
+        process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, workers=2, manifest=manifest
+        )
+
+        assert manifest.is_current(tmp_path / "a.mp4", "_RecordingProcessor", {})
+        assert not manifest.is_current(tmp_path / "bad.mp4", "_RecordingProcessor", {})
+
+
+class _ListSink(MetricsSink):
+    """Metrics sink that keeps every emitted record."""
+
+    def __init__(self) -> None:
+        self.emitted: list[StageMetrics] = []
+
+    def emit(self, metrics: StageMetrics) -> None:
+        """Keep the record."""
+        self.emitted.append(metrics)
+
+
+class TestProcessAllFilesMetrics:
+    """Verifies that every processed file's metrics reach the sink."""
+
+    def test_serial_failure_is_emitted_and_reported(self, tmp_path):
+        (tmp_path / "a.mp4").write_bytes(b"data")
+        (tmp_path / "bad.mp4").write_bytes(b"data")
+        sink = _ListSink()
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, metrics_sink=sink
+        )
+
+        assert [r.status for r in results] == ["ok", "failed"]
+        assert [(Path(m.file_path).name, m.status) for m in sink.emitted] == [
+            ("a.mp4", "ok"),
+            ("bad.mp4", "failed"),
+        ]
+        assert sink.emitted[0].input_bytes == 4
+        assert sink.emitted[0].output_path == str(tmp_path / "a.mp4")
+        assert sink.emitted[0].stage == "_RecordingProcessor"
+
+    def test_pool_emits_metrics_of_every_file(self, tmp_path):
+        (tmp_path / "a.mp4").write_bytes(b"data")
+        (tmp_path / "bad.mp4").write_bytes(b"data")
+        sink = _ListSink()
+
+        results = process_all_files(
+            tmp_path, ["mp4"], _RecordingProcessor, workers=2, metrics_sink=sink
+        )
+
+        assert sorted(m.status for m in sink.emitted) == ["failed", "ok"]
+        assert [r.metrics.status for r in results] == ["ok", "failed"]
+        assert all(m.wall_s > 0 for m in sink.emitted)
+
+
+class _AsyncProcessor(_RecordingProcessor):
+    """Recording processor whose async work takes as long as the file name says.
+
+    A file named "0.05.mp3" sleeps for 0.05 s; the number of jobs running at
+    once is tracked on the class.
+    """
+
+    running = 0
+    peak = 0
+
+    async def process_file_async(self, on_progress=None) -> None:
+        """Sleep, report progress once, then behave like process_file."""
+        cls = type(self)
+        cls.running += 1
+        cls.peak = max(cls.peak, cls.running)
+        try:
+            await asyncio.sleep(float(Path(self.file_path).stem.split("_")[0]))
+            if on_progress is not None:
+                on_progress(FFmpegProgress(out_time=1.0, speed=2.0, done=True))
+            self.process_file()
+        finally:
+            cls.running -= 1
+
+
+class _SyncOnlyProcessor(ProcessClass):
+    """Processor without an async implementation, like AudioTagger."""
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+
+    def process_file(self) -> None:
+        """Report the input as the output."""
+        self.output_path = Path(self.file_path)
+
+
+class TestProcessAllFilesAsync:
+    """Verifies the asyncio runner: bounded concurrency, timeouts, cancellation."""
+
+    @pytest.fixture(autouse=True)
+    def _reset_counts(self):
+        _AsyncProcessor.running = _AsyncProcessor.peak = 0
+
+    @staticmethod
+    def _patch_files(mocker, names):
+        mocker.patch(
+            "files_processor.iter_files",
+            return_value=iter([f"/d/{name}" for name in names]),
+        )
+
+    def test_bounds_concurrency_and_keeps_discovery_order(self, mocker):
+        names = ["0.05_a.mp3", "0.01_b.mp3", "0.03_c.mp3", "0.02_d.mp3", "0_e.mp3"]
+        self._patch_files(mocker, names)
+
+        results = asyncio.run(
+            process_all_files_async(
+                "/d", ["mp3"], _AsyncProcessor, runner=AsyncRunner(max_concurrent=2)
+            )
+        )
+
+        assert [r.file_path for r in results] == [f"/d/{name}" for name in names]
+        assert all(r.ok for r in results)
+        assert results[0].output_path == "/d/0.05_a.mp3"
+        assert _AsyncProcessor.peak == 2
+
+    def test_overlapping_jobs_leave_process_wide_metrics_unset(self, mocker):
+        self._patch_files(mocker, ["0.05_a.mp3", "0.05_b.mp3", "0_c.mp3"])
+        runner = AsyncRunner(max_concurrent=2)
+
+        results = asyncio.run(
+            process_all_files_async("/d", ["mp3"], _AsyncProcessor, runner=runner)
+        )
+
+        overlapped = [r.metrics for r in results[:2]]
+        assert [(m.cpu_s, m.peak_rss_kb) for m in overlapped] == [(None, None)] * 2
+        assert all(m.wall_s >= 0.05 for m in overlapped)
+        assert results[2].metrics.cpu_s is not None
+        assert results[2].metrics.peak_rss_kb > 0
+
+    def test_runs_sync_only_processors_in_threads(self, mocker):
+        self._patch_files(mocker, ["a.mp3", "b.mp3"])
+
+        results = asyncio.run(
+            process_all_files_async("/d", ["mp3"], _SyncOnlyProcessor)
+        )
+
+        assert [r.output_path for r in results] == ["/d/a.mp3", "/d/b.mp3"]
+
+    def test_records_failures_and_carries_on(self, mocker):
+        self._patch_files(mocker, ["0_bad.mp3", "0_good.mp3"])
+
+        results = asyncio.run(process_all_files_async("/d", ["mp3"], _AsyncProcessor))
+
+        assert results[0].error == "ValueError: cannot process /d/0_bad.mp3"
+        assert results[1].ok
+
+    def test_times_out_slow_files(self, mocker):
+        self._patch_files(mocker, ["5_slow.mp3", "0_fast.mp3"])
+        runner = AsyncRunner(timeout=0.05)
+
+        results = asyncio.run(
+            process_all_files_async("/d", ["mp3"], _AsyncProcessor, runner=runner)
+        )
+
+        assert results[0].error.startswith("TimeoutError")
+        assert results[1].ok
+
+    def test_forwards_progress_with_file_path(self, mocker):
+        self._patch_files(mocker, ["0_a.mp3"])
+        reports = []
+        runner = AsyncRunner(on_progress=lambda *report: reports.append(report))
+
+        asyncio.run(
+            process_all_files_async("/d", ["mp3"], _AsyncProcessor, runner=runner)
+        )
+
+        assert reports == [("/d/0_a.mp3", FFmpegProgress(1.0, 2.0, True))]
+
+    def test_cancels_a_single_job(self, mocker):
+        self._patch_files(mocker, ["5_slow.mp3", "0.01_fast.mp3"])
+        runner = AsyncRunner()
+
+        async def run_and_cancel() -> list[FileResult]:
+            batch = asyncio.ensure_future(
+                process_all_files_async("/d", ["mp3"], _AsyncProcessor, runner=runner)
+            )
+            await asyncio.sleep(0.02)
+            assert runner.cancel("/d/5_slow.mp3") is True
+            assert runner.cancel("/d/not_running.mp3") is False
+            return await batch
+
+        results = asyncio.run(run_and_cancel())
+
+        assert results[0].error == "CancelledError: cancelled"
+        assert results[1].ok
+
+    def test_cancelling_the_batch_cancels_every_job(self, mocker):
+        self._patch_files(mocker, ["5_a.mp3", "5_b.mp3"])
+
+        async def cancel_batch() -> None:
+            batch = asyncio.ensure_future(
+                process_all_files_async("/d", ["mp3"], _AsyncProcessor)
+            )
+            await asyncio.sleep(0.02)
+            batch.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await batch
+
+        asyncio.run(asyncio.wait_for(cancel_batch(), timeout=2))
+
+        assert _AsyncProcessor.running == 0
+
+    def test_skips_and_records_with_manifest(self, tmp_path):
+        (tmp_path / "0_a.mp3").write_bytes(b"a")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+
+        first = asyncio.run(
+            process_all_files_async(
+                tmp_path, ["mp3"], _AsyncProcessor, manifest=manifest
+            )
+        )
+        second = asyncio.run(
+            process_all_files_async(
+                tmp_path, ["mp3"], _AsyncProcessor, manifest=manifest
+            )
+        )
+
+        assert first[0].skipped is False
+        assert second[0].skipped is True
+
+    def test_rejects_non_positive_concurrency(self):
+        with pytest.raises(ValueError, match="max_concurrent"):
+            AsyncRunner(max_concurrent=0)
+
+
+class _CopyingProcessor(_MirroringProcessor):
+    """Mirroring processor that writes <name>.<ext> under out_dir."""
+
+    def __init__(
+        self, file_path: str, out_dir: str, ext: str = "mp3", relative_dir: str = ""
+    ) -> None:
+        super().__init__(file_path, relative_dir)
+        self.out_dir = out_dir
+        self.ext = ext
+
+    def process_file(self) -> None:
+        """Raise for 'bad' files, otherwise write a copy with the new extension."""
+        if "bad" in self.file_path:
+            raise ValueError(f"cannot process {self.file_path}")
+        output_dir = Path(self.out_dir) / self.relative_dir
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.output_path = output_dir / f"{Path(self.file_path).stem}.{self.ext}"
+        self.output_path.write_bytes(Path(self.file_path).read_bytes())
+
+
+class TestWatchAndProcess:
+    """Verifies that watched files are pushed through every stage."""
+
+    @pytest.fixture
+    def dirs(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        return tmp_path / "in", tmp_path / "out"
+
+    @staticmethod
+    def _stages(out_dir, ext="mp3"):
+        return [
+            Stage(_CopyingProcessor, ["mp4"], {"out_dir": str(out_dir), "ext": ext}),
+            Stage(_RecordingProcessor, ["mp3"]),
+        ]
+
+    @staticmethod
+    def _watch(in_dir, stages, count, **kwargs):
+        """Collect the results of count files, then stop watching."""
+        stop = threading.Event()
+        watch = watch_and_process(
+            in_dir, stages, poll_interval=0.01, polling=True, stop=stop, **kwargs
+        )
+        results = [next(watch) for _ in range(count)]
+        stop.set()
+        assert list(watch) == []
+        return results
+
+    def test_chains_stages_on_each_output(self, dirs):
+        in_dir, out_dir = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        sink = _ListSink()
+
+        [results] = self._watch(in_dir, self._stages(out_dir), 1, metrics_sink=sink)
+
+        assert [(r.file_path, r.output_path) for r in results] == [
+            (str(in_dir / "a.mp4"), str(out_dir / "a.mp3")),
+            (str(out_dir / "a.mp3"), str(out_dir / "a.mp3")),
+        ]
+        assert [m.stage for m in sink.emitted] == [
+            "_CopyingProcessor",
+            "_RecordingProcessor",
+        ]
+
+    def test_processes_files_that_land_while_watching(self, dirs):
+        in_dir, out_dir = dirs
+        late = in_dir / "late.mp4"
+        threading.Timer(0.1, late.write_bytes, [b"data"]).start()
+
+        [results] = self._watch(in_dir, self._stages(out_dir), 1)
+
+        assert results[0].file_path == str(late)
+        assert (out_dir / "late.mp3").is_file()
+
+    def test_chain_stops_at_failure_and_unaccepted_output(self, dirs):
+        in_dir, out_dir = dirs
+        (in_dir / "bad.mp4").write_bytes(b"data")
+        (in_dir / "good.mp4").write_bytes(b"data")
+
+        results = self._watch(in_dir, self._stages(out_dir, ext="m4a"), 2)
+
+        assert [[r.ok for r in chain] for chain in results] == [[False], [True]]
+        assert results[0][0].error == f"ValueError: cannot process {in_dir / 'bad.mp4'}"
+
+    def test_recursive_outputs_mirror_input_tree(self, dirs):
+        in_dir, out_dir = dirs
+        (in_dir / "2024").mkdir()
+        (in_dir / "2024" / "a.mp4").write_bytes(b"data")
+
+        [results] = self._watch(in_dir, self._stages(out_dir), 1, recursive=True)
+
+        assert results[-1].output_path == str(out_dir / "2024" / "a.mp3")
+
+    def test_manifest_skips_done_stages(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        self._watch(in_dir, self._stages(out_dir), 1, manifest=manifest)
+
+        [rerun] = self._watch(in_dir, self._stages(out_dir), 1, manifest=manifest)
+
+        assert [(r.skipped, r.output_path) for r in rerun] == [
+            (True, str(out_dir / "a.mp3")),
+            (True, str(out_dir / "a.mp3")),
+        ]
+
+    def test_pool_processes_every_file(self, dirs):
+        in_dir, out_dir = dirs
+        for name in ("a", "b", "c"):
+            (in_dir / f"{name}.mp4").write_bytes(b"data")
+
+        results = self._watch(in_dir, self._stages(out_dir), 3, workers=2)
+
+        assert sorted(chain[-1].output_path for chain in results) == [
+            str(out_dir / f"{name}.mp3") for name in ("a", "b", "c")
+        ]
+
+    def test_rejects_empty_stages(self, dirs):
+        with pytest.raises(ValueError, match="stage"):
+            next(watch_and_process(dirs[0], []))
+
+
+class _GatedProcessor(_RecordingProcessor):
+    """Recording processor that holds 'slow' files until a gate file exists."""
+
+    def __init__(self, file_path: str, gate: str) -> None:
+        super().__init__(file_path)
+        self.gate = gate
+
+    def process_file(self) -> None:
+        """Wait for the gate if the file is slow, then report it as the output."""
+        while "slow" in self.file_path and not Path(self.gate).exists():
+            time.sleep(0.01)
+        super().process_file()
+
+
+class TestProcessPipelined:
+    """Verifies overlapping stages, bounded queues and per-file results."""
+
+    @pytest.fixture
+    def dirs(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        return tmp_path / "in", tmp_path / "out"
+
+    @staticmethod
+    def _stages(out_dir, ext="mp3"):
+        return [
+            Stage(_CopyingProcessor, ["mp4"], {"out_dir": str(out_dir), "ext": ext}),
+            Stage(_RecordingProcessor, ["mp3"]),
+        ]
+
+    def test_chains_stages_on_each_output(self, dirs):
+        in_dir, out_dir = dirs
+        for name in ("a", "b"):
+            (in_dir / f"{name}.mp4").write_bytes(b"data")
+        sink = _ListSink()
+
+        results = list(
+            process_pipelined(in_dir, self._stages(out_dir), metrics_sink=sink)
+        )
+
+        assert sorted(
+            (r.file_path, r.output_path) for chain in results for r in chain
+        ) == [
+            (str(in_dir / "a.mp4"), str(out_dir / "a.mp3")),
+            (str(in_dir / "b.mp4"), str(out_dir / "b.mp3")),
+            (str(out_dir / "a.mp3"), str(out_dir / "a.mp3")),
+            (str(out_dir / "b.mp3"), str(out_dir / "b.mp3")),
+        ]
+        assert len(sink.emitted) == 4
+
+    def test_chain_stops_at_failure_and_unaccepted_output(self, dirs):
+        in_dir, out_dir = dirs
+        (in_dir / "bad.mp4").write_bytes(b"data")
+        (in_dir / "good.mp4").write_bytes(b"data")
+
+        results = list(process_pipelined(in_dir, self._stages(out_dir, ext="m4a")))
+
+        assert sorted([r.ok for r in chain] for chain in results) == [[False], [True]]
+
+    def test_yields_files_as_they_finish(self, dirs, tmp_path):
+        in_dir, _ = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        (in_dir / "slow.mp4").write_bytes(b"data")
+        gate = tmp_path / "gate"
+        stages = [
+            Stage(_GatedProcessor, ["mp4"], {"gate": str(gate)}),
+            Stage(_RecordingProcessor, ["mp4"]),
+        ]
+        pipeline = process_pipelined(in_dir, stages, workers=2)
+
+        first = next(pipeline)
+        gate.touch()
+        rest = list(pipeline)
+
+        assert [r.file_path for r in first] == [str(in_dir / "a.mp4")] * 2
+        assert [[r.file_path for r in chain] for chain in rest] == [
+            [str(in_dir / "slow.mp4")] * 2
+        ]
+
+    def test_slow_stage_holds_up_earlier_stages(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        for index in range(8):
+            (in_dir / f"slow{index}.mp4").write_bytes(b"data")
+        gate = tmp_path / "gate"
+        stages = [
+            Stage(_CopyingProcessor, ["mp4"], {"out_dir": str(out_dir)}),
+            Stage(_GatedProcessor, ["mp3"], {"gate": str(gate)}),
+        ]
+        written = []
+
+        def count_then_open() -> None:
+            written.append(len(list(out_dir.glob("*.mp3"))))
+            gate.touch()
+
+        threading.Timer(0.5, count_then_open).start()
+        results = list(process_pipelined(in_dir, stages, queue_size=1))
+
+        # One file in the gated stage, one queued, one waiting to be queued.
+        assert 1 <= written[0] <= 3
+        assert len(results) == 8
+        assert all(chain[-1].ok for chain in results)
+
+    def test_recursive_outputs_mirror_input_tree(self, dirs):
+        in_dir, out_dir = dirs
+        (in_dir / "2024").mkdir()
+        (in_dir / "2024" / "a.mp4").write_bytes(b"data")
+
+        [results] = process_pipelined(in_dir, self._stages(out_dir), recursive=True)
+
+        assert results[-1].output_path == str(out_dir / "2024" / "a.mp3")
+
+    def test_manifest_skips_done_stages(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        list(process_pipelined(in_dir, self._stages(out_dir), manifest=manifest))
+
+        [rerun] = process_pipelined(in_dir, self._stages(out_dir), manifest=manifest)
+
+        assert [r.skipped for r in rerun] == [True, True]
+
+    def test_manifest_is_checked_without_the_pool(self, dirs, tmp_path, mocker):
+        in_dir, out_dir = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        submit = mocker.spy(ProcessPoolExecutor, "submit")
+        list(process_pipelined(in_dir, self._stages(out_dir), manifest=manifest))
+
+        assert submit.call_count == 2
+        assert not any(
+            isinstance(arg, Manifest)
+            for call in submit.call_args_list
+            for arg in call.args
+        )
+        submit.reset_mock()
+
+        list(process_pipelined(in_dir, self._stages(out_dir), manifest=manifest))
+
+        submit.assert_not_called()
+
+    def test_quarantines_failed_chains(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        (in_dir / "bad.mp4").write_bytes(b"data")
+        (in_dir / "good.mp4").write_bytes(b"data")
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+        list(process_pipelined(in_dir, self._stages(out_dir), quarantine=quarantine))
+
+        report = BatchReport()
+        report.collect(
+            process_pipelined(
+                in_dir,
+                self._stages(out_dir),
+                quarantine=quarantine,
+                quarantined=report.quarantined,
+            )
+        )
+        retry = list(
+            process_pipelined(
+                in_dir,
+                self._stages(out_dir),
+                quarantine=quarantine,
+                retry_quarantined=True,
+            )
+        )
+
+        assert list(quarantine.entries()) == [str(in_dir / "bad.mp4")]
+        assert report[0].file_path == str(in_dir / "good.mp4")
+        assert report.quarantined == [str(in_dir / "bad.mp4")]
+        assert report.counts()["quarantined"] == 1
+        assert [chain[0].file_path for chain in retry] == [str(in_dir / "bad.mp4")]
+        assert quarantine.entries()[str(in_dir / "bad.mp4")]["attempts"] == 2
+
+    def test_memory_budget_streams_oversized_files(self, dirs, mocker):
+        in_dir, out_dir = dirs
+        for name in ("a", "big"):
+            (in_dir / f"{name}.mp4").write_bytes(b"data")
+        stages = [
+            Stage(_CopyingProcessor, ["mp4"], {"out_dir": str(out_dir)}),
+            Stage(_SizedProcessor, ["mp3"]),
+        ]
+        release = mocker.spy(MemoryBudget, "release")
+
+        results = list(
+            process_pipelined(in_dir, stages, workers=2, memory_budget=3 << 20)
+        )
+
+        assert sorted(chain[-1].output_path for chain in results) == [
+            str(out_dir / "a.mp3"),
+            str(out_dir / "big.mp3.streamed"),
+        ]
+        assert sorted(call.args[1] for call in release.call_args_list) == [
+            0,
+            0,
+            1 << 20,
+            1 << 20,
+        ]
+
+    @pytest.mark.parametrize(
+        ("kwargs", "message"),
+        [
+            ({"workers": 0}, "workers"),
+            ({"queue_size": 0}, "queue_size"),
+            ({"memory_budget": 0}, "positive"),
+            ({"retry_quarantined": True}, "quarantine"),
+        ],
+    )
+    def test_rejects_invalid_options(self, dirs, kwargs, message):
+        with pytest.raises(ValueError, match=message):
+            next(process_pipelined(dirs[0], self._stages(dirs[1]), **kwargs))
+
+    def test_rejects_empty_stages(self, dirs):
+        with pytest.raises(ValueError, match="stage"):
+            next(process_pipelined(dirs[0], []))
+
+
+class TestBatchJournal:
+    """Verifies that an interrupted batch resumes from its journal."""
+
+    @pytest.fixture
+    def dirs(self, tmp_path, mocker):
+        mocker.patch.object(files_processor, "JOURNAL_DIR", tmp_path / "journals")
+        (tmp_path / "in").mkdir()
+        return tmp_path / "in", tmp_path / "out"
+
+    def test_same_batch_finds_same_journal(self, dirs):
+        in_dir, out_dir = dirs
+        stages = TestProcessPipelined._stages(out_dir)
+
+        journal = batch_journal(in_dir, stages, recursive=True)
+
+        assert batch_journal(in_dir, stages, recursive=True).path == journal.path
+        assert journal.path.parent == in_dir.parent / "journals"
+        assert batch_journal(in_dir, stages).path != journal.path
+        assert (
+            batch_journal(in_dir, TestProcessPipelined._stages(out_dir, "m4a")).path
+            != batch_journal(in_dir, stages).path
+        )
+
+    def test_rerun_resumes_where_interrupted_run_stopped(self, dirs):
+        in_dir, out_dir = dirs
+        for name in ("a", "b", "c"):
+            (in_dir / f"{name}.mp4").write_bytes(b"data")
+        stages = TestProcessPipelined._stages(out_dir)
+        pipeline = process_pipelined(
+            in_dir, stages, manifest=batch_journal(in_dir, stages)
+        )
+        [finished, _] = next(pipeline)
+        # Stopping the run stands in for the process being killed.
+        pipeline.close()
+        journal = batch_journal(in_dir, stages)
+        journaled = len(journal.path.read_text().splitlines())
+
+        rerun = list(process_pipelined(in_dir, stages, manifest=journal))
+
+        by_file = {chain[0].file_path: chain for chain in rerun}
+        assert [r.skipped for r in by_file[finished.file_path]] == [True, True]
+        assert sum(not r.skipped for chain in rerun for r in chain) == 6 - journaled
+        assert all(r.ok for chain in rerun for r in chain)
+        assert len(rerun) == 3
+
+
+class _LoggingProcessor(_RecordingProcessor):
+    """Recording processor that appends each file it processes to a log file."""
+
+    def __init__(self, file_path: str, log: str) -> None:
+        super().__init__(file_path)
+        self.log = log
+
+    def process_file(self) -> None:
+        """Log the file, then behave like _RecordingProcessor."""
+        with open(self.log, "a", encoding="utf-8") as f:
+            f.write(f"{os.getpid()} {Path(self.file_path).name}\n")
+        time.sleep(0.01)
+        super().process_file()
+
+
+def _drain_queue(queue_path: str, in_dir: str, log: str) -> None:
+    """Run one worker process against a shared queue until it is done."""
+    stages = [Stage(_LoggingProcessor, ["mp4"], {"log": log})]
+    for _ in process_queue(in_dir, stages, WorkQueue(queue_path), poll_interval=0.01):
+        pass
+
+
+class TestProcessQueue:
+    """Verifies claiming, retrying and sharing files through a work queue."""
+
+    @pytest.fixture
+    def dirs(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        return tmp_path / "in", tmp_path / "out"
+
+    @staticmethod
+    def _stages(out_dir):
+        return [
+            Stage(_CopyingProcessor, ["mp4"], {"out_dir": str(out_dir)}),
+            Stage(_RecordingProcessor, ["mp3"]),
+        ]
+
+    def test_processes_every_file_once(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        for name in ("a", "b", "c"):
+            (in_dir / f"{name}.mp4").write_bytes(b"data")
+        work_queue = WorkQueue(tmp_path / "queue.sqlite3")
+        sink = _ListSink()
+
+        results = list(
+            process_queue(
+                in_dir, self._stages(out_dir), work_queue, workers=2, metrics_sink=sink
+            )
+        )
+
+        assert sorted(chain[-1].output_path for chain in results) == [
+            str(out_dir / f"{name}.mp3") for name in ("a", "b", "c")
+        ]
+        assert work_queue.counts()["done"] == 3
+        assert len(sink.emitted) == 6
+        assert list(process_queue(in_dir, self._stages(out_dir), work_queue)) == []
+
+    def test_failing_file_is_retried_then_failed(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        (in_dir / "bad.mp4").write_bytes(b"data")
+        work_queue = WorkQueue(tmp_path / "queue.sqlite3", max_attempts=2)
+
+        results = list(process_queue(in_dir, self._stages(out_dir), work_queue))
+
+        assert [[r.ok for r in chain] for chain in results] == [[False], [False]]
+        assert work_queue.failures() == {
+            str(in_dir / "bad.mp4"): f"ValueError: cannot process {in_dir / 'bad.mp4'}"
+        }
+
+    def test_done_stages_are_skipped_without_the_pool(self, dirs, tmp_path, mocker):
+        in_dir, out_dir = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        stages = self._stages(out_dir)
+        list(
+            process_queue(
+                in_dir, stages[:1], WorkQueue(tmp_path / "1.sqlite3"), manifest=manifest
+            )
+        )
+        submit = mocker.spy(ProcessPoolExecutor, "submit")
+
+        [results] = process_queue(
+            in_dir, stages, WorkQueue(tmp_path / "2.sqlite3"), manifest=manifest
+        )
+
+        assert [r.skipped for r in results] == [True, False]
+        assert results[1].file_path == str(out_dir / "a.mp3")
+        [call] = submit.call_args_list
+        assert call.args[2:] == (str(out_dir / "a.mp3"), stages[1:], None)
+
+    def test_reclaims_file_of_dead_worker(self, dirs, tmp_path):
+        in_dir, out_dir = dirs
+        (in_dir / "a.mp4").write_bytes(b"data")
+        work_queue = WorkQueue(tmp_path / "queue.sqlite3", lease_seconds=0.2)
+        work_queue.enqueue([(str(in_dir / "a.mp4"), None)])
+        work_queue.claim("dead-host:1")
+
+        [results] = process_queue(
+            in_dir, self._stages(out_dir), work_queue, poll_interval=0.01
+        )
+
+        assert results[-1].output_path == str(out_dir / "a.mp3")
+        assert work_queue.counts()["done"] == 1
+
+    def test_heartbeats_keep_long_jobs_leased(self, dirs, tmp_path, mocker):
+        in_dir, _ = dirs
+        (in_dir / "slow.mp4").write_bytes(b"data")
+        gate = tmp_path / "gate"
+        work_queue = WorkQueue(tmp_path / "queue.sqlite3", lease_seconds=0.3)
+        heartbeat = mocker.spy(work_queue, "heartbeat")
+        threading.Timer(0.5, gate.touch).start()
+
+        [results] = process_queue(
+            in_dir, [Stage(_GatedProcessor, ["mp4"], {"gate": str(gate)})], work_queue
+        )
+
+        assert results[0].ok
+        assert heartbeat.call_count >= 2
+        assert work_queue.counts()["done"] == 1
+
+    def test_worker_processes_share_one_queue(self, dirs, tmp_path):
+        in_dir, _ = dirs
+        names = [f"{index}.mp4" for index in range(12)]
+        for name in names:
+            (in_dir / name).write_bytes(b"data")
+        queue_path = str(tmp_path / "queue.sqlite3")
+        log = tmp_path / "log.txt"
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(
+                target=_drain_queue, args=(queue_path, str(in_dir), str(log))
+            )
+            for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+
+        entries = [line.split() for line in log.read_text().splitlines()]
+        assert all(process.exitcode == 0 for process in processes)
+        assert sorted(name for _, name in entries) == sorted(names)
+        assert WorkQueue(queue_path).counts()["done"] == 12
+
+    def test_rejects_empty_stages(self, dirs, tmp_path):
+        with pytest.raises(ValueError, match="stage"):
+            next(process_queue(dirs[0], [], WorkQueue(tmp_path / "queue.sqlite3")))
+
+
+class TestFusedArguments:
+    """Verifies that --fused rejects flags it cannot honor."""
+
+    @pytest.mark.parametrize(
+        "flags",
+        [
+            ["--copy_stream"],
+            ["--segments", "4"],
+            ["--streaming"],
+            ["--lossless"],
+            ["--in_place"],
+            ["--streaming", "--lossless"],
+        ],
+    )
+    def test_rejects_flags_of_other_stages(self, flags, tmp_path):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "files_processor.py",
+                "--dir",
+                str(tmp_path),
+                "--fused",
+                *flags,
+            ],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parent.parent / "src",
+        )
+
+        assert result.returncode == 2
+        flag_names = ", ".join(flag for flag in flags if flag.startswith("--"))
+        assert f"--fused cannot be combined with {flag_names}." in result.stderr
+
+
+class TestLazyStageImports:
+    """Verifies that the CLIs load heavy dependencies only for their stage."""
+
+    @pytest.mark.parametrize(
+        ("module", "not_loaded"),
+        [
+            ("files_processor", {"asyncio", "eyed3", "moviepy", "numpy", "pydub"}),
+            ("extract_audios_from_dir", {"asyncio", "eyed3", "moviepy", "pydub"}),
+            ("normalize_audios_from_dir", {"asyncio", "eyed3", "moviepy", "pydub"}),
+            ("tag_audios_from_dir", {"asyncio", "eyed3", "moviepy", "numpy", "pydub"}),
+        ],
+    )
+    def test_cli_import_skips_heavy_packages(self, module, not_loaded):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import sys, {module}; print(' '.join(sys.modules))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent.parent / "src",
+        )
+
+        loaded = {name.partition(".")[0] for name in result.stdout.split()}
+        assert not loaded & not_loaded
@@ -0,0 +1,178 @@
+"""Tests for the header-only ID3v2 reader and in-place writer."""
+
+import eyed3.id3
+import pytest
+
+from id3_writer import (
+    ALBUM_FRAME,
+    ARTIST_FRAME,
+    TITLE_FRAME,
+    UnsupportedTagError,
+    read_id3v2,
+    set_text_frames,
+    write_text_frames,
+)
+
+_AUDIO = b"\xff\xfb\x90\x00" + bytes(range(256)) * 4
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def _text_frame(frame_id: str, text: str, version: int = 3) -> bytes:
+    body = b"\x00" + text.encode("latin-1")
+    size = _syncsafe(len(body)) if version == 4 else len(body).to_bytes(4, "big")
+    return frame_id.encode() + size + b"\x00\x00" + body
+
+
+def _tagged(frames: bytes, padding: int, version: int = 3, flags: int = 0) -> bytes:
+    size = len(frames) + padding
+    header = b"ID3" + bytes([version, 0, flags]) + _syncsafe(size)
+    return header + frames + bytes(padding)
+
+
+def _eyed3_tag(path) -> eyed3.id3.Tag:
+    tag = eyed3.id3.Tag()
+    tag.parse(str(path))
+    return tag
+
+
+class TestReadId3v2:
+    """Verifies header-only parsing."""
+
+    def test_returns_none_without_tag(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_AUDIO)
+        assert read_id3v2(path) is None
+
+    @pytest.mark.parametrize("version", [3, 4])
+    def test_reads_text_frames(self, tmp_path, version):
+        path = tmp_path / "a.mp3"
+        frames = _text_frame("TIT2", "Intro", version) + _text_frame(
+            "TPE1", "Band", version
+        )
+        path.write_bytes(_tagged(frames, 100, version) + _AUDIO)
+
+        tag = read_id3v2(path)
+
+        assert (tag.version, tag.size) == (version, len(frames) + 100)
+        assert tag.text(TITLE_FRAME) == "Intro"
+        assert tag.text(ARTIST_FRAME) == "Band"
+        assert tag.text(ALBUM_FRAME) is None
+
+    def test_reads_tags_written_by_eyed3(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_AUDIO)
+        tag = eyed3.id3.Tag()
+        tag.title = "Ünïcode ☃"
+        tag.album = "Album"
+        tag.save(str(path), version=eyed3.id3.ID3_V2_3)
+
+        parsed = read_id3v2(path)
+
+        assert parsed.text(TITLE_FRAME) == "Ünïcode ☃"
+        assert parsed.text(ALBUM_FRAME) == "Album"
+
+    @pytest.mark.parametrize(
+        ("version", "flags"), [(2, 0), (3, 0x80), (3, 0x40), (4, 0x10)]
+    )
+    def test_rejects_unsupported_tags(self, tmp_path, version, flags):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_tagged(b"", 10, version, flags) + _AUDIO)
+        with pytest.raises(UnsupportedTagError):
+            read_id3v2(path)
+
+
+class TestWriteTextFrames:
+    """Verifies in-place edits, padding reuse, and whole-file rewrites."""
+
+    def test_edits_in_place_within_padding(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        frames = _text_frame("TIT2", "Old") + _text_frame("COMM", "keep me")
+        original = _tagged(frames, 200) + _AUDIO
+        path.write_bytes(original)
+        inode = path.stat().st_ino
+
+        in_place = write_text_frames(
+            path, {TITLE_FRAME: "New title", ARTIST_FRAME: "Band"}
+        )
+
+        data = path.read_bytes()
+        assert in_place
+        assert path.stat().st_ino == inode
+        assert len(data) == len(original)
+        assert data.endswith(_AUDIO)
+        tag = _eyed3_tag(path)
+        assert (tag.title, tag.artist) == ("New title", "Band")
+        assert read_id3v2(path).text("COMM") == "keep me"
+
+    def test_adds_tag_with_padding_to_untagged_file(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_AUDIO)
+
+        in_place = write_text_frames(
+            path, {ALBUM_FRAME: "Album", ARTIST_FRAME: "Band", TITLE_FRAME: "Song"}
+        )
+
+        tag = read_id3v2(path)
+        assert not in_place
+        assert path.read_bytes().endswith(_AUDIO)
+        assert tag.version == 3
+        assert tag.size - tag.frames_size >= 4096
+        assert (_eyed3_tag(path).album, _eyed3_tag(path).title) == ("Album", "Song")
+
+    def test_later_edits_fit_in_reserved_padding(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_AUDIO)
+        write_text_frames(path, {TITLE_FRAME: "Song"})
+
+        assert write_text_frames(path, {TITLE_FRAME: "A much longer title" * 10})
+        assert read_id3v2(path).text(TITLE_FRAME) == "A much longer title" * 10
+
+    def test_rewrites_when_tag_outgrows_padding(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_tagged(_text_frame("TIT2", "Old"), 0) + _AUDIO)
+
+        in_place = write_text_frames(path, {TITLE_FRAME: "Much longer title"})
+
+        assert not in_place
+        assert path.read_bytes().endswith(_AUDIO)
+        assert _eyed3_tag(path).title == "Much longer title"
+        assert not list(tmp_path.glob(".a.mp3.*"))
+
+    def test_writes_non_latin_text(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(_tagged(b"", 100, version=4) + _AUDIO)
+
+        write_text_frames(path, {ARTIST_FRAME: "Sigur Rós ☃"})
+
+        assert _eyed3_tag(path).artist == "Sigur Rós ☃"
+
+
+class TestSetTextFrames:
+    """Verifies retagging an mp3 held in memory."""
+
+    def test_keeps_tag_size_when_frames_fit(self):
+        original = _tagged(_text_frame("TIT2", "Old"), 200) + _AUDIO
+
+        data = set_text_frames(original, {TITLE_FRAME: "New", ARTIST_FRAME: "Band"})
+
+        assert len(data) == len(original)
+        assert data.endswith(_AUDIO)
+        assert data[:10] == original[:10]
+        assert b"TPE1" in data
+        assert b"New" in data
+
+    def test_adds_padded_tag_to_untagged_mp3(self):
+        data = set_text_frames(memoryview(_AUDIO), {ALBUM_FRAME: "Album"})
+
+        assert data.startswith(b"ID3\x03")
+        assert data.endswith(_AUDIO)
+        assert len(data) - len(_AUDIO) > 4096
+
+    def test_rejects_unsupported_tags(self):
+        original = _tagged(_text_frame("TIT2", "Old"), 0, flags=0x80) + _AUDIO
+
+        with pytest.raises(UnsupportedTagError):
+            set_text_frames(original, {TITLE_FRAME: "New"})
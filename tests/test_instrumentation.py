@@ -0,0 +1,196 @@
+"""Tests for stage metrics, the metrics sinks, and the JSON log formatter."""
+
+import json
+import logging
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from instrumentation import (
+    JsonLinesSink,
+    JsonLogFormatter,
+    PrometheusTextfileSink,
+    StageMetrics,
+    configure_logging,
+    measure,
+    open_metrics_sink,
+)
+
+
+class TestMeasure:
+    """Verifies the resources recorded around a processor run."""
+
+    def test_records_time_sizes_and_processor_report(self, tmp_path):
+        source = tmp_path / "in.mp3"
+        source.write_bytes(bytes(100))
+        output = tmp_path / "out.mp3"
+        metrics = StageMetrics("AudioNormalizer", str(source))
+
+        with measure(metrics):
+            output.write_bytes(bytes(40))
+            metrics.observe(SimpleNamespace(output_path=output, audio_seconds=12.5))
+
+        assert metrics.input_bytes == 100
+        assert metrics.output_bytes == 40
+        assert metrics.output_path == str(output)
+        assert metrics.audio_s == 12.5
+        assert metrics.wall_s > 0
+        assert metrics.cpu_s >= 0
+        assert metrics.peak_rss_kb > 0
+        assert metrics.status == "ok"
+
+    def test_records_error_and_reraises(self, tmp_path):
+        metrics = StageMetrics("AudioTagger", str(tmp_path / "missing.mp3"))
+
+        with pytest.raises(ValueError), measure(metrics):
+            raise ValueError("corrupt frame")
+
+        assert metrics.error == "ValueError: corrupt frame"
+        assert metrics.status == "failed"
+        assert metrics.input_bytes == 0
+        assert metrics.wall_s > 0
+
+    def test_overlapping_measurements_leave_cpu_and_rss_unset(self):
+        first = StageMetrics("AudioExtractor", "/a.mp4")
+        second = StageMetrics("AudioExtractor", "/b.mp4")
+        third = StageMetrics("AudioExtractor", "/c.mp4")
+
+        with measure(first), measure(second):
+            pass
+        with measure(third):
+            pass
+
+        assert (first.cpu_s, first.peak_rss_kb) == (None, None)
+        assert (second.cpu_s, second.peak_rss_kb) == (None, None)
+        assert first.wall_s >= second.wall_s > 0
+        assert third.cpu_s is not None
+        assert third.peak_rss_kb > 0
+
+    def test_observe_ignores_unset_attributes(self):
+        metrics = StageMetrics("AudioTagger", "/a.mp3")
+
+        metrics.observe(SimpleNamespace(output_path=None, skipped=True))
+
+        assert metrics.output_path is None
+        assert metrics.audio_s is None
+        assert metrics.status == "skipped"
+
+
+def _metrics(stage: str = "AudioNormalizer", **overrides) -> StageMetrics:
+    values = {
+        "started_at": 1000.0,
+        "wall_s": 2.0,
+        "cpu_s": 1.5,
+        "audio_s": 60.0,
+        "input_bytes": 1000,
+        "output_bytes": 900,
+        "peak_rss_kb": 2048,
+        **overrides,
+    }
+    return StageMetrics(stage, "/in.mp3", **values)
+
+
+class TestJsonLinesSink:
+    """Verifies that each file is appended as one JSON object."""
+
+    def test_appends_one_line_per_file_with_status(self, tmp_path):
+        sink = JsonLinesSink(tmp_path / "logs" / "metrics.jsonl")
+
+        sink.emit(_metrics())
+        sink.emit(_metrics(error="ValueError: bad"))
+
+        lines = (tmp_path / "logs" / "metrics.jsonl").read_text().splitlines()
+        records = [json.loads(line) for line in lines]
+        assert [r["status"] for r in records] == ["ok", "failed"]
+        assert records[0]["audio_s"] == 60.0
+        assert records[0]["stage"] == "AudioNormalizer"
+
+
+class TestPrometheusTextfileSink:
+    """Verifies per-stage totals in the Prometheus text format."""
+
+    def test_accumulates_totals_per_stage(self, tmp_path):
+        path = tmp_path / "audio.prom"
+        sink = PrometheusTextfileSink(path)
+
+        sink.emit(_metrics())
+        sink.emit(_metrics(wall_s=3.0, peak_rss_kb=4096))
+        sink.emit(_metrics("AudioTagger", audio_s=None, error="OSError: x"))
+
+        lines = path.read_text().splitlines()
+        assert 'audio_extractor_files_total{stage="AudioNormalizer",status="ok"} 2' in (
+            lines
+        )
+        assert 'audio_extractor_files_total{stage="AudioTagger",status="failed"} 1' in (
+            lines
+        )
+        assert 'audio_extractor_wall_seconds_total{stage="AudioNormalizer"} 5' in lines
+        assert 'audio_extractor_audio_seconds_total{stage="AudioNormalizer"} 120' in (
+            lines
+        )
+        assert 'audio_extractor_peak_rss_bytes{stage="AudioNormalizer"} 4194304' in (
+            lines
+        )
+        assert (
+            'audio_extractor_last_success_timestamp_seconds{stage="AudioNormalizer"} '
+            "1003.000"
+        ) in lines
+        assert not any(
+            "last_success" in line and "AudioTagger" in line for line in lines
+        )
+
+    def test_every_sample_follows_its_type_line(self, tmp_path):
+        sink = PrometheusTextfileSink(tmp_path / "audio.prom")
+        sink.emit(_metrics())
+
+        typed = set()
+        for line in sink.render().splitlines():
+            if line.startswith("# TYPE"):
+                typed.add(line.split()[2])
+            elif not line.startswith("#"):
+                assert line.split("{")[0] in typed
+
+    def test_leaves_no_partial_file(self, tmp_path):
+        PrometheusTextfileSink(tmp_path / "audio.prom").emit(_metrics())
+
+        assert [p.name for p in tmp_path.iterdir()] == ["audio.prom"]
+
+
+class TestOpenMetricsSink:
+    """Verifies that the sink is chosen by file extension."""
+
+    @pytest.mark.parametrize(
+        ("name", "sink_type"),
+        [("m.prom", PrometheusTextfileSink), ("m.jsonl", JsonLinesSink)],
+    )
+    def test_picks_sink_by_suffix(self, name, sink_type):
+        assert isinstance(open_metrics_sink(Path(name)), sink_type)
+
+
+class TestJsonLogFormatter:
+    """Verifies structured log lines."""
+
+    def test_includes_message_level_and_extra_fields(self):
+        record = logging.makeLogRecord(
+            {
+                "name": "audio_normalizer",
+                "levelno": logging.INFO,
+                "levelname": "INFO",
+                "msg": "Normalizing %s...",
+                "args": ("track",),
+                "stage": "AudioNormalizer",
+            }
+        )
+
+        entry = json.loads(JsonLogFormatter().format(record))
+
+        assert entry["message"] == "Normalizing track..."
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "audio_normalizer"
+        assert entry["stage"] == "AudioNormalizer"
+        assert "args" not in entry
+
+    def test_configure_logging_rejects_unknown_format(self):
+        with pytest.raises(ValueError, match="log format"):
+            configure_logging("xml")
@@ -0,0 +1,146 @@
+"""Tests for the BS.1770 loudness and true-peak meters."""
+
+import math
+
+import numpy as np
+import pytest
+
+from audio_buffer import AudioBuffer
+from loudness import LoudnessMeter, TruePeakMeter, k_weighting_sections
+
+
+def _buffer(samples: np.ndarray, rate: int = 48000) -> AudioBuffer:
+    """Wrap (frames, channels) floats in [-1, 1] as an s16 AudioBuffer."""
+    pcm = np.rint(samples * 32767).astype("<i2")
+    return AudioBuffer(bytearray(pcm.tobytes()), samples.shape[1], rate)
+
+
+def _sine(freq: float, seconds: float, rate: int = 48000, phase: float = 0.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return np.sin(2 * np.pi * freq * t + phase)
+
+
+def _reference_filter(b: np.ndarray, a: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Sample-by-sample direct form I biquad, for comparison."""
+    y = np.zeros_like(x)
+    for n in range(len(x)):
+        y[n] = sum(b[k] * x[n - k] for k in range(3) if n >= k) - sum(
+            a[k] * y[n - k] for k in range(1, 3) if n >= k
+        )
+    return y
+
+
+class TestKWeighting:
+    """Verifies the filter design against the coefficients in BS.1770."""
+
+    def test_matches_standard_coefficients_at_48k(self):
+        (shelf_b, shelf_a), (highpass_b, highpass_a) = k_weighting_sections(48000)
+
+        np.testing.assert_allclose(
+            shelf_b, [1.53512485958697, -2.69169618940638, 1.19839281085285]
+        )
+        np.testing.assert_allclose(shelf_a, [1.0, -1.69065929318241, 0.73248077421585])
+        np.testing.assert_allclose(highpass_b, [1.0, -2.0, 1.0])
+        np.testing.assert_allclose(
+            highpass_a, [1.0, -1.99004745483398, 0.99007225036621]
+        )
+
+    def test_block_filter_matches_sample_by_sample_filter(self, mocker):
+        mocker.patch("loudness._BLOCK_FRAMES", 777)
+        rate = 44100
+        x = np.random.default_rng(0).uniform(-0.5, 0.5, (5000, 1))
+        meter = LoudnessMeter(rate, 1)
+        meter.step_frames = 1
+
+        meter.add(_buffer(x, rate))
+
+        expected = np.rint(x[:, 0] * 32767) / 32768
+        for b, a in k_weighting_sections(rate):
+            expected = _reference_filter(b, a, expected)
+        measured = np.concatenate(meter._steps)[:, 0]
+        np.testing.assert_allclose(measured, expected**2, atol=1e-12)
+
+
+class TestLoudnessMeter:
+    """Verifies integrated loudness, gating, and chunking."""
+
+    @pytest.mark.parametrize("rate", [44100, 48000])
+    def test_full_scale_sine_reads_minus_three(self, rate):
+        meter = LoudnessMeter(rate, 1)
+        meter.add(_buffer(_sine(997, 3, rate)[:, None], rate))
+        assert meter.integrated_loudness == pytest.approx(-3.01, abs=0.1)
+
+    def test_stereo_adds_channel_powers(self):
+        tone = _sine(997, 3)[:, None]
+        meter = LoudnessMeter(48000, 2)
+        meter.add(_buffer(np.hstack([tone, tone])))
+        assert meter.integrated_loudness == pytest.approx(0.0, abs=0.1)
+
+    def test_surround_ignores_lfe_channel(self):
+        tone = _sine(997, 3)[:, None]
+        silent = np.zeros_like(tone)
+        meter = LoudnessMeter(48000, 6)
+        meter.add(_buffer(np.hstack([silent, silent, tone, tone, silent, silent])))
+        assert meter.integrated_loudness == pytest.approx(-3.01, abs=0.1)
+
+    def test_chunking_does_not_change_result(self):
+        audio = np.random.default_rng(1).uniform(-0.3, 0.3, (48000 * 3, 2))
+        whole = LoudnessMeter(48000, 2)
+        whole.add(_buffer(audio))
+        chunked = LoudnessMeter(48000, 2)
+        for start in range(0, len(audio), 12345):
+            chunked.add(_buffer(audio[start : start + 12345]))
+        assert chunked.integrated_loudness == pytest.approx(
+            whole.integrated_loudness, abs=1e-9
+        )
+
+    def test_relative_gate_drops_quiet_passages(self):
+        loud = 0.5 * _sine(997, 3)
+        quiet = 0.005 * _sine(997, 30)
+        loud_only = LoudnessMeter(48000, 1)
+        loud_only.add(_buffer(loud[:, None]))
+        with_quiet = LoudnessMeter(48000, 1)
+        with_quiet.add(_buffer(np.concatenate([loud, quiet])[:, None]))
+
+        # Ungated, the quiet passage would pull the reading down about 10 LU.
+        assert with_quiet.integrated_loudness == pytest.approx(
+            loud_only.integrated_loudness, abs=0.5
+        )
+
+    def test_silence_and_short_input_are_minus_inf(self):
+        silent = LoudnessMeter(48000, 1)
+        silent.add(_buffer(np.zeros((48000, 1))))
+        short = LoudnessMeter(48000, 1)
+        short.add(_buffer(_sine(997, 0.3)[:, None]))
+        assert silent.integrated_loudness == -math.inf
+        assert short.integrated_loudness == -math.inf
+
+
+class TestTruePeakMeter:
+    """Verifies inter-sample peak detection."""
+
+    def test_finds_peak_between_samples(self):
+        # A quarter-rate sine sampled 45 degrees off its peaks: every sample is
+        # at -3 dBFS while the waveform reaches 0 dBFS between them.
+        tone = 0.99 * _sine(12000, 1, phase=np.pi / 4)[:, None]
+        buffer = _buffer(tone)
+        meter = TruePeakMeter(48000, 1)
+
+        meter.add(buffer)
+
+        assert buffer.max_dbfs == pytest.approx(-3.1, abs=0.1)
+        assert meter.true_peak == pytest.approx(20 * math.log10(0.99), abs=0.2)
+
+    def test_chunking_does_not_change_result(self):
+        tone = _sine(11000, 1, phase=0.3)[:, None] * 0.9
+        whole = TruePeakMeter(48000, 1)
+        whole.add(_buffer(tone))
+        chunked = TruePeakMeter(48000, 1)
+        for start in range(0, len(tone), 1001):
+            chunked.add(_buffer(tone[start : start + 1001]))
+        assert chunked.true_peak == pytest.approx(whole.true_peak, abs=1e-12)
+
+    def test_silence_is_minus_inf(self):
+        meter = TruePeakMeter(48000, 2)
+        meter.add(_buffer(np.zeros((100, 2))))
+        assert meter.true_peak == -math.inf
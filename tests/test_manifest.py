@@ -0,0 +1,168 @@
+"""Tests for the Manifest used to skip unchanged files between runs."""
+
+import os
+
+from manifest import Manifest
+
+
+def _touch(path, content: bytes = b"data", mtime_ns: int | None = None):
+    path.write_bytes(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+class TestManifestIsCurrent:
+    """Verifies change detection on size, mtime, hash, params, and outputs."""
+
+    def test_unknown_file_is_not_current(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        assert manifest.is_current(source, "AudioExtractor", {}) is False
+
+    def test_recorded_file_is_current(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {"copy_stream": False})
+
+        assert manifest.is_current(source, "AudioExtractor", {"copy_stream": False})
+
+    def test_other_stage_is_not_current(self, tmp_path):
+        source = _touch(tmp_path / "a.mp3")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioNormalizer", {})
+
+        assert manifest.is_current(source, "AudioTagger", {}) is False
+
+    def test_changed_params_are_not_current(self, tmp_path):
+        source = _touch(tmp_path / "a.mp3")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioNormalizer", {"target_dbfs": -20.0})
+
+        assert not manifest.is_current(source, "AudioNormalizer", {"target_dbfs": -14})
+
+    def test_changed_size_is_not_current(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {})
+        _touch(source, b"more data")
+
+        assert manifest.is_current(source, "AudioExtractor", {}) is False
+
+    def test_touched_file_is_not_current_without_hash(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4", mtime_ns=1_000_000_000)
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {})
+        _touch(source, mtime_ns=2_000_000_000)
+
+        assert manifest.is_current(source, "AudioExtractor", {}) is False
+
+    def test_touched_file_is_current_with_matching_hash(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4", mtime_ns=1_000_000_000)
+        manifest = Manifest(tmp_path / "manifest.jsonl", use_hash=True)
+        manifest.record(source, "AudioExtractor", {})
+        _touch(source, mtime_ns=2_000_000_000)
+
+        assert manifest.is_current(source, "AudioExtractor", {}) is True
+
+    def test_hash_match_records_new_mtime(self, tmp_path, mocker):
+        source = _touch(tmp_path / "a.mp4", mtime_ns=1_000_000_000)
+        path = tmp_path / "manifest.jsonl"
+        Manifest(path, use_hash=True).record(source, "AudioExtractor", {})
+        _touch(source, mtime_ns=2_000_000_000)
+        assert Manifest(path, use_hash=True).is_current(source, "AudioExtractor", {})
+        file_sha256 = mocker.patch("manifest._file_sha256")
+
+        second_run = Manifest(path, use_hash=True)
+
+        assert second_run.is_current(source, "AudioExtractor", {}) is True
+        file_sha256.assert_not_called()
+        assert len(path.read_text().splitlines()) == 2
+
+    def test_edited_file_is_not_current_with_hash(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4", b"aaaa", mtime_ns=1_000_000_000)
+        manifest = Manifest(tmp_path / "manifest.jsonl", use_hash=True)
+        manifest.record(source, "AudioExtractor", {})
+        _touch(source, b"bbbb", mtime_ns=2_000_000_000)
+
+        assert manifest.is_current(source, "AudioExtractor", {}) is False
+
+    def test_missing_output_is_not_current(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        output = _touch(tmp_path / "a.mp3")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {}, output)
+        output.unlink()
+
+        assert manifest.is_current(source, "AudioExtractor", {}) is False
+
+
+class TestManifestPersistence:
+    """Verifies entries survive reloading and later entries win."""
+
+    def test_entries_are_reloaded(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        Manifest(tmp_path / "manifest.jsonl").record(source, "AudioExtractor", {})
+
+        reloaded = Manifest(tmp_path / "manifest.jsonl")
+
+        assert reloaded.is_current(source, "AudioExtractor", {})
+
+    def test_latest_entry_wins(self, tmp_path):
+        source = _touch(tmp_path / "a.mp3")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioNormalizer", {"target_dbfs": -20.0})
+        manifest.record(source, "AudioNormalizer", {"target_dbfs": -14.0})
+
+        reloaded = Manifest(tmp_path / "manifest.jsonl")
+
+        assert reloaded.is_current(source, "AudioNormalizer", {"target_dbfs": -14.0})
+        assert not reloaded.is_current(
+            source, "AudioNormalizer", {"target_dbfs": -20.0}
+        )
+
+    def test_cut_short_last_line_is_ignored(self, tmp_path):
+        path = tmp_path / "manifest.jsonl"
+        first = _touch(tmp_path / "a.mp4")
+        second = _touch(tmp_path / "b.mp4")
+        Manifest(path).record(first, "AudioExtractor", {})
+        with path.open("a", encoding="utf-8") as f:
+            f.write('{"source": "')
+
+        manifest = Manifest(path)
+        manifest.record(second, "AudioExtractor", {})
+        reloaded = Manifest(path)
+
+        assert reloaded.is_current(first, "AudioExtractor", {})
+        assert reloaded.is_current(second, "AudioExtractor", {})
+
+    def test_clear_forgets_entries_and_file(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {})
+
+        manifest.clear()
+
+        assert not manifest.is_current(source, "AudioExtractor", {})
+        assert not manifest.path.exists()
+
+
+class TestManifestRecordedOutput:
+    """Verifies lookup of the output a stage recorded."""
+
+    def test_returns_latest_output(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {}, tmp_path / "old.mp3")
+        manifest.record(source, "AudioExtractor", {}, tmp_path / "a.mp3")
+
+        assert manifest.recorded_output(source, "AudioExtractor") == str(
+            tmp_path / "a.mp3"
+        )
+
+    def test_unknown_stage_has_no_output(self, tmp_path):
+        source = _touch(tmp_path / "a.mp4")
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(source, "AudioExtractor", {}, tmp_path / "a.mp3")
+
+        assert manifest.recorded_output(source, "AudioTagger") is None
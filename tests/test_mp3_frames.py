@@ -0,0 +1,252 @@
+"""Tests for mp3 frame parsing and lossless global_gain adjustment."""
+
+import os
+
+import pytest
+
+from mp3_frames import (
+    adjust_global_gain,
+    crc16,
+    crc16_lame,
+    global_gain_offsets,
+    iter_frames,
+    parse_frame_header,
+    read_encoder_padding,
+    write_info_tag,
+)
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames.
+_MPEG1_LENGTH = 417
+# MPEG-2 Layer III, 64 kbps, 22.05 kHz: 208-byte frames.
+_MPEG2_LENGTH = 208
+
+
+def _side_info(gains: list[int], mpeg1: bool, channels: int) -> bytes:
+    """Build side information whose only non-zero fields are global_gain."""
+    if mpeg1:
+        bits = "0" * (9 + (5 if channels == 1 else 3) + 4 * channels)
+        block_rest = 59 - 29
+    else:
+        bits = "0" * (8 + (1 if channels == 1 else 2))
+        block_rest = 63 - 29
+    for gain in gains:
+        bits += "0" * 21 + format(gain, "08b") + "0" * block_rest
+    bits += "0" * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+
+def _frame(
+    gains: list[int],
+    mpeg1: bool = True,
+    channels: int = 2,
+    protected: bool = False,
+    info: bool = False,
+) -> bytes:
+    """Build one Layer III frame with the given global_gain values."""
+    b1 = (0xFA if mpeg1 else 0xF2) | (0 if protected else 1)
+    b2 = 0x90 if mpeg1 else 0x80
+    b3 = 0xC0 if channels == 1 else 0x00
+    frame = bytes([0xFF, b1, b2, b3])
+    if protected:
+        frame += b"\x00\x00"
+    frame += _side_info(gains, mpeg1, channels)
+    if info:
+        frame += b"Info"
+    length = _MPEG1_LENGTH if mpeg1 else _MPEG2_LENGTH
+    return frame + bytes(length - len(frame))
+
+
+def _id3v2(size: int) -> bytes:
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x03\x00\x00" + syncsafe + bytes(size)
+
+
+def _lame_info_frame(delay: int = 576, padding: int = 0) -> bytearray:
+    """Build an MPEG-1 stereo Info frame with a LAME tag and a valid tag CRC."""
+    frame = bytearray(_frame([0] * 4))
+    xing = 4 + 32
+    tag = (
+        b"Info"
+        + (0xF).to_bytes(4, "big")
+        + bytes(4 + 4 + 100 + 4)
+        + b"LAME3.100"
+        + bytes(12)
+        + (delay << 12 | padding).to_bytes(3, "big")
+    )
+    frame[xing : xing + len(tag)] = tag
+    crc_at = xing + 120 + 34
+    frame[crc_at : crc_at + 2] = crc16_lame(frame[:crc_at]).to_bytes(2, "big")
+    return frame
+
+
+def _gains(data: bytearray) -> list[int]:
+    result = []
+    for frame in iter_frames(data):
+        for bit in global_gain_offsets(frame):
+            word = int.from_bytes(data[bit // 8 : bit // 8 + 2], "big")
+            result.append((word >> (8 - bit % 8)) & 0xFF)
+    return result
+
+
+class TestCrc16:
+    """Verifies the MPEG audio CRC."""
+
+    def test_check_value(self):
+        assert crc16(b"123456789") == 0xAEE7
+
+
+class TestCrc16Lame:
+    """Verifies the LAME tag CRC, including its parallel path for long inputs."""
+
+    def test_check_value(self):
+        assert crc16_lame(b"123456789") == 0xBB3D
+
+    def test_long_input_matches_chained_short_inputs(self):
+        data = os.urandom(200_003)
+
+        crc = 0
+        for start in range(0, len(data), 1000):
+            crc = crc16_lame(data[start : start + 1000], crc)
+
+        assert crc16_lame(data) == crc
+        assert crc16_lame(data[777:], crc16_lame(data[:777])) == crc
+
+
+class TestParseFrameHeader:
+    """Verifies header decoding and frame length."""
+
+    def test_parses_mpeg1_stereo(self):
+        frame = parse_frame_header(_frame([0] * 4), 0)
+        assert (frame.length, frame.sample_rate, frame.channels) == (417, 44100, 2)
+        assert frame.granules == 2
+        assert frame.sample_count == 1152
+        assert not frame.protected
+
+    def test_parses_mpeg2_mono(self):
+        frame = parse_frame_header(_frame([0], mpeg1=False, channels=1), 0)
+        assert (frame.length, frame.sample_rate, frame.channels) == (208, 22050, 1)
+        assert frame.granules == 1
+        assert frame.side_info_size == 9
+
+    def test_rejects_non_header_and_truncated_frame(self):
+        assert parse_frame_header(b"TAG" + bytes(200), 0) is None
+        assert parse_frame_header(_frame([0] * 4)[:100], 0) is None
+
+    def test_detects_info_frame(self):
+        assert parse_frame_header(_frame([0] * 4, info=True), 0).is_info
+
+
+class TestIterFrames:
+    """Verifies frame walking across tags and junk."""
+
+    def test_skips_id3v2_junk_and_id3v1(self):
+        data = (
+            _id3v2(100)
+            + _frame([1] * 4)
+            + b"\x00junk\xff"
+            + _frame([2] * 4)
+            + _frame([3] * 4)
+            + b"TAG"
+            + bytes(125)
+        )
+        frames = list(iter_frames(data))
+        assert [frame.offset for frame in frames] == [
+            110,
+            110 + 417 + 6,
+            110 + 2 * 417 + 6,
+        ]
+
+
+class TestAdjustGlobalGain:
+    """Verifies in-place gain edits, clamping, and CRC updates."""
+
+    def test_shifts_every_field(self):
+        data = bytearray(_frame([100, 101, 102, 103]) + _frame([90, 91, 92, 93]))
+
+        assert adjust_global_gain(data, 4) == 4
+
+        assert _gains(data) == [104, 105, 106, 107, 94, 95, 96, 97]
+
+    def test_handles_mpeg2_mono(self):
+        data = bytearray(_frame([150], mpeg1=False, channels=1) * 3)
+        adjust_global_gain(data, -3)
+        assert _gains(data) == [147, 147, 147]
+
+    def test_leaves_info_frame_alone(self):
+        data = bytearray(_frame([0] * 4, info=True) + _frame([100] * 4))
+
+        assert adjust_global_gain(data, -2) == -2
+
+        assert _gains(data) == [0, 0, 0, 0, 98, 98, 98, 98]
+
+    def test_clamps_to_field_range(self):
+        data = bytearray(_frame([250, 10, 10, 10]))
+
+        assert adjust_global_gain(data, 20) == 5
+        assert _gains(data) == [255, 15, 15, 15]
+        assert adjust_global_gain(data, -30) == -15
+        assert _gains(data) == [240, 0, 0, 0]
+
+    def test_only_touches_global_gain_bits(self):
+        original = bytearray(_frame([100] * 4))
+        data = bytearray(original)
+
+        adjust_global_gain(data, 1)
+        adjust_global_gain(data, -1)
+
+        assert data == original
+
+    def test_recomputes_crc_of_protected_frames(self):
+        data = bytearray(_frame([100] * 4, protected=True))
+
+        adjust_global_gain(data, 2)
+
+        side_info = data[6 : 6 + 32]
+        assert int.from_bytes(data[4:6], "big") == crc16(data[2:4] + side_info)
+
+    def test_raises_without_frames(self):
+        with pytest.raises(ValueError, match="No MPEG"):
+            adjust_global_gain(bytearray(b"not an mp3"), 1)
+
+
+class TestLameTag:
+    """Verifies reading and rewriting the Xing/LAME metadata frame."""
+
+    def test_reads_delay_and_padding(self):
+        data = _lame_info_frame(delay=576, padding=1234)
+
+        frame = parse_frame_header(data, 0)
+
+        assert frame.is_info
+        assert read_encoder_padding(data, frame) == (576, 1234)
+
+    def test_rewrites_counts_padding_and_crcs(self):
+        data = _lame_info_frame(delay=576, padding=100)
+        frame = parse_frame_header(data, 0)
+        offsets = [417 * index for index in range(1, 201)]
+
+        write_info_tag(data, frame, offsets, 417 * 201, 700, 0xBEEF)
+
+        xing = 36
+        assert int.from_bytes(data[xing + 8 : xing + 12], "big") == 200
+        assert int.from_bytes(data[xing + 12 : xing + 16], "big") == 417 * 201
+        toc = list(data[xing + 16 : xing + 116])
+        assert toc == sorted(toc)
+        assert toc[0] == 256 // 201
+        assert read_encoder_padding(data, frame) == (576, 700)
+        lame = xing + 120
+        assert int.from_bytes(data[lame + 28 : lame + 32], "big") == 417 * 201
+        assert data[lame + 32 : lame + 34] == b"\xbe\xef"
+        assert data[lame : lame + 9] == b"LAME3.100"
+
+    def test_rejects_frame_without_lame_tag(self):
+        data = bytearray(_frame([0] * 4, info=True))
+
+        with pytest.raises(ValueError, match="no LAME tag"):
+            read_encoder_padding(data, parse_frame_header(data, 0))
+
+    def test_rejects_padding_that_does_not_fit(self):
+        data = _lame_info_frame()
+
+        with pytest.raises(ValueError, match="does not fit"):
+            write_info_tag(data, parse_frame_header(data, 0), [417], 834, 5000, 0)
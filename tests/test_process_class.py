@@ -1,5 +1,8 @@
 """Tests for the ProcessClass abstract base class enforcement."""
 
+import asyncio
+import threading
+
 import pytest
 
 from process_class import ProcessClass
@@ -26,3 +29,21 @@ class TestProcessClass:
 
         obj = Concrete()
         assert obj.process_file() == "processed"
+
+    def test_process_file_async_runs_process_file_in_a_thread(self):
+        class Concrete(ProcessClass):
+            def process_file(self):
+                self.thread = threading.current_thread()
+
+        obj = Concrete()
+        asyncio.run(obj.process_file_async())
+
+        assert obj.thread is not threading.main_thread()
+
+    def test_no_peak_memory_or_low_memory_mode_by_default(self):
+        class Concrete(ProcessClass):
+            def process_file(self):
+                return "processed"
+
+        assert Concrete.estimate_peak_memory("/a.mp3", target_dbfs=-20.0) == 0
+        assert Concrete.low_memory_kwargs is None
@@ -0,0 +1,60 @@
+"""Tests for the Quarantine of files that failed."""
+
+import json
+
+from quarantine import Quarantine
+
+
+class TestQuarantine:
+    """Verifies adding, releasing and persisting quarantined files."""
+
+    def test_add_records_failure(self, tmp_path):
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+
+        quarantine.add(
+            tmp_path / "a.mp4", "AudioExtractor", "OSError", "OSError: no audio"
+        )
+
+        assert tmp_path / "a.mp4" in quarantine
+        assert str(tmp_path / "a.mp4") in quarantine
+        assert tmp_path / "b.mp4" not in quarantine
+        [entry] = quarantine.entries().values()
+        assert entry["stage"] == "AudioExtractor"
+        assert entry["error_type"] == "OSError"
+        assert entry["error"] == "OSError: no audio"
+        assert entry["attempts"] == 1
+
+    def test_failing_again_counts_attempts(self, tmp_path):
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+
+        quarantine.add(tmp_path / "a.mp4", "AudioExtractor", "OSError", "first")
+        quarantine.add(tmp_path / "a.mp4", "AudioNormalizer", "ValueError", "second")
+
+        [entry] = quarantine.entries().values()
+        assert entry["attempts"] == 2
+        assert entry["stage"] == "AudioNormalizer"
+        assert entry["error"] == "second"
+
+    def test_release(self, tmp_path):
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+        quarantine.add(tmp_path / "a.mp4", None, "OSError", "OSError: no audio")
+
+        assert quarantine.release(tmp_path / "a.mp4") is True
+        assert quarantine.release(tmp_path / "a.mp4") is False
+        assert len(quarantine) == 0
+
+    def test_persists_between_instances(self, tmp_path):
+        path = tmp_path / "data" / "quarantine.json"
+        Quarantine(path).add(tmp_path / "a.mp4", None, "OSError", "OSError: x")
+
+        reloaded = Quarantine(path)
+
+        assert tmp_path / "a.mp4" in reloaded
+        assert list(json.loads(path.read_text())) == [str(tmp_path / "a.mp4")]
+        assert [p.name for p in path.parent.iterdir()] == ["quarantine.json"]
+
+    def test_missing_file_is_empty(self, tmp_path):
+        quarantine = Quarantine(tmp_path / "quarantine.json")
+
+        assert len(quarantine) == 0
+        assert 42 not in quarantine
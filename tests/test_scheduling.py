@@ -0,0 +1,162 @@
+"""Tests for batch cost estimates and longest-first plans."""
+
+import threading
+
+import pytest
+
+from ffmpeg_utils import FFmpegError
+from scheduling import MemoryBudget, estimate_cost, format_plan, parse_size, plan_batch
+
+
+@pytest.fixture
+def durations(mocker):
+    """Patch probing so each file's duration is looked up in a dict."""
+    durations = {}
+
+    def probe(file_path):
+        if file_path not in durations:
+            raise FFmpegError(f"{file_path}: Invalid data found")
+        return {"duration": str(durations[file_path])}
+
+    mocker.patch("scheduling.probe_audio_stream", side_effect=probe)
+    return durations
+
+
+class TestEstimateCost:
+    """Verifies cost estimates from headers and the size fallback."""
+
+    def test_cost_is_probed_duration(self, durations):
+        durations["/media/a.mp4"] = 42.5
+
+        assert estimate_cost("/media/a.mp4") == (42.5, 42.5)
+
+    def test_unprobeable_file_is_estimated_from_size(self, durations, tmp_path):
+        path = tmp_path / "junk.mkv"
+        path.write_bytes(bytes(32_000))
+
+        assert estimate_cost(str(path)) == (None, 2.0)
+
+    def test_missing_file_costs_nothing(self, durations):
+        assert estimate_cost("/missing.mp4") == (None, 0.0)
+
+
+class TestPlanBatch:
+    """Verifies longest-first ordering and the simulated schedule."""
+
+    def test_orders_longest_first_and_beats_discovery_order(self, durations):
+        durations.update({"/a.mp4": 5, "/b.mp4": 6, "/c.mp4": 7, "/d.mp4": 60})
+
+        plan = plan_batch(list(durations), workers=2)
+
+        assert plan.file_paths == ["/d.mp4", "/c.mp4", "/b.mp4", "/a.mp4"]
+        assert [(f.worker, f.start_s) for f in plan.files] == [
+            (0, 0.0),
+            (1, 0.0),
+            (1, 7.0),
+            (1, 13.0),
+        ]
+        assert plan.total_cost_s == 78
+        assert plan.makespan_s == 60
+        assert plan.discovery_makespan_s == 66
+
+    def test_equal_costs_keep_discovery_order(self, durations):
+        durations.update({"/b.mp4": 3, "/a.mp4": 3, "/c.mp4": 3})
+
+        plan = plan_batch(["/b.mp4", "/a.mp4", "/c.mp4"])
+
+        assert plan.file_paths == ["/b.mp4", "/a.mp4", "/c.mp4"]
+        assert plan.makespan_s == 9
+
+    def test_empty_batch(self, durations):
+        plan = plan_batch([], workers=4)
+
+        assert plan.files == []
+        assert plan.makespan_s == plan.discovery_makespan_s == 0
+
+    def test_rejects_no_workers(self):
+        with pytest.raises(ValueError, match="workers"):
+            plan_batch(["/a.mp4"], workers=0)
+
+
+class TestFormatPlan:
+    """Verifies the printed plan."""
+
+    def test_lists_files_and_makespan(self, durations):
+        durations.update({"/short.mp4": 30, "/long.mp4": 3725})
+
+        text = format_plan(plan_batch(["/short.mp4", "/long.mp4", "/junk.mkv"], 2))
+
+        lines = text.splitlines()
+        assert lines[1].split() == ["0", "0:00:00", "1:02:05", "/long.mp4"]
+        assert lines[2].split() == ["1", "0:00:00", "0:00:30", "/short.mp4"]
+        assert lines[3].split() == ["1", "0:00:30", "~", "0:00:00", "/junk.mkv"]
+        assert lines[-1] == (
+            "3 file(s) on 2 worker(s): 1:02:35 of audio, makespan 1:02:05"
+            " (in discovery order 1:02:05)."
+        )
+
+
+class TestParseSize:
+    """Verifies parsing of --memory_budget sizes."""
+
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        [
+            ("1024", 1024),
+            ("512M", 512 << 20),
+            ("4g", 4 << 30),
+            ("1.5GiB", 3 << 29),
+            ("2 KB", 2048),
+        ],
+    )
+    def test_parses_binary_units(self, text, expected):
+        assert parse_size(text) == expected
+
+    @pytest.mark.parametrize("text", ["", "G", "4X", "-1M"])
+    def test_rejects_non_sizes(self, text):
+        with pytest.raises(ValueError, match="Not a size"):
+            parse_size(text)
+
+
+class TestMemoryBudget:
+    """Verifies admission of jobs under a memory budget."""
+
+    def test_admits_jobs_while_they_fit(self):
+        budget = MemoryBudget(100)
+
+        assert budget.acquire(60)
+        assert budget.acquire(40)
+        assert not budget.acquire(1, timeout=0.01)
+
+        budget.release(60)
+
+        assert budget.acquire(50)
+        assert budget.in_use == 90
+
+    def test_oversized_job_runs_alone(self):
+        budget = MemoryBudget(100)
+        budget.acquire(10)
+
+        assert not budget.acquire(500, timeout=0.01)
+
+        budget.release(10)
+
+        assert budget.acquire(500, timeout=0.01)
+        assert not budget.acquire(1, timeout=0.01)
+
+    def test_release_wakes_waiting_thread(self):
+        budget = MemoryBudget(100)
+        budget.acquire(100)
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(budget.acquire(30)))
+        waiter.start()
+
+        budget.release(100)
+        waiter.join(timeout=5)
+
+        assert admitted == [True]
+        assert budget.in_use == 30
+
+    def test_rejects_empty_budget(self):
+        with pytest.raises(ValueError, match="positive"):
+            MemoryBudget(0)
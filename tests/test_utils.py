@@ -1,7 +1,18 @@
 """Tests for get_file_strings and is_valid_ext utility functions."""
 
+import os
+
+import pytest
+
 from constants import VID_EXTS
-from utils import get_file_strings, is_valid_ext
+from utils import (
+    atomic_output,
+    get_file_strings,
+    is_partial,
+    is_selected,
+    is_valid_ext,
+    iter_files,
+)
 
 
 class TestGetFileStrings:
@@ -86,3 +97,162 @@ class TestIsValidExt:
 
     def test_vid_exts_invalid(self):
         assert is_valid_ext("clip.mp3", VID_EXTS) is False
+
+
+def _make_tree(root):
+    for rel in (
+        "b.mp4",
+        "a.mp4",
+        "notes.txt",
+        "2024/jan/x.mp4",
+        "2024/jan/tmp/y.mp4",
+        "2024/feb.mp4",
+        "2025/z.mkv",
+        "2025/.z.123-0a1b2c3d.partial.mkv",
+    ):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    (root / "dir.mp4").mkdir()
+
+
+class TestIterFiles:
+    """Verifies lazy discovery, recursion, depth limits, and glob filters."""
+
+    def _rel(self, root, paths):
+        return [os.path.relpath(p, root).replace(os.sep, "/") for p in paths]
+
+    def test_top_level_only_by_default(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS)
+        assert self._rel(tmp_path, found) == ["a.mp4", "b.mp4"]
+
+    def test_recursive_walks_depth_first_in_name_order(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS, recursive=True)
+        assert self._rel(tmp_path, found) == [
+            "a.mp4",
+            "b.mp4",
+            "2024/feb.mp4",
+            "2024/jan/x.mp4",
+            "2024/jan/tmp/y.mp4",
+            "2025/z.mkv",
+        ]
+
+    def test_max_depth_limits_recursion(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS, recursive=True, max_depth=1)
+        assert self._rel(tmp_path, found) == [
+            "a.mp4",
+            "b.mp4",
+            "2024/feb.mp4",
+            "2025/z.mkv",
+        ]
+
+    def test_include_matches_relative_path(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS, recursive=True, include=["2024/*"])
+        assert self._rel(tmp_path, found) == [
+            "2024/feb.mp4",
+            "2024/jan/x.mp4",
+            "2024/jan/tmp/y.mp4",
+        ]
+
+    def test_include_matches_base_name(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS, recursive=True, include=["*.mkv"])
+        assert self._rel(tmp_path, found) == ["2025/z.mkv"]
+
+    def test_exclude_prunes_directories(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS, recursive=True, exclude=["tmp", "b.*"])
+        assert self._rel(tmp_path, found) == [
+            "a.mp4",
+            "2024/feb.mp4",
+            "2024/jan/x.mp4",
+            "2025/z.mkv",
+        ]
+
+    def test_is_lazy(self, tmp_path):
+        _make_tree(tmp_path)
+        found = iter_files(tmp_path, VID_EXTS)
+        assert next(found).endswith("a.mp4")
+
+
+class TestIsSelected:
+    """Verifies that is_selected agrees with iter_files file by file."""
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"recursive": True},
+            {"recursive": True, "max_depth": 1},
+            {"recursive": True, "include": ["2024/*"]},
+            {"recursive": True, "include": ["*.mkv"]},
+            {"recursive": True, "exclude": ["tmp", "b.*"]},
+        ],
+    )
+    def test_matches_iter_files(self, tmp_path, options):
+        _make_tree(tmp_path)
+        every_file = [
+            os.path.join(dir_path, name)
+            for dir_path, _, names in os.walk(tmp_path)
+            for name in names
+        ]
+
+        selected = {
+            p for p in every_file if is_selected(tmp_path, p, VID_EXTS, **options)
+        }
+
+        assert selected == set(iter_files(tmp_path, VID_EXTS, **options))
+
+    def test_file_outside_root_is_not_selected(self, tmp_path):
+        assert not is_selected(tmp_path / "in", tmp_path / "a.mp4", VID_EXTS)
+
+
+class TestAtomicOutput:
+    """Verifies that outputs only appear at their path once complete."""
+
+    def test_renames_complete_output_into_place(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(b"old")
+
+        with atomic_output(path) as partial:
+            partial.write_bytes(b"new")
+            assert partial.parent == tmp_path
+            assert partial.suffix == ".mp3"
+            assert is_partial(partial)
+            assert path.read_bytes() == b"old"
+
+        assert path.read_bytes() == b"new"
+        assert os.listdir(tmp_path) == ["a.mp3"]
+
+    def test_failed_output_is_removed_and_path_kept(self, tmp_path):
+        path = tmp_path / "a.mp3"
+        path.write_bytes(b"old")
+
+        with pytest.raises(RuntimeError), atomic_output(path) as partial:
+            partial.write_bytes(b"trunc")
+            raise RuntimeError("killed")
+
+        assert path.read_bytes() == b"old"
+        assert os.listdir(tmp_path) == ["a.mp3"]
+
+    def test_missing_output_is_an_error(self, tmp_path):
+        with pytest.raises(FileNotFoundError), atomic_output(tmp_path / "a.mp3"):
+            pass
+
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.parametrize(
+        ("name", "expected"),
+        [
+            (".a.123-0a1b2c3d.partial.mp3", True),
+            ("a.partial.mp3", False),
+            (".a.mp3", False),
+            ("a.mp3", False),
+        ],
+    )
+    def test_is_partial(self, name, expected):
+        assert is_partial(name) is expected
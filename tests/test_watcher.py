@@ -0,0 +1,172 @@
+"""Tests for the inotify and polling directory watchers and watch_files."""
+
+import sys
+import threading
+
+import pytest
+
+from watcher import InotifyWatcher, PollingWatcher, open_watcher, watch_files
+
+linux_only = pytest.mark.skipif(sys.platform != "linux", reason="needs inotify")
+
+
+class TestPollingWatcher:
+    """Verifies that files are reported once their size stops changing."""
+
+    def test_reports_file_once_stable(self, tmp_path):
+        path = tmp_path / "a.mp4"
+        path.write_bytes(b"partial")
+        watcher = PollingWatcher(tmp_path, ["mp4"], interval=0)
+
+        first = watcher.wait(1)
+        second = watcher.wait(1)
+        third = watcher.wait(1)
+
+        assert first == []
+        assert second == [str(path)]
+        assert third == []
+
+    def test_growing_file_is_reported_after_it_settles(self, tmp_path):
+        path = tmp_path / "a.mp4"
+        path.write_bytes(b"partial")
+        watcher = PollingWatcher(tmp_path, ["mp4"], interval=0)
+        watcher.wait(1)
+
+        with path.open("ab") as f:
+            f.write(b" and the rest")
+        growing = watcher.wait(1)
+        settled = watcher.wait(1)
+
+        assert growing == []
+        assert settled == [str(path)]
+
+    def test_ignores_other_extensions(self, tmp_path):
+        (tmp_path / "notes.txt").write_bytes(b"x")
+        watcher = PollingWatcher(tmp_path, ["mp4"], interval=0)
+
+        assert watcher.wait(1) + watcher.wait(1) == []
+
+    def test_waits_no_longer_than_timeout(self, tmp_path):
+        (tmp_path / "a.mp4").write_bytes(b"x")
+        watcher = PollingWatcher(tmp_path, ["mp4"], interval=60)
+        watcher.wait(1)
+
+        assert watcher.wait(0.01) == []
+
+
+@linux_only
+class TestInotifyWatcher:
+    """Verifies close-after-write, move-in and new-directory events."""
+
+    def test_reports_file_when_writer_closes_it(self, tmp_path):
+        with InotifyWatcher(tmp_path) as watcher:
+            with (tmp_path / "a.mp4").open("wb") as f:
+                f.write(b"partial")
+                assert watcher.wait(0.05) == []
+            reported = watcher.wait(1)
+
+        assert reported == [str(tmp_path / "a.mp4")]
+
+    def test_reports_file_moved_in(self, tmp_path):
+        outside = tmp_path / "outside"
+        outside.mkdir()
+        (outside / "a.tmp").write_bytes(b"data")
+        watched = tmp_path / "in"
+        watched.mkdir()
+
+        with InotifyWatcher(watched) as watcher:
+            (outside / "a.tmp").rename(watched / "a.mp4")
+            reported = watcher.wait(1)
+
+        assert reported == [str(watched / "a.mp4")]
+
+    def test_recursive_watches_new_directories(self, tmp_path):
+        with InotifyWatcher(tmp_path, recursive=True) as watcher:
+            (tmp_path / "2024").mkdir()
+            watcher.wait(1)
+            (tmp_path / "2024" / "a.mp4").write_bytes(b"data")
+            reported = watcher.wait(1)
+
+        assert reported == [str(tmp_path / "2024" / "a.mp4")]
+
+    def test_non_recursive_ignores_subdirectories(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+
+        with InotifyWatcher(tmp_path) as watcher:
+            (tmp_path / "sub" / "a.mp4").write_bytes(b"data")
+            reported = watcher.wait(0.05)
+
+        assert reported == []
+
+
+class TestOpenWatcher:
+    """Verifies the choice between inotify and polling."""
+
+    def test_polling_when_requested(self, tmp_path):
+        assert isinstance(open_watcher(tmp_path, ["mp4"], polling=True), PollingWatcher)
+
+    def test_falls_back_to_polling_without_inotify(self, tmp_path, mocker, caplog):
+        mocker.patch(
+            "watcher.InotifyWatcher", side_effect=OSError("inotify is not available.")
+        )
+
+        watcher = open_watcher(tmp_path, ["mp4"], poll_interval=5)
+
+        assert isinstance(watcher, PollingWatcher)
+        assert watcher.interval == 5
+        assert "Falling back to polling" in caplog.text
+
+
+class TestWatchFiles:
+    """Verifies existing files, new files, filtering and stopping."""
+
+    def test_yields_existing_then_new_files(self, tmp_path):
+        (tmp_path / "old.mp4").write_bytes(b"data")
+        stop = threading.Event()
+        batches = watch_files(
+            tmp_path, ["mp4"], poll_interval=0, polling=True, stop=stop
+        )
+
+        existing = next(batches)
+        (tmp_path / "new.mp4").write_bytes(b"data")
+        (tmp_path / "notes.txt").write_bytes(b"data")
+        new = [path for _ in range(3) for path in next(batches)]
+        stop.set()
+
+        assert existing == [str(tmp_path / "old.mp4")]
+        assert new == [str(tmp_path / "new.mp4")]
+        assert list(batches) == []
+
+    def test_applies_include_and_exclude(self, tmp_path):
+        (tmp_path / "keep").mkdir()
+        (tmp_path / "skip").mkdir()
+        (tmp_path / "keep" / "a.mp4").write_bytes(b"data")
+        (tmp_path / "skip" / "b.mp4").write_bytes(b"data")
+        (tmp_path / "c.mp4").write_bytes(b"data")
+        batches = watch_files(
+            tmp_path,
+            ["mp4"],
+            recursive=True,
+            include=["keep/*", "skip/*"],
+            exclude=["skip"],
+            poll_interval=0,
+            polling=True,
+        )
+
+        found = [path for _ in range(3) for path in next(batches)]
+        batches.close()
+
+        assert found == [str(tmp_path / "keep" / "a.mp4")]
+
+    @linux_only
+    def test_rewritten_file_is_yielded_again(self, tmp_path):
+        path = tmp_path / "a.mp4"
+        path.write_bytes(b"first")
+        batches = watch_files(tmp_path, ["mp4"], poll_interval=1)
+        next(batches)
+
+        path.write_bytes(b"second version")
+        rewritten = next(batches)
+        batches.close()
+
+        assert rewritten == [str(path)]
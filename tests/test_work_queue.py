@@ -0,0 +1,128 @@
+"""Tests for the SQLite work queue and its leases."""
+
+import pytest
+
+from work_queue import Job, WorkQueue
+
+
+@pytest.fixture
+def clock(mocker):
+    """Patch the queue's wall clock; set clock.now to move time."""
+    clock = mocker.MagicMock(now=1000.0)
+    mocker.patch("work_queue.time.time", side_effect=lambda: clock.now)
+    return clock
+
+
+@pytest.fixture
+def work_queue(tmp_path, clock):
+    queue = WorkQueue(tmp_path / "queue.sqlite3", lease_seconds=60, max_attempts=2)
+    queue.enqueue([("/media/a.mp4", None), ("/media/b.mp4", "2024")])
+    return queue
+
+
+class TestEnqueue:
+    """Verifies that files are only ever added once."""
+
+    def test_counts_new_files_only(self, work_queue):
+        added = work_queue.enqueue([("/media/a.mp4", None), ("/media/c.mp4", None)])
+
+        assert added == 1
+        assert work_queue.counts() == {
+            "pending": 3,
+            "leased": 0,
+            "done": 0,
+            "failed": 0,
+        }
+
+    def test_done_files_are_not_requeued(self, work_queue):
+        job = work_queue.claim("w1")
+        work_queue.complete(job, "w1")
+
+        assert work_queue.enqueue([("/media/a.mp4", None)]) == 0
+        assert work_queue.counts()["done"] == 1
+
+    @pytest.mark.parametrize(
+        ("kwargs", "message"),
+        [({"lease_seconds": 0}, "lease_seconds"), ({"max_attempts": 0}, "attempts")],
+    )
+    def test_rejects_invalid_options(self, tmp_path, kwargs, message):
+        with pytest.raises(ValueError, match=message):
+            WorkQueue(tmp_path / "queue.sqlite3", **kwargs)
+
+
+class TestClaim:
+    """Verifies claims, leases and their expiry."""
+
+    def test_claims_oldest_pending_job_once(self, work_queue):
+        first = work_queue.claim("w1")
+        second = work_queue.claim("w2")
+
+        assert first == Job(first.id, "/media/a.mp4", None, 1)
+        assert second == Job(second.id, "/media/b.mp4", "2024", 1)
+        assert work_queue.claim("w3") is None
+        assert work_queue.counts()["leased"] == 2
+
+    def test_expired_lease_is_reclaimed(self, work_queue, clock, caplog):
+        job = work_queue.claim("dead")
+        work_queue.claim("w1")
+        clock.now += 61
+
+        again = work_queue.claim("w2")
+
+        assert (again.id, again.attempts) == (job.id, 2)
+        assert "held by dead expired" in caplog.text
+        assert not work_queue.heartbeat(job, "dead")
+        assert not work_queue.complete(job, "dead")
+        assert work_queue.complete(again, "w2")
+
+    def test_heartbeat_extends_lease(self, work_queue, clock):
+        kept = work_queue.claim("w1")
+        dropped = work_queue.claim("w1")
+        clock.now += 50
+        assert work_queue.heartbeat(kept, "w1")
+
+        clock.now += 50
+
+        assert work_queue.claim("w2").id == dropped.id
+        assert work_queue.claim("w2") is None
+
+    def test_lease_expiring_on_last_attempt_fails_job(self, work_queue, clock):
+        for _ in range(2):
+            work_queue.claim("dead")
+            clock.now += 61
+
+        job = work_queue.claim("w1")
+
+        assert job.file_path == "/media/b.mp4"
+        assert work_queue.failures() == {
+            "/media/a.mp4": "Lease expired on the last attempt."
+        }
+
+
+class TestFinish:
+    """Verifies completion, retries and release."""
+
+    def test_failed_attempt_is_retried_then_failed(self, work_queue):
+        job = work_queue.claim("w1")
+        assert work_queue.fail(job, "w1", "ValueError: first")
+
+        retry = work_queue.claim("w1")
+        work_queue.fail(retry, "w1", "ValueError: second")
+
+        assert (retry.id, retry.attempts) == (job.id, 2)
+        assert work_queue.failures() == {"/media/a.mp4": "ValueError: second"}
+
+    def test_release_does_not_count_attempt(self, work_queue):
+        job = work_queue.claim("w1")
+        assert work_queue.release(job, "w1")
+
+        again = work_queue.claim("w2")
+
+        assert (again.id, again.attempts) == (job.id, 1)
+
+    def test_only_lease_holder_can_finish(self, work_queue):
+        job = work_queue.claim("w1")
+
+        assert not work_queue.complete(job, "w2")
+        assert not work_queue.fail(job, "w2", "error")
+        assert work_queue.counts()["leased"] == 1